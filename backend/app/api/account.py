@@ -3,10 +3,15 @@
 """
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from typing import Optional, List, Dict
+from datetime import date, datetime
+import zlib
+
+import numpy as np
 
 from app.services.futu_client import futu_client
+from app.services.kline_store import KLINE_DTYPE, to_epoch
+from app.services.risk import BENCHMARKS, risk_engine
 
 router = APIRouter()
 
@@ -46,6 +51,51 @@ class AccountStatus(BaseModel):
     last_sync: Optional[datetime]
 
 
+class PortfolioRisk(BaseModel):
+    """组合风险指标（比例为小数，amount 为金额）"""
+    volatility: float
+    beta: Optional[float]
+    var_95: float
+    cvar_95: float
+    var_99: float
+    cvar_99: float
+    var_95_amount: float
+    cvar_95_amount: float
+    var_99_amount: float
+    cvar_99_amount: float
+
+
+class Concentration(BaseModel):
+    """持仓集中度"""
+    hhi: float
+    effective_n: float
+    max_weight: float
+    top5_weight: float
+
+
+class PositionRisk(BaseModel):
+    """个股风险"""
+    stock_code: str
+    weight: float
+    volatility: float
+    beta: Optional[float]
+    risk_contribution: float
+
+
+class RiskReport(BaseModel):
+    """组合风险报告"""
+    as_of: date
+    benchmark: str
+    observations: int
+    total_value: float
+    portfolio: PortfolioRisk
+    concentration: Concentration
+    positions: List[PositionRisk]
+    excluded: List[str] = []
+    correlation: Optional[List[List[float]]] = None
+    covariance: Optional[List[List[float]]] = None
+
+
 class AccountListItem(BaseModel):
     """账户列表项"""
     acc_id: str
@@ -116,11 +166,13 @@ async def get_account_info(acc_id: str = None):
 
 
 @router.get("/positions", response_model=List[Position], summary="获取持仓列表")
-async def get_positions():
+async def get_positions(acc_id: str = None):
     """
     获取当前持仓列表
     
     返回所有持仓股票的详细信息
+
+    - acc_id: 账户ID（可选，默认使用活跃账户）
     """
     # 未连接或交易权限未启用时返回模拟数据
     if not futu_client.is_connected or not futu_client.is_trade_enabled:
@@ -150,12 +202,55 @@ async def get_positions():
         ]
 
     try:
-        result = await futu_client.get_positions()
+        result = await futu_client.get_positions(acc_id)
         return [Position(**p) for p in result]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取持仓列表失败: {str(e)}")
 
 
+def _mock_risk_series(codes: List[str], days: int = 300) -> Dict[str, np.ndarray]:
+    """模拟日K线（开发模式）：共同市场因子 + 个股噪声，按代码固定随机种子"""
+    end = to_epoch(date.today())
+    times = end - np.arange(days)[::-1] * 86400
+    market = np.random.default_rng(0).normal(0.0003, 0.012, days)
+    series = {}
+    for code in codes:
+        rng = np.random.default_rng(zlib.crc32(code.encode()))
+        beta = 1.0 if code in BENCHMARKS.values() else rng.uniform(0.5, 1.5)
+        noise = 0.0 if code in BENCHMARKS.values() else rng.normal(0, 0.015, days)
+        close = 100 * np.exp(np.cumsum(beta * market + noise))
+        bars = np.zeros(days, dtype=KLINE_DTYPE)
+        bars["time"] = times
+        bars["open"] = bars["high"] = bars["low"] = bars["close"] = close
+        series[code] = bars
+    return series
+
+
+@router.get("/risk", response_model=RiskReport, summary="组合风险分析")
+async def get_portfolio_risk(acc_id: str = None, benchmark: Optional[str] = None, include_matrix: bool = True):
+    """
+    基于日K线计算持仓组合风险
+
+    - acc_id: 账户ID（可选，默认使用活跃账户）
+    - benchmark: 基准指数代码（默认按持仓市场选择，如 HK.800000）
+    - include_matrix: 是否返回相关系数与（年化）协方差矩阵
+
+    返回组合波动率、Beta、历史模拟VaR/CVaR（95%/99%，日度）、集中度与个股风险贡献。
+    协方差按日缓存，盘中只按最新持仓权重重新计算。
+    """
+    if not futu_client.is_connected or not futu_client.is_trade_enabled:
+        positions = [p.model_dump() for p in await get_positions(acc_id)]
+        bench = benchmark or BENCHMARKS["HK"]
+        series = _mock_risk_series([p["stock_code"] for p in positions] + [bench])
+        return await risk_engine.analyze(positions, bench, include_matrix=include_matrix, series=series)
+
+    try:
+        positions = await futu_client.get_positions(acc_id)
+        return await risk_engine.analyze(positions, benchmark, client=futu_client, include_matrix=include_matrix)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"风险分析失败: {str(e)}")
+
+
 @router.get("/status", response_model=AccountStatus, summary="获取账户状态")
 async def get_account_status():
     """
@@ -0,0 +1,77 @@
+"""
+系统管理API
+
+请求采样分析的开关与结果查询、日志队列状态
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from app.utils.log import log_stats
+from app.utils.profiler import request_profiler
+
+router = APIRouter()
+
+
+class ProfilerConfig(BaseModel):
+    """采样配置（未提供的字段保持不变）"""
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None
+    routes: Optional[List[str]] = None
+    interval_ms: Optional[float] = None
+
+
+@router.get("/profiler", summary="采样分析配置")
+async def get_profiler_config():
+    return request_profiler.config()
+
+
+@router.put("/profiler", summary="修改采样分析配置")
+async def update_profiler_config(config: ProfilerConfig):
+    """
+    运行时开启/关闭请求采样分析
+
+    - enabled: 是否开启
+    - sample_rate: 采样请求比例 (0, 1]
+    - routes: 只采样这些路径前缀的请求，如 ["/api/market/search"]；空列表表示全部
+    - interval_ms: 采样间隔（毫秒）
+    """
+    try:
+        request_profiler.configure(**config.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return request_profiler.config()
+
+
+@router.get("/profiles", summary="采样结果列表")
+async def list_profiles():
+    """最近的采样结果（新的在前），含总耗时、事件循环CPU、线程池与SDK耗时"""
+    return request_profiler.list_profiles()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse, summary="采样结果（折叠栈）")
+async def get_profile(profile_id: int):
+    """折叠栈文本，可直接用 flamegraph.pl 或 speedscope 生成火焰图"""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"采样结果不存在: {profile_id}")
+    return profile.folded()
+
+
+@router.delete("/profiles", summary="清空采样结果")
+async def clear_profiles():
+    request_profiler.clear()
+    return {"cleared": True}
+
+
+@router.get("/logging", summary="日志队列状态")
+async def get_logging_stats():
+    """
+    异步日志输出状态
+
+    - sink: 队列中待写出、已写出、因队列满或输出失败丢弃的条数（未启用异步输出时为 null）
+    - suppressed: 各高频事件类别自上次输出以来被采样/限速抑制的条数
+    """
+    return log_stats()
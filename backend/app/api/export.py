@@ -0,0 +1,140 @@
+"""
+数据导出API
+
+K线、历史订单与成交的流式批量导出（CSV / NDJSON / Parquet）
+"""
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+import pandas as pd
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.services.export import (
+    DEAL_EXPORT_COLUMNS, EXPORT_MEDIA_TYPES, KLINE_EXPORT_COLUMNS, ORDER_EXPORT_COLUMNS,
+    FrameEncoder, astream_frames, history_frames, kline_frames, stream_frames,
+)
+from app.services.futu_client import futu_client
+from app.services.kline_store import kline_store
+
+router = APIRouter()
+
+
+def _encoder(fmt: str, columns) -> FrameEncoder:
+    try:
+        return FrameEncoder(fmt, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _response(body, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@router.get("/kline", summary="导出K线")
+async def export_kline(
+    codes: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    kline_type: str = "K_DAY",
+    autype: Literal["qfq", "hfq", "none"] = "qfq",
+    format: str = "csv",
+    fill: bool = True,
+):
+    """
+    流式导出本地存储的K线
+
+    - codes: 股票代码，多个用逗号分隔，按代码依次输出
+    - start_date / end_date: 日期区间 (YYYY-MM-DD)，默认全部
+    - kline_type: K线类型；autype: 复权方式 (qfq, hfq, none)，按本地复权因子表换算
+    - format: csv | ndjson | parquet（parquet 需安装 pyarrow）
+    - fill: 已连接OpenD时先补齐缺失区间再导出；否则只导出本地已有数据
+    """
+    code_list = [c.strip() for c in codes.split(",") if c.strip()]
+    if not code_list:
+        raise HTTPException(status_code=400, detail="股票代码不能为空")
+    encoder = _encoder(format, KLINE_EXPORT_COLUMNS)
+
+    if fill and futu_client.is_connected and start_date:
+        try:
+            for code in code_list:
+                await kline_store.get(code, start_date, end_date, kline_type, autype, client=futu_client)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"补齐K线失败: {str(e)}")
+
+    def frames():
+        for code in code_list:
+            bars, rehab = kline_store.scan(code, start_date, end_date, kline_type)
+            yield from kline_frames(code, bars, rehab=rehab, autype=autype)
+
+    name = code_list[0] if len(code_list) == 1 else "kline"
+    return _response(stream_frames(frames(), encoder), format, f"{name}_{kline_type}")
+
+
+def _history_range(start_date: Optional[str], end_date: Optional[str]):
+    try:
+        end = date.fromisoformat(end_date).isoformat() if end_date else date.today().isoformat()
+        start = date.fromisoformat(start_date).isoformat() if start_date else \
+            (date.fromisoformat(end) - timedelta(days=90)).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式应为 YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    return start, end
+
+
+async def _mock_history(kind: str):
+    """模拟历史订单/成交（开发模式）"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [("HK.00700", "腾讯控股", "BUY", 350.0, 100), ("HK.09988", "阿里巴巴-SW", "SELL", 80.0, 200)]
+    if kind == "orders":
+        yield pd.DataFrame([{
+            "order_id": f"MOCK_00{i + 1}", "code": code, "stock_name": name, "trd_side": side,
+            "order_type": "NORMAL", "order_status": "FILLED_ALL", "price": price, "qty": qty,
+            "dealt_qty": qty, "dealt_avg_price": price, "create_time": now, "updated_time": now,
+        } for i, (code, name, side, price, qty) in enumerate(rows)])
+    else:
+        yield pd.DataFrame([{
+            "deal_id": f"MOCK_D00{i + 1}", "order_id": f"MOCK_00{i + 1}", "code": code, "stock_name": name,
+            "trd_side": side, "price": price, "qty": qty, "create_time": now, "status": "OK",
+        } for i, (code, name, side, price, qty) in enumerate(rows)])
+
+
+def _export_history(kind: str, columns, start_date, end_date, acc_id, fmt) -> StreamingResponse:
+    encoder = _encoder(fmt, columns)
+    start, end = _history_range(start_date, end_date)
+    if not futu_client.is_connected or not futu_client.is_trade_enabled:
+        frames = _mock_history(kind)
+    else:
+        frames = history_frames(futu_client, kind, start, end, acc_id)
+    return _response(astream_frames(frames, encoder), fmt, f"{kind}_{start}_{end}")
+
+
+@router.get("/orders", summary="导出历史订单")
+async def export_orders(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        acc_id: Optional[str] = None, format: str = "csv"):
+    """
+    流式导出历史订单，按时间窗口分批向OpenD查询
+
+    - start_date / end_date: 日期区间 (YYYY-MM-DD)，默认最近90天
+    - acc_id: 账户ID（可选，默认使用活跃账户）
+    - format: csv | ndjson | parquet
+    """
+    return _export_history("orders", ORDER_EXPORT_COLUMNS, start_date, end_date, acc_id, format)
+
+
+@router.get("/deals", summary="导出历史成交")
+async def export_deals(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       acc_id: Optional[str] = None, format: str = "csv"):
+    """
+    流式导出历史成交，按时间窗口分批向OpenD查询
+
+    - start_date / end_date: 日期区间 (YYYY-MM-DD)，默认最近90天
+    - acc_id: 账户ID（可选，默认使用活跃账户）
+    - format: csv | ndjson | parquet
+    """
+    return _export_history("deals", DEAL_EXPORT_COLUMNS, start_date, end_date, acc_id, format)
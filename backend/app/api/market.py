@@ -1,13 +1,32 @@
 """
 行情服务API
 """
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
-import json
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Optional, List, Dict, Literal
+from datetime import date, datetime, timedelta
+import asyncio
 
+import futu as ft
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.services.factors import FACTORS, factor_engine
 from app.services.futu_client import futu_client
+from app.services.kline_store import frame_to_bars, kline_store
+from app.services.market_recorder import MarketDataReader
+from app.services.market_replay import kline_sources, recorded_sources
+from app.services.options import OptionChain, bs_price, build_chain, option_chains
+from app.services.quote_bus import quote_bus
+from app.services.screener import SCREEN_FIELDS, MarketTable, build_table, screener, screen_table
+from app.services.security_master import security_master
+from app.services.subscription_manager import PRIORITY_LOW, subscription_manager
+from app.services.trading_calendar import calendar_market, trading_calendar
+from app.utils import ws_codec
+from app.utils.downsample import lttb_indices, ohlc_buckets
+from app.utils.http_cache import ResponseCache, etag_matches, make_etag
+from app.utils.log import EventLog
 
 router = APIRouter()
 
@@ -88,12 +107,71 @@ async def get_quote(stock_code: str):
         raise HTTPException(status_code=500, detail=f"获取行情失败: {str(e)}")
 
 
+# K线响应缓存：未结束区间按ETag存储，已结束的历史区间按请求参数存储（无需再请求OpenD）
+_kline_cache = ResponseCache(max_entries=512)
+_kline_list = TypeAdapter(List[KLine])
+
+# 各周期客户端缓存时长（秒），最新一根K线仍在变化
+KLINE_MAX_AGE = {
+    "K_1M": 5,
+    "K_5M": 15,
+    "K_15M": 30,
+    "K_30M": 60,
+    "K_60M": 60,
+    "K_DAY": 60,
+    "K_WEEK": 300,
+    "K_MON": 300,
+}
+
+
+def _is_closed_range(end_date: Optional[str]) -> bool:
+    """结束日期早于今天的区间不会再变化"""
+    return bool(end_date) and end_date < date.today().isoformat()
+
+
+def _kline_cache_control(kline_type: str, closed: bool) -> str:
+    if closed:
+        return "public, max-age=86400"
+    return f"private, max-age={KLINE_MAX_AGE.get(kline_type, 60)}"
+
+
+def _conditional_response(request: Request, etag: str, body: Optional[bytes], cache_control: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _downsample_rows(bars: np.ndarray, max_points: int, method: str) -> List[dict]:
+    """K线数组降采样后转换为字典列表"""
+    if method == "lttb":
+        bars = bars[lttb_indices(bars["time"], bars["close"], max_points)]
+    else:
+        bars = ohlc_buckets(bars, max_points)
+    timestamps = bars["time"].astype("datetime64[s]").tolist()
+    return [
+        {
+            "timestamp": ts,
+            "open_price": float(bar["open"]),
+            "high_price": float(bar["high"]),
+            "low_price": float(bar["low"]),
+            "close_price": float(bar["close"]),
+            "volume": int(bar["volume"]),
+            "turnover": float(bar["turnover"]),
+        }
+        for ts, bar in zip(timestamps, bars)
+    ]
+
+
 @router.get("/kline/{stock_code}", response_model=List[KLine], summary="获取K线数据")
 async def get_kline(
+    request: Request,
     stock_code: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    kline_type: str = "K_DAY"
+    kline_type: str = "K_DAY",
+    max_points: Optional[int] = Query(None, ge=10, le=10000),
+    downsample: Literal["ohlc", "lttb"] = "ohlc",
 ):
     """
     获取股票K线数据
@@ -102,6 +180,11 @@ async def get_kline(
     - start_date: 开始日期 (YYYY-MM-DD)
     - end_date: 结束日期 (YYYY-MM-DD)
     - kline_type: K线类型 (K_DAY, K_WEEK, K_MON, K_1M, K_5M, K_15M, K_30M, K_60M)
+    - max_points: 最多返回的K线根数，超出时在服务端降采样（不传则返回全部）
+    - downsample: 降采样方式，ohlc 按桶聚合K线（保留最高/最低价），lttb 按收盘价折线形状选点
+
+    响应带强ETag，If-None-Match 命中时返回304；相同版本的响应直接复用已序列化的字节，
+    降采样结果按 (区间, max_points, 方式) 分别缓存
     """
     if not futu_client.is_connected:
         # 返回模拟数据（开发模式）
@@ -131,9 +214,38 @@ async def get_kline(
         
         return klines
     
+    range_key = (stock_code, kline_type, start_date, end_date)
+    if max_points:
+        range_key += (max_points, downsample)
+    closed = _is_closed_range(end_date)
+    cache_control = _kline_cache_control(kline_type, closed)
+    if closed:
+        cached = _kline_cache.get(range_key)
+        if cached is not None:
+            return _conditional_response(request, *cached, cache_control)
+
     try:
-        result = await futu_client.get_kline(stock_code, start_date, end_date, kline_type)
-        return [KLine(**k) for k in result]
+        data = await futu_client.get_kline_frame(stock_code, start_date, end_date, kline_type)
+        # 版本 = 请求区间 + 最后一根K线（当前周期K线的收盘价/成交量仍会变化）
+        if len(data):
+            last = data.iloc[-1]
+            etag = make_etag(*range_key, len(data), last["time_key"], last["close"], last["volume"])
+        else:
+            etag = make_etag(*range_key, 0)
+        if etag_matches(request, etag):
+            return _conditional_response(request, etag, None, cache_control)
+
+        cache_key = range_key if closed else etag
+        cached = _kline_cache.get(cache_key)
+        if cached is None or cached[0] != etag:
+            if max_points and len(data) > max_points:
+                rows = _downsample_rows(frame_to_bars(data), max_points, downsample)
+            else:
+                rows = futu_client.kline_rows(data)
+            body = _kline_list.dump_json([KLine(**k) for k in rows])
+            _kline_cache.put(cache_key, etag, body)
+            cached = (etag, body)
+        return _conditional_response(request, *cached, cache_control)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取K线数据失败: {str(e)}")
 
@@ -169,7 +281,498 @@ async def search_stock(keyword: str):
         raise HTTPException(status_code=500, detail=f"搜索股票失败: {str(e)}")
 
 
+ScreenField = Literal[SCREEN_FIELDS]
+
+
+class ScreenFilter(BaseModel):
+    """选股条件"""
+    field: ScreenField
+    op: Literal[">", ">=", "<", "<=", "==", "!="]
+    value: float
+
+
+class ScreenRequest(BaseModel):
+    """选股请求"""
+    market: Literal["HK", "US", "SH", "SZ"] = "HK"
+    filters: List[ScreenFilter] = []
+    sort_by: Optional[ScreenField] = None
+    ascending: bool = False
+    limit: int = Field(50, ge=1, le=1000)
+    include_suspended: bool = False
+
+
+class ScreenRow(BaseModel):
+    """选股结果行（缺失值为 null）"""
+    stock_code: str
+    stock_name: str
+    last_price: Optional[float] = None
+    change_ratio: Optional[float] = None
+    volume: Optional[float] = None
+    turnover: Optional[float] = None
+    turnover_rate: Optional[float] = None
+    volume_ratio: Optional[float] = None
+    amplitude: Optional[float] = None
+    pe_ratio: Optional[float] = None
+    pe_ttm_ratio: Optional[float] = None
+    pb_ratio: Optional[float] = None
+    total_market_val: Optional[float] = None
+    circular_market_val: Optional[float] = None
+
+
+class ScreenResult(BaseModel):
+    """选股结果"""
+    market: str
+    total: int
+    matched: int
+    updated_at: datetime
+    rows: List[ScreenRow]
+
+
+_mock_screener_tables: Dict[str, MarketTable] = {}
+
+
+def _mock_screener_table(market: str, n: int = 500) -> MarketTable:
+    """模拟全市场快照（开发模式，固定种子）"""
+    table = _mock_screener_tables.get(market)
+    if table is None:
+        rng = np.random.default_rng(sum(map(ord, market)))
+        prev_close = np.round(rng.uniform(1, 300, n), 3)
+        last = np.round(prev_close * (1 + rng.normal(0, 0.03, n)), 3)
+        volume = rng.integers(0, 50_000_000, n)
+        frame = pd.DataFrame({
+            "code": [f"{market}.{i:05d}" for i in range(1, n + 1)],
+            "name": [f"模拟股票{i}" for i in range(1, n + 1)],
+            "last_price": last,
+            "prev_close_price": prev_close,
+            "volume": volume,
+            "turnover": np.round(volume * last, 2),
+            "turnover_rate": np.round(rng.uniform(0, 5, n), 3),
+            "volume_ratio": np.round(rng.uniform(0, 5, n), 3),
+            "amplitude": np.round(rng.uniform(0, 10, n), 3),
+            "pe_ratio": np.round(rng.uniform(-20, 80, n), 3),
+            "pe_ttm_ratio": np.round(rng.uniform(-20, 80, n), 3),
+            "pb_ratio": np.round(rng.uniform(0.2, 10, n), 3),
+            "total_market_val": np.round(rng.uniform(1e8, 4e12, n), 2),
+            "circular_market_val": np.round(rng.uniform(1e8, 4e12, n), 2),
+            "suspension": rng.random(n) < 0.02,
+        })
+        table = _mock_screener_tables[market] = build_table(market, frame)
+    return table
+
+
+@router.post("/screener", response_model=ScreenResult, summary="全市场选股")
+async def screen_market(req: ScreenRequest):
+    """
+    按条件筛选全市场股票
+
+    - filters: 条件列表（取交集），如 {"field": "change_ratio", "op": ">", "value": 3}
+    - sort_by / ascending / limit: 排序与返回数量
+
+    全市场快照在刷新周期内缓存，重复查询直接在内存中过滤。
+    """
+    filters = [f.model_dump() for f in req.filters]
+    if not futu_client.is_connected:
+        table = _mock_screener_table(req.market)
+        matched, rows = screen_table(table, filters, req.sort_by, req.ascending, req.limit, req.include_suspended)
+        return ScreenResult(market=req.market, total=len(table), matched=matched,
+                            updated_at=table.updated_at, rows=rows)
+
+    try:
+        return await screener.screen(req.market, filters, req.sort_by, req.ascending,
+                                     req.limit, req.include_suspended)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"选股失败: {str(e)}")
+
+
+class FactorRequest(BaseModel):
+    """因子截面查询"""
+    codes: List[str] = []  # 股票池，为空时取 market 全部股票
+    market: str = "HK"
+    factors: List[str] = []  # 为空时返回全部因子
+    trade_date: Optional[str] = None  # 截面日期，默认最新交易日
+    group_by: Literal["market", "industry"] = "market"  # z-score 分组方式
+    sort_by: Optional[str] = None  # 因子名或 {因子}_z
+    ascending: bool = False
+    limit: int = Field(100, ge=1, le=5000)
+
+
+class FactorResult(BaseModel):
+    """因子截面结果（缺失值为 null）"""
+    trade_date: date
+    factors: List[str]
+    groups: int
+    total: int
+    rows: List[Dict[str, Optional[object]]]
+
+
+@router.get("/factors", summary="因子列表")
+async def list_factors():
+    return {name: spec.description for name, spec in FACTORS.items()}
+
+
+@router.post("/factors", response_model=FactorResult, summary="横截面因子")
+async def get_factors(req: FactorRequest):
+    """
+    计算股票池的横截面因子（基于本地日K线）
+
+    - 每个因子附组内 z-score（{因子}_z），group_by=industry 时按所属行业板块分组，查不到行业的按市场分组
+    - 股票池面板缓存在内存中，新交易日增量追加，重复查询不重新计算
+    """
+    unknown = [f for f in req.factors if f not in FACTORS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的因子: {unknown}")
+    try:
+        codes = req.codes or await security_master.codes(req.market)
+        panel = await factor_engine.apanel(codes)
+        groups = await security_master.industries(panel.codes) if req.group_by == "industry" else None
+        result = factor_engine.cross_section(
+            panel, req.trade_date, req.factors or None, groups
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"因子计算失败: {str(e)}")
+
+    rows = result["rows"]
+    if req.sort_by is not None:
+        if req.sort_by not in rows[0]:
+            raise HTTPException(status_code=400, detail=f"不支持的排序字段: {req.sort_by}")
+        present = [r for r in rows if r[req.sort_by] is not None]
+        present.sort(key=lambda r: r[req.sort_by], reverse=not req.ascending)
+        rows = present + [r for r in rows if r[req.sort_by] is None]
+    return FactorResult(**{**result, "total": len(rows), "rows": rows[:req.limit]})
+
+
+class OptionRow(BaseModel):
+    """期权合约行情与希腊值（无法计算时为 null）"""
+    option_code: str
+    name: str
+    option_type: str
+    strike_price: float
+    iv: Optional[float] = None
+    delta: Optional[float] = None
+    gamma: Optional[float] = None
+    vega: Optional[float] = None
+    theta: Optional[float] = None
+    bid: Optional[float] = None
+    ask: Optional[float] = None
+    last: Optional[float] = None
+    price: Optional[float] = None
+    volume: Optional[float] = None
+    open_interest: Optional[float] = None
+
+
+class OptionChainResult(BaseModel):
+    """期权链"""
+    underlying: str
+    expiry: str
+    spot: Optional[float] = None
+    rate: float
+    updated_at: datetime
+    rows: List[OptionRow]
+
+
+def _mock_option_chain(underlying: str, expiry: Optional[str], n: int = 40) -> OptionChain:
+    """模拟期权链（开发模式，固定种子，波动率微笑）"""
+    rng = np.random.default_rng(sum(map(ord, underlying)))
+    spot = float(np.round(rng.uniform(50, 500), 2))
+    expiry = expiry or (date.today() + timedelta(days=30)).isoformat()
+    strikes = np.round(spot * np.linspace(0.7, 1.3, n), 2)
+    symbol = underlying.split(".", 1)[-1]
+    chain = pd.DataFrame({
+        "code": [f"{underlying}{expiry[2:10].replace('-', '')}{t[0]}{k:g}" for k in strikes for t in ("CALL", "PUT")],
+        "name": [f"{symbol} {expiry} {k:g} {t}" for k in strikes for t in ("CALL", "PUT")],
+        "option_type": [t for _ in strikes for t in (ft.OptionType.CALL, ft.OptionType.PUT)],
+        "strike_price": np.repeat(strikes, 2),
+    })
+    result = build_chain(underlying, expiry, chain, option_chains.rate(underlying))
+    now = trading_calendar.now()
+    sigma = 0.3 + 0.8 * np.log(result.strike / spot) ** 2
+    price = bs_price(spot, result.strike, max(result.years(now), 1 / 365), result.rate, sigma, result.is_call)
+    spread = np.maximum(np.round(price * 0.02, 2), 0.01)
+    snapshot = pd.DataFrame({
+        "code": result.codes,
+        "bid_price": np.maximum(np.round(price - spread / 2, 2), 0),
+        "ask_price": np.round(price + spread / 2, 2),
+        "last_price": np.round(price, 2),
+        "volume": rng.integers(0, 5000, len(result)),
+        "option_open_interest": rng.integers(0, 50000, len(result)),
+    })
+    result.apply_snapshot(snapshot, spot, now)
+    return result
+
+
+@router.get("/options/{underlying}/expiries", summary="期权到期日")
+async def get_option_expiries(underlying: str):
+    try:
+        calendar_market(underlying)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not futu_client.is_connected:
+        day = date.today()
+        return [
+            {"strike_time": (day + timedelta(days=d)).isoformat(), "option_expiry_date_distance": d}
+            for d in (30, 60, 90)
+        ]
+    try:
+        return await option_chains.expiries(underlying)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取期权到期日失败: {str(e)}")
+
+
+@router.get("/options/{underlying}", response_model=OptionChainResult, summary="期权链与希腊值")
+async def get_option_chain(
+    underlying: str,
+    expiry: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="到期日，默认最近到期日"),
+    option_type: Literal["ALL", "CALL", "PUT"] = "ALL",
+):
+    """
+    期权链行情与隐含波动率、delta / gamma / vega / theta
+
+    整条链向量化计算；快照在刷新周期内复用，期间标的报价变化只重算希腊值
+    """
+    try:
+        calendar_market(underlying)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not futu_client.is_connected:
+        chain = _mock_option_chain(underlying, expiry)
+    else:
+        try:
+            chain = await option_chains.chain(underlying, expiry)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取期权链失败: {str(e)}")
+
+    rows = chain.rows()
+    if option_type != "ALL":
+        rows = [r for r in rows if r["option_type"] == option_type]
+    return OptionChainResult(
+        underlying=underlying,
+        expiry=chain.expiry,
+        spot=chain.spot if np.isfinite(chain.spot) else None,
+        rate=chain.rate,
+        updated_at=chain.updated_at,
+        rows=rows,
+    )
+
+
+class ReplayRequest(BaseModel):
+    """行情回放请求（仅 MARKET_DATA_MODE=replay）"""
+    source: Literal["recorded", "kline"] = "recorded"
+    day: Optional[date] = None  # 录制数据的日期
+    codes: List[str] = []  # 为空时回放全部已录制标的
+    streams: List[str] = []  # quote / ticker / kline / kline.K_1M，为空时全部
+    start_date: Optional[date] = None  # 本地K线区间
+    end_date: Optional[date] = None
+    kline_type: str = "K_DAY"
+    speed: float = Field(1.0, ge=0, description="回放倍速，0 为最大速度")
+
+
+def _replay_context():
+    ctx = futu_client.replay_context
+    if ctx is None:
+        raise HTTPException(status_code=400, detail="当前不是回放模式（MARKET_DATA_MODE=replay）")
+    return ctx
+
+
+@router.post("/replay", summary="开始行情回放")
+async def start_replay(req: ReplayRequest):
+    """
+    将录制数据或本地K线按倍速发布到推送链路（WebSocket、策略运行时）
+
+    只回放已订阅的 (标的, 订阅类型)，与OpenD推送行为一致。
+    """
+    ctx = _replay_context()
+    if req.source == "recorded":
+        if req.day is None:
+            raise HTTPException(status_code=400, detail="请指定回放日期 day")
+        reader = MarketDataReader(settings.MARKET_RECORD_DIR)
+        sources = recorded_sources(reader, req.day.isoformat(), req.codes or None, req.streams or None)
+    else:
+        if not req.codes:
+            raise HTTPException(status_code=400, detail="K线回放需要指定 codes")
+        start = req.start_date.isoformat() if req.start_date else None
+        end = req.end_date.isoformat() if req.end_date else None
+        sources = kline_sources(
+            {code: kline_store.query(code, start, end, req.kline_type) for code in req.codes},
+            req.kline_type,
+        )
+    if not sources:
+        raise HTTPException(status_code=404, detail="没有可回放的数据")
+    try:
+        return ctx.start(sources, req.speed)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/replay", summary="行情回放状态")
+async def replay_status():
+    return _replay_context().status() or {}
+
+
+@router.delete("/replay", summary="停止行情回放")
+async def stop_replay():
+    ctx = _replay_context()
+    ctx.stop()
+    return {"stopped": True}
+
+
+@router.get("/subscriptions", summary="行情订阅额度")
+async def get_subscriptions():
+    """
+    行情订阅额度使用情况
+
+    - quota / used: 订阅额度与已占用数量
+    - idle: 已无消费者、等待最短持有时间后退订的订阅
+    - pending: 额度不足暂未订阅（或已被淘汰）的条目
+    - evictions: 累计淘汰次数
+    """
+    return subscription_manager.stats()
+
+
+@router.get("/calendar/{market}", summary="交易日历")
+async def get_calendar(market: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """
+    交易日历与当前交易阶段
+
+    - market: HK / US / CN（也可传 SH、SZ 或股票代码）
+    - start_date / end_date: 交易日查询区间 (YYYY-MM-DD)，默认今天起30天
+    - phase: OPEN 交易中 / BREAK 午休 / CLOSED 休市；OpenD未连接时按工作日估算
+    """
+    try:
+        start = date.fromisoformat(start_date) if start_date else date.today()
+        end = date.fromisoformat(end_date) if end_date else start + timedelta(days=30)
+        calendar_market(market)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if end < start or (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="日期区间无效（最长366天）")
+    days = await trading_calendar.trading_days(market, start, end)
+    return {**trading_calendar.status(market), "trading_days": days}
+
+
 # WebSocket实时行情推送
+_ws_log = EventLog("ws")
+
+# 交易时段内的推送间隔（秒）
+QUOTE_PUSH_INTERVAL = 1.0
+
+
+def _calendar_markets(codes: List[str]) -> List[str]:
+    """代码对应的日历市场（无法识别的代码不参与调度）"""
+    markets = set()
+    for code in codes:
+        try:
+            markets.add(calendar_market(code))
+        except ValueError:
+            continue
+    return sorted(markets)
+
+
+async def _acquire_quote_push(consumer: str, codes: List[str]):
+    """
+    登记QUOTE推送订阅，之后由QuoteBus最新报价供数（共享模式下由行情进程统一扇出）
+
+    WebSocket为低优先级消费者，额度不足时可能订阅不上或被淘汰，此时对应标的退回快照轮询
+    """
+    active = await subscription_manager.acquire(
+        consumer, [(c, ft.SubType.QUOTE) for c in codes], PRIORITY_LOW
+    )
+    if len(active) < len(codes):
+        _ws_log.info("{} 个标的暂未订阅推送，改用快照轮询", len(codes) - len(active))
+
+
+async def _release_quote_push(consumer: str):
+    await subscription_manager.release(consumer)
+
+
+async def _fetch_quotes(codes: List[str]) -> List[dict]:
+    """获取推送用行情字典（跳过pydantic模型，减少序列化开销）"""
+    if futu_client.is_connected:
+        pushed = {}
+        for code in codes:
+            record = quote_bus.latest_quote(code) if subscription_manager.is_active(code, ft.SubType.QUOTE) else None
+            if record is not None:
+                pushed[code] = futu_client._snapshot_to_quote(record)
+        # 尚未收到首次推送的标的用快照补齐
+        missing = [c for c in codes if c not in pushed]
+        if missing:
+            pushed.update((q["stock_code"], q) for q in await futu_client.get_quotes(missing))
+        return [pushed[c] for c in codes if c in pushed]
+
+    quotes = []
+    for code in codes:
+        try:
+            quotes.append((await get_quote(code)).model_dump())
+        except HTTPException:
+            continue
+    return quotes
+
+
+async def _stream_quotes(websocket: WebSocket, codes: List[str], single: bool):
+    """按协商的协议每秒推送行情，客户端可发送 "resync" 请求关键帧"""
+    requested = list(websocket.scope.get("subprotocols", []))
+    requested.append(websocket.query_params.get("protocol", ""))
+    protocol = ws_codec.negotiate(requested)
+    encoder = ws_codec.create_encoder(protocol, single=single)
+    # 仅当客户端通过子协议请求时才回传子协议头
+    await websocket.accept(subprotocol=protocol if protocol in websocket.scope.get("subprotocols", []) else None)
+
+    async def receive_control():
+        while True:
+            message = await websocket.receive_text()
+            if message == "resync":
+                encoder.request_keyframe()
+
+    control = asyncio.create_task(receive_control())
+    markets = _calendar_markets(codes)
+    consumer = f"ws:{id(websocket)}"
+    pushing = futu_client.is_connected
+    if pushing:
+        await _acquire_quote_push(consumer, codes)
+    try:
+        while not control.done():
+            quotes = await _fetch_quotes(codes)
+            if quotes:
+                payload = encoder.encode(quotes)
+                if encoder.binary:
+                    await websocket.send_bytes(payload)
+                else:
+                    await websocket.send_text(payload)
+
+            # 交易时段内每秒推送（开盘/收盘前后加快），休市期间暂停到下一时段；客户端断开时立即退出
+            delay = await trading_calendar.delay(markets, QUOTE_PUSH_INTERVAL)
+            await asyncio.wait({control}, timeout=delay)
+
+        control.result()
+    except WebSocketDisconnect:
+        _ws_log.info("WebSocket断开连接: {}", codes)
+    except Exception as e:
+        _ws_log.warning("WebSocket错误: {}", e)
+    finally:
+        control.cancel()
+        if pushing:
+            await _release_quote_push(consumer)
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
+
+
+@router.websocket("/ws")
+async def websocket_watchlist(websocket: WebSocket, codes: str):
+    """
+    WebSocket自选股行情推送
+
+    - codes: 逗号分隔的股票代码，如 HK.00700,HK.09988
+    - 子协议 quote.msgpack-delta.v1: MessagePack增量帧（见 app.utils.ws_codec）
+    """
+    code_list = [c.strip() for c in codes.split(",") if c.strip()]
+    await _stream_quotes(websocket, code_list, single=False)
+
+
 @router.websocket("/ws/{stock_code}")
 async def websocket_quote(websocket: WebSocket, stock_code: str):
     """
@@ -177,23 +780,4 @@ async def websocket_quote(websocket: WebSocket, stock_code: str):
     
     连接后会持续推送指定股票的实时行情
     """
-    await websocket.accept()
-    
-    try:
-        while True:
-            # 获取行情数据
-            quote = await get_quote(stock_code)
-            
-            # 发送数据
-            await websocket.send_json(quote.model_dump())
-            
-            # 等待1秒
-            import asyncio
-            await asyncio.sleep(1)
-            
-    except WebSocketDisconnect:
-        print(f"WebSocket断开连接: {stock_code}")
-    except Exception as e:
-        print(f"WebSocket错误: {e}")
-    finally:
-        await websocket.close()
+    await _stream_quotes(websocket, [stock_code], single=True)
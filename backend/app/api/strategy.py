@@ -0,0 +1,311 @@
+"""
+策略服务API
+"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+from datetime import date, datetime, timedelta
+from enum import Enum
+import json
+import uuid
+import zlib
+
+import numpy as np
+
+from app.services import optimizer
+from app.services.backtest import STRATEGIES, run_backtest
+from app.services.futu_client import futu_client
+from app.services.kline_store import KLINE_DTYPE, kline_store, to_datetime, to_epoch
+from app.services.strategy_runtime import SignalStrategy, strategy_runtime
+
+router = APIRouter()
+
+
+class StrategyType(str, Enum):
+    """策略类型"""
+    MA = "MA"        # 均线策略
+    MACD = "MACD"    # MACD策略
+    GRID = "GRID"    # 网格交易
+    DCA = "DCA"      # 定投策略
+
+
+class BacktestRequest(BaseModel):
+    """回测请求"""
+    stock_code: str
+    strategy_type: StrategyType = StrategyType.MA
+    start_date: date = Field(default_factory=lambda: date.today() - timedelta(days=3 * 365))
+    end_date: Optional[date] = None
+    kline_type: str = "K_DAY"
+    capital: float = Field(default=100000.0, gt=0)
+    params: Dict[str, Any] = {}
+    commission_rate: float = Field(default=0.0003, ge=0, lt=1)  # 佣金率
+    slippage_bps: float = Field(default=5.0, ge=0, lt=10000)    # 滑点（基点）
+
+
+class WalkForwardConfig(BaseModel):
+    """滚动前推配置（单位：K线根数）"""
+    train_bars: int = Field(default=250, gt=0)
+    test_bars: int = Field(default=60, gt=0)
+
+
+class SweepRequest(BaseModel):
+    """参数寻优请求"""
+    stock_codes: List[str] = Field(min_length=1, max_length=200)
+    strategy_type: StrategyType = StrategyType.MA
+    start_date: date = Field(default_factory=lambda: date.today() - timedelta(days=3 * 365))
+    end_date: Optional[date] = None
+    kline_type: str = "K_DAY"
+    capital: float = Field(default=100000.0, gt=0)
+    param_grid: Dict[str, List[Any]] = {}  # 如 {"fast": [5, 10], "slow": [20, 30, 60]}
+    commission_rate: float = Field(default=0.0003, ge=0, lt=1)
+    slippage_bps: float = Field(default=5.0, ge=0, lt=10000)
+    metric: str = "sharpe"
+    top_n: int = Field(default=20, gt=0, le=500)
+    workers: Optional[int] = Field(default=None, gt=0)
+    walk_forward: Optional[WalkForwardConfig] = None
+
+
+class EquityPoint(BaseModel):
+    """权益曲线点"""
+    timestamp: datetime
+    equity: float
+    position: float
+
+
+class BacktestTrade(BaseModel):
+    """回测成交"""
+    timestamp: datetime
+    side: str
+    price: float
+    quantity: float
+    value: float
+    position_before: float
+    position_after: float
+
+
+class BacktestResponse(BaseModel):
+    """回测结果"""
+    stock_code: str
+    strategy_type: StrategyType
+    bars: int
+    stats: Dict[str, float]
+    equity_curve: List[EquityPoint]
+    trades: List[BacktestTrade]
+
+
+def _mock_bars(stock_code: str, start_date: date, end_date: Optional[date]) -> np.ndarray:
+    """生成模拟日K线（开发模式，按股票代码固定随机种子）"""
+    start = to_epoch(start_date)
+    end = to_epoch(end_date or date.today())
+    times = np.arange(start, end + 1, 86400, dtype="i8")
+    times = times[(times // 86400 + 4) % 7 < 5]  # 去掉周末
+    rng = np.random.default_rng(zlib.crc32(stock_code.encode()))
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.018, len(times))))
+    bars = np.empty(len(times), dtype=KLINE_DTYPE)
+    bars["time"] = times
+    bars["close"] = close
+    bars["open"] = close * (1 + rng.normal(0, 0.005, len(times)))
+    bars["high"] = np.maximum(bars["open"], close) * 1.005
+    bars["low"] = np.minimum(bars["open"], close) * 0.995
+    bars["volume"] = rng.integers(1_000_000, 20_000_000, len(times))
+    bars["turnover"] = bars["volume"] * close
+    return bars
+
+
+async def _load_bars(stock_code: str, start_date: date, end_date: Optional[date], kline_type: str) -> np.ndarray:
+    """从K线存储加载回测数据，OpenD未连接且本地无数据时使用模拟数据"""
+    if end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="结束日期不能早于开始日期")
+
+    try:
+        bars = await kline_store.get(
+            stock_code,
+            start_date.isoformat(),
+            end_date.isoformat() if end_date else None,
+            kline_type,
+            client=futu_client,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取K线数据失败: {str(e)}")
+
+    if len(bars) == 0:
+        if futu_client.is_connected:
+            raise HTTPException(status_code=404, detail=f"无K线数据: {stock_code}")
+        # 返回模拟数据（开发模式）
+        bars = _mock_bars(stock_code, start_date, end_date)
+    return bars
+
+
+@router.post("/backtest", response_model=BacktestResponse, summary="策略回测")
+async def backtest(req: BacktestRequest):
+    """
+    基于本地K线存储运行向量化回测
+
+    - strategy_type: MA(fast, slow) / MACD(fast, slow, signal) / GRID(window, band, levels) / DCA(interval, installments)
+    - params: 策略参数，缺省使用默认值
+    - commission_rate: 佣金率；slippage_bps: 滑点基点
+    """
+    bars = await _load_bars(req.stock_code, req.start_date, req.end_date, req.kline_type)
+
+    try:
+        result = run_backtest(
+            bars,
+            req.strategy_type.value,
+            params=req.params,
+            capital=req.capital,
+            commission_rate=req.commission_rate,
+            slippage=req.slippage_bps / 10000,
+            kline_type=req.kline_type,
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"策略参数错误: {str(e)}")
+
+    return BacktestResponse(
+        stock_code=req.stock_code,
+        strategy_type=req.strategy_type,
+        bars=len(bars),
+        stats=result.stats,
+        equity_curve=[
+            EquityPoint(timestamp=to_datetime(t), equity=float(e), position=float(p))
+            for t, e, p in zip(result.times, result.equity, result.position)
+        ],
+        trades=[
+            BacktestTrade(timestamp=to_datetime(t.pop("time")), **t)
+            for t in result.trades
+        ],
+    )
+
+
+@router.post("/sweep", summary="参数寻优")
+async def sweep(req: SweepRequest):
+    """
+    并行参数网格寻优 / 滚动前推优化
+
+    以 NDJSON 流式返回：若干 {"type": "progress", "done", "total"}，最后一行为 {"type": "result", ...}
+    - param_grid: 参数名 -> 候选值列表，取笛卡尔积
+    - metric: 排序指标 sharpe / total_return / annual_return / win_rate / max_drawdown / volatility
+    - walk_forward: 设置后按滚动窗口在训练段选参、测试段检验
+    """
+    if req.metric not in optimizer.RANK_METRICS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序指标: {req.metric}")
+    combos = optimizer.expand_grid(req.param_grid)
+    runs = len(combos) * len(req.stock_codes)
+    if runs > optimizer.MAX_SWEEP_RUNS:
+        raise HTTPException(status_code=400, detail=f"回测次数过多: {runs} > {optimizer.MAX_SWEEP_RUNS}")
+    # 先用首个参数组合校验参数名，避免整批任务都失败
+    try:
+        STRATEGIES[req.strategy_type.value](np.linspace(1.0, 2.0, 8), **combos[0])
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"策略参数错误: {str(e)}")
+
+    series = {}
+    for code in dict.fromkeys(req.stock_codes):
+        series[code] = await _load_bars(code, req.start_date, req.end_date, req.kline_type)
+
+    options = {
+        "capital": req.capital,
+        "commission_rate": req.commission_rate,
+        "slippage": req.slippage_bps / 10000,
+        "kline_type": req.kline_type,
+    }
+    if req.walk_forward:
+        if not any(optimizer.walk_forward_folds(len(b), req.walk_forward.train_bars, req.walk_forward.test_bars)
+                   for b in series.values()):
+            raise HTTPException(status_code=400, detail="K线数量不足以划分训练段与测试段")
+        events = optimizer.walk_forward(
+            series, req.strategy_type.value, req.param_grid,
+            req.walk_forward.train_bars, req.walk_forward.test_bars,
+            metric=req.metric, workers=req.workers, **options,
+        )
+    else:
+        events = optimizer.sweep(
+            series, req.strategy_type.value, req.param_grid,
+            metric=req.metric, top_n=req.top_n, workers=req.workers, **options,
+        )
+
+    async def ndjson():
+        try:
+            async for event in events:
+                yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": f"参数寻优失败: {str(e)}"}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+# ==================== 实盘策略 ====================
+
+class StrategyCreate(BaseModel):
+    """创建实盘策略"""
+    name: str = Field(min_length=1)
+    type: StrategyType = StrategyType.MA
+    stock_code: str
+    capital: float = Field(default=50000.0, gt=0)
+    params: Dict[str, Any] = {}
+    kline_type: str = "K_1M"
+    dry_run: bool = True  # 默认只记录委托，不真实下单
+    acc_id: Optional[str] = None
+
+
+@router.get("/strategies", summary="实盘策略列表")
+async def list_strategies():
+    """策略列表，含运行状态、估算收益与延迟/吞吐统计"""
+    return strategy_runtime.list_strategies()
+
+
+@router.post("/strategies", summary="创建实盘策略")
+async def create_strategy(req: StrategyCreate):
+    try:
+        strategy = SignalStrategy(
+            uuid.uuid4().hex[:12],
+            req.name,
+            req.type.value,
+            req.stock_code,
+            req.capital,
+            params=req.params,
+            kline_type=req.kline_type,
+            dry_run=req.dry_run,
+            acc_id=req.acc_id,
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"策略参数错误: {str(e)}")
+    strategy_runtime.add(strategy)
+    return strategy_runtime.describe(strategy.strategy_id)
+
+
+def _require_strategy(strategy_id: str):
+    if strategy_runtime.get(strategy_id) is None:
+        raise HTTPException(status_code=404, detail=f"策略不存在: {strategy_id}")
+
+
+@router.get("/strategies/{strategy_id}", summary="实盘策略详情")
+async def get_strategy(strategy_id: str):
+    _require_strategy(strategy_id)
+    detail = strategy_runtime.describe(strategy_id)
+    detail["orders"] = strategy_runtime.get(strategy_id).orders[-100:]
+    return detail
+
+
+@router.post("/strategies/{strategy_id}/start", summary="启用策略")
+async def start_strategy(strategy_id: str):
+    _require_strategy(strategy_id)
+    try:
+        await strategy_runtime.start(strategy_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"启用策略失败: {str(e)}")
+    return strategy_runtime.describe(strategy_id)
+
+
+@router.post("/strategies/{strategy_id}/stop", summary="停用策略")
+async def stop_strategy(strategy_id: str):
+    _require_strategy(strategy_id)
+    await strategy_runtime.stop(strategy_id)
+    return strategy_runtime.describe(strategy_id)
+
+
+@router.delete("/strategies/{strategy_id}", summary="删除策略")
+async def delete_strategy(strategy_id: str):
+    _require_strategy(strategy_id)
+    await strategy_runtime.remove(strategy_id)
+    return {"message": "策略已删除", "id": strategy_id}
@@ -0,0 +1,89 @@
+"""
+增量同步API
+
+订单、持仓与资金按版本号增量同步，支持长轮询
+"""
+from datetime import date, datetime, time
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from app.services.account_sync import account_sync
+from app.services.futu_client import futu_client
+
+router = APIRouter()
+
+# 长轮询最长等待时间（秒）
+MAX_WAIT_SECONDS = 30.0
+
+
+class SyncResult(BaseModel):
+    """增量同步结果（full 为 true 时客户端应整体替换本地状态）"""
+    acc_id: str
+    epoch: str
+    version: int
+    full: bool
+    orders: List[Dict[str, Any]]
+    removed_orders: List[str]
+    positions: List[Dict[str, Any]]
+    removed_positions: List[str]
+    balance: Dict[str, Any]
+
+
+def _mock_state() -> Dict[str, Any]:
+    """模拟账户状态（开发模式），时间固定以免每次都被视为变化"""
+    opened = datetime.combine(date.today(), time(9, 30))
+    return {
+        "orders": [
+            {"order_id": "MOCK_001", "stock_code": "HK.00700", "stock_name": "腾讯控股", "side": "BUY",
+             "order_type": "LIMIT", "price": 350.0, "quantity": 100, "filled_quantity": 100,
+             "status": "FILLED_ALL", "created_at": opened, "updated_at": opened},
+            {"order_id": "MOCK_002", "stock_code": "HK.09988", "stock_name": "阿里巴巴-SW", "side": "SELL",
+             "order_type": "LIMIT", "price": 80.0, "quantity": 200, "filled_quantity": 0,
+             "status": "SUBMITTED", "created_at": opened, "updated_at": opened},
+        ],
+        "positions": [
+            {"stock_code": "HK.00700", "stock_name": "腾讯控股", "quantity": 100, "available_quantity": 100,
+             "cost_price": 350.0, "current_price": 360.0, "market_value": 36000.0,
+             "profit_loss": 1000.0, "profit_loss_ratio": 0.0286},
+            {"stock_code": "HK.09988", "stock_name": "阿里巴巴-SW", "quantity": 200, "available_quantity": 200,
+             "cost_price": 80.0, "current_price": 75.0, "market_value": 15000.0,
+             "profit_loss": -1000.0, "profit_loss_ratio": -0.0625},
+        ],
+        "balance": {
+            "acc_id": "mock_account", "total_assets": 100000.0, "cash": 50000.0, "market_value": 50000.0,
+            "frozen_cash": 0.0, "available_cash": 50000.0, "currency": "HKD",
+        },
+    }
+
+
+@router.get("", response_model=SyncResult, summary="账户状态增量同步")
+async def sync_account(
+    since: Optional[int] = None,
+    epoch: Optional[str] = None,
+    acc_id: Optional[str] = None,
+    wait: float = Query(0.0, ge=0, le=MAX_WAIT_SECONDS),
+):
+    """
+    返回指定版本之后变化的订单、持仓与资金字段
+
+    - since: 客户端已同步到的版本号（为空时返回全量）
+    - epoch: 上次响应中的 epoch，服务重启后不一致时返回全量
+    - acc_id: 账户ID（可选，默认使用活跃账户）
+    - wait: 长轮询等待秒数，无变化时挂起直到有变化或超时（最长30秒）
+
+    同一账户的OpenD查询按最小间隔合并，客户端可以高频轮询；
+    清仓的持仓与不再返回的订单在 removed_positions / removed_orders 中列出。
+    """
+    if not futu_client.is_connected or not futu_client.is_trade_enabled:
+        account_sync.apply("mock_account", **_mock_state())
+        return await account_sync.sync("mock_account", since, epoch, wait=wait, refresh=False)
+
+    target = acc_id or futu_client.active_account_id
+    if not target:
+        raise HTTPException(status_code=400, detail="未指定账户ID")
+    try:
+        return await account_sync.sync(str(target), since, epoch, wait=wait)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"同步账户状态失败: {str(e)}")
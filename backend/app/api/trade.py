@@ -1,13 +1,17 @@
 """
 交易服务API
 """
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 
+from app.services.execution import execution_engine
 from app.services.futu_client import futu_client
+from app.services.order_sizing import Capacity, max_quantities, order_sizer
+from app.services.reference_data import OrderRejected
+from app.services.security_master import security_master
 
 router = APIRouter()
 
@@ -60,6 +64,7 @@ class OrderCreate(BaseModel):
     acc_id: Optional[str] = None  # 账户ID
     stop_price: Optional[float] = None  # 止损价格
     take_profit_price: Optional[float] = None  # 止盈价格
+    adjust: bool = False  # 价格/数量不合规时自动规整到最小价位与整手（否则拒绝）
 
 
 class OrderCancel(BaseModel):
@@ -80,10 +85,14 @@ async def create_order(order: OrderCreate):
     - acc_id: 账户ID（可选，默认使用活跃账户）
     - stop_price: 止损价（可选）
     - take_profit_price: 止盈价（可选）
+    - adjust: 价格/数量不合规时自动规整（可选，默认直接拒绝）
     """
     if not futu_client.is_connected or not futu_client.is_trade_enabled:
         raise HTTPException(status_code=400, detail="交易权限未开启")
 
+    # 确保所属市场的每手股数已加载（加载失败时只校验价格）
+    await security_master.lot_size(order.stock_code)
+
     try:
         result = await futu_client.place_order(
             stock_code=order.stock_code,
@@ -91,36 +100,41 @@ async def create_order(order: OrderCreate):
             price=order.price,
             quantity=order.quantity,
             order_type=order.order_type.value,
-            acc_id=order.acc_id
+            acc_id=order.acc_id,
+            adjust=order.adjust
         )
         return Order(**result)
+    except OrderRejected as e:
+        raise HTTPException(status_code=400, detail=f"下单失败: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"下单失败: {str(e)}")
 
 
 @router.delete("/order/{order_id}", summary="撤单")
-async def cancel_order(order_id: str):
+async def cancel_order(order_id: str, acc_id: Optional[str] = None):
     """
     撤销指定订单
     
     - order_id: 订单ID
+    - acc_id: 账户ID（可选，默认使用活跃账户）
     """
     if not futu_client.is_connected:
         return {"message": f"订单 {order_id} 已撤销（模拟）", "success": True}
     
     try:
-        await futu_client.cancel_order(order_id)
+        await futu_client.cancel_order(order_id, acc_id=acc_id)
         return {"message": f"订单 {order_id} 已撤销", "success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"撤单失败: {str(e)}")
 
 
 @router.get("/orders", response_model=List[Order], summary="获取订单列表")
-async def get_orders(status: Optional[OrderStatus] = None):
+async def get_orders(status: Optional[OrderStatus] = None, acc_id: Optional[str] = None):
     """
     获取订单列表
     
     - status: 订单状态筛选（可选）
+    - acc_id: 账户ID（可选，默认使用活跃账户）
     """
     if not futu_client.is_connected:
         # 返回模拟数据（开发模式）
@@ -154,24 +168,168 @@ async def get_orders(status: Optional[OrderStatus] = None):
         ]
     
     try:
-        result = await futu_client.get_orders(status=status.value if status else None)
+        result = await futu_client.get_orders(status=status.value if status else None, acc_id=acc_id)
         return [Order(**o) for o in result]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取订单列表失败: {str(e)}")
 
 
+class MaxQty(BaseModel):
+    """最大可买卖数量（股）"""
+    acc_id: str
+    stock_code: str
+    price: float
+    lot_size: int
+    max_cash_buy: Optional[int] = None  # 仅用现金
+    max_margin_buy: Optional[int] = None  # 含融资（跨币种本地估算时为空）
+    max_sell: int  # 整手可卖
+    odd_lot_sell: int  # 零股
+    source: str  # cache: 本地估算；opend: OpenD查询
+    as_of: datetime
+
+
+@router.get("/max-qty", response_model=MaxQty, summary="最大可买卖数量")
+async def get_max_qty(
+    stock_code: str,
+    price: float = Query(..., gt=0),
+    acc_id: Optional[str] = None,
+    order_type: OrderType = OrderType.LIMIT,
+):
+    """
+    按价格估算最大可买、可卖数量（下单页输入时调用）
+
+    账户状态缓存有效时在本地计算，否则查询OpenD（同一代码的并发请求合并为一次），
+    结果缓存后其他价格同样在本地换算
+    """
+    if not futu_client.is_connected or not futu_client.is_trade_enabled:
+        # 返回模拟数据（开发模式）
+        capacity = Capacity(cash_power=1_000_000.0, margin_power=2_500_000.0, sellable=1050,
+                            source="cache", as_of=datetime.now())
+        return MaxQty(acc_id=acc_id or "MOCK", stock_code=stock_code, price=price,
+                      **max_quantities(price, 100 if stock_code.startswith("HK.") else 1, capacity))
+
+    try:
+        return MaxQty(**await order_sizer.max_qty(stock_code, price, acc_id, order_type.value))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询最大可买卖数量失败: {str(e)}")
+
+
 @router.get("/order/{order_id}", response_model=Order, summary="获取订单详情")
-async def get_order(order_id: str):
+async def get_order(order_id: str, acc_id: Optional[str] = None):
     """
     获取指定订单详情
     
     - order_id: 订单ID
+    - acc_id: 账户ID（可选，默认使用活跃账户）
     """
     if not futu_client.is_connected:
         raise HTTPException(status_code=404, detail=f"订单不存在: {order_id}")
     
     try:
-        result = await futu_client.get_order(order_id)
+        result = await futu_client.get_order(order_id, acc_id=acc_id)
         return Order(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取订单详情失败: {str(e)}")
+
+
+class AlgoType(str, Enum):
+    """执行算法"""
+    TWAP = "TWAP"
+    VWAP = "VWAP"
+    ICEBERG = "ICEBERG"
+
+
+class AlgoOrderCreate(BaseModel):
+    """算法母单请求"""
+    stock_code: str
+    side: OrderSide
+    quantity: int = Field(..., gt=0)
+    algo: AlgoType = AlgoType.TWAP
+    start_at: Optional[datetime] = None  # 默认立即开始
+    end_at: Optional[datetime] = None  # TWAP/VWAP 必填
+    slices: int = Field(10, gt=0, le=1000)  # TWAP 分段数
+    limit_price: Optional[float] = Field(None, gt=0)  # 买入不高于/卖出不低于
+    display_quantity: Optional[int] = Field(None, gt=0)  # 冰山单每次挂出数量
+    lot_size: Optional[int] = Field(None, gt=0)  # 默认按证券主数据
+    acc_id: Optional[str] = None
+
+
+class AlgoChildOrder(BaseModel):
+    """算法子单"""
+    order_id: str
+    price: float
+    quantity: int
+    filled: int
+    avg_price: float
+    status: str
+
+
+class AlgoOrder(BaseModel):
+    """算法母单"""
+    algo_id: str
+    algo: AlgoType
+    stock_code: str
+    side: OrderSide
+    quantity: int
+    lot_size: int
+    limit_price: Optional[float]
+    display_quantity: Optional[int]
+    start_at: datetime
+    end_at: datetime
+    status: str
+    filled_quantity: int
+    working_quantity: int
+    avg_price: float
+    progress: float
+    scheduled_quantity: int
+    children: List[AlgoChildOrder]
+    errors: List[str]
+    created_at: datetime
+
+
+@router.post("/algo", response_model=AlgoOrder, summary="提交算法单")
+async def create_algo_order(req: AlgoOrderCreate):
+    """
+    按 TWAP / VWAP / 冰山 算法拆分大单执行
+
+    - TWAP: start_at~end_at 等分 slices 段
+    - VWAP: 按近期分钟K线的分时成交量分布
+    - ICEBERG: 每次只挂出 display_quantity
+    """
+    if not futu_client.is_connected or not futu_client.is_trade_enabled:
+        raise HTTPException(status_code=400, detail="交易权限未开启")
+
+    try:
+        parent = await execution_engine.submit(
+            stock_code=req.stock_code, side=req.side.value, quantity=req.quantity, algo=req.algo.value,
+            start_at=req.start_at, end_at=req.end_at, slices=req.slices, limit_price=req.limit_price,
+            display_quantity=req.display_quantity, lot_size=req.lot_size, acc_id=req.acc_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return parent.to_dict()
+
+
+@router.get("/algo", response_model=List[AlgoOrder], summary="算法单列表")
+async def list_algo_orders():
+    return [p.to_dict() for p in execution_engine.list_orders()]
+
+
+@router.get("/algo/{algo_id}", response_model=AlgoOrder, summary="算法单详情")
+async def get_algo_order(algo_id: str):
+    parent = execution_engine.get(algo_id)
+    if parent is None:
+        raise HTTPException(status_code=404, detail=f"算法单不存在: {algo_id}")
+    return parent.to_dict()
+
+
+@router.delete("/algo/{algo_id}", response_model=AlgoOrder, summary="撤销算法单")
+async def cancel_algo_order(algo_id: str):
+    """撤销母单并撤掉在途子单（已成交部分保留）"""
+    try:
+        parent = await execution_engine.cancel(algo_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"算法单不存在: {algo_id}")
+    return parent.to_dict()
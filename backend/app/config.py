@@ -1,7 +1,7 @@
 """
 应用配置管理
 """
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 
@@ -18,17 +18,65 @@ class Settings(BaseSettings):
     FUTU_HOST: str = "127.0.0.1"
     FUTU_PORT: int = 11111
     
+    # 共享行情进程配置
+    # direct: 每个进程直连OpenD；shared: 连接独立行情进程（python -m app.services.market_data_server）
+    # replay: 不连接OpenD，回放录制数据或本地K线（见 app.services.market_replay）
+    MARKET_DATA_MODE: str = "direct"
+    MARKET_DATA_ADDRESS: str = "unix:/tmp/futu_market_data.sock"  # Windows 使用 tcp:127.0.0.1:11200
+    API_WORKERS: int = 1
+    
     # 安全配置
     SECRET_KEY: str = "dev-secret-key-change-in-production"
     
     # 数据库配置
     DATABASE_URL: str = "sqlite+aiosqlite:///./futu_trading.db"
     
+    # K线本地存储目录
+    KLINE_STORE_DIR: str = "./data/kline"
+    # 复权因子表刷新周期（天），已知除权日过后也会刷新
+    KLINE_REHAB_REFRESH_DAYS: int = 7
+    
+    # 行情录制（推送事件按日追加写入定长记录文件）
+    MARKET_RECORD_ENABLED: bool = False
+    MARKET_RECORD_DIR: str = "./data/market"
+    MARKET_RECORD_COMPRESS: bool = False
+    
+    # 参数寻优进程数（0 表示按CPU核数）
+    SWEEP_WORKERS: int = 0
+    
+    # 行情订阅额度（按账户等级，如 100/300/1000/2000）与OpenD要求的最短持有时间（秒）
+    # 共享行情模式下额度由各 API worker 平分（SUBSCRIPTION_QUOTA // API_WORKERS）
+    SUBSCRIPTION_QUOTA: int = 100
+    SUBSCRIPTION_MIN_HOLD_SECONDS: int = 60
+    
+    # 全市场选股快照刷新周期（秒）
+    SCREENER_REFRESH_SECONDS: int = 30
+    
+    # 期权快照刷新周期（秒，期间标的价格变化只重算希腊值）与各市场无风险利率
+    OPTION_REFRESH_SECONDS: float = 5.0
+    OPTION_RISK_FREE_RATES: Dict[str, float] = {"HK": 0.035, "US": 0.045, "CN": 0.02}
+    
+    # 账户增量同步：同一账户向OpenD查询订单/持仓/资金的最小间隔（秒）
+    SYNC_MIN_INTERVAL_SECONDS: float = 2.0
+    
+    # 最大可买卖数量：账户状态或OpenD查询结果在该时长（秒）内用于本地估算
+    MAX_QTY_CACHE_SECONDS: float = 10.0
+    
+    # 请求采样分析（运行时通过 /api/admin/profiler 开启）：保留的采样结果数、采样间隔（毫秒）
+    PROFILER_MAX_PROFILES: int = 50
+    PROFILER_INTERVAL_MS: int = 5
+    
     # 交易密码
     TRADE_PASSWORD: str = ""
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = False  # 输出JSON行（便于日志采集）
+    LOG_FILE: str = ""  # 为空时输出到标准输出
+    LOG_QUEUE_SIZE: int = 10000  # 日志队列容量，写出跟不上时丢弃新日志
+    # 高频事件类别的采样比例与每秒最多条数（推送按事件类型分类，见 app.utils.log.EventLog）
+    LOG_SAMPLE_RATES: Dict[str, float] = {"quote": 0.01, "ticker": 0.01, "kline": 0.1}
+    LOG_RATE_LIMITS: Dict[str, float] = {"quote": 20, "ticker": 20, "kline": 20, "order": 50, "ws": 10, "bus": 5}
     
     # CORS配置
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:5174", "http://127.0.0.1:5174"]
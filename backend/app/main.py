@@ -1,37 +1,61 @@
 """
 FastAPI应用入口
 """
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from loguru import logger
 
 from app.config import settings
-from app.api import account, market, trade
+from app.api import account, admin, export, market, strategy, sync, trade
+from app.services.execution import execution_engine
 from app.services.futu_client import futu_client
+from app.services.market_recorder import market_recorder
+from app.services.quote_bus import quote_bus, trade_bus
+from app.services.strategy_runtime import strategy_runtime
+from app.utils.log import setup_logging, shutdown_logging
+from app.utils.profiler import ProfiledThreadPoolExecutor, ProfilerMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时
-    print(f"[START] {settings.APP_NAME} v{settings.APP_VERSION} 启动中...")
-    print(f"[INFO] 富途OpenD配置: {settings.FUTU_HOST}:{settings.FUTU_PORT}")
+    # 启动时：日志改为队列异步输出，推送/行情路径不等待磁盘或终端
+    setup_logging()
+    logger.info("{} v{} 启动中...", settings.APP_NAME, settings.APP_VERSION)
+    logger.info("富途OpenD配置: {}:{}", settings.FUTU_HOST, settings.FUTU_PORT)
+    logger.info("行情模式: {}", settings.MARKET_DATA_MODE)
+
+    # 默认线程池记录任务所属请求，供请求采样分析关联SDK调用耗时
+    asyncio.get_running_loop().set_default_executor(ProfiledThreadPoolExecutor())
+
+    # OpenD推送回调在SDK线程中触发，统一切回当前事件循环分发
+    quote_bus.bind_loop(asyncio.get_running_loop())
+    trade_bus.bind_loop(asyncio.get_running_loop())
+    if settings.MARKET_RECORD_ENABLED:
+        market_recorder.start(quote_bus)
 
     # 尝试连接OpenD（如果可用）
     try:
         if futu_client.connect():
-            print("[OK] OpenD连接成功")
+            logger.info("OpenD连接成功")
         else:
-            print("[WARN] OpenD未连接，部分功能不可用")
+            logger.warning("OpenD未连接，部分功能不可用")
     except Exception as e:
-        print(f"[WARN] OpenD连接失败: {e}")
+        logger.warning("OpenD连接失败: {}", e)
 
     yield
 
     # 关闭时
-    print("[INFO] 关闭OpenD连接...")
+    await strategy_runtime.shutdown()
+    await execution_engine.shutdown()
+    market_recorder.stop()
+    logger.info("关闭OpenD连接...")
     futu_client.close()
-    print("[OK] 应用已关闭")
+    logger.info("应用已关闭")
+    shutdown_logging()
 
 
 # 创建FastAPI应用
@@ -51,10 +75,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按需请求采样分析（默认关闭）
+app.add_middleware(ProfilerMiddleware)
+
 # 注册路由
 app.include_router(account.router, prefix="/api/account", tags=["账户管理"])
 app.include_router(market.router, prefix="/api/market", tags=["行情服务"])
 app.include_router(trade.router, prefix="/api/trade", tags=["交易服务"])
+app.include_router(strategy.router, prefix="/api/strategy", tags=["策略服务"])
+app.include_router(sync.router, prefix="/api/sync", tags=["增量同步"])
+app.include_router(export.router, prefix="/api/export", tags=["数据导出"])
+app.include_router(admin.router, prefix="/api/admin", tags=["系统管理"])
 
 
 @app.get("/", tags=["根路径"])
@@ -75,15 +106,21 @@ async def health_check():
         "status": "healthy",
         "opend_connected": futu_client.is_connected,
         "trade_enabled": futu_client.is_trade_enabled,
+        "market_data_mode": settings.MARKET_DATA_MODE,
         "version": settings.APP_VERSION
     }
 
 
 if __name__ == "__main__":
     import uvicorn
+
+    # 多worker时每个进程各自直连OpenD会重复订阅，应配合共享行情进程使用
+    if settings.API_WORKERS > 1 and settings.MARKET_DATA_MODE != "shared":
+        logger.warning("API_WORKERS>1 建议设置 MARKET_DATA_MODE=shared 并启动 app.services.market_data_server")
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        workers=settings.API_WORKERS,
+        reload=settings.API_WORKERS == 1
     )
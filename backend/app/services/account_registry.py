@@ -0,0 +1,175 @@
+"""
+交易账户路由
+
+- AccountRegistry: 按 acc_id O(1) 查找账户，预先解析交易环境与市场权限
+- TradeContextPool: 按市场懒创建并复用交易上下文（HK/US/CN/HKCC）
+"""
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+import futu as ft
+from loguru import logger
+
+# 市场 -> 交易上下文类
+TRADE_CONTEXT_FACTORIES: Dict[str, Callable[..., Any]] = {
+    "HK": ft.OpenHKTradeContext,
+    "US": ft.OpenUSTradeContext,
+    "CN": ft.OpenCNTradeContext,
+    "HKCC": ft.OpenHKCCTradeContext,
+}
+
+# 账户有多个市场权限且无法按股票代码判断时的默认优先级
+MARKET_PRIORITY = ("HK", "US", "CN", "HKCC")
+
+# 股票代码前缀 -> 可交易该代码的市场（按优先级）
+CODE_MARKETS = {
+    "HK": ("HK",),
+    "US": ("US",),
+    "SH": ("CN", "HKCC"),
+    "SZ": ("CN", "HKCC"),
+}
+
+
+def parse_market_auth(value: Any) -> FrozenSet[str]:
+    """解析 trdmarket_auth（SDK返回列表，旧数据可能是字符串）"""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return frozenset(str(v) for v in value)
+    if not value:
+        return frozenset()
+    return frozenset(re.findall(r"[A-Z_]+", str(value)))
+
+
+@dataclass(frozen=True)
+class AccountEntry:
+    """预解析的账户路由信息"""
+    acc_id: str
+    acc_id_int: int
+    trd_env: str
+    markets: FrozenSet[str]
+    primary_market: str
+    info: Dict[str, Any] = field(compare=False)
+
+    def market_for_code(self, stock_code: Optional[str]) -> str:
+        """根据股票代码选择该账户下的交易市场"""
+        if stock_code:
+            for market in CODE_MARKETS.get(stock_code.split(".", 1)[0], ()):
+                if market in self.markets:
+                    return market
+        return self.primary_market
+
+
+class AccountRegistry:
+    """账户注册表"""
+
+    def __init__(self):
+        self._entries: Dict[str, AccountEntry] = {}
+        self._accounts: List[Dict[str, Any]] = []
+
+    def load(self, accounts: List[Dict[str, Any]]):
+        """用账户列表重建注册表"""
+        entries = {}
+        for acc in accounts:
+            markets = parse_market_auth(acc.get("trdmarket_auth"))
+            primary = next((m for m in MARKET_PRIORITY if m in markets), "HK")
+            info = dict(acc, trdmarket_auth=",".join(m for m in MARKET_PRIORITY if m in markets))
+            entries[str(acc["acc_id"])] = AccountEntry(
+                acc_id=str(acc["acc_id"]),
+                acc_id_int=int(acc["acc_id"]),
+                trd_env=ft.TrdEnv.SIMULATE if acc["trd_env"] == "SIMULATE" else ft.TrdEnv.REAL,
+                markets=markets,
+                primary_market=primary,
+                info=info,
+            )
+        self._entries = entries
+        self._accounts = [e.info for e in entries.values()]
+
+    @property
+    def accounts(self) -> List[Dict[str, Any]]:
+        return self._accounts
+
+    def get(self, acc_id: str) -> Optional[AccountEntry]:
+        return self._entries.get(str(acc_id))
+
+    @property
+    def markets(self) -> FrozenSet[str]:
+        """所有账户的市场权限并集"""
+        return frozenset().union(*(e.markets for e in self._entries.values()))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TradeContextPool:
+    """按市场懒创建的交易上下文池"""
+
+    def __init__(self, host: str, port: int, password: str = "", handlers: Sequence[Callable[[], Any]] = ()):
+        self._host = host
+        self._port = port
+        self._password = password
+        # 推送处理器工厂，新建上下文时各创建一个实例挂上
+        self._handlers = list(handlers)
+        self._contexts: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.unlocked = False
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self._contexts)
+
+    def get(self, market: str):
+        """获取市场对应的交易上下文，首次使用时创建"""
+        ctx = self._contexts.get(market)
+        if ctx is not None:
+            return ctx
+        with self._lock:
+            ctx = self._contexts.get(market)
+            if ctx is None:
+                factory = TRADE_CONTEXT_FACTORIES.get(market)
+                if factory is None:
+                    raise Exception(f"不支持的交易市场: {market}")
+                ctx = factory(host=self._host, port=self._port)
+                for handler in self._handlers:
+                    ctx.set_handler(handler())
+                if self.unlocked and self._password:
+                    ret, data = ctx.unlock_trade(self._password)
+                    if ret != ft.RET_OK:
+                        ctx.close()
+                        raise Exception(f"[{market}] 交易解锁失败: {data}")
+                self._contexts[market] = ctx
+                logger.info(f"[{market}] 交易上下文已创建")
+        return ctx
+
+    def put(self, market: str, ctx):
+        """注入已创建的上下文"""
+        self._contexts[market] = ctx
+
+    def unlock(self, market: str = "HK") -> tuple:
+        """解锁交易（解锁状态对之后懒创建的上下文同样生效）"""
+        ret, data = self.get(market).unlock_trade(self._password)
+        if ret == ft.RET_OK:
+            self.unlocked = True
+            for other, ctx in list(self._contexts.items()):
+                if other != market:
+                    other_ret, other_data = ctx.unlock_trade(self._password)
+                    if other_ret != ft.RET_OK:
+                        logger.warning(f"[{other}] 交易解锁失败: {other_data}")
+        return ret, data
+
+    def warm_up(self, markets):
+        """预先创建账户实际拥有的市场上下文，避免请求路径上首次创建阻塞"""
+        for market in markets:
+            if market not in TRADE_CONTEXT_FACTORIES:
+                continue
+            try:
+                self.get(market)
+            except Exception as e:
+                logger.warning(f"[{market}] 交易上下文预创建失败: {e}")
+
+    def close(self):
+        with self._lock:
+            for ctx in self._contexts.values():
+                ctx.close()
+            self._contexts.clear()
+            self.unlocked = False
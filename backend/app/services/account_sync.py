@@ -0,0 +1,251 @@
+"""
+账户状态增量同步
+
+每个账户维护单调递增的版本号，订单/持仓/资金字段各自记住最后一次变化时的版本：
+
+- sync(since=v) 只返回版本 v 之后变化的记录，清仓/不再返回的订单以 removed_* 列出
+- 刷新由请求驱动且按账户合并：SYNC_MIN_INTERVAL_SECONDS 内最多向OpenD查询一次，多个客户端共享结果
+- 订单推送（trade_bus "order"）直接更新已知订单并唤醒长轮询，同时标记账户需要重新查询持仓与资金
+- 响应带进程内 epoch，服务重启或客户端版本过旧（删除记录已被清理）时返回全量快照
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.services.futu_client import FutuClient, futu_client
+from app.services.quote_bus import QuoteBus, trade_bus
+
+# 每类记录保留的删除标记数量上限，超出后更早的版本需要全量同步
+REMOVED_LIMIT = 1024
+
+# 资金信息中不参与比较的字段（每次查询都会变化）
+BALANCE_IGNORED_FIELDS = ("updated_at",)
+
+
+class _Collection:
+    """按键记录最后变化版本的记录集合"""
+
+    def __init__(self):
+        self.items: Dict[str, Tuple[int, Any]] = {}
+        self.removed: Dict[str, int] = {}
+        # 早于此版本的删除标记已被清理
+        self.floor = 0
+
+    def replace(self, new: Dict[str, Any], version: int) -> bool:
+        """用完整列表替换，返回是否有变化"""
+        changed = False
+        for key, value in new.items():
+            if self.upsert(key, value, version):
+                changed = True
+        for key in [k for k in self.items if k not in new]:
+            del self.items[key]
+            self.removed[key] = version
+            changed = True
+        if len(self.removed) > REMOVED_LIMIT:
+            for key, ver in sorted(self.removed.items(), key=lambda kv: kv[1])[:len(self.removed) - REMOVED_LIMIT]:
+                del self.removed[key]
+                self.floor = max(self.floor, ver)
+        return changed
+
+    def upsert(self, key: str, value: Any, version: int) -> bool:
+        old = self.items.get(key)
+        if old is not None and old[1] == value:
+            return False
+        self.items[key] = (version, value)
+        self.removed.pop(key, None)
+        return True
+
+    def since(self, version: int) -> Tuple[List[Any], List[str]]:
+        changed = [value for ver, value in self.items.values() if ver > version]
+        removed = [key for key, ver in self.removed.items() if ver > version]
+        return changed, removed
+
+
+class _AccountState:
+    def __init__(self):
+        self.version = 0
+        self.orders = _Collection()
+        self.positions = _Collection()
+        self.balance = _Collection()
+        self.refreshed_at = float("-inf")
+        self.refreshing: Optional[asyncio.Task] = None
+        self.waiters: List[asyncio.Future] = []
+
+    @property
+    def floor(self) -> int:
+        return max(self.orders.floor, self.positions.floor)
+
+    def commit(self, apply: Callable[[int], bool]) -> bool:
+        """以下一个版本号应用修改，有变化时提交版本并唤醒长轮询"""
+        if not apply(self.version + 1):
+            return False
+        self.version += 1
+        self.wake()
+        return True
+
+    def wake(self):
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.waiters.clear()
+
+
+class AccountSync:
+    """账户状态版本管理"""
+
+    def __init__(self, client: FutuClient, bus: Optional[QuoteBus] = None,
+                 min_interval: float = settings.SYNC_MIN_INTERVAL_SECONDS):
+        self._client = client
+        self.min_interval = min_interval
+        # 进程内唯一，客户端据此识别服务重启
+        self.epoch = f"{time.time_ns():x}"
+        self._states: Dict[str, _AccountState] = {}
+        if bus is not None:
+            bus.add_listener("order", self._on_order)
+
+    def _state(self, acc_id: str) -> _AccountState:
+        state = self._states.get(acc_id)
+        if state is None:
+            state = self._states[acc_id] = _AccountState()
+        return state
+
+    def version(self, acc_id: str) -> int:
+        state = self._states.get(acc_id)
+        return state.version if state else 0
+
+    # ==================== 应用数据 ====================
+
+    def apply(self, acc_id: str, orders: Optional[List[Dict[str, Any]]] = None,
+              positions: Optional[List[Dict[str, Any]]] = None,
+              balance: Optional[Dict[str, Any]] = None) -> int:
+        """应用一次完整查询结果（None 表示该类未查询），返回当前版本"""
+        state = self._state(acc_id)
+
+        def apply(version: int) -> bool:
+            changed = False
+            if orders is not None:
+                changed |= state.orders.replace({str(o["order_id"]): o for o in orders}, version)
+            if positions is not None:
+                changed |= state.positions.replace({p["stock_code"]: p for p in positions}, version)
+            if balance is not None:
+                fields = {k: v for k, v in balance.items() if k not in BALANCE_IGNORED_FIELDS}
+                changed |= state.balance.replace(fields, version)
+            return changed
+
+        state.commit(apply)
+        return state.version
+
+    def _on_order(self, kind: str, code: str, data: Dict[str, Any]):
+        """订单推送不带账户ID：更新已知该订单的账户，所有账户的持仓与资金标记为待刷新"""
+        order_id = str(data.get("order_id", ""))
+        for state in self._states.values():
+            state.refreshed_at = float("-inf")
+            if order_id not in state.orders.items:
+                state.wake()
+                continue
+            try:
+                row = FutuClient._order_row(data)
+            except (KeyError, TypeError, ValueError):
+                state.wake()
+                continue
+            if not state.commit(lambda version: state.orders.upsert(order_id, row, version)):
+                state.wake()
+
+    # ==================== 刷新 ====================
+
+    async def refresh(self, acc_id: str, force: bool = False):
+        """按最小间隔刷新（同一账户并发请求共享同一次查询）"""
+        state = self._state(acc_id)
+        if state.refreshing is None:
+            if not force and time.monotonic() - state.refreshed_at < self.min_interval:
+                return
+            state.refreshing = asyncio.ensure_future(self._refresh(acc_id, state))
+        task = state.refreshing
+        try:
+            await asyncio.shield(task)
+        finally:
+            if state.refreshing is task and task.done():
+                state.refreshing = None
+
+    async def _refresh(self, acc_id: str, state: _AccountState):
+        started = time.monotonic()
+        orders, positions, balance = await asyncio.gather(
+            self._client.get_orders(acc_id=acc_id),
+            self._client.get_positions(acc_id),
+            self._client.get_acc_info(acc_id),
+        )
+        self.apply(acc_id, orders=orders, positions=positions, balance=balance)
+        state.refreshed_at = started
+
+    # ==================== 查询 ====================
+
+    def cached(self, acc_id: str, max_age: float) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """max_age 秒内查询过的 (持仓 代码->记录, 资金)；订单推送后持仓与资金视为过期，返回 None"""
+        state = self._states.get(acc_id)
+        if state is None or time.monotonic() - state.refreshed_at >= max_age:
+            return None
+        positions = {code: value for code, (_, value) in state.positions.items.items()}
+        balance = {key: value for key, (_, value) in state.balance.items.items()}
+        return positions, balance
+
+    def changes(self, acc_id: str, since: Optional[int] = None, epoch: Optional[str] = None) -> Dict[str, Any]:
+        """since 之后的变化；since 为空、epoch 不符或版本已无法增量时返回全量"""
+        state = self._state(acc_id)
+        full = since is None or epoch != self.epoch or since < state.floor or since > state.version
+        base = 0 if full else since
+        orders, removed_orders = state.orders.since(base)
+        positions, removed_positions = state.positions.since(base)
+        return {
+            "acc_id": acc_id,
+            "epoch": self.epoch,
+            "version": state.version,
+            "full": full,
+            "orders": orders,
+            "removed_orders": [] if full else removed_orders,
+            "positions": positions,
+            "removed_positions": [] if full else removed_positions,
+            "balance": {k: v for k, (ver, v) in state.balance.items.items() if ver > base},
+        }
+
+    async def sync(self, acc_id: str, since: Optional[int] = None, epoch: Optional[str] = None,
+                   wait: float = 0.0, refresh: bool = True) -> Dict[str, Any]:
+        """
+        增量同步；wait > 0 时为长轮询：无变化则挂起直到有变化或超时
+
+        挂起期间每隔 min_interval 刷新一次（与其他客户端合并），推送到达时立即唤醒
+        """
+        if refresh:
+            await self.refresh(acc_id)
+        result = self.changes(acc_id, since, epoch)
+        if result["full"] or wait <= 0 or result["version"] > since:
+            return result
+
+        state = self._state(acc_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while state.version <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            waiter = loop.create_future()
+            state.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=min(remaining, self.min_interval))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+            if refresh and state.version <= since:
+                try:
+                    await self.refresh(acc_id)
+                except Exception as e:
+                    logger.warning(f"[{acc_id}] 账户状态刷新失败: {e}")
+        return self.changes(acc_id, since, epoch)
+
+
+# 全局账户同步实例
+account_sync = AccountSync(futu_client, trade_bus)
@@ -0,0 +1,239 @@
+"""
+向量化回测引擎
+
+信号与持仓全部以NumPy数组计算，不逐根K线循环：
+1. 策略函数根据收盘价序列生成目标仓位（占权益比例，0~1），第 t 根收盘时决定、按收盘价成交
+2. 第 t 根K线收益 = 前一根的仓位 × 当根涨跌幅
+3. 成本 = 仓位变化量 × (佣金率 + 滑点)，按权益比例扣除
+4. 权益曲线 = 初始资金 × 累乘(1 + 收益) × 累乘(1 - 成本)
+
+成本按成交金额比例计算，不包含最低佣金、整手限制等与路径相关的规则。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 每年K线数量，用于年化（港股每日交易 5.5 小时）
+PERIODS_PER_YEAR = {
+    "K_1M": 252 * 330,
+    "K_5M": 252 * 66,
+    "K_15M": 252 * 22,
+    "K_30M": 252 * 11,
+    "K_60M": 252 * 6,
+    "K_DAY": 252,
+    "K_WEEK": 52,
+    "K_MON": 12,
+}
+
+
+# ==================== 指标 ====================
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均（前 window-1 个为 NaN）"""
+    out = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return out
+    csum = np.cumsum(np.insert(values, 0, 0.0))
+    out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+# ==================== 策略信号 ====================
+
+def _require_positive(**params):
+    """窗口/档位等参数必须为正数"""
+    for name, value in params.items():
+        if value <= 0:
+            raise ValueError(f"参数 {name} 必须大于0: {value}")
+
+
+def signal_ma(close: np.ndarray, fast: int = 5, slow: int = 20) -> np.ndarray:
+    """均线策略：快线在慢线之上满仓，否则空仓"""
+    _require_positive(fast=fast, slow=slow)
+    fast_ma, slow_ma = sma(close, int(fast)), sma(close, int(slow))
+    return np.where(fast_ma > slow_ma, 1.0, 0.0)
+
+
+def signal_macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> np.ndarray:
+    """MACD策略：DIF 在 DEA 之上满仓"""
+    _require_positive(fast=fast, slow=slow, signal=signal)
+    dif = ema(close, int(fast)) - ema(close, int(slow))
+    dea = ema(dif, int(signal))
+    pos = np.where(dif > dea, 1.0, 0.0)
+    pos[:int(slow)] = 0.0  # 预热期不交易
+    return pos
+
+
+def signal_grid(close: np.ndarray, window: int = 20, band: float = 0.1, levels: int = 5) -> np.ndarray:
+    """
+    网格交易：以滚动均线为中枢，价格每下跌一格加仓一档、上涨一格减仓一档
+
+    仓位只取决于当前价格所在的格子（不含迟滞），可直接向量化
+    """
+    _require_positive(window=window, band=band, levels=levels)
+    center = sma(close, int(window))
+    lower = center * (1 - band)
+    step = 2 * band * center / levels
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grid_idx = np.floor((close - lower) / step)
+    pos = 1.0 - np.clip(grid_idx, 0, levels) / levels
+    return np.nan_to_num(pos, nan=0.0)
+
+
+def signal_dca(close: np.ndarray, interval: int = 20, installments: int = 12) -> np.ndarray:
+    """定投策略：每 interval 根K线投入 1/installments 的资金，直至满仓"""
+    _require_positive(interval=interval, installments=installments)
+    n = np.arange(len(close)) // int(interval) + 1
+    return np.minimum(n / int(installments), 1.0)
+
+
+STRATEGIES: Dict[str, Callable[..., np.ndarray]] = {
+    "MA": signal_ma,
+    "MACD": signal_macd,
+    "GRID": signal_grid,
+    "DCA": signal_dca,
+}
+
+
+# ==================== 回测 ====================
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    times: np.ndarray
+    equity: np.ndarray
+    position: np.ndarray
+    trades: List[Dict[str, Any]] = field(default_factory=list)
+    stats: Dict[str, float] = field(default_factory=dict)
+
+
+def simulate(
+    close: np.ndarray,
+    position: np.ndarray,
+    capital: float,
+    commission_rate: float = 0.0003,
+    slippage: float = 0.0005,
+) -> Dict[str, np.ndarray]:
+    """根据目标仓位序列计算权益曲线（纯数组运算）"""
+    position = np.clip(np.nan_to_num(position, nan=0.0), 0.0, 1.0)
+    returns = np.zeros(len(close))
+    returns[1:] = close[1:] / close[:-1] - 1.0
+
+    turnover = np.abs(np.diff(position, prepend=0.0))
+    cost = turnover * (commission_rate + slippage)
+    held = np.concatenate(([0.0], position[:-1]))
+    growth = (1.0 + held * returns) * (1.0 - cost)
+    equity = capital * np.cumprod(growth)
+    return {"equity": equity, "returns": growth - 1.0, "turnover": turnover, "position": position}
+
+
+def compute_stats(equity: np.ndarray, returns: np.ndarray, position: np.ndarray,
+                  capital: float, periods_per_year: int) -> Dict[str, float]:
+    n = len(equity)
+    if n == 0:
+        return {}
+    total_return = equity[-1] / capital - 1.0
+    years = n / periods_per_year
+    annual_return = (equity[-1] / capital) ** (1 / years) - 1.0 if years > 0 and equity[-1] > 0 else 0.0
+    volatility = float(np.std(returns) * np.sqrt(periods_per_year))
+    sharpe = float(np.mean(returns) / np.std(returns) * np.sqrt(periods_per_year)) if np.std(returns) > 0 else 0.0
+    peak = np.maximum.accumulate(equity)
+    max_drawdown = float(np.max(1.0 - equity / peak))
+    return {
+        "total_return": float(total_return),
+        "annual_return": float(annual_return),
+        "volatility": volatility,
+        "sharpe": sharpe,
+        "max_drawdown": max_drawdown,
+        "exposure": float(np.mean(position > 0)),
+        "final_equity": float(equity[-1]),
+    }
+
+
+def extract_trades(times: np.ndarray, close: np.ndarray, sim: Dict[str, np.ndarray],
+                   slippage: float) -> List[Dict[str, Any]]:
+    """从仓位变化提取成交记录"""
+    position, turnover, equity = sim["position"], sim["turnover"], sim["equity"]
+    idx = np.flatnonzero(turnover > 1e-9)
+    if len(idx) == 0:
+        return []
+    before = np.concatenate(([0.0], position[:-1]))[idx]
+    after = position[idx]
+    buy = after > before
+    price = close[idx] * np.where(buy, 1 + slippage, 1 - slippage)
+    value = turnover[idx] * equity[idx]
+    return [
+        {
+            "time": int(t),
+            "side": "BUY" if b else "SELL",
+            "price": float(p),
+            "quantity": float(v / p),
+            "value": float(v),
+            "position_before": float(pb),
+            "position_after": float(pa),
+        }
+        for t, b, p, v, pb, pa in zip(times[idx], buy, price, value, before, after)
+    ]
+
+
+def round_trip_stats(sim: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """按“空仓→持仓→空仓”划分交易回合，统计胜率"""
+    flat = sim["position"] <= 1e-9
+    change = np.diff(flat.astype(np.int8), prepend=1)
+    entries = np.flatnonzero(change == -1)
+    exits = np.flatnonzero(change == 1)
+    if len(entries) == 0:
+        return {"round_trips": 0, "win_rate": 0.0}
+    equity = sim["equity"]
+    exit_idx = np.append(exits[exits > entries[0]], len(equity) - 1)[:len(entries)]
+    entry_equity = equity[np.maximum(entries - 1, 0)]
+    pnl = equity[exit_idx] / entry_equity - 1.0
+    return {"round_trips": int(len(entries)), "win_rate": float(np.mean(pnl > 0))}
+
+
+def run_backtest(
+    bars: np.ndarray,
+    strategy: str,
+    params: Optional[Dict[str, Any]] = None,
+    capital: float = 100000.0,
+    commission_rate: float = 0.0003,
+    slippage: float = 0.0005,
+    kline_type: str = "K_DAY",
+    collect_trades: bool = True,
+) -> BacktestResult:
+    """
+    运行回测
+
+    - bars: KLINE_DTYPE 结构化数组（见 kline_store）
+    - strategy: MA / MACD / GRID / DCA
+    - slippage: 滑点比例（0.0005 即 5 个基点）
+    - collect_trades: 是否生成逐笔成交明细（参数寻优时关闭，只统计笔数）
+    """
+    if capital <= 0:
+        raise ValueError(f"初始资金必须大于0: {capital}")
+    signal_fn = STRATEGIES.get(strategy)
+    if signal_fn is None:
+        raise ValueError(f"不支持的策略类型: {strategy}")
+
+    close = bars["close"].astype("f8")
+    periods = PERIODS_PER_YEAR.get(kline_type, 252)
+    position = signal_fn(close, **(params or {}))
+    sim = simulate(close, position, capital, commission_rate, slippage)
+
+    stats = compute_stats(sim["equity"], sim["returns"], sim["position"], capital, periods)
+    stats.update(round_trip_stats(sim))
+    if collect_trades:
+        trades = extract_trades(bars["time"], close, sim, slippage)
+        stats["trade_count"] = len(trades)
+    else:
+        trades = []
+        stats["trade_count"] = int(np.count_nonzero(sim["turnover"] > 1e-9))
+    stats["commission_paid"] = float(np.sum(sim["turnover"] * sim["equity"]) * commission_rate)
+    return BacktestResult(times=bars["time"], equity=sim["equity"], position=sim["position"],
+                          trades=trades, stats=stats)
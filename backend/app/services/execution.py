@@ -0,0 +1,432 @@
+"""
+算法执行（TWAP / VWAP / 冰山单）
+
+母单按调度曲线拆成限价子单:
+- TWAP:    时间窗口等分为 slices 段，第 k 段开始时累计目标为 总量 × (k+1) / slices
+- VWAP:    按历史分钟K线的分时成交量分布计算累计目标比例（无历史数据时退化为TWAP）
+- ICEBERG: 不按时间拆分，始终只挂出 display_quantity，成交后再挂下一笔
+
+单个调度协程每个 tick 检查全部活动母单：累计目标 - 已成交 - 在途 不少于一手时下新子单；
+子单挂出超过 replace_seconds 仍未完全成交且价格已偏离时按最新价改单。
+子单价格按最小价位规整（买入向下、卖出向上），不足一个价位的波动不触发改单。
+子单成交由 trade_bus 订单推送更新，并定期批量查询订单对账。下单/改单经OpenD限频器排队。
+
+调度时间使用本机时间，VWAP分时分布按K线的交易所当地时间计算（默认本机与交易所同时区）。
+"""
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.services.futu_client import TERMINAL_ORDER_STATUS, futu_client
+from app.services.kline_store import kline_store
+from app.services.quote_bus import QuoteBus, quote_bus, trade_bus
+from app.services.reference_data import reference_data
+from app.services.security_master import security_master
+
+ALGO_TYPES = ("TWAP", "VWAP", "ICEBERG")
+
+# 母单连续失败次数上限
+MAX_FAILURES = 5
+
+# VWAP 分时分布使用的历史天数与分桶秒数
+VWAP_LOOKBACK_DAYS = 20
+VWAP_BUCKET_SECONDS = 300
+
+
+def twap_schedule(start: float, end: float, slices: int) -> Tuple[np.ndarray, np.ndarray]:
+    """返回 (各段开始时间, 累计目标比例)"""
+    k = np.arange(slices)
+    return start + (end - start) * k / slices, (k + 1) / slices
+
+
+def vwap_schedule(bars: np.ndarray, start: float, end: float,
+                  bucket_seconds: int = VWAP_BUCKET_SECONDS) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    按历史分钟K线的分时成交量分布生成调度
+
+    bars 为 KLINE_DTYPE（time 为交易所当地时间秒数），返回 None 表示窗口内没有历史成交量
+    """
+    if len(bars) == 0 or end <= start:
+        return None
+    start_local = datetime.fromtimestamp(start)
+    start_tod = start_local.hour * 3600 + start_local.minute * 60 + start_local.second
+    tod = bars["time"] % 86400
+    edges = np.arange(start_tod, start_tod + (end - start) + bucket_seconds, bucket_seconds)
+    in_window = (tod >= edges[0]) & (tod < edges[-1])
+    if not in_window.any():
+        return None
+    volume = np.bincount(((tod[in_window] - edges[0]) // bucket_seconds).astype(np.int64),
+                         weights=bars["volume"][in_window], minlength=len(edges) - 1)[:len(edges) - 1]
+    if volume.sum() <= 0:
+        return None
+    return start + (edges[:-1] - start_tod), np.cumsum(volume) / volume.sum()
+
+
+@dataclass
+class ChildOrder:
+    """子单"""
+    order_id: str
+    price: float
+    quantity: int
+    placed_at: float
+    filled: int = 0
+    avg_price: float = 0.0
+    status: str = "SUBMITTED"
+
+    @property
+    def is_open(self) -> bool:
+        return self.status not in TERMINAL_ORDER_STATUS
+
+    @property
+    def working(self) -> int:
+        return self.quantity - self.filled if self.is_open else 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "order_id": self.order_id, "price": self.price, "quantity": self.quantity,
+            "filled": self.filled, "avg_price": self.avg_price, "status": self.status,
+        }
+
+
+@dataclass
+class ParentOrder:
+    """母单"""
+    algo_id: str
+    algo: str
+    stock_code: str
+    side: str
+    quantity: int
+    lot_size: int
+    start_at: float
+    end_at: float
+    schedule_times: np.ndarray
+    schedule_frac: np.ndarray
+    limit_price: Optional[float] = None
+    display_quantity: Optional[int] = None
+    acc_id: Optional[str] = None
+    status: str = "RUNNING"
+    children: Dict[str, ChildOrder] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    failures: int = 0
+    busy: bool = False
+    created_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def is_active(self) -> bool:
+        return self.status == "RUNNING"
+
+    @property
+    def filled(self) -> int:
+        return sum(c.filled for c in self.children.values())
+
+    @property
+    def working(self) -> int:
+        return sum(c.working for c in self.children.values())
+
+    @property
+    def avg_price(self) -> float:
+        filled = self.filled
+        return sum(c.filled * c.avg_price for c in self.children.values()) / filled if filled else 0.0
+
+    def target(self, now: float) -> int:
+        """当前时刻应累计完成的数量（按整手向下取整，最后一段为全部）"""
+        if self.algo == "ICEBERG":
+            return self.quantity
+        step = int(np.searchsorted(self.schedule_times, now, side="right")) - 1
+        if step < 0:
+            return 0
+        if step >= len(self.schedule_frac) - 1:
+            return self.quantity
+        return int(self.quantity * self.schedule_frac[step]) // self.lot_size * self.lot_size
+
+    def to_dict(self) -> Dict[str, Any]:
+        filled = self.filled
+        return {
+            "algo_id": self.algo_id,
+            "algo": self.algo,
+            "stock_code": self.stock_code,
+            "side": self.side,
+            "quantity": self.quantity,
+            "lot_size": self.lot_size,
+            "limit_price": self.limit_price,
+            "display_quantity": self.display_quantity,
+            "start_at": datetime.fromtimestamp(self.start_at),
+            "end_at": datetime.fromtimestamp(self.end_at),
+            "status": self.status,
+            "filled_quantity": filled,
+            "working_quantity": self.working,
+            "avg_price": self.avg_price,
+            "progress": filled / self.quantity if self.quantity else 0.0,
+            "scheduled_quantity": self.target(time.time()),
+            "children": [c.to_dict() for c in self.children.values()],
+            "errors": self.errors[-10:],
+            "created_at": self.created_at,
+        }
+
+
+class ExecutionEngine:
+    """算法执行调度（单协程管理全部母单）"""
+
+    def __init__(self, client, bus: QuoteBus = trade_bus, quotes: QuoteBus = quote_bus, master=security_master,
+                 tick_seconds: float = 1.0, replace_seconds: float = 30.0, reconcile_seconds: float = 10.0):
+        self.client = client
+        self._bus = bus
+        self._quotes = quotes
+        self._master = master
+        self.tick_seconds = tick_seconds
+        self.replace_seconds = replace_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self._parents: Dict[str, ParentOrder] = {}
+        self._by_order: Dict[str, ParentOrder] = {}
+        self._ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set = set()
+        self._last_reconcile = 0.0
+        self._listening = False
+
+    # ---------- 母单管理 ----------
+
+    async def submit(self, stock_code: str, side: str, quantity: int, algo: str = "TWAP",
+                     start_at: Optional[datetime] = None, end_at: Optional[datetime] = None,
+                     slices: int = 10, limit_price: Optional[float] = None,
+                     display_quantity: Optional[int] = None, lot_size: Optional[int] = None,
+                     acc_id: Optional[str] = None) -> ParentOrder:
+        """提交母单（参数错误抛出 ValueError）"""
+        if algo not in ALGO_TYPES:
+            raise ValueError(f"不支持的执行算法: {algo}")
+        if side not in ("BUY", "SELL"):
+            raise ValueError(f"买卖方向错误: {side}")
+        lot_size = lot_size or await self._master.lot_size(stock_code)
+        if quantity <= 0 or quantity % lot_size:
+            raise ValueError(f"数量必须为每手股数 {lot_size} 的正整数倍")
+        if algo == "ICEBERG" and (not display_quantity or display_quantity % lot_size):
+            raise ValueError(f"冰山单显示数量必须为每手股数 {lot_size} 的正整数倍")
+
+        start = (start_at or datetime.now()).timestamp()
+        end = end_at.timestamp() if end_at else start
+        if algo != "ICEBERG" and end <= start:
+            raise ValueError("结束时间必须晚于开始时间")
+        if slices <= 0:
+            raise ValueError("slices 必须大于0")
+
+        schedule = None
+        if algo == "VWAP":
+            schedule = vwap_schedule(await self._intraday_bars(stock_code), start, end)
+            if schedule is None:
+                logger.warning(f"[{stock_code}] 无可用分时成交量，VWAP 按 TWAP 调度")
+        if schedule is None:
+            schedule = twap_schedule(start, max(end, start + 1), slices if algo != "ICEBERG" else 1)
+
+        parent = ParentOrder(
+            algo_id=f"ALGO-{next(self._ids)}", algo=algo, stock_code=stock_code, side=side,
+            quantity=quantity, lot_size=lot_size, start_at=start, end_at=end,
+            schedule_times=schedule[0], schedule_frac=schedule[1], limit_price=limit_price,
+            display_quantity=display_quantity, acc_id=acc_id,
+        )
+        self._parents[parent.algo_id] = parent
+        logger.info(f"[{parent.algo_id}] {algo} {side} {stock_code} {quantity} 股，{len(schedule[0])} 段")
+        self._ensure_running()
+        return parent
+
+    def get(self, algo_id: str) -> Optional[ParentOrder]:
+        return self._parents.get(algo_id)
+
+    def list_orders(self) -> List[ParentOrder]:
+        return list(self._parents.values())
+
+    async def cancel(self, algo_id: str) -> ParentOrder:
+        """撤销母单及其在途子单"""
+        parent = self._parents.get(algo_id)
+        if parent is None:
+            raise KeyError(algo_id)
+        if parent.is_active:
+            parent.status = "CANCELLED"
+            await self._cancel_children(parent)
+        return parent
+
+    async def _cancel_children(self, parent: ParentOrder):
+        """撤销母单的全部在途子单（失败记入 errors）"""
+        open_children = [c for c in parent.children.values() if c.is_open]
+        results = await asyncio.gather(
+            *(self.client.cancel_order(c.order_id, acc_id=parent.acc_id) for c in open_children),
+            return_exceptions=True,
+        )
+        for child, result in zip(open_children, results):
+            if isinstance(result, Exception):
+                parent.errors.append(f"撤销子单 {child.order_id} 失败: {result}")
+            else:
+                child.status = "CANCELLED_PART" if child.filled else "CANCELLED_ALL"
+
+    async def shutdown(self):
+        """停止调度（不撤销在途子单）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._listening:
+            self._bus.remove_listener("order", self._on_order)
+            self._listening = False
+
+    # ---------- 调度 ----------
+
+    def _ensure_running(self):
+        if not self._listening:
+            self._bus.add_listener("order", self._on_order)
+            self._listening = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while any(p.is_active for p in self._parents.values()):
+            now = time.time()
+            for parent in self._parents.values():
+                if parent.is_active and not parent.busy:
+                    action = self._plan(parent, now)
+                    if action is not None:
+                        parent.busy = True
+                        self._spawn(self._act(parent, *action))
+            if time.monotonic() - self._last_reconcile >= self.reconcile_seconds:
+                self._last_reconcile = time.monotonic()
+                self._spawn(self._reconcile())
+            await asyncio.sleep(self.tick_seconds)
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _plan(self, parent: ParentOrder, now: float) -> Optional[Tuple]:
+        """本 tick 对母单要执行的动作：("place", 数量) / ("replace", 子单) / None"""
+        if now < parent.start_at:
+            return None
+        filled = parent.filled
+        if filled >= parent.quantity:
+            parent.status = "FILLED"
+            for order_id in parent.children:
+                self._by_order.pop(order_id, None)
+            logger.info(f"[{parent.algo_id}] 执行完成，均价 {parent.avg_price:.4f}")
+            return None
+
+        working = parent.working
+        for child in parent.children.values():
+            if child.is_open and time.monotonic() - child.placed_at >= self.replace_seconds:
+                price = self._market_price(parent)
+                if price is not None and abs(price - child.price) > 1e-9:
+                    return "replace", child
+
+        if parent.algo == "ICEBERG":
+            deficit = min(parent.display_quantity - working, parent.quantity - filled - working)
+        else:
+            deficit = parent.target(now) - filled - working
+        deficit = deficit // parent.lot_size * parent.lot_size
+        if deficit > 0:
+            return "place", deficit
+        return None
+
+    @staticmethod
+    def _bounded(parent: ParentOrder, price: Optional[float]) -> Optional[float]:
+        """受母单限价约束并规整到最小价位"""
+        limit = parent.limit_price
+        if price is None:
+            price = limit
+        elif limit is not None:
+            price = min(price, limit) if parent.side == "BUY" else max(price, limit)
+        if price is None:
+            return None
+        return reference_data.round_price(parent.stock_code, price, parent.side)
+
+    def _market_price(self, parent: ParentOrder) -> Optional[float]:
+        """子单价格：最新价，受母单限价约束"""
+        quote = self._quotes.latest_quote(parent.stock_code)
+        return self._bounded(parent, float(quote["last_price"]) if quote else None)
+
+    async def _price(self, parent: ParentOrder) -> float:
+        price = self._market_price(parent)
+        if price is None:
+            quote = await self.client.get_quote(parent.stock_code)
+            price = self._bounded(parent, quote["current_price"])
+        return price
+
+    async def _act(self, parent: ParentOrder, action: str, arg):
+        try:
+            price = await self._price(parent)
+            if action == "place":
+                result = await self.client.place_order(
+                    parent.stock_code, parent.side, price, arg, "LIMIT", acc_id=parent.acc_id
+                )
+                order_id = str(result["order_id"])
+                parent.children[order_id] = ChildOrder(order_id, price, arg, time.monotonic())
+                self._by_order[order_id] = parent
+                logger.info(f"[{parent.algo_id}] 子单 {order_id}: {parent.side} {arg}@{price}")
+            else:
+                await self.client.modify_order(arg.order_id, price, arg.quantity, acc_id=parent.acc_id)
+                arg.price = price
+                arg.placed_at = time.monotonic()
+                logger.info(f"[{parent.algo_id}] 子单 {arg.order_id} 改价 {price}")
+            parent.failures = 0
+        except Exception as e:
+            parent.failures += 1
+            parent.errors.append(str(e))
+            logger.warning(f"[{parent.algo_id}] {action} 失败: {e}")
+            if parent.failures >= MAX_FAILURES:
+                # 母单失败后不再改价/对账，在途子单一并撤销
+                parent.status = "FAILED"
+                await self._cancel_children(parent)
+        finally:
+            parent.busy = False
+
+    # ---------- 成交回报 ----------
+
+    def _on_order(self, kind: str, code: str, data: Dict[str, Any]):
+        self._update_child(data)
+
+    def _update_child(self, data: Dict[str, Any]):
+        order_id = str(data.get("order_id", ""))
+        parent = self._by_order.get(order_id)
+        if parent is None:
+            return
+        child = parent.children[order_id]
+        dealt = data.get("dealt_qty", data.get("filled_quantity"))
+        if dealt is not None:
+            child.filled = max(child.filled, int(float(dealt)))
+        avg = data.get("dealt_avg_price")
+        if avg not in (None, "N/A"):
+            child.avg_price = float(avg)
+        elif child.filled and not child.avg_price:
+            child.avg_price = child.price
+        status = data.get("order_status", data.get("status"))
+        if status:
+            child.status = status
+
+    async def _reconcile(self):
+        """批量查询订单补齐可能丢失的推送（每个账户一次请求）"""
+        accounts = {p.acc_id for p in self._parents.values()
+                    if p.is_active and any(c.is_open for c in p.children.values())}
+        for acc_id in accounts:
+            try:
+                for order in await self.client.get_orders(acc_id=acc_id):
+                    self._update_child(order)
+            except Exception as e:
+                logger.debug(f"执行算法订单对账失败: {e}")
+
+    async def _intraday_bars(self, stock_code: str) -> np.ndarray:
+        start = (date.today() - timedelta(days=VWAP_LOOKBACK_DAYS * 2)).isoformat()
+        end = (date.today() - timedelta(days=1)).isoformat()
+        try:
+            return await kline_store.get(stock_code, start, end, ktype="K_1M", client=self.client)
+        except Exception as e:
+            logger.warning(f"[{stock_code}] 获取分钟K线失败: {e}")
+            return np.empty(0)
+
+
+# 全局执行引擎实例
+execution_engine = ExecutionEngine(futu_client)
@@ -0,0 +1,196 @@
+"""
+数据批量导出
+
+以固定行数的数据块流式生成 CSV / NDJSON / Parquet 字节流，内存占用与导出总量无关：
+
+- K线: 从本地存储按块切片，未缓存的序列以内存映射方式只读打开，复权按块换算
+- 历史订单/成交: 按时间窗口分批向OpenD查询，每个窗口返回后立即输出
+
+CSV 先输出表头，客户端无需等待第一批数据即可开始接收。
+Parquet 依赖可选的 pyarrow，每个数据块写成一个 row group，结束时写入文件尾。
+"""
+from datetime import date, timedelta
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖，未安装时不支持 parquet 格式
+    pa = pq = None
+
+from app.services.kline_store import adjust_bars
+
+# 格式 -> Content-Type
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# 每个数据块的行数
+EXPORT_CHUNK_ROWS = 10000
+
+# 历史订单/成交单次查询的时间窗口（天）
+HISTORY_WINDOW_DAYS = 30
+
+KLINE_EXPORT_COLUMNS = ["code", "time_key", "open", "high", "low", "close", "volume", "turnover"]
+
+ORDER_EXPORT_COLUMNS = [
+    "order_id", "code", "stock_name", "trd_side", "order_type", "order_status",
+    "price", "qty", "dealt_qty", "dealt_avg_price", "create_time", "updated_time",
+]
+
+DEAL_EXPORT_COLUMNS = [
+    "deal_id", "order_id", "code", "stock_name", "trd_side", "price", "qty", "create_time", "status",
+]
+
+
+def available_formats() -> List[str]:
+    if pa is None:
+        return ["csv", "ndjson"]
+    return ["csv", "ndjson", "parquet"]
+
+
+def kline_frames(code: str, bars: np.ndarray, chunk_rows: int = EXPORT_CHUNK_ROWS,
+                 rehab: Optional[np.ndarray] = None, autype: str = "none") -> Iterator[pd.DataFrame]:
+    """不复权K线结构化数组（可为内存映射）按块复权并转换为DataFrame"""
+    for lo in range(0, len(bars), chunk_rows):
+        chunk = np.asarray(bars[lo:lo + chunk_rows])
+        if rehab is not None:
+            # 累积复权因子逐根K线独立计算，按块换算与整段换算结果相同
+            chunk = adjust_bars(chunk, rehab, autype)
+        stamps = np.datetime_as_string(chunk["time"].astype("datetime64[s]"), unit="s")
+        frame = pd.DataFrame({"code": code, "time_key": np.char.replace(stamps, "T", " ")})
+        for field in ("open", "high", "low", "close", "volume", "turnover"):
+            frame[field] = chunk[field]
+        yield frame
+
+
+def history_windows(start: str, end: str, days: int = HISTORY_WINDOW_DAYS) -> List[Tuple[str, str]]:
+    """把 [start, end] 日期区间切分为查询窗口（"YYYY-MM-DD HH:MM:SS"，首尾相接不重叠）"""
+    lo, hi = date.fromisoformat(start), date.fromisoformat(end)
+    windows = []
+    while lo <= hi:
+        upper = min(lo + timedelta(days=days - 1), hi)
+        windows.append((f"{lo.isoformat()} 00:00:00", f"{upper.isoformat()} 23:59:59"))
+        lo = upper + timedelta(days=1)
+    return windows
+
+
+class FrameEncoder:
+    """把列固定的DataFrame数据块依次编码为字节"""
+
+    def __init__(self, fmt: str, columns: List[str]):
+        if fmt not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt == "parquet" and pa is None:
+            raise ValueError("导出 parquet 需要安装 pyarrow")
+        self.fmt = fmt
+        self.columns = columns
+        self.rows = 0
+        self._sink = None
+        self._writer = None
+
+    def header(self) -> bytes:
+        if self.fmt == "csv":
+            return (",".join(self.columns) + "\n").encode("utf-8")
+        return b""
+
+    def encode(self, frame: pd.DataFrame) -> bytes:
+        frame = frame.reindex(columns=self.columns)
+        if not len(frame):
+            return b""
+        self.rows += len(frame)
+        if self.fmt == "csv":
+            return frame.to_csv(index=False, header=False, lineterminator="\n").encode("utf-8")
+        if self.fmt == "ndjson":
+            return frame.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+        return self._write_parquet(frame)
+
+    def close(self) -> bytes:
+        if self.fmt != "parquet":
+            return b""
+        if self._writer is None:
+            # 无数据时也输出带表头的合法文件
+            self._write_parquet(pd.DataFrame({c: pd.Series(dtype="object") for c in self.columns}))
+        self._writer.close()
+        return self._sink.drain()
+
+    def _write_parquet(self, frame: pd.DataFrame) -> bytes:
+        if self._writer is None:
+            self._sink = _ChunkSink()
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            self._writer = pq.ParquetWriter(pa.PythonFile(self._sink, mode="w"), table.schema)
+        else:
+            table = pa.Table.from_pandas(frame, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+
+class _ChunkSink:
+    """只追加的输出缓冲，取走数据后 tell() 仍返回累计偏移（Parquet文件尾记录的是绝对偏移）"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_frames(frames: Iterable[pd.DataFrame], encoder: FrameEncoder) -> Iterator[bytes]:
+    """同步数据块 -> 字节流（StreamingResponse 会在线程池中迭代，不阻塞事件循环）"""
+    head = encoder.header()
+    if head:
+        yield head
+    for frame in frames:
+        data = encoder.encode(frame)
+        if data:
+            yield data
+    tail = encoder.close()
+    if tail:
+        yield tail
+
+
+async def astream_frames(frames: AsyncIterator[pd.DataFrame], encoder: FrameEncoder) -> AsyncIterator[bytes]:
+    """异步数据块 -> 字节流"""
+    head = encoder.header()
+    if head:
+        yield head
+    async for frame in frames:
+        data = encoder.encode(frame)
+        if data:
+            yield data
+    tail = encoder.close()
+    if tail:
+        yield tail
+
+
+async def history_frames(client, kind: str, start: str, end: str,
+                         acc_id: Optional[str] = None) -> AsyncIterator[pd.DataFrame]:
+    """按时间窗口依次查询历史订单/成交（kind: orders | deals）"""
+    for window_start, window_end in history_windows(start, end):
+        frame = await client.get_history_frame(kind, window_start, window_end, acc_id)
+        if len(frame):
+            yield frame
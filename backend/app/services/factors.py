@@ -0,0 +1,386 @@
+"""
+横截面因子引擎
+
+把本地日K线对齐为 T×N 的稠密面板（交易日 × 标的，float32），在整个面板上向量化计算因子：
+
+- 时间序列算子（pct_change / rolling_mean / rolling_std）基于累计和，复杂度 O(T·N)，与窗口长度无关
+- 横截面算子（cs_rank / cs_zscore）逐行计算，cs_zscore 支持按行业或市场分组
+- 面板按股票池缓存（最多 MAX_PANELS 个），只保留最近 max_days 个交易日，内存占用固定
+  （3000只×5年 每个字段约15MB）
+- 新交易日只读取各标的最新K线追加到面板末尾，并只对末尾 WARMUP_DAYS 行重算因子
+- 已连接OpenD时，构建/更新前先经 kline_store 补齐股票池截至昨天缺失的日K线（并发 FETCH_CONCURRENCY，
+  历史K线接口限频），已覆盖的区间不重复拉取
+
+前复权价格在除权后整体缩放：追加时按重叠日收盘价的比例同步缩放已有面板，
+收益率类因子与价格尺度无关，已缓存的因子无需重算。
+不同市场的交易日取并集，某市场休市日沿用前收盘（收益为0），停牌日同样处理。
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.services.futu_client import futu_client
+from app.services.kline_store import KLineStore, adjust_bars, kline_store, to_datetime, to_epoch
+
+PANEL_DTYPE = np.float32
+
+# 面板保留的交易日数（约5年）
+DEFAULT_DAYS = 5 * 252
+
+# 缓存的股票池面板数
+MAX_PANELS = 2
+
+TRADING_DAYS = 252
+
+# 滚动窗口允许的最少有效样本比例
+MIN_PERIODS_RATIO = 0.8
+
+# 补齐日K线的并发数
+FETCH_CONCURRENCY = 8
+
+
+# ==================== 算子 ====================
+
+def shift(x: np.ndarray, n: int) -> np.ndarray:
+    """沿时间轴后移 n 行（前 n 行为 NaN）"""
+    out = np.full_like(x, np.nan)
+    if n < len(x):
+        out[n:] = x[:len(x) - n]
+    return out
+
+
+def pct_change(x: np.ndarray, n: int) -> np.ndarray:
+    """n 期收益率"""
+    out = np.full_like(x, np.nan)
+    if n < len(x):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[n:] = x[n:] / x[:-n] - 1
+    return out
+
+
+def _rolling_sums(x: np.ndarray, n: int, squares: bool = False):
+    """窗口内有效值的和（及平方和）与个数，累计和用 float64 避免精度损失"""
+    valid = ~np.isnan(x)
+    values = np.where(valid, x, 0).astype(np.float64)
+    parts = [values, valid.astype(np.float64)]
+    if squares:
+        parts.append(values * values)
+    sums = []
+    for part in parts:
+        c = np.cumsum(part, axis=0)
+        c[n:] -= c[:-n].copy()
+        sums.append(c)
+    return sums
+
+
+def rolling_mean(x: np.ndarray, n: int, min_periods: Optional[int] = None) -> np.ndarray:
+    total, count = _rolling_sums(x, n)
+    min_periods = min_periods or max(int(n * MIN_PERIODS_RATIO), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = total / count
+    out[count < min_periods] = np.nan
+    return out.astype(x.dtype)
+
+
+def rolling_std(x: np.ndarray, n: int, min_periods: Optional[int] = None) -> np.ndarray:
+    """滚动样本标准差"""
+    total, count, square = _rolling_sums(x, n, squares=True)
+    min_periods = max(min_periods or int(n * MIN_PERIODS_RATIO), 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (square - total * total / count) / (count - 1)
+    out = np.sqrt(np.maximum(var, 0))
+    out[count < min_periods] = np.nan
+    return out.astype(x.dtype)
+
+
+def cs_rank(x: np.ndarray) -> np.ndarray:
+    """横截面百分位排名（每行 0~1，NaN 保持为 NaN）"""
+    x = np.atleast_2d(x)
+    valid = ~np.isnan(x)
+    # 排序下标的逆排列即名次（NaN 排在最后）
+    order = np.argsort(np.where(valid, x, np.inf), axis=1, kind="stable")
+    ranks = np.argsort(order, axis=1)
+    count = valid.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (ranks / np.maximum(count - 1, 1)).astype(x.dtype)
+    out[~valid] = np.nan
+    return out
+
+
+def cs_zscore(x: np.ndarray, groups: Optional[np.ndarray] = None, clip: Optional[float] = 3.0) -> np.ndarray:
+    """
+    横截面标准化（每行减均值除以标准差）
+
+    groups 为每列的分组编号（0..G-1），提供时在组内标准化；组内有效样本少于2时为 NaN
+    """
+    x = np.atleast_2d(x)
+    valid = ~np.isnan(x)
+    values = np.where(valid, x, 0).astype(np.float64)
+    if groups is None:
+        groups = np.zeros(x.shape[1], dtype=np.int64)
+    onehot = np.zeros((x.shape[1], int(groups.max()) + 1 if len(groups) else 1))
+    onehot[np.arange(x.shape[1]), groups] = 1
+    count = valid @ onehot
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (values @ onehot) / count
+        var = ((values * values) @ onehot) / count - mean * mean
+        std = np.sqrt(np.maximum(var * count / (count - 1), 0))
+        out = (x - mean[:, groups]) / std[:, groups]
+    out[~valid | (count[:, groups] < 2) | (std[:, groups] == 0)] = np.nan
+    if clip is not None:
+        np.clip(out, -clip, clip, out=out)
+    return out.astype(x.dtype)
+
+
+# ==================== 因子定义 ====================
+
+@dataclass(frozen=True)
+class FactorSpec:
+    """因子定义：compute(close, turnover) -> T×N，warmup 为计算最后一行所需的历史行数"""
+    compute: Callable[[np.ndarray, np.ndarray], np.ndarray]
+    warmup: int
+    description: str
+
+
+def _log_returns(close: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log(close / shift(close, 1))
+
+
+FACTORS: Dict[str, FactorSpec] = {
+    "momentum": FactorSpec(
+        lambda close, turnover: shift(pct_change(close, TRADING_DAYS - 21), 21),
+        TRADING_DAYS + 1, "12-1个月动量（剔除最近1个月的过去1年收益）",
+    ),
+    "reversal": FactorSpec(
+        lambda close, turnover: -pct_change(close, 21),
+        22, "1个月反转（过去21日收益取负）",
+    ),
+    "volatility": FactorSpec(
+        lambda close, turnover: rolling_std(_log_returns(close), 63) * np.float32(np.sqrt(TRADING_DAYS)),
+        64, "3个月年化波动率",
+    ),
+    "turnover_rank": FactorSpec(
+        lambda close, turnover: cs_rank(rolling_mean(turnover, 21)),
+        21, "1个月日均成交额横截面排名",
+    ),
+}
+
+WARMUP_DAYS = max(spec.warmup for spec in FACTORS.values())
+
+
+def compute_factors(close: np.ndarray, turnover: np.ndarray, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    return {name: FACTORS[name].compute(close, turnover) for name in (names or FACTORS)}
+
+
+# ==================== 面板 ====================
+
+@dataclass
+class FactorPanel:
+    """股票池的价格面板与因子缓存"""
+    codes: List[str]
+    times: np.ndarray           # (T,) 交易日（KLineStore 秒数）
+    close: np.ndarray           # (T, N) 收盘价，休市/停牌日沿用前收盘，上市前为 NaN
+    turnover: np.ndarray        # (T, N) 成交额，休市/停牌日为0，上市前为 NaN
+    factors: Dict[str, np.ndarray] = field(default_factory=dict)
+    updated_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def nbytes(self) -> int:
+        return self.close.nbytes + self.turnover.nbytes + sum(v.nbytes for v in self.factors.values())
+
+    def row(self, as_of: Optional[str] = None) -> int:
+        """as_of 当日或之前最近一个交易日的行号"""
+        if as_of is None:
+            return len(self.times) - 1
+        pos = int(np.searchsorted(self.times, to_epoch(as_of), side="right")) - 1
+        if pos < 0:
+            raise ValueError(f"{as_of} 早于面板起始日期")
+        return pos
+
+
+def _fill(close: np.ndarray, turnover: np.ndarray, prev_close: Optional[np.ndarray] = None):
+    """收盘价按列向前填充（prev_close 为上一行），上市后缺失的成交额记为0"""
+    if prev_close is not None:
+        close = np.vstack([prev_close[None, :], close])
+    idx = np.where(np.isnan(close), 0, np.arange(len(close))[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    close = close[idx, np.arange(close.shape[1])]
+    if prev_close is not None:
+        close = close[1:]
+    turnover[np.isnan(turnover) & ~np.isnan(close)] = 0
+    return close, turnover
+
+
+class FactorEngine:
+    """因子面板构建、增量更新与缓存"""
+
+    def __init__(self, store: KLineStore = kline_store, max_days: int = DEFAULT_DAYS, autype: str = "qfq",
+                 client=None):
+        self._store = store
+        self._client = client
+        self.max_days = max_days
+        self.autype = autype
+        self._panels: "OrderedDict[Tuple[str, ...], FactorPanel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._async_locks: Dict[Tuple[str, ...], asyncio.Lock] = {}
+
+    def _scan(self, codes: List[str], start: Optional[str]) -> List[np.ndarray]:
+        return [adjust_bars(*self._store.scan(code, start, None, "K_DAY"), self.autype) for code in codes]
+
+    def _start(self, end_day: date) -> str:
+        # 按自然日多取一些以覆盖节假日
+        return (end_day - timedelta(days=int(self.max_days * 1.5) + 30)).isoformat()
+
+    async def fetch(self, codes: List[str]):
+        """已连接OpenD时补齐股票池缺失的日K线（单只失败只记录日志）"""
+        client = self._client
+        if client is None or not client.is_connected:
+            return
+        # 只补到昨天：当天K线未收盘，否则每次请求都会对整个股票池重新拉取当天数据
+        end = (date.today() - timedelta(days=1)).isoformat()
+        start = self._start(date.today())
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+        async def fetch_one(code: str):
+            async with semaphore:
+                try:
+                    await self._store.get(code, start, end, "K_DAY", self.autype, client=client)
+                except Exception as e:
+                    logger.warning("补齐日K线失败 {}: {}", code, e)
+
+        await asyncio.gather(*(fetch_one(code) for code in codes))
+
+    def _align(self, series: List[np.ndarray], times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        close = np.full((len(times), len(series)), np.nan, dtype=PANEL_DTYPE)
+        turnover = np.full_like(close, np.nan)
+        for j, bars in enumerate(series):
+            if not len(bars):
+                continue
+            pos = np.searchsorted(times, bars["time"])
+            keep = (pos < len(times)) & (times[np.minimum(pos, len(times) - 1)] == bars["time"])
+            close[pos[keep], j] = bars["close"][keep]
+            turnover[pos[keep], j] = bars["turnover"][keep]
+        return close, turnover
+
+    def build(self, codes: List[str], end: Optional[str] = None) -> FactorPanel:
+        """从K线存储构建面板并计算全部因子"""
+        end_day = date.fromisoformat(end) if end else date.today()
+        start = self._start(end_day)
+        series = [s[s["time"] <= to_epoch(end_day.isoformat())] for s in self._scan(codes, start)]
+        non_empty = [s["time"] for s in series if len(s)]
+        if not non_empty:
+            raise Exception("股票池中没有可用的本地日K线")
+        times = np.unique(np.concatenate(non_empty))[-self.max_days:]
+        close, turnover = _fill(*self._align(series, times))
+        panel = FactorPanel(list(codes), times, close, turnover)
+        panel.factors = compute_factors(close, turnover)
+        logger.info("因子面板已构建: {} 只 × {} 日, {:.1f}MB", len(codes), len(times), panel.nbytes / 2**20)
+        return panel
+
+    def update(self, panel: FactorPanel) -> int:
+        """追加面板最后一日之后的新K线，只重算末尾窗口，返回新增交易日数"""
+        last = panel.times[-1]
+        series = self._scan(panel.codes, to_datetime(last).date().isoformat())
+        newer = [s["time"][s["time"] > last] for s in series]
+        if not any(len(t) for t in newer):
+            return 0
+        times = np.unique(np.concatenate(newer))
+        close, turnover = self._align(series, times)
+
+        # 前复权基准变化（除权）时按重叠日收盘价比例缩放该列历史价格
+        overlap = np.array([
+            s["close"][0] if len(s) and s["time"][0] == last else np.nan for s in series
+        ], dtype=PANEL_DTYPE)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = overlap / panel.close[-1]
+        rescale = np.isfinite(scale) & (np.abs(scale - 1) > 1e-6)
+        if rescale.any():
+            panel.close[:, rescale] *= scale[rescale]
+            logger.info("前复权价格已更新: {}", [panel.codes[j] for j in np.flatnonzero(rescale)])
+
+        close, turnover = _fill(close, turnover, prev_close=panel.close[-1])
+        added = len(times)
+        # 末尾窗口 + 新增行一起计算，取新增部分
+        tail = min(WARMUP_DAYS, len(panel.times))
+        window_close = np.vstack([panel.close[-tail:], close])
+        window_turnover = np.vstack([panel.turnover[-tail:], turnover])
+        fresh = compute_factors(window_close, window_turnover, list(panel.factors))
+
+        keep = max(len(panel.times) + added - self.max_days, 0)
+        panel.times = np.concatenate([panel.times, times])[keep:]
+        panel.close = np.vstack([panel.close, close])[keep:]
+        panel.turnover = np.vstack([panel.turnover, turnover])[keep:]
+        for name, values in fresh.items():
+            panel.factors[name] = np.vstack([panel.factors[name], values[-added:]])[keep:]
+        panel.updated_at = datetime.now()
+        return added
+
+    def panel(self, codes: List[str]) -> FactorPanel:
+        """股票池面板（已缓存时增量更新）"""
+        key = tuple(sorted(set(codes)))
+        with self._lock:
+            panel = self._panels.get(key)
+            if panel is None:
+                panel = self.build(list(key))
+            else:
+                added = self.update(panel)
+                if added:
+                    logger.info("因子面板已追加 {} 个交易日: {} 只", added, len(key))
+            self._panels[key] = panel
+            self._panels.move_to_end(key)
+            while len(self._panels) > MAX_PANELS:
+                self._panels.popitem(last=False)
+        return panel
+
+    async def apanel(self, codes: List[str]) -> FactorPanel:
+        """补齐日K线后在线程池中构建/更新面板（同一股票池并发请求只计算一次）"""
+        key = tuple(sorted(set(codes)))
+        lock = self._async_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            await self.fetch(list(key))
+            return await asyncio.get_running_loop().run_in_executor(None, self.panel, list(key))
+
+    def cross_section(self, panel: FactorPanel, as_of: Optional[str] = None,
+                      names: Optional[List[str]] = None, groups: Optional[Dict[str, str]] = None) -> Dict[str, object]:
+        """
+        某日的因子截面，附组内 z-score（{因子}_z）
+
+        groups 为代码 -> 分组（如行业），未提供或缺失的按市场分组
+        """
+        names = names or list(panel.factors)
+        unknown = [n for n in names if n not in panel.factors]
+        if unknown:
+            raise ValueError(f"不支持的因子: {unknown}")
+        row = panel.row(as_of)
+        labels = [(groups or {}).get(code) or code.split(".", 1)[0] for code in panel.codes]
+        group_names, group_ids = np.unique(labels, return_inverse=True)
+        values = {n: panel.factors[n][row] for n in names}
+        zscores = {n: cs_zscore(v[None, :], group_ids)[0] for n, v in values.items()}
+
+        def clean(v) -> Optional[float]:
+            return None if np.isnan(v) else round(float(v), 6)
+
+        rows = []
+        for j, code in enumerate(panel.codes):
+            item = {"stock_code": code, "group": labels[j]}
+            for n in names:
+                item[n] = clean(values[n][j])
+                item[f"{n}_z"] = clean(zscores[n][j])
+            rows.append(item)
+        return {
+            "trade_date": to_datetime(panel.times[row]).date(),
+            "factors": names,
+            "groups": len(group_names),
+            "rows": rows,
+        }
+
+
+# 全局因子引擎实例
+factor_engine = FactorEngine(client=futu_client)
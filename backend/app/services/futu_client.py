@@ -4,27 +4,140 @@
 提供连接管理、行情订阅、交易接口
 """
 import asyncio
-from typing import Optional, List, Dict, Any
+import math
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 import futu as ft
+import pandas as pd
 from loguru import logger
 
 from app.config import settings
+from app.services.account_registry import MARKET_PRIORITY, AccountEntry, AccountRegistry, TradeContextPool
+from app.services.quote_bus import QuoteBus, quote_bus, trade_bus
+from app.services.reference_data import reference_data
+from app.utils.log import EventLog
+from app.utils.rate_limit import limiter
+
+# 订单类型映射
+ORDER_TYPE_MAP = {
+    "NORMAL": ft.OrderType.NORMAL,
+    "MARKET": ft.OrderType.MARKET,
+    "LIMIT": ft.OrderType.NORMAL,
+    "STOP": ft.OrderType.STOP,
+}
+
+# 已结束的订单状态（不再需要撤单/查单路由）
+TERMINAL_ORDER_STATUS = frozenset({
+    "FILLED_ALL", "CANCELLED_PART", "CANCELLED_ALL", "FAILED",
+    "DISABLED", "DELETED", "SUBMIT_FAILED", "TIMEOUT",
+})
+
+# 各币种现金购买力字段（accinfo_query）
+CASH_POWER_COLUMNS = {
+    "HKD": "hkd_net_cash_power",
+    "USD": "usd_net_cash_power",
+    "CNH": "cnh_net_cash_power",
+}
+
+# 订单市场路由缓存上限
+ORDER_MARKET_CACHE_SIZE = 4096
+
+# get_market_snapshot 单次请求最多400只股票
+SNAPSHOT_BATCH_SIZE = 400
+
+# K线类型映射
+KTYPE_MAP = {
+    "K_DAY": ft.KLType.K_DAY,
+    "K_WEEK": ft.KLType.K_WEEK,
+    "K_MON": ft.KLType.K_MON,
+    "K_1M": ft.KLType.K_1M,
+    "K_5M": ft.KLType.K_5M,
+    "K_15M": ft.KLType.K_15M,
+    "K_30M": ft.KLType.K_30M,
+    "K_60M": ft.KLType.K_60M,
+}
+
+
+def _float_or_none(value) -> Optional[float]:
+    """OpenD数值字段（"N/A" 或缺失时为 None）"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _parse_time(value) -> datetime:
+    """解析OpenD返回的时间字段（"YYYY-MM-DD HH:MM:SS[.fff]" 字符串或时间戳）"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.fromtimestamp(value)
+
+
+class _PushHandlerMixin:
+    """将SDK推送转换为记录并发布到事件总线"""
+
+    event_kind = ""
+
+    def __init__(self, bus: QuoteBus):
+        super().__init__()
+        self._bus = bus
+        # 推送日志按事件类型采样限速（SDK回调线程中只做入队）
+        self._log = EventLog(self.event_kind)
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == ft.RET_OK:
+            for record in data.to_dict("records"):
+                self._log_push(record)
+                self._bus.publish(self.event_kind, record["code"], record)
+        else:
+            self._log.warning("{} 推送解析失败: {}", self.event_kind, data)
+        return ret, data
+
+    def _log_push(self, record: Dict[str, Any]):
+        self._log.debug("{} 推送 {}", self.event_kind, record["code"])
+
+
+class _QuotePushHandler(_PushHandlerMixin, ft.StockQuoteHandlerBase):
+    event_kind = "quote"
+
+
+class _TickerPushHandler(_PushHandlerMixin, ft.TickerHandlerBase):
+    event_kind = "ticker"
+
+
+class _KlinePushHandler(_PushHandlerMixin, ft.CurKlineHandlerBase):
+    event_kind = "kline"
+
+
+class _OrderPushHandler(_PushHandlerMixin, ft.TradeOrderHandlerBase):
+    event_kind = "order"
+
+    def _log_push(self, record: Dict[str, Any]):
+        self._log.info("订单推送 {} {} {}", record.get("order_id"), record["code"], record.get("order_status"))
 
 
 class FutuClient:
     """富途OpenD客户端"""
 
-    def __init__(self):
+    def __init__(self, mode: Optional[str] = None):
+        # direct: 本进程直连OpenD；shared: 经由共享行情进程（见 market_data_server）
+        self._mode: str = mode or settings.MARKET_DATA_MODE
         self._quote_ctx: Optional[ft.OpenQuoteContext] = None
-        self._trade_ctx: Optional[ft.OpenHKTradeContext] = None
-        self._trade_ctx_us: Optional[ft.OpenUSTradeContext] = None
         self._is_connected: bool = False
         self._trade_enabled: bool = False
-        self._accounts: List[Dict] = []
         self._active_account_id: Optional[str] = None
         self._host: str = settings.FUTU_HOST
         self._port: int = settings.FUTU_PORT
+        self._registry = AccountRegistry()
+        self._trade_contexts = TradeContextPool(
+            self._host, self._port, settings.TRADE_PASSWORD,
+            handlers=[lambda: _OrderPushHandler(trade_bus)],
+        )
+        # (acc_id, order_id) -> 订单所属市场，撤单时选择对应交易上下文（LRU，终态订单移除）
+        self._order_markets: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
 
     @property
     def is_connected(self) -> bool:
@@ -36,142 +149,196 @@ class FutuClient:
 
     @property
     def accounts(self) -> List[Dict]:
-        return self._accounts
+        return self._registry.accounts
 
     @property
     def active_account_id(self) -> Optional[str]:
         return self._active_account_id
 
-    def connect(self) -> bool:
-        """连接OpenD"""
+    @property
+    def replay_context(self):
+        """回放模式下的行情上下文（其他模式为 None）"""
+        return self._quote_ctx if self._mode == "replay" else None
+
+    def connect(self, trade: bool = True) -> bool:
+        """
+        连接OpenD
+
+        - trade: 是否同时创建交易上下文（共享行情进程只需要行情）
+        """
         try:
             # 创建行情上下文
-            self._quote_ctx = ft.OpenQuoteContext(host=self._host, port=self._port)
+            if self._mode == "shared":
+                from app.services.market_data import RemoteQuoteContext
+                self._quote_ctx = RemoteQuoteContext(settings.MARKET_DATA_ADDRESS, quote_bus)
+            elif self._mode == "replay":
+                from app.services.market_replay import ReplayQuoteContext
+                self._quote_ctx = ReplayQuoteContext(quote_bus)
+                # 回放模式只有行情，不连接交易
+                trade = False
+            else:
+                self._quote_ctx = ft.OpenQuoteContext(host=self._host, port=self._port)
+                for handler in (_QuotePushHandler, _TickerPushHandler, _KlinePushHandler):
+                    self._quote_ctx.set_handler(handler(quote_bus))
 
             # 测试行情连接
             ret, data = self._quote_ctx.get_global_state()
             if ret == ft.RET_OK:
                 self._is_connected = True
-                logger.info(f"OpenD行情连接成功: {self._host}:{self._port}")
-
-                # 创建交易上下文
-                try:
-                    self._trade_ctx = ft.OpenHKTradeContext(host=self._host, port=self._port)
-                    self._trade_ctx_us = ft.OpenUSTradeContext(host=self._host, port=self._port)
-                    # 解锁交易（需要交易密码）
-                    if settings.TRADE_PASSWORD:
-                        unlock_ret, unlock_data = self._trade_ctx.unlock_trade(settings.TRADE_PASSWORD)
-                        if unlock_ret == ft.RET_OK:
-                            self._trade_enabled = True
-                            logger.info("OpenD交易权限已解锁")
-                            # 同步解锁美股上下文
-                            self._trade_ctx_us.unlock_trade(settings.TRADE_PASSWORD)
-
-                            # 从港股和美股上下文各获取账户列表，合并去重
-                            acc_map: Dict[str, Dict] = {}
-                            for ctx, market_label in [
-                                (self._trade_ctx, "HK"),
-                                (self._trade_ctx_us, "US"),
-                            ]:
-                                acc_ret, acc_data = ctx.get_acc_list()
-                                if acc_ret == ft.RET_OK:
-                                    for _, row in acc_data.iterrows():
-                                        acc_id = str(row["acc_id"])
-                                        if acc_id not in acc_map:
-                                            acc_map[acc_id] = {
-                                                "acc_id": acc_id,
-                                                "trd_env": row["trd_env"],
-                                                "acc_type": row["acc_type"],
-                                                "acc_status": row["acc_status"],
-                                                "uni_card_num": row.get("uni_card_num", ""),
-                                                "card_num": row.get("card_num", ""),
-                                                "security_firm": row.get("security_firm", ""),
-                                                "trdmarket_auth": row.get("trdmarket_auth", ""),
-                                                "acc_role": row.get("acc_role", ""),
-                                            }
-                                    logger.info(f"[{market_label}] 获取到 {len(acc_data)} 个账户")
-                                else:
-                                    logger.warning(f"[{market_label}] 获取账户列表失败: {acc_data}")
-
-                            self._accounts = list(acc_map.values())
-                            logger.info(f"合并去重后共 {len(self._accounts)} 个账户")
-                            for acc in self._accounts:
-                                logger.info(
-                                    f"  acc_id={acc['acc_id']} trd_env={acc['trd_env']} "
-                                    f"acc_status={acc['acc_status']} market={acc.get('trdmarket_auth', '')}"
-                                )
-
-                            # 优先选择活跃的真实账户，其次活跃模拟账户
-                            for acc in self._accounts:
-                                if acc["acc_status"] == "ACTIVE" and acc["trd_env"] == "REAL":
-                                    self._active_account_id = acc["acc_id"]
-                                    logger.info(f"默认选择真实账户: {acc['acc_id']}")
-                                    break
-                            if not self._active_account_id:
-                                for acc in self._accounts:
-                                    if acc["acc_status"] == "ACTIVE":
-                                        self._active_account_id = acc["acc_id"]
-                                        logger.info(f"默认选择账户: {acc['acc_id']} ({acc['trd_env']})")
-                                        break
-                        else:
-                            logger.warning(f"交易解锁失败: {unlock_data}")
-                    else:
-                        logger.warning("未配置交易密码，交易功能不可用")
-                except Exception as te:
-                    logger.warning(f"交易上下文创建失败: {te}")
+                logger.info("OpenD行情连接成功: {}:{} (mode={})", self._host, self._port, self._mode)
 
+                if trade:
+                    self._connect_trade()
                 return True
             else:
-                logger.error(f"OpenD连接失败: {data}")
+                logger.error("OpenD连接失败: {}", data)
                 return False
 
         except Exception as e:
-            logger.error(f"OpenD连接异常: {e}")
+            logger.error("OpenD连接异常: {}", e)
             self._is_connected = False
             return False
-    
+
+    def _connect_trade(self):
+        """创建交易上下文、解锁并加载账户列表（其他市场的上下文按需懒创建）"""
+        try:
+            # 解锁交易（需要交易密码）
+            if settings.TRADE_PASSWORD:
+                unlock_ret, unlock_data = self._trade_contexts.unlock("HK")
+                if unlock_ret == ft.RET_OK:
+                    self._trade_enabled = True
+                    logger.info("OpenD交易权限已解锁")
+
+                    # 从港股和美股上下文各获取账户列表，合并去重
+                    acc_map: Dict[str, Dict] = {}
+                    for market_label in ("HK", "US"):
+                        ctx = self._trade_contexts.get(market_label)
+                        acc_ret, acc_data = ctx.get_acc_list()
+                        if acc_ret == ft.RET_OK:
+                            for _, row in acc_data.iterrows():
+                                acc_id = str(row["acc_id"])
+                                if acc_id not in acc_map:
+                                    acc_map[acc_id] = {
+                                        "acc_id": acc_id,
+                                        "trd_env": row["trd_env"],
+                                        "acc_type": row["acc_type"],
+                                        "acc_status": row["acc_status"],
+                                        "uni_card_num": row.get("uni_card_num", ""),
+                                        "card_num": row.get("card_num", ""),
+                                        "security_firm": row.get("security_firm", ""),
+                                        "trdmarket_auth": row.get("trdmarket_auth", ""),
+                                        "acc_role": row.get("acc_role", ""),
+                                    }
+                            logger.info("[{}] 获取到 {} 个账户", market_label, len(acc_data))
+                        else:
+                            logger.warning("[{}] 获取账户列表失败: {}", market_label, acc_data)
+
+                    self._registry.load(list(acc_map.values()))
+                    self._trade_contexts.warm_up(self._registry.markets)
+                    accounts = self._registry.accounts
+                    logger.info("合并去重后共 {} 个账户", len(accounts))
+                    for acc in accounts:
+                        logger.info(
+                            "  acc_id={} trd_env={} acc_status={} market={}",
+                            acc["acc_id"], acc["trd_env"], acc["acc_status"], acc.get("trdmarket_auth", ""),
+                        )
+
+                    # 优先选择活跃的真实账户，其次活跃模拟账户
+                    for acc in accounts:
+                        if acc["acc_status"] == "ACTIVE" and acc["trd_env"] == "REAL":
+                            self._active_account_id = acc["acc_id"]
+                            logger.info("默认选择真实账户: {}", acc["acc_id"])
+                            break
+                    if not self._active_account_id:
+                        for acc in accounts:
+                            if acc["acc_status"] == "ACTIVE":
+                                self._active_account_id = acc["acc_id"]
+                                logger.info("默认选择账户: {} ({})", acc["acc_id"], acc["trd_env"])
+                                break
+                else:
+                    logger.warning("交易解锁失败: {}", unlock_data)
+            else:
+                self._trade_contexts.get("HK")
+                logger.warning("未配置交易密码，交易功能不可用")
+        except Exception as te:
+            logger.warning("交易上下文创建失败: {}", te)
+
     def close(self):
         """关闭连接"""
         if self._quote_ctx:
             self._quote_ctx.close()
-        if self._trade_ctx:
-            self._trade_ctx.close()
-        if self._trade_ctx_us:
-            self._trade_ctx_us.close()
+        self._trade_contexts.close()
         self._is_connected = False
         logger.info("OpenD连接已关闭")
     
-    def _get_trade_ctx_for_account(self, acc_id: str):
-        """根据账户的市场权限选择合适的交易上下文"""
-        for acc in self._accounts:
-            if acc["acc_id"] == acc_id:
-                market_auth = acc.get("trdmarket_auth", "")
-                # 如果账户有 US 市场权限且无 HK 权限，优先用美股上下文
-                has_hk = "HK" in str(market_auth)
-                has_us = "US" in str(market_auth)
-                if has_us and not has_hk and self._trade_ctx_us:
-                    return self._trade_ctx_us
-                break
-        return self._trade_ctx
+    def _resolve_account(self, acc_id: Optional[str] = None) -> AccountEntry:
+        """解析目标账户（默认当前活跃账户）"""
+        if not self._is_connected or not self._trade_contexts.is_open:
+            raise Exception("OpenD未连接或交易权限未开通")
+
+        # 使用指定的账户ID或当前活跃账户
+        target_acc_id = acc_id or self._active_account_id
+        if not target_acc_id:
+            raise Exception("未指定账户ID")
+
+        entry = self._registry.get(target_acc_id)
+        if entry is None:
+            raise Exception(f"账户不存在: {target_acc_id}")
+        return entry
+
+    def _get_trade_ctx(self, entry: AccountEntry, stock_code: Optional[str] = None):
+        """
+        按账户市场权限（及股票代码所属市场）选择交易上下文
+
+        首次使用某市场时会同步创建上下文，应在线程池中调用
+        """
+        return self._trade_contexts.get(entry.market_for_code(stock_code))
+
+    def _remember_order_market(self, entry: AccountEntry, order_id, market: str, status: Optional[str] = None):
+        key = (entry.acc_id, str(order_id))
+        if status in TERMINAL_ORDER_STATUS:
+            self._order_markets.pop(key, None)
+            return
+        self._order_markets[key] = market
+        self._order_markets.move_to_end(key)
+        while len(self._order_markets) > ORDER_MARKET_CACHE_SIZE:
+            self._order_markets.popitem(last=False)
 
     # ==================== 行情接口 ====================
-    
-    async def get_quote(self, stock_code: str) -> Dict[str, Any]:
-        """获取实时行情"""
+
+    async def subscribe(self, codes: List[str], subtypes: List[str]):
+        """
+        订阅实时推送，推送事件发布到 quote_bus
+
+        - subtypes: QUOTE / TICKER / K_1M 等 ft.SubType 取值
+        """
         if not self._is_connected or not self._quote_ctx:
             raise Exception("OpenD未连接")
 
-        # 在线程池中执行同步调用
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
-            lambda: self._quote_ctx.get_market_snapshot([stock_code])
+            lambda: self._quote_ctx.subscribe(codes, subtypes, subscribe_push=True)
         )
-
         if ret != ft.RET_OK:
-            raise Exception(f"获取行情失败: {data}")
+            raise Exception(f"订阅失败: {data}")
 
-        row = data.iloc[0]
+    async def unsubscribe(self, codes: List[str], subtypes: List[str]):
+        """取消订阅"""
+        if not self._is_connected or not self._quote_ctx:
+            raise Exception("OpenD未连接")
+
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(
+            None,
+            lambda: self._quote_ctx.unsubscribe(codes, subtypes)
+        )
+        if ret != ft.RET_OK:
+            raise Exception(f"取消订阅失败: {data}")
+    
+    @staticmethod
+    def _snapshot_to_quote(row: Dict[str, Any]) -> Dict[str, Any]:
+        """快照（或QUOTE推送）记录转换为行情字典"""
         # 计算涨跌额和涨跌幅
         last_price = float(row["last_price"])
         prev_close = float(row["prev_close_price"]) if row["prev_close_price"] != "N/A" else last_price
@@ -180,7 +347,7 @@ class FutuClient:
 
         return {
             "stock_code": row["code"],
-            "stock_name": row["name"],
+            "stock_name": row.get("name", ""),
             "current_price": last_price,
             "open_price": float(row["open_price"]) if row["open_price"] != "N/A" else last_price,
             "high_price": float(row["high_price"]) if row["high_price"] != "N/A" else last_price,
@@ -192,47 +359,131 @@ class FutuClient:
             "change_ratio": change_ratio,
             "updated_at": datetime.now()
         }
-    
-    async def get_kline(
-        self, 
-        stock_code: str, 
-        start_date: str = None, 
+
+    async def get_quote(self, stock_code: str) -> Dict[str, Any]:
+        """获取实时行情"""
+        if not self._is_connected or not self._quote_ctx:
+            raise Exception("OpenD未连接")
+
+        # 在线程池中执行同步调用
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(
+            None,
+            lambda: self._quote_ctx.get_market_snapshot([stock_code])
+        )
+
+        if ret != ft.RET_OK:
+            raise Exception(f"获取行情失败: {data}")
+
+        return self._snapshot_to_quote(data.iloc[0])
+
+    async def get_quotes(self, stock_codes: List[str]) -> List[Dict[str, Any]]:
+        """批量获取实时行情（按快照接口单次上限分批）"""
+        if not self._is_connected or not self._quote_ctx:
+            raise Exception("OpenD未连接")
+
+        loop = asyncio.get_event_loop()
+        quotes = []
+        for i in range(0, len(stock_codes), SNAPSHOT_BATCH_SIZE):
+            batch = stock_codes[i:i + SNAPSHOT_BATCH_SIZE]
+            ret, data = await loop.run_in_executor(
+                None,
+                lambda: self._quote_ctx.get_market_snapshot(batch)
+            )
+            if ret != ft.RET_OK:
+                raise Exception(f"获取行情失败: {data}")
+            quotes.extend(self._snapshot_to_quote(row) for row in data.to_dict("records"))
+
+        return quotes
+
+    async def get_kline_frame(
+        self,
+        stock_code: str,
+        start_date: str = None,
         end_date: str = None,
         kline_type: str = "K_DAY"
-    ) -> List[Dict[str, Any]]:
-        """获取K线数据"""
+    ):
+        """
+        获取K线原始DataFrame（未转换）
+
+        指定了日期区间时按区间拉取历史K线，否则返回最近100根
+        """
         if not self._is_connected or not self._quote_ctx:
             raise Exception("OpenD未连接")
-        
-        # 映射K线类型
-        ktype_map = {
-            "K_DAY": ft.KLType.K_DAY,
-            "K_WEEK": ft.KLType.K_WEEK,
-            "K_MON": ft.KLType.K_MON,
-            "K_1M": ft.KLType.K_1M,
-            "K_5M": ft.KLType.K_5M,
-            "K_15M": ft.KLType.K_15M,
-            "K_30M": ft.KLType.K_30M,
-            "K_60M": ft.KLType.K_60M,
-        }
-        
+
+        if start_date or end_date:
+            return await self.request_history_kline(stock_code, start_date, end_date, kline_type)
+
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
             lambda: self._quote_ctx.get_cur_kline(
                 code=stock_code,
                 num=100,
-                ktype=ktype_map.get(kline_type, ft.KLType.K_DAY)
+                ktype=KTYPE_MAP.get(kline_type, ft.KLType.K_DAY)
             )
         )
         
         if ret != ft.RET_OK:
             raise Exception(f"获取K线数据失败: {data}")
-        
+        return data
+
+    async def request_history_kline(
+        self,
+        stock_code: str,
+        start_date: str = None,
+        end_date: str = None,
+        kline_type: str = "K_DAY",
+        autype: str = ft.AuType.QFQ
+    ) -> pd.DataFrame:
+        """分页拉取历史K线（消耗历史K线额度，每页经限流器排队），返回原始DataFrame"""
+        if not self._is_connected or not self._quote_ctx:
+            raise Exception("OpenD未连接")
+
+        loop = asyncio.get_event_loop()
+        frames = []
+        page_req_key = None
+        while True:
+            await limiter("request_history_kline").acquire()
+            ret, data, page_req_key = await loop.run_in_executor(
+                None,
+                lambda: self._quote_ctx.request_history_kline(
+                    stock_code,
+                    start=start_date,
+                    end=end_date,
+                    ktype=KTYPE_MAP.get(kline_type, ft.KLType.K_DAY),
+                    autype=autype,
+                    max_count=1000,
+                    page_req_key=page_req_key
+                )
+            )
+            if ret != ft.RET_OK:
+                raise Exception(f"获取历史K线失败: {data}")
+            frames.append(data)
+            if page_req_key is None:
+                break
+
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    async def get_rehab(self, stock_code: str) -> pd.DataFrame:
+        """复权因子表（各次除权除息日及前/后复权因子），返回原始DataFrame"""
+        if not self._is_connected or not self._quote_ctx:
+            raise Exception("OpenD未连接")
+
+        await limiter("get_rehab").acquire()
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(None, lambda: self._quote_ctx.get_rehab(stock_code))
+        if ret != ft.RET_OK:
+            raise Exception(f"获取复权因子失败: {data}")
+        return data
+
+    @staticmethod
+    def kline_rows(data) -> List[Dict[str, Any]]:
+        """K线DataFrame转换为字典列表"""
         klines = []
         for _, row in data.iterrows():
             klines.append({
-                "timestamp": datetime.fromtimestamp(row["time_key"]),
+                "timestamp": _parse_time(row["time_key"]),
                 "open_price": float(row["open"]),
                 "high_price": float(row["high"]),
                 "low_price": float(row["low"]),
@@ -240,8 +491,18 @@ class FutuClient:
                 "volume": int(row["volume"]),
                 "turnover": float(row["turnover"])
             })
-        
         return klines
+
+    async def get_kline(
+        self, 
+        stock_code: str, 
+        start_date: str = None, 
+        end_date: str = None,
+        kline_type: str = "K_DAY"
+    ) -> List[Dict[str, Any]]:
+        """获取K线数据"""
+        data = await self.get_kline_frame(stock_code, start_date, end_date, kline_type)
+        return self.kline_rows(data)
     
     async def search_stock(self, keyword: str) -> List[Dict[str, Any]]:
         """搜索股票"""
@@ -265,8 +526,8 @@ class FutuClient:
                 keyword_lower in row["name"].lower()):
                 results.append({
                     "stock_code": row["code"],
-                    "stock_name": row["name"],
-                    "market": row["market"]
+                    "stock_name": row.get("name", ""),
+                    "market": row["code"].split(".", 1)[0]
                 })
         
         return results[:20]  # 限制返回数量
@@ -275,26 +536,11 @@ class FutuClient:
 
     async def get_acc_info(self, acc_id: str = None) -> Dict[str, Any]:
         """获取账户信息"""
-        if not self._is_connected or not self._trade_ctx:
-            raise Exception("OpenD未连接或交易权限未开通")
-
-        # 使用指定的账户ID或当前活跃账户
-        target_acc_id = acc_id or self._active_account_id
-        if not target_acc_id:
-            raise Exception("未指定账户ID")
-
-        # 查找账户环境
-        trd_env = ft.TrdEnv.REAL
-        for acc in self._accounts:
-            if acc["acc_id"] == target_acc_id:
-                trd_env = ft.TrdEnv.SIMULATE if acc["trd_env"] == "SIMULATE" else ft.TrdEnv.REAL
-                break
-
-        trade_ctx = self._get_trade_ctx_for_account(target_acc_id)
+        entry = self._resolve_account(acc_id)
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
-            lambda: trade_ctx.accinfo_query(acc_id=int(target_acc_id), trd_env=trd_env)
+            lambda: self._get_trade_ctx(entry).accinfo_query(acc_id=entry.acc_id_int, trd_env=entry.trd_env)
         )
 
         if ret != ft.RET_OK:
@@ -302,38 +548,56 @@ class FutuClient:
 
         row = data.iloc[0]
         return {
-            "acc_id": target_acc_id,
+            "acc_id": entry.acc_id,
             "total_assets": float(row["total_assets"]) if row["total_assets"] != "N/A" else 0.0,
             "cash": float(row["cash"]) if row["cash"] != "N/A" else 0.0,
             "market_value": float(row["market_val"]) if row["market_val"] != "N/A" else 0.0,
             "frozen_cash": float(row["frozen_cash"]) if row["frozen_cash"] != "N/A" else 0.0,
             "available_cash": float(row["avl_withdrawal_cash"]) if row["avl_withdrawal_cash"] != "N/A" else 0.0,
+            # 最大购买力（含融资，账户币种）与各币种现金购买力（用于本地估算最大可买数量）
+            "buying_power": _float_or_none(row.get("power")),
+            "cash_power": {
+                currency: _float_or_none(row.get(column)) for currency, column in CASH_POWER_COLUMNS.items()
+            },
             "currency": "HKD",
             "updated_at": datetime.now()
         }
 
-    async def get_positions(self, acc_id: str = None) -> List[Dict[str, Any]]:
-        """获取持仓列表"""
-        if not self._is_connected or not self._trade_ctx:
-            raise Exception("OpenD未连接或交易权限未开通")
+    async def get_max_trd_qtys(
+        self, stock_code: str, price: float, order_type: str = "LIMIT", acc_id: str = None
+    ) -> Dict[str, Any]:
+        """查询最大可买卖数量（acctradinginfo_query，限频10次/30秒）"""
+        entry = self._resolve_account(acc_id)
+        await limiter("acctradinginfo_query").acquire()
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(
+            None,
+            lambda: self._get_trade_ctx(entry, stock_code).acctradinginfo_query(
+                order_type=ORDER_TYPE_MAP.get(order_type, ft.OrderType.NORMAL),
+                code=stock_code,
+                price=price,
+                acc_id=entry.acc_id_int,
+                trd_env=entry.trd_env
+            )
+        )
 
-        # 使用指定的账户ID或当前活跃账户
-        target_acc_id = acc_id or self._active_account_id
-        if not target_acc_id:
-            raise Exception("未指定账户ID")
+        if ret != ft.RET_OK:
+            raise Exception(f"查询最大可买卖数量失败: {data}")
 
-        # 查找账户环境
-        trd_env = ft.TrdEnv.REAL
-        for acc in self._accounts:
-            if acc["acc_id"] == target_acc_id:
-                trd_env = ft.TrdEnv.SIMULATE if acc["trd_env"] == "SIMULATE" else ft.TrdEnv.REAL
-                break
+        row = data.iloc[0]
+        return {
+            "max_cash_buy": int(float(row["max_cash_buy"])),
+            "max_cash_and_margin_buy": int(float(row["max_cash_and_margin_buy"])),
+            "max_position_sell": int(float(row["max_position_sell"])),
+        }
 
-        trade_ctx = self._get_trade_ctx_for_account(target_acc_id)
+    async def get_positions(self, acc_id: str = None) -> List[Dict[str, Any]]:
+        """获取持仓列表"""
+        entry = self._resolve_account(acc_id)
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
-            lambda: trade_ctx.position_list_query(acc_id=int(target_acc_id), trd_env=trd_env)
+            lambda: self._get_trade_ctx(entry).position_list_query(acc_id=entry.acc_id_int, trd_env=entry.trd_env)
         )
 
         if ret != ft.RET_OK:
@@ -364,47 +628,34 @@ class FutuClient:
         price: float,
         quantity: int,
         order_type: str = "LIMIT",
-        acc_id: str = None
+        acc_id: str = None,
+        adjust: bool = False
     ) -> Dict[str, Any]:
-        """下单"""
-        if not self._is_connected or not self._trade_ctx:
-            raise Exception("OpenD未连接或交易权限未开通")
+        """
+        下单
 
-        # 使用指定的账户ID或当前活跃账户
-        target_acc_id = acc_id or self._active_account_id
-        if not target_acc_id:
-            raise Exception("未指定账户ID")
-
-        # 查找账户环境
-        trd_env = ft.TrdEnv.REAL
-        for acc in self._accounts:
-            if acc["acc_id"] == target_acc_id:
-                trd_env = ft.TrdEnv.SIMULATE if acc["trd_env"] == "SIMULATE" else ft.TrdEnv.REAL
-                break
+        数量/价格不符合每手股数或最小价位时直接抛出 OrderRejected，不提交OpenD；
+        adjust=True 时改为规整到有效价位与整手后下单
+        """
+        price, quantity = reference_data.normalize_order(stock_code, side, price, quantity, order_type, adjust)
+        entry = self._resolve_account(acc_id)
 
         # 映射买卖方向
         trd_side = ft.TrdSide.BUY if side == "BUY" else ft.TrdSide.SELL
 
-        # 映射订单类型
-        order_type_map = {
-            "NORMAL": ft.OrderType.NORMAL,
-            "MARKET": ft.OrderType.MARKET,
-            "LIMIT": ft.OrderType.NORMAL,
-            "STOP": ft.OrderType.STOP,
-        }
-
-        trade_ctx = self._get_trade_ctx_for_account(target_acc_id)
+        market = entry.market_for_code(stock_code)
+        await limiter("place_order").acquire()
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
-            lambda: trade_ctx.place_order(
+            lambda: self._trade_contexts.get(market).place_order(
                 price=price,
                 qty=quantity,
                 code=stock_code,
                 trd_side=trd_side,
-                order_type=order_type_map.get(order_type, ft.OrderType.NORMAL),
-                acc_id=int(target_acc_id),
-                trd_env=trd_env
+                order_type=ORDER_TYPE_MAP.get(order_type, ft.OrderType.NORMAL),
+                acc_id=entry.acc_id_int,
+                trd_env=entry.trd_env
             )
         )
 
@@ -412,6 +663,7 @@ class FutuClient:
             raise Exception(f"下单失败: {data}")
 
         row = data.iloc[0]
+        self._remember_order_market(entry, row["order_id"], market)
         return {
             "order_id": row["order_id"],
             "stock_code": stock_code,
@@ -426,57 +678,150 @@ class FutuClient:
             "updated_at": datetime.now()
         }
     
-    async def cancel_order(self, order_id: str):
+    async def cancel_order(self, order_id: str, acc_id: str = None):
         """撤单"""
-        if not self._is_connected or not self._trade_ctx:
-            raise Exception("OpenD未连接或交易权限未开通")
-        
+        entry = self._resolve_account(acc_id)
+        market = self._order_markets.get((entry.acc_id, str(order_id)), entry.primary_market)
+        await limiter("modify_order").acquire()
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
-            lambda: self._trade_ctx.modify_order(
+            lambda: self._trade_contexts.get(market).modify_order(
                 modify_order_op=ft.ModifyOrderOp.CANCEL,
                 order_id=order_id,
-                quantity=0,
-                price=0
+                qty=0,
+                price=0,
+                acc_id=entry.acc_id_int,
+                trd_env=entry.trd_env
             )
         )
         
         if ret != ft.RET_OK:
             raise Exception(f"撤单失败: {data}")
-    
-    async def get_orders(self, status: str = None) -> List[Dict[str, Any]]:
-        """获取订单列表"""
-        if not self._is_connected or not self._trade_ctx:
-            raise Exception("OpenD未连接或交易权限未开通")
-        
+        self._order_markets.pop((entry.acc_id, str(order_id)), None)
+
+    async def modify_order(self, order_id: str, price: float, quantity: int, acc_id: str = None):
+        """改单（修改价格与数量，quantity 为改单后的总数量）"""
+        entry = self._resolve_account(acc_id)
+        market = self._order_markets.get((entry.acc_id, str(order_id)), entry.primary_market)
+        await limiter("modify_order").acquire()
         loop = asyncio.get_event_loop()
         ret, data = await loop.run_in_executor(
             None,
-            lambda: self._trade_ctx.order_list_query()
+            lambda: self._trade_contexts.get(market).modify_order(
+                modify_order_op=ft.ModifyOrderOp.NORMAL,
+                order_id=order_id,
+                qty=quantity,
+                price=price,
+                acc_id=entry.acc_id_int,
+                trd_env=entry.trd_env
+            )
         )
-        
+
         if ret != ft.RET_OK:
-            raise Exception(f"获取订单列表失败: {data}")
-        
+            raise Exception(f"改单失败: {data}")
+
+    @staticmethod
+    def _order_row(row) -> Dict[str, Any]:
+        return {
+            "order_id": row["order_id"],
+            "stock_code": row["code"],
+            "stock_name": row["stock_name"],
+            "side": "BUY" if row["trd_side"] == "BUY" else "SELL",
+            "order_type": row["order_type"],
+            "price": float(row["price"]),
+            "quantity": int(row["qty"]),
+            "filled_quantity": int(row["dealt_qty"]),
+            "status": row["order_status"],
+            "created_at": _parse_time(row["create_time"]),
+            "updated_at": _parse_time(row["updated_time"])
+        }
+
+    async def get_orders(self, status: str = None, acc_id: str = None, order_id: str = "") -> List[Dict[str, Any]]:
+        """获取订单列表（并发汇总账户有权限的各市场，单个市场失败时跳过）"""
+        entry = self._resolve_account(acc_id)
+        markets = [m for m in MARKET_PRIORITY if m in entry.markets] or [entry.primary_market]
+        loop = asyncio.get_event_loop()
+
+        def query(market: str):
+            return self._trade_contexts.get(market).order_list_query(
+                order_id=order_id,
+                acc_id=entry.acc_id_int,
+                trd_env=entry.trd_env
+            )
+
+        results = await asyncio.gather(
+            *(loop.run_in_executor(None, query, market) for market in markets),
+            return_exceptions=True
+        )
+
         orders = []
-        for _, row in data.iterrows():
-            orders.append({
-                "order_id": row["order_id"],
-                "stock_code": row["code"],
-                "stock_name": row["stock_name"],
-                "side": "BUY" if row["trd_side"] == "BUY" else "SELL",
-                "order_type": row["order_type"],
-                "price": float(row["price"]),
-                "quantity": int(row["qty"]),
-                "filled_quantity": int(row["dealt_qty"]),
-                "status": row["order_status"],
-                "created_at": datetime.fromtimestamp(row["create_time"]),
-                "updated_at": datetime.fromtimestamp(row["updated_time"])
-            })
-        
+        errors = []
+        for market, result in zip(markets, results):
+            if isinstance(result, Exception):
+                ret, data = ft.RET_ERROR, result
+            else:
+                ret, data = result
+            if ret != ft.RET_OK:
+                logger.warning("[{}] 获取订单列表失败: {}", market, data)
+                errors.append(f"{market}: {data}")
+                continue
+
+            for _, row in data.iterrows():
+                self._remember_order_market(entry, row["order_id"], market, row["order_status"])
+                orders.append(self._order_row(row))
+
+        if len(errors) == len(markets):
+            raise Exception(f"获取订单列表失败: {'; '.join(errors)}")
         return orders
 
+    async def get_history_frame(self, kind: str, start: str, end: str, acc_id: str = None) -> pd.DataFrame:
+        """
+        历史订单/成交原始DataFrame（kind: orders | deals），并发查询账户有权限的各市场
+
+        - start/end: "YYYY-MM-DD HH:MM:SS"
+        """
+        if kind not in ("orders", "deals"):
+            raise Exception(f"不支持的历史数据类型: {kind}")
+        entry = self._resolve_account(acc_id)
+        markets = [m for m in MARKET_PRIORITY if m in entry.markets] or [entry.primary_market]
+        method = "history_order_list_query" if kind == "orders" else "history_deal_list_query"
+        loop = asyncio.get_event_loop()
+
+        async def query(market: str):
+            await limiter(method).acquire()
+            return await loop.run_in_executor(
+                None,
+                lambda: getattr(self._trade_contexts.get(market), method)(
+                    start=start, end=end, acc_id=entry.acc_id_int, trd_env=entry.trd_env
+                )
+            )
+
+        results = await asyncio.gather(*(query(m) for m in markets), return_exceptions=True)
+
+        frames = []
+        errors = []
+        for market, result in zip(markets, results):
+            ret, data = (ft.RET_ERROR, result) if isinstance(result, Exception) else result
+            if ret != ft.RET_OK:
+                logger.warning("[{}] 获取历史{}失败: {}", market, "订单" if kind == "orders" else "成交", data)
+                errors.append(f"{market}: {data}")
+            elif len(data):
+                frames.append(data)
+
+        if len(errors) == len(markets):
+            raise Exception(f"获取历史数据失败: {'; '.join(errors)}")
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values("create_time", kind="stable", ignore_index=True)
+
+    async def get_order(self, order_id: str, acc_id: str = None) -> Dict[str, Any]:
+        """获取订单详情"""
+        orders = await self.get_orders(acc_id=acc_id, order_id=order_id)
+        if not orders:
+            raise Exception(f"订单不存在: {order_id}")
+        return orders[0]
+
 
 # 全局客户端实例
 futu_client = FutuClient()
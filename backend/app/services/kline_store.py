@@ -0,0 +1,315 @@
+"""
+K线存储
+
+按 (股票代码, K线类型) 以NumPy结构化数组保存不复权K线为 .npy 文件，内存中缓存已加载的序列。
+缺失的日期区间按需通过 request_history_kline（不复权）补齐后合并落盘。
+
+复权在本地计算：每个股票另存一张复权因子表（get_rehab 的除权除息日与前/后复权因子A/B），
+读取时按每根K线之后（前复权）或之前（后复权）的除权事件累积复合因子，向量化换算为
+价格 × A + B。不复权、前复权、后复权共用一份K线，历史K线额度只消耗一次。
+复权因子表在已知的除权日过后或超过 KLINE_REHAB_REFRESH_DAYS 天时，于下次请求复权K线时刷新。
+
+time 字段为交易所当地时间按UTC方式换算的秒数（与OpenD返回的 time_key 一一对应，不做时区转换）。
+"""
+import asyncio
+import json
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import futu as ft
+from loguru import logger
+
+from app.config import settings
+
+KLINE_DTYPE = np.dtype([
+    ("time", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+])
+
+# 复权因子表：除权除息日（同K线 time 约定）与前/后复权因子
+REHAB_DTYPE = np.dtype([
+    ("time", "i8"),
+    ("fwd_a", "f8"),
+    ("fwd_b", "f8"),
+    ("bwd_a", "f8"),
+    ("bwd_b", "f8"),
+])
+
+# 复权因子表字段 -> get_rehab 列名
+REHAB_COLUMNS = {
+    "fwd_a": "forward_adj_factorA",
+    "fwd_b": "forward_adj_factorB",
+    "bwd_a": "backward_adj_factorA",
+    "bwd_b": "backward_adj_factorB",
+}
+
+AUTYPES = ("qfq", "hfq", "none")
+
+_PRICE_FIELDS = ("open", "high", "low", "close")
+
+_Key = Tuple[str, str]
+
+
+def to_epoch(value) -> int:
+    """日期/时间（字符串或datetime）转换为存储用秒数"""
+    return int(np.datetime64(pd.Timestamp(value).to_datetime64(), "s").astype("i8"))
+
+
+def to_datetime(seconds: int) -> datetime:
+    return pd.Timestamp(int(seconds), unit="s").to_pydatetime()
+
+
+def frame_to_bars(data: pd.DataFrame) -> np.ndarray:
+    """OpenD K线DataFrame转换为结构化数组（向量化）"""
+    bars = np.empty(len(data), dtype=KLINE_DTYPE)
+    bars["time"] = pd.to_datetime(data["time_key"]).to_numpy().astype("datetime64[s]").astype("i8")
+    for field in ("open", "high", "low", "close", "volume", "turnover"):
+        bars[field] = data[field].to_numpy(dtype="f8")
+    return bars
+
+
+def merge_bars(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """按时间合并去重，新数据覆盖旧数据"""
+    if len(old) == 0:
+        merged = new
+    elif len(new) == 0:
+        return old
+    else:
+        merged = np.concatenate([new, old])
+    _, idx = np.unique(merged["time"], return_index=True)
+    return merged[idx]
+
+
+def rehab_to_table(data: pd.DataFrame) -> np.ndarray:
+    """get_rehab DataFrame转换为按除权日排序的复权因子表（缺失的因子A按1、B按0处理）"""
+    table = np.empty(len(data), dtype=REHAB_DTYPE)
+    table["time"] = pd.to_datetime(data["ex_div_date"]).to_numpy().astype("datetime64[s]").astype("i8")
+    for field, column in REHAB_COLUMNS.items():
+        values = pd.to_numeric(data[column], errors="coerce").to_numpy(dtype="f8") if column in data else np.nan
+        table[field] = np.nan_to_num(values, nan=1.0 if field.endswith("_a") else 0.0)
+    return np.sort(table, order="time")
+
+
+def adjust_bars(bars: np.ndarray, rehab: np.ndarray, autype: str = "qfq") -> np.ndarray:
+    """
+    按复权因子表换算复权价格（成交量/成交额不变）
+
+    除权日当天及之后的K线不受该次除权影响。前复权对K线之后的各次除权按时间顺序依次作用，
+    后复权对K线之前的各次除权按时间倒序依次作用；各次的 p -> A·p + B 先复合为累积因子，
+    每根K线只做一次乘加。
+    """
+    if autype not in AUTYPES:
+        raise ValueError(f"不支持的复权方式: {autype}")
+    if autype == "none" or len(rehab) == 0 or len(bars) == 0:
+        return bars
+    # 每根K线之前（含当天）的除权次数
+    idx = np.searchsorted(rehab["time"], bars["time"], side="right")
+    if autype == "qfq":
+        a, b = rehab["fwd_a"], rehab["fwd_b"]
+        a_cum = np.append(np.cumprod(a[::-1])[::-1], 1.0)
+        b_cum = np.append(np.cumsum((b * a_cum[1:])[::-1])[::-1], 0.0)
+    else:
+        a, b = rehab["bwd_a"], rehab["bwd_b"]
+        a_cum = np.concatenate(([1.0], np.cumprod(a)))
+        b_cum = np.concatenate(([0.0], np.cumsum(b * a_cum[:-1])))
+    scale, shift = a_cum[idx], b_cum[idx]
+    adjusted = np.array(bars)
+    for field in _PRICE_FIELDS:
+        adjusted[field] = bars[field] * scale + shift
+    return adjusted
+
+
+def _slice(bars: np.ndarray, start: Optional[str], end: Optional[str]) -> np.ndarray:
+    """按日期区间切片（二分查找，返回视图）"""
+    lo = np.searchsorted(bars["time"], to_epoch(start)) if start else 0
+    hi = np.searchsorted(bars["time"], to_epoch(end) + 86400) if end else len(bars)
+    return bars[lo:hi]
+
+
+class KLineStore:
+    """K线本地存储（不复权K线 + 复权因子表）"""
+
+    def __init__(self, root: str, rehab_refresh_days: int = None):
+        self._root = Path(root)
+        self._rehab_refresh_days = settings.KLINE_REHAB_REFRESH_DAYS if rehab_refresh_days is None \
+            else rehab_refresh_days
+        self._cache: Dict[_Key, np.ndarray] = {}
+        self._coverage: Dict[_Key, Tuple[str, str]] = {}
+        # 代码 -> (拉取日期, 复权因子表)
+        self._rehab: Dict[str, Tuple[Optional[str], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[Tuple[str, ...], asyncio.Lock] = {}
+
+    def _path(self, key: _Key) -> Path:
+        code, ktype = key
+        return self._root / ktype / f"{code}.npy"
+
+    def _rehab_path(self, code: str) -> Path:
+        return self._root / "rehab" / f"{code}.npy"
+
+    def load(self, code: str, ktype: str = "K_DAY") -> np.ndarray:
+        """读取全部已存储K线（不复权）"""
+        key = (code, ktype)
+        bars = self._cache.get(key)
+        if bars is not None:
+            return bars
+        with self._lock:
+            bars = self._cache.get(key)
+            if bars is None:
+                path = self._path(key)
+                bars = np.load(path) if path.exists() else np.empty(0, dtype=KLINE_DTYPE)
+                meta = path.with_suffix(".json")
+                if meta.exists():
+                    coverage = json.loads(meta.read_text(encoding="utf-8"))
+                    self._coverage[key] = (coverage["start"], coverage["end"])
+                self._cache[key] = bars
+        return bars
+
+    def save(self, code: str, bars: np.ndarray, ktype: str = "K_DAY",
+             coverage: Optional[Tuple[str, str]] = None):
+        """合并写入不复权K线；coverage 为已向OpenD确认过的日期区间"""
+        key = (code, ktype)
+        with self._lock:
+            merged = merge_bars(self._cache.get(key, np.empty(0, dtype=KLINE_DTYPE)), bars)
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(path, merged)
+            if coverage:
+                old = self._coverage.get(key)
+                if old:
+                    coverage = (min(old[0], coverage[0]), max(old[1], coverage[1]))
+                self._coverage[key] = coverage
+                path.with_suffix(".json").write_text(
+                    json.dumps({"start": coverage[0], "end": coverage[1]}), encoding="utf-8"
+                )
+            self._cache[key] = merged
+        return merged
+
+    def load_rehab(self, code: str) -> np.ndarray:
+        """读取复权因子表（未拉取过时为空表，即不复权）"""
+        entry = self._rehab.get(code)
+        if entry is not None:
+            return entry[1]
+        with self._lock:
+            entry = self._rehab.get(code)
+            if entry is None:
+                path = self._rehab_path(code)
+                table = np.load(path) if path.exists() else np.empty(0, dtype=REHAB_DTYPE)
+                meta = path.with_suffix(".json")
+                fetched = json.loads(meta.read_text(encoding="utf-8"))["fetched"] if meta.exists() else None
+                entry = self._rehab[code] = (fetched, table)
+        return entry[1]
+
+    def save_rehab(self, code: str, table: np.ndarray, fetched: Optional[str] = None):
+        """整表替换复权因子表；fetched 为拉取日期"""
+        fetched = fetched or date.today().isoformat()
+        with self._lock:
+            path = self._rehab_path(code)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(path, table)
+            path.with_suffix(".json").write_text(json.dumps({"fetched": fetched}), encoding="utf-8")
+            self._rehab[code] = (fetched, table)
+
+    def rehab_stale(self, code: str, today: Optional[str] = None) -> bool:
+        """复权因子表是否需要刷新：从未拉取、拉取后已过已知除权日，或超过刷新周期"""
+        self.load_rehab(code)
+        fetched, table = self._rehab[code]
+        if fetched is None:
+            return True
+        today = today or date.today().isoformat()
+        if fetched >= today:
+            return False
+        if (date.fromisoformat(today) - date.fromisoformat(fetched)).days >= self._rehab_refresh_days:
+            return True
+        # 已公布、在上次拉取之后才生效的除权日
+        times = table["time"]
+        lo, hi = np.searchsorted(times, [to_epoch(fetched) + 86400, to_epoch(today) + 86400])
+        return bool(hi > lo)
+
+    async def refresh_rehab(self, code: str, client) -> np.ndarray:
+        """从OpenD拉取复权因子表（失败时保留原表）"""
+        lock = self._fetch_locks.setdefault((code, "rehab"), asyncio.Lock())
+        async with lock:
+            if self.rehab_stale(code):
+                try:
+                    table = rehab_to_table(await client.get_rehab(code))
+                    self.save_rehab(code, table)
+                    logger.info(f"复权因子已更新: {code} 共 {len(table)} 次除权")
+                except Exception as e:
+                    logger.warning(f"获取复权因子失败 {code}: {e}")
+        return self.load_rehab(code)
+
+    def query(self, code: str, start: Optional[str] = None, end: Optional[str] = None,
+              ktype: str = "K_DAY", autype: str = "qfq") -> np.ndarray:
+        """按日期区间切片（二分查找）并按本地复权因子换算；不复权时返回视图"""
+        return adjust_bars(_slice(self.load(code, ktype), start, end), self.load_rehab(code), autype)
+
+    def scan(self, code: str, start: Optional[str] = None, end: Optional[str] = None,
+             ktype: str = "K_DAY") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按日期区间切片，返回 (不复权K线, 复权因子表)
+
+        未缓存的序列以内存映射方式只读打开且不进入缓存，调用方按块用 adjust_bars 复权（用于批量导出）
+        """
+        rehab = self.load_rehab(code)
+        bars = self._cache.get((code, ktype))
+        if bars is None:
+            path = self._path((code, ktype))
+            if not path.exists():
+                return np.empty(0, dtype=KLINE_DTYPE), rehab
+            bars = np.load(path, mmap_mode="r")
+        return _slice(bars, start, end), rehab
+
+    def _missing_ranges(self, key: _Key, start: str, end: str) -> List[Tuple[str, str]]:
+        """需要向OpenD补齐的区间（只拉取覆盖区间两端的缺口，覆盖区间保持连续）"""
+        coverage = self._coverage.get(key)
+        if coverage is None:
+            return [(start, end)]
+        missing = []
+        if start < coverage[0]:
+            missing.append((start, coverage[0]))
+        if end > coverage[1]:
+            missing.append((coverage[1], end))
+        return missing
+
+    async def get(self, code: str, start: str, end: Optional[str] = None,
+                  ktype: str = "K_DAY", autype: str = "qfq", client=None) -> np.ndarray:
+        """
+        获取区间K线，本地缺失的部分从OpenD补齐（只拉取不复权K线）
+
+        - autype: 复权方式 (qfq, hfq, none)，复权因子表过期时一并刷新
+        - client: FutuClient，未连接时只返回本地已有数据
+        """
+        if autype not in AUTYPES:
+            raise ValueError(f"不支持的复权方式: {autype}")
+        end = end or date.today().isoformat()
+        key = (code, ktype)
+        self.load(code, ktype)
+
+        if client is not None and client.is_connected:
+            lock = self._fetch_locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                for gap_start, gap_end in self._missing_ranges(key, start, end):
+                    data = await client.request_history_kline(code, gap_start, gap_end, ktype, ft.AuType.NONE)
+                    # 当天K线尚未收盘，覆盖区间只记到昨天，下次请求时刷新
+                    covered_end = min(gap_end, (pd.Timestamp.today() - pd.Timedelta(days=1)).date().isoformat())
+                    coverage = (gap_start, covered_end) if covered_end >= gap_start else None
+                    self.save(code, frame_to_bars(data), ktype, coverage=coverage)
+                    logger.info(f"K线已补齐: {code} {ktype} {gap_start}~{gap_end} 共 {len(data)} 根")
+            if autype != "none" and self.rehab_stale(code):
+                await self.refresh_rehab(code, client)
+
+        return self.query(code, start, end, ktype, autype)
+
+
+# 全局K线存储实例
+kline_store = KLineStore(settings.KLINE_STORE_DIR)
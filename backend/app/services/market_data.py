@@ -0,0 +1,263 @@
+"""
+共享行情进程 - 通信协议与客户端
+
+多个API worker进程通过本地socket连接同一个行情进程（market_data_server），
+由行情进程独占OpenD行情上下文：OpenD只看到一个订阅者，API可按CPU核数扩展。
+
+帧格式: 4字节大端长度 + MessagePack负载（DataFrame按列名+行数据编码为扩展类型，
+不使用pickle，收到的数据不会被当作代码执行）。TCP地址只允许回环地址，
+Unix socket 权限为 0600。
+
+消息:
+- 请求  {"id", "op": "call", "method", "args", "kwargs"}  -> {"id", "result"} / {"id", "error"}
+- 请求  {"id", "op": "subscribe" | "unsubscribe", "codes", "subtypes"}
+- 推送  {"op": "event", "kind", "code", "data"}
+"""
+import ipaddress
+import itertools
+import socket
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import futu as ft
+import msgpack
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.services.quote_bus import QuoteBus
+
+_HEADER = struct.Struct(">I")
+
+# MessagePack 扩展类型编号
+_EXT_FRAME = 1
+_EXT_TUPLE = 2
+
+# 允许行情进程代理的只读行情接口
+ALLOWED_METHODS = frozenset({
+    "get_global_state",
+    "get_market_snapshot",
+    "get_cur_kline",
+    "request_history_kline",
+    "get_stock_basicinfo",
+    "get_stock_quote",
+    "get_rt_ticker",
+    "get_rt_data",
+    "get_order_book",
+    "get_rehab",
+    "request_trading_days",
+    "get_market_state",
+    "get_option_chain",
+    "get_option_expiration_date",
+    "get_owner_plate",
+    "query_subscription",
+})
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """
+    解析行情进程地址
+
+    - unix:/tmp/futu_market_data.sock
+    - tcp:127.0.0.1:11200（只允许回环地址）
+    """
+    scheme, _, rest = address.partition(":")
+    if scheme == "unix":
+        return "unix", rest
+    if scheme == "tcp":
+        host, _, port = rest.rpartition(":")
+        host = (host or "127.0.0.1").strip("[]")
+        if not _is_loopback(host):
+            raise ValueError(f"行情进程只能监听/连接本机回环地址: {host}")
+        return "tcp", (host, int(port))
+    raise ValueError(f"无法识别的行情进程地址: {address}")
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _encode_default(obj: Any):
+    if isinstance(obj, pd.DataFrame):
+        body = {"columns": [str(c) for c in obj.columns], "data": obj.to_dict("list")}
+        return msgpack.ExtType(_EXT_FRAME, _packb(body))
+    if isinstance(obj, tuple):
+        return msgpack.ExtType(_EXT_TUPLE, _packb(list(obj)))
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pd.Timestamp, np.datetime64)):
+        return str(obj)
+    raise TypeError(f"行情进程无法编码类型: {type(obj).__name__}")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _EXT_FRAME:
+        body = unpack_payload(data)
+        return pd.DataFrame(body["data"], columns=body["columns"])
+    if code == _EXT_TUPLE:
+        return tuple(unpack_payload(data))
+    return msgpack.ExtType(code, data)
+
+
+def _packb(obj: Any) -> bytes:
+    # strict_types 使 tuple 走扩展类型，解码后仍为 tuple（(ret, data) 等返回值）
+    return msgpack.packb(obj, default=_encode_default, strict_types=True, use_bin_type=True)
+
+
+def unpack_payload(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    payload = _packb(message)
+    return _HEADER.pack(len(payload)) + payload
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("行情进程连接已断开")
+        buf += chunk
+    return bytes(buf)
+
+
+class _PendingCall:
+    __slots__ = ("event", "reply")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.reply: Optional[Dict[str, Any]] = None
+
+
+class RemoteQuoteContext:
+    """
+    行情上下文代理
+
+    接口与 ft.OpenQuoteContext 保持一致（返回 (ret, data)），同步阻塞，
+    FutuClient 照常在线程池中调用；推送事件直接发布到本进程的 QuoteBus。
+    """
+
+    def __init__(self, address: str, bus: QuoteBus, timeout: float = 30.0):
+        self._address = address
+        self._bus = bus
+        self._timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, _PendingCall] = {}
+        self._ids = itertools.count(1)
+        self._subscriptions: Set[Tuple[str, str]] = set()
+        self._closed = False
+        self._connect()
+
+    def _connect(self):
+        kind, target = parse_address(self._address)
+        family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.connect(target)
+        self._sock = sock
+        threading.Thread(target=self._reader, args=(sock,), name="market-data-reader", daemon=True).start()
+        logger.info(f"已连接共享行情进程: {self._address}")
+
+    def _reader(self, sock: socket.socket):
+        try:
+            while True:
+                (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+                message = unpack_payload(_recv_exact(sock, size))
+                if message.get("op") == "event":
+                    self._bus.publish(message["kind"], message["code"], message["data"])
+                    continue
+                pending = self._pending.pop(message.get("id"), None)
+                if pending is not None:
+                    pending.reply = message
+                    pending.event.set()
+        except (ConnectionError, OSError) as e:
+            if not self._closed:
+                logger.warning(f"共享行情进程连接中断: {e}")
+        finally:
+            if self._sock is sock:
+                self._sock = None
+            # 唤醒所有等待中的调用
+            for pending in list(self._pending.values()):
+                pending.event.set()
+            self._pending.clear()
+
+    def _request(self, message: Dict[str, Any]) -> Any:
+        if self._sock is None:
+            if self._closed:
+                return ft.RET_ERROR, "行情进程连接已关闭"
+            try:
+                self._connect()
+                self._resubscribe()
+            except OSError as e:
+                return ft.RET_ERROR, f"无法连接共享行情进程: {e}"
+
+        call_id = next(self._ids)
+        message["id"] = call_id
+        pending = _PendingCall()
+        self._pending[call_id] = pending
+        try:
+            with self._send_lock:
+                self._sock.sendall(encode_frame(message))
+        except (OSError, AttributeError) as e:
+            self._pending.pop(call_id, None)
+            return ft.RET_ERROR, f"行情进程请求发送失败: {e}"
+
+        if not pending.event.wait(self._timeout):
+            self._pending.pop(call_id, None)
+            return ft.RET_ERROR, "行情进程请求超时"
+        reply = pending.reply
+        if reply is None:
+            return ft.RET_ERROR, "行情进程连接中断"
+        if "error" in reply:
+            return ft.RET_ERROR, reply["error"]
+        return reply["result"]
+
+    def _resubscribe(self):
+        """重连后按订阅类型分组恢复订阅（不做代码×类型的笛卡尔积，避免浪费订阅额度）"""
+        grouped: Dict[str, List[str]] = {}
+        for code, subtype in sorted(self._subscriptions):
+            grouped.setdefault(subtype, []).append(code)
+        for subtype, codes in grouped.items():
+            self._request({"op": "subscribe", "codes": codes, "subtypes": [subtype]})
+
+    # ==================== OpenQuoteContext 兼容接口 ====================
+
+    def subscribe(self, code_list: List[str], subtype_list: List[str], **kwargs):
+        ret, data = self._request({"op": "subscribe", "codes": list(code_list), "subtypes": list(subtype_list)})
+        if ret == ft.RET_OK:
+            self._subscriptions.update((c, s) for c in code_list for s in subtype_list)
+        return ret, data
+
+    def unsubscribe(self, code_list: List[str], subtype_list: List[str], **kwargs):
+        self._subscriptions.difference_update((c, s) for c in code_list for s in subtype_list)
+        return self._request({"op": "unsubscribe", "codes": list(code_list), "subtypes": list(subtype_list)})
+
+    def set_handler(self, handler):
+        # 推送由行情进程转换后直接发布到 QuoteBus，无需本地处理器
+        return ft.RET_OK
+
+    def close(self):
+        self._closed = True
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def __getattr__(self, name: str):
+        if name not in ALLOWED_METHODS:
+            raise AttributeError(f"共享行情模式不支持接口: {name}")
+
+        def remote_call(*args, **kwargs):
+            return self._request({"op": "call", "method": name, "args": args, "kwargs": kwargs})
+        return remote_call
@@ -0,0 +1,200 @@
+"""
+共享行情进程
+
+独占OpenD行情上下文，向多个API worker转发行情请求并按订阅分发推送。
+
+启动（在 backend 目录下）:
+    python -m app.services.market_data_server
+
+API worker 设置 MARKET_DATA_MODE=shared 后通过 MARKET_DATA_ADDRESS 连接本进程。
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, Set, Tuple, Any, List
+
+import futu as ft
+from loguru import logger
+
+from app.config import settings
+from app.services.futu_client import FutuClient
+from app.services.market_data import ALLOWED_METHODS, encode_frame, parse_address, unpack_payload, _HEADER
+from app.services.quote_bus import QuoteBus, event_subtype, quote_bus
+from app.utils.log import setup_logging
+
+# 单个连接待发送缓冲上限，超过后丢弃该连接的推送（慢消费者不拖累其他worker）
+MAX_WRITE_BUFFER = 8 * 1024 * 1024
+
+SubKey = Tuple[str, str]  # (code, subtype)
+
+
+def _group_by_subtype(keys) -> Dict[str, List[str]]:
+    grouped: Dict[str, List[str]] = defaultdict(list)
+    for code, subtype in sorted(keys):
+        grouped[subtype].append(code)
+    return grouped
+
+
+class _Connection:
+    """一个API worker连接"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.subscriptions: Set[SubKey] = set()
+        self.dropped = 0
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        if self.writer.is_closing():
+            return False
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.dropped += 1
+            return False
+        self.writer.write(encode_frame(message))
+        return True
+
+
+class MarketDataServer:
+    """共享行情服务"""
+
+    def __init__(self, client: FutuClient, bus: QuoteBus, address: str):
+        self._client = client
+        self._bus = bus
+        self._address = address
+        self._subscribers: Dict[SubKey, Set[_Connection]] = defaultdict(set)
+        self._lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def subscription_count(self) -> int:
+        return len(self._subscribers)
+
+    async def serve_forever(self):
+        self._bus.bind_loop(asyncio.get_running_loop())
+        self._bus.add_listener("*", self._on_event)
+
+        kind, target = parse_address(self._address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self._handle, path=target)
+            os.chmod(target, 0o600)
+        else:
+            server = await asyncio.start_server(self._handle, host=target[0], port=target[1])
+        logger.info(f"共享行情进程已启动: {self._address}")
+        async with server:
+            await server.serve_forever()
+
+    # ==================== 推送分发 ====================
+
+    def _on_event(self, kind: str, code: str, data: Dict[str, Any]):
+        connections = self._subscribers.get((code, event_subtype(kind, data)))
+        if not connections:
+            return
+        message = {"op": "event", "kind": kind, "code": code, "data": data}
+        for conn in connections:
+            conn.send(message)
+
+    # ==================== 连接处理 ====================
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = _Connection(writer)
+        logger.info("API worker已连接")
+        try:
+            while True:
+                header = await reader.readexactly(_HEADER.size)
+                (size,) = _HEADER.unpack(header)
+                message = await reader.readexactly(size)
+                task = asyncio.create_task(self._dispatch(conn, message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await self._release(conn, set(conn.subscriptions))
+            writer.close()
+            logger.info(f"API worker已断开（丢弃推送 {conn.dropped} 条）")
+
+    async def _dispatch(self, conn: _Connection, raw: bytes):
+        reply: Dict[str, Any] = {"id": None}
+        try:
+            message = unpack_payload(raw)
+            reply["id"] = message.get("id")
+            op = message["op"]
+            if op == "call":
+                reply["result"] = await self._call(message["method"], message["args"], message["kwargs"])
+            elif op == "subscribe":
+                reply["result"] = await self._subscribe(conn, message["codes"], message["subtypes"])
+            elif op == "unsubscribe":
+                keys = {(c, s) for c in message["codes"] for s in message["subtypes"]}
+                await self._release(conn, keys & conn.subscriptions)
+                reply["result"] = (ft.RET_OK, None)
+            else:
+                reply["error"] = f"未知操作: {op}"
+        except Exception as e:
+            reply["error"] = str(e)
+        try:
+            conn.send(reply)
+        except TypeError as e:
+            conn.send({"id": reply["id"], "error": str(e)})
+
+    async def _call(self, method: str, args: tuple, kwargs: dict):
+        if method not in ALLOWED_METHODS:
+            raise Exception(f"不允许的接口: {method}")
+        quote_ctx = self._client._quote_ctx
+        if quote_ctx is None:
+            return ft.RET_ERROR, "OpenD未连接"
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: getattr(quote_ctx, method)(*args, **kwargs))
+
+    async def _subscribe(self, conn: _Connection, codes: List[str], subtypes: List[str]):
+        """引用计数订阅：只有首个订阅者会触发OpenD订阅"""
+        async with self._lock:
+            keys = {(c, s) for c in codes for s in subtypes}
+            new_keys = {k for k in keys if not self._subscribers.get(k)}
+            try:
+                for subtype, sub_codes in _group_by_subtype(new_keys).items():
+                    await self._client.subscribe(sub_codes, [subtype])
+            except Exception as e:
+                return ft.RET_ERROR, str(e)
+            for key in keys:
+                self._subscribers[key].add(conn)
+            conn.subscriptions |= keys
+            return ft.RET_OK, None
+
+    async def _release(self, conn: _Connection, keys: Set[SubKey]):
+        async with self._lock:
+            idle = []
+            for key in keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.discard(conn)
+                if not subscribers:
+                    del self._subscribers[key]
+                    idle.append(key)
+            conn.subscriptions -= keys
+            try:
+                for subtype, sub_codes in _group_by_subtype(idle).items():
+                    await self._client.unsubscribe(sub_codes, [subtype])
+            except Exception as e:
+                # OpenD要求订阅至少保持1分钟，提前退订失败不影响推送分发
+                logger.debug(f"退订失败: {e}")
+
+
+def main():
+    setup_logging()
+    client = FutuClient(mode="direct")
+    if not client.connect(trade=False):
+        logger.error("OpenD连接失败，行情进程退出")
+        return
+    server = MarketDataServer(client, quote_bus, settings.MARKET_DATA_ADDRESS)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+行情录制
+
+将事件总线上的推送（报价/逐笔/K线）按 交易日/数据流/股票代码 追加写入定长二进制记录文件:
+
+    {root}/{YYYY-MM-DD}/{stream}/{code}.bin    未压缩，可直接内存映射
+    {root}/{YYYY-MM-DD}/{stream}/{code}.binz   分块压缩，每块为 [原始长度 u4][压缩长度 u4][zlib数据]
+
+stream 为 quote / ticker / kline.K_1M 等。推送回调只把事件放入队列，格式转换与写盘在后台线程批量完成。
+time 字段为交易所当地时间按UTC方式换算的毫秒数（与 kline_store 相同约定），recv_ns 为本机接收时间。
+"""
+import queue
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.config import settings
+from app.services.quote_bus import QuoteBus, event_subtype
+
+QUOTE_DTYPE = np.dtype([
+    ("recv_ns", "i8"),
+    ("time", "i8"),
+    ("last_price", "f8"),
+    ("open_price", "f8"),
+    ("high_price", "f8"),
+    ("low_price", "f8"),
+    ("prev_close_price", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+])
+
+TICKER_DTYPE = np.dtype([
+    ("recv_ns", "i8"),
+    ("time", "i8"),
+    ("sequence", "i8"),
+    ("price", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+    ("direction", "i1"),
+])
+
+KLINE_PUSH_DTYPE = np.dtype([
+    ("recv_ns", "i8"),
+    ("time", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+    ("turnover", "f8"),
+])
+
+TICKER_DIRECTIONS = {"BUY": 1, "SELL": -1}
+
+# 录制队列上限，写盘跟不上时丢弃新事件而不是阻塞推送线程
+RECORDER_QUEUE_SIZE = 200_000
+RECORDER_FLUSH_SECONDS = 0.5
+
+
+def stream_name(kind: str, data: Dict[str, Any]) -> str:
+    """事件对应的数据流名称"""
+    if kind == "kline":
+        return f"kline.{event_subtype(kind, data)}"
+    return kind
+
+
+def stream_dtype(stream: str) -> np.dtype:
+    if stream == "quote":
+        return QUOTE_DTYPE
+    if stream == "ticker":
+        return TICKER_DTYPE
+    if stream.startswith("kline."):
+        return KLINE_PUSH_DTYPE
+    raise ValueError(f"未知数据流: {stream}")
+
+
+def _to_ms(values: List[str]) -> np.ndarray:
+    """时间字符串批量转换为毫秒数（无法解析的记为0）"""
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), format="ISO8601", errors="coerce")
+    return parsed.to_numpy().astype("datetime64[ms]").astype("i8").clip(min=0)
+
+
+def _num(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def events_to_records(stream: str, events: List[Tuple[int, Dict[str, Any]]]) -> np.ndarray:
+    """(recv_ns, 推送记录) 列表转换为定长记录数组"""
+    records = np.zeros(len(events), dtype=stream_dtype(stream))
+    records["recv_ns"] = [recv_ns for recv_ns, _ in events]
+    if stream == "quote":
+        records["time"] = _to_ms([f"{d.get('data_date', '')} {d.get('data_time', '')}" for _, d in events])
+        for field in QUOTE_DTYPE.names[2:]:
+            records[field] = [_num(d.get(field)) for _, d in events]
+    elif stream == "ticker":
+        records["time"] = _to_ms([d.get("time", "") for _, d in events])
+        records["sequence"] = [_int(d.get("sequence")) for _, d in events]
+        for field in ("price", "volume", "turnover"):
+            records[field] = [_num(d.get(field)) for _, d in events]
+        records["direction"] = [TICKER_DIRECTIONS.get(d.get("ticker_direction"), 0) for _, d in events]
+    else:
+        records["time"] = _to_ms([d.get("time_key", "") for _, d in events])
+        for field in KLINE_PUSH_DTYPE.names[2:]:
+            records[field] = [_num(d.get(field)) for _, d in events]
+    return records
+
+
+class _StreamWriter:
+    """单个文件的追加写入"""
+
+    def __init__(self, path: Path, compress: bool):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.compress = compress
+        self._file = open(path, "ab")
+
+    def append(self, records: np.ndarray):
+        raw = records.tobytes()
+        if self.compress:
+            block = zlib.compress(raw, 1)
+            self._file.write(np.array([len(raw), len(block)], dtype="<u4").tobytes())
+            self._file.write(block)
+        else:
+            self._file.write(raw)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class MarketRecorder:
+    """行情录制（后台线程批量写盘）"""
+
+    def __init__(self, root: str, compress: bool = False, queue_size: int = RECORDER_QUEUE_SIZE,
+                 flush_seconds: float = RECORDER_FLUSH_SECONDS):
+        self._root = Path(root)
+        self._compress = compress
+        self._flush_seconds = flush_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._writers: Dict[Tuple[str, str, str], _StreamWriter] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._bus: Optional[QuoteBus] = None
+        self.recorded = 0
+        self.dropped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, bus: QuoteBus):
+        """开始录制事件总线上的全部推送"""
+        if self._thread is not None:
+            return
+        self._bus = bus
+        self._thread = threading.Thread(target=self._run, name="market-recorder", daemon=True)
+        self._thread.start()
+        bus.add_listener("*", self._on_event)
+        logger.info(f"行情录制已启动: {self._root} (compress={self._compress})")
+
+    def stop(self):
+        """停止录制，写完队列中剩余事件"""
+        if self._thread is None:
+            return
+        self._bus.remove_listener("*", self._on_event)
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        logger.info(f"行情录制已停止: 共 {self.recorded} 条, 丢弃 {self.dropped} 条")
+
+    def _on_event(self, kind: str, code: str, data: Dict[str, Any]):
+        # 在事件循环线程中调用，只入队
+        try:
+            self._queue.put_nowait((time.time_ns(), kind, code, data))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self._flush_seconds)
+            except queue.Empty:
+                continue
+            batch = []
+            while item is not None:
+                batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = item is None
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"行情录制写盘失败: {e}")
+
+    def _write(self, batch: List[Tuple[int, str, str, Dict[str, Any]]]):
+        groups: Dict[Tuple[str, str, str], List[Tuple[int, Dict[str, Any]]]] = defaultdict(list)
+        for recv_ns, kind, code, data in batch:
+            day = date.fromtimestamp(recv_ns / 1e9).isoformat()
+            groups[(day, stream_name(kind, data), code)].append((recv_ns, data))
+        for key, events in groups.items():
+            writer = self._writers.get(key)
+            if writer is None:
+                # 跨日后关闭前一天的文件
+                for old in [k for k in self._writers if k[0] != key[0]]:
+                    self._writers.pop(old).close()
+                day, stream, code = key
+                suffix = ".binz" if self._compress else ".bin"
+                writer = self._writers[key] = _StreamWriter(
+                    self._root / day / stream / f"{code}{suffix}", self._compress
+                )
+            writer.append(events_to_records(key[1], events))
+            self.recorded += len(events)
+        for writer in self._writers.values():
+            writer.flush()
+
+
+class MarketDataReader:
+    """录制文件读取（未压缩文件内存映射，零拷贝切片）"""
+
+    def __init__(self, root: str):
+        self._root = Path(root)
+
+    def days(self) -> List[str]:
+        if not self._root.exists():
+            return []
+        return sorted(p.name for p in self._root.iterdir() if p.is_dir())
+
+    def streams(self, day: str) -> List[str]:
+        path = self._root / day
+        return sorted(p.name for p in path.iterdir() if p.is_dir()) if path.exists() else []
+
+    def codes(self, day: str, stream: str) -> List[str]:
+        path = self._root / day / stream
+        if not path.exists():
+            return []
+        return sorted({p.name.rsplit(".", 1)[0] for p in path.iterdir() if p.suffix in (".bin", ".binz")})
+
+    def read(self, day: str, stream: str, code: str,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> np.ndarray:
+        """
+        读取某日某数据流记录，可按 time 区间 [start, end) 过滤
+
+        只有未压缩文件时返回内存映射上的视图。
+        """
+        dtype = stream_dtype(stream)
+        base = self._root / day / stream / code
+        parts = []
+        raw_path = base.with_name(f"{code}.bin")
+        if raw_path.exists() and raw_path.stat().st_size >= dtype.itemsize:
+            # 进程异常退出时末尾可能只写了半条记录
+            count = raw_path.stat().st_size // dtype.itemsize
+            parts.append(np.memmap(raw_path, dtype=dtype, mode="r", shape=(count,)))
+        packed_path = base.with_name(f"{code}.binz")
+        if packed_path.exists():
+            parts.append(self._read_blocks(packed_path, dtype))
+
+        if not parts:
+            records = np.empty(0, dtype=dtype)
+        elif len(parts) == 1:
+            records = parts[0]
+        else:
+            records = np.concatenate(parts)
+            records = records[np.argsort(records["recv_ns"], kind="stable")]
+
+        if start is not None or end is not None:
+            times = records["time"]
+            lo = np.searchsorted(times, _datetime_ms(start)) if start is not None else 0
+            hi = np.searchsorted(times, _datetime_ms(end)) if end is not None else len(records)
+            records = records[lo:hi]
+        return records
+
+    @staticmethod
+    def _read_blocks(path: Path, dtype: np.dtype) -> np.ndarray:
+        data = path.read_bytes()
+        blocks = []
+        offset = 0
+        while offset + 8 <= len(data):
+            raw_len, packed_len = np.frombuffer(data, dtype="<u4", count=2, offset=offset)
+            offset += 8
+            if offset + packed_len > len(data):
+                break
+            blocks.append(zlib.decompress(data[offset:offset + packed_len]))
+            offset += int(packed_len)
+        raw = b"".join(blocks)
+        return np.frombuffer(raw, dtype=dtype, count=len(raw) // dtype.itemsize)
+
+
+def _datetime_ms(value: datetime) -> int:
+    return int(np.datetime64(pd.Timestamp(value).to_datetime64(), "ms").astype("i8"))
+
+
+# 全局录制实例（MARKET_RECORD_ENABLED 时随应用启动）
+market_recorder = MarketRecorder(settings.MARKET_RECORD_DIR, compress=settings.MARKET_RECORD_COMPRESS)
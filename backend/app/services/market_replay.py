@@ -0,0 +1,296 @@
+"""
+历史行情回放
+
+MARKET_DATA_MODE=replay 时 FutuClient 使用 ReplayQuoteContext 代替OpenD行情上下文，
+把录制文件（market_recorder）或本地K线（kline_store）还原成推送记录，经 quote_bus 发布，
+下游的WebSocket扇出、策略运行时与直连OpenD时走同一条链路。
+
+回放顺序按 (接收时间, 数据流, 股票代码, 文件内序号) 排序，同一份数据每次回放的事件顺序与内容一致；
+speed 为回放倍速，0 表示不等待、尽快发布。
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import futu as ft
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.services.kline_store import KLINE_DTYPE
+from app.services.market_recorder import KLINE_PUSH_DTYPE, QUOTE_DTYPE, MarketDataReader
+from app.services.quote_bus import QuoteBus
+
+TICKER_DIRECTION_NAMES = {1: "BUY", -1: "SELL", 0: "NEUTRAL"}
+
+# 最大速度回放时每发布多少条事件让出一次事件循环
+MAX_SPEED_BATCH = 500
+# 距离计划发布时间不足该秒数时直接发布（asyncio.sleep 精度有限）
+MIN_SLEEP_SECONDS = 0.001
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _ms_to_datetime(ms: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=int(ms))
+
+
+class ReplaySource:
+    """单个 (数据流, 股票代码) 的回放记录"""
+
+    def __init__(self, stream: str, code: str, records: np.ndarray):
+        self.stream = stream
+        self.code = code
+        self.records = records
+        self.kind = stream.split(".", 1)[0]
+        # 订阅类型：QUOTE / TICKER / K_1M ...
+        self.subtype = stream.split(".", 1)[1] if self.kind == "kline" else self.kind.upper()
+
+    def __len__(self):
+        return len(self.records)
+
+    def event(self, i: int) -> Dict[str, Any]:
+        """第 i 条记录还原为推送记录"""
+        rec = self.records[i]
+        when = _ms_to_datetime(rec["time"])
+        if self.kind == "quote":
+            return {
+                "code": self.code,
+                "data_date": when.strftime("%Y-%m-%d"),
+                "data_time": when.strftime("%H:%M:%S"),
+                "last_price": float(rec["last_price"]),
+                "open_price": float(rec["open_price"]),
+                "high_price": float(rec["high_price"]),
+                "low_price": float(rec["low_price"]),
+                "prev_close_price": float(rec["prev_close_price"]),
+                "volume": int(rec["volume"]) if rec["volume"] == rec["volume"] else 0,
+                "turnover": float(rec["turnover"]),
+            }
+        if self.kind == "ticker":
+            return {
+                "code": self.code,
+                "time": when.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "price": float(rec["price"]),
+                "volume": int(rec["volume"]) if rec["volume"] == rec["volume"] else 0,
+                "turnover": float(rec["turnover"]),
+                "ticker_direction": TICKER_DIRECTION_NAMES.get(int(rec["direction"]), "NEUTRAL"),
+                "sequence": int(rec["sequence"]),
+            }
+        return {
+            "code": self.code,
+            "time_key": when.strftime("%Y-%m-%d %H:%M:%S"),
+            "open": float(rec["open"]),
+            "close": float(rec["close"]),
+            "high": float(rec["high"]),
+            "low": float(rec["low"]),
+            "volume": int(rec["volume"]) if rec["volume"] == rec["volume"] else 0,
+            "turnover": float(rec["turnover"]),
+            "k_type": self.subtype,
+        }
+
+
+def recorded_sources(reader: MarketDataReader, day: str, codes: Optional[List[str]] = None,
+                     streams: Optional[List[str]] = None) -> List[ReplaySource]:
+    """某个交易日的录制数据"""
+    sources = []
+    for stream in reader.streams(day):
+        if streams and stream not in streams and stream.split(".", 1)[0] not in streams:
+            continue
+        for code in reader.codes(day, stream):
+            if codes and code not in codes:
+                continue
+            records = reader.read(day, stream, code)
+            if len(records):
+                sources.append(ReplaySource(stream, code, records))
+    return sources
+
+
+def kline_sources(bars_by_code: Dict[str, np.ndarray], ktype: str = "K_DAY") -> List[ReplaySource]:
+    """本地K线（KLINE_DTYPE）转换为K线推送与报价推送，报价取收盘价"""
+    sources = []
+    for code, bars in bars_by_code.items():
+        if len(bars) == 0:
+            continue
+        bars = np.asarray(bars, dtype=KLINE_DTYPE)
+        stamp_ns = bars["time"] * 1_000_000_000
+
+        kline = np.zeros(len(bars), dtype=KLINE_PUSH_DTYPE)
+        kline["recv_ns"] = stamp_ns
+        kline["time"] = bars["time"] * 1000
+        for field in ("open", "high", "low", "close", "volume", "turnover"):
+            kline[field] = bars[field]
+        sources.append(ReplaySource(f"kline.{ktype}", code, kline))
+
+        quote = np.zeros(len(bars), dtype=QUOTE_DTYPE)
+        quote["recv_ns"] = stamp_ns
+        quote["time"] = kline["time"]
+        quote["last_price"] = bars["close"]
+        quote["open_price"] = bars["open"]
+        quote["high_price"] = bars["high"]
+        quote["low_price"] = bars["low"]
+        quote["prev_close_price"] = np.concatenate([bars["close"][:1], bars["close"][:-1]])
+        quote["volume"] = bars["volume"]
+        quote["turnover"] = bars["turnover"]
+        sources.append(ReplaySource("quote", code, quote))
+    return sources
+
+
+def merge_order(sources: List[ReplaySource]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """全部记录的确定性回放顺序，返回 (来源序号, 记录序号, 时间戳ns)"""
+    if not sources:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # 来源先按 (数据流, 代码) 排序，保证同一时间戳的事件顺序与来源列表顺序无关
+    ranked = sorted(range(len(sources)), key=lambda i: (sources[i].stream, sources[i].code))
+    rank = np.empty(len(sources), dtype=np.int64)
+    rank[ranked] = np.arange(len(sources))
+
+    src = np.concatenate([np.full(len(s), i, dtype=np.int64) for i, s in enumerate(sources)])
+    row = np.concatenate([np.arange(len(s), dtype=np.int64) for s in sources])
+    ts = np.concatenate([np.asarray(s.records["recv_ns"], dtype=np.int64) for s in sources])
+    order = np.lexsort((row, rank[src], ts))
+    return src[order], row[order], ts[order]
+
+
+class ReplayStats:
+    """回放统计"""
+
+    def __init__(self, total: int, speed: float):
+        self.total = total
+        self.speed = speed
+        self.published = 0
+        self.skipped = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.lags: Deque[float] = deque(maxlen=10000)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        lags = np.array(self.lags) if self.lags else np.zeros(1)
+        return {
+            "total": self.total,
+            "published": self.published,
+            "skipped": self.skipped,
+            "speed": self.speed,
+            "running": self.started_at is not None and self.finished_at is None,
+            "elapsed_seconds": round(elapsed, 3),
+            "events_per_second": round(self.published / elapsed, 1) if elapsed > 0 else 0.0,
+            # 实际发布时间落后计划时间的程度（最大速度回放时不统计）
+            "lag_ms": {
+                "p50": round(float(np.percentile(lags, 50)) * 1000, 3),
+                "p99": round(float(np.percentile(lags, 99)) * 1000, 3),
+                "max": round(float(lags.max()) * 1000, 3),
+            },
+        }
+
+
+class ReplayQuoteContext:
+    """回放行情上下文（接口与 ft.OpenQuoteContext 的常用部分一致）"""
+
+    def __init__(self, bus: QuoteBus):
+        self._bus = bus
+        self._subscriptions: Set[Tuple[str, str]] = set()
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats: Optional[ReplayStats] = None
+
+    # ---------- OpenQuoteContext 兼容接口 ----------
+
+    def get_global_state(self):
+        return ft.RET_OK, {"market_state": "REPLAY"}
+
+    def set_handler(self, handler):
+        return ft.RET_OK
+
+    def subscribe(self, code_list: List[str], subtype_list: List[str], **kwargs):
+        self._subscriptions.update((code, subtype) for code in code_list for subtype in subtype_list)
+        return ft.RET_OK, None
+
+    def unsubscribe(self, code_list: List[str], subtype_list: List[str], **kwargs):
+        self._subscriptions.difference_update((code, subtype) for code in code_list for subtype in subtype_list)
+        return ft.RET_OK, None
+
+    def get_market_snapshot(self, code_list: List[str]):
+        """已回放到的最新报价"""
+        rows = [dict(self._latest[code], name="") for code in code_list if code in self._latest]
+        if not rows:
+            return ft.RET_ERROR, "回放尚未推送该标的报价"
+        return ft.RET_OK, pd.DataFrame(rows)
+
+    def close(self):
+        self.stop()
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def unsupported(*args, **kwargs):
+            return ft.RET_ERROR, f"回放模式不支持接口: {name}"
+        return unsupported
+
+    # ---------- 回放控制 ----------
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        return self._stats.to_dict() if self._stats else None
+
+    def start(self, sources: List[ReplaySource], speed: float = 1.0) -> Dict[str, Any]:
+        """在当前事件循环中后台回放"""
+        if self.is_running:
+            raise Exception("回放正在进行中")
+        order = merge_order(sources)
+        self._stats = ReplayStats(len(order[0]), speed)
+        self._task = asyncio.get_running_loop().create_task(self._run(sources, order, speed))
+        return self._stats.to_dict()
+
+    def stop(self):
+        if self.is_running:
+            self._task.cancel()
+
+    async def replay(self, sources: List[ReplaySource], speed: float = 1.0) -> Dict[str, Any]:
+        """回放并等待结束，返回统计"""
+        self.start(sources, speed)
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return self._stats.to_dict()
+
+    async def _run(self, sources: List[ReplaySource], order: Tuple[np.ndarray, ...], speed: float):
+        stats = self._stats
+        src_idx, row_idx, stamps = order
+        stats.started_at = time.monotonic()
+        logger.info(f"行情回放开始: {stats.total} 条事件, speed={speed or 'max'}")
+        try:
+            if len(stamps):
+                origin = int(stamps[0])
+                wall_start = time.perf_counter()
+                for n, (s, r, stamp) in enumerate(zip(src_idx.tolist(), row_idx.tolist(), stamps.tolist())):
+                    if speed > 0:
+                        delay = wall_start + (stamp - origin) / 1e9 / speed - time.perf_counter()
+                        if delay > MIN_SLEEP_SECONDS:
+                            await asyncio.sleep(delay)
+                        else:
+                            stats.lags.append(max(0.0, -delay))
+                    elif n % MAX_SPEED_BATCH == 0:
+                        await asyncio.sleep(0)
+
+                    source = sources[s]
+                    if (source.code, source.subtype) not in self._subscriptions:
+                        stats.skipped += 1
+                        continue
+                    data = source.event(r)
+                    if source.kind == "quote":
+                        self._latest[source.code] = data
+                    self._bus.publish(source.kind, source.code, data)
+                    stats.published += 1
+        finally:
+            stats.finished_at = time.monotonic()
+            logger.info(f"行情回放结束: 发布 {stats.published} 条, 跳过(未订阅) {stats.skipped} 条")
+
@@ -0,0 +1,331 @@
+"""
+策略参数寻优
+
+- 网格寻优: 参数组合 × 股票 拆成小批任务分发到进程池并行回测，结果按指标排序
+- 滚动前推(walk-forward): 每个窗口在训练段选出最优参数，在紧随其后的测试段做样本外检验
+
+K线数组只写一次到内存映射文件（优先 /dev/shm），worker 以 mmap_mode="r" 打开，
+任务消息只包含股票下标与参数，不会序列化K线数据。
+"""
+import asyncio
+import itertools
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.backtest import PERIODS_PER_YEAR, STRATEGIES, compute_stats, run_backtest
+from app.services.kline_store import KLINE_DTYPE
+
+# 单次寻优允许的最大回测次数
+MAX_SWEEP_RUNS = 200000
+
+# 指标 -> 是否越大越好
+RANK_METRICS = {
+    "sharpe": True,
+    "total_return": True,
+    "annual_return": True,
+    "win_rate": True,
+    "max_drawdown": False,
+    "volatility": False,
+}
+
+# worker 进程内的共享K线（由 _init_worker 设置）
+_BARS: Optional[np.ndarray] = None
+_OFFSETS: Optional[np.ndarray] = None
+
+
+def expand_grid(param_grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """参数网格展开为参数组合列表"""
+    if not param_grid:
+        return [{}]
+    names = list(param_grid)
+    values = [list(v) if isinstance(v, (list, tuple)) else [v] for v in param_grid.values()]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+class SharedBars:
+    """多只股票的K线拼接为一个 .npy 文件，供 worker 以内存映射方式只读共享"""
+
+    def __init__(self, series: Sequence[np.ndarray]):
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self._dir = tempfile.mkdtemp(prefix="futu_sweep_", dir=base)
+        self.path = os.path.join(self._dir, "bars.npy")
+        lengths = [len(s) for s in series]
+        self.offsets = np.concatenate(([0], np.cumsum(lengths))).astype("i8")
+        out = np.lib.format.open_memmap(self.path, mode="w+", dtype=KLINE_DTYPE, shape=(int(self.offsets[-1]),))
+        for i, bars in enumerate(series):
+            out[self.offsets[i]:self.offsets[i + 1]] = bars
+        out.flush()
+        del out
+
+    def close(self):
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def _init_worker(path: str, offsets: np.ndarray):
+    global _BARS, _OFFSETS
+    _BARS = np.load(path, mmap_mode="r")
+    _OFFSETS = offsets
+
+
+def _symbol_bars(index: int, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+    start = int(_OFFSETS[index])
+    end = int(_OFFSETS[index + 1])
+    return _BARS[start + lo:end if hi is None else start + hi]
+
+
+def _evaluate(bars: np.ndarray, strategy: str, params: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        result = run_backtest(bars, strategy, params, collect_trades=False, **options)
+    except (TypeError, ValueError) as e:
+        return {"params": params, "error": str(e)}
+    return {"params": params, "stats": result.stats}
+
+
+def _sweep_task(strategy: str, items: List[Tuple[int, Dict[str, Any]]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """worker: 回测一批 (股票下标, 参数) 组合"""
+    out = []
+    for index, params in items:
+        record = _evaluate(_symbol_bars(index), strategy, params, options)
+        record["symbol"] = index
+        out.append(record)
+    return out
+
+
+def _score(stats: Dict[str, float], metric: str) -> float:
+    value = stats.get(metric, float("nan"))
+    if not math.isfinite(value):
+        return float("-inf")
+    return value if RANK_METRICS.get(metric, True) else -value
+
+
+def _out_of_sample_stats(bars: np.ndarray, warmup: int, strategy: str, params: Dict[str, Any],
+                         options: Dict[str, Any]) -> Dict[str, float]:
+    """训练段+测试段连续回测（训练段充当指标预热），只对测试段权益计算指标"""
+    result = run_backtest(bars, strategy, params, collect_trades=False, **options)
+    capital = options.get("capital", 100000.0)
+    equity = result.equity[warmup - 1:]
+    test_equity = capital * equity[1:] / equity[0]
+    returns = equity[1:] / equity[:-1] - 1.0
+    periods = PERIODS_PER_YEAR.get(options.get("kline_type", "K_DAY"), 252)
+    return compute_stats(test_equity, returns, result.position[warmup:], capital, periods)
+
+
+def _walk_forward_task(strategy: str, index: int, fold: int, bounds: Tuple[int, int, int],
+                       combos: List[Dict[str, Any]], metric: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """worker: 一个窗口内训练段选参 + 测试段检验"""
+    train_lo, train_hi, test_hi = bounds
+    train = _symbol_bars(index, train_lo, train_hi)
+    best, best_score = None, float("-inf")
+    for params in combos:
+        record = _evaluate(train, strategy, params, options)
+        if "stats" in record and _score(record["stats"], metric) > best_score:
+            best, best_score = record, _score(record["stats"], metric)
+
+    window = _symbol_bars(index, train_lo, test_hi)
+    result = {
+        "symbol": index,
+        "fold": fold,
+        "train_start": int(window["time"][0]),
+        "test_start": int(window["time"][train_hi - train_lo]),
+        "test_end": int(window["time"][-1]),
+    }
+    if best is None:
+        result["error"] = "训练段没有有效的参数组合"
+        return result
+    result.update(
+        params=best["params"],
+        train_stats=best["stats"],
+        test_stats=_out_of_sample_stats(window, train_hi - train_lo, strategy, best["params"], options),
+    )
+    return result
+
+
+def walk_forward_folds(length: int, train_bars: int, test_bars: int) -> List[Tuple[int, int, int]]:
+    """滚动窗口边界 [(train_lo, train_hi, test_hi)]，窗口按测试段长度前移"""
+    folds = []
+    lo = 0
+    while lo + train_bars + test_bars <= length:
+        folds.append((lo, lo + train_bars, lo + train_bars + test_bars))
+        lo += test_bars
+    return folds
+
+
+def rank_results(records: List[Dict[str, Any]], metric: str, top_n: int) -> Dict[str, Any]:
+    """
+    排序寻优结果
+
+    - by_params: 同一参数组合在各股票上的指标均值排名（选参用）
+    - top_runs: 单只股票 × 参数组合的排名
+    """
+    valid = [r for r in records if "stats" in r]
+    groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for r in valid:
+        groups.setdefault(tuple(sorted(r["params"].items(), key=lambda kv: kv[0])), []).append(r)
+
+    by_params = []
+    for key, runs in groups.items():
+        scores = np.array([_score(r["stats"], metric) for r in runs])
+        finite = scores[np.isfinite(scores)]
+        by_params.append({
+            "params": dict(key),
+            "symbols": len(runs),
+            "score": float(finite.mean()) if len(finite) else None,
+            metric: float(np.mean([r["stats"].get(metric, 0.0) for r in runs])),
+            "total_return": float(np.mean([r["stats"]["total_return"] for r in runs])),
+        })
+    by_params.sort(key=lambda r: float("-inf") if r["score"] is None else r["score"], reverse=True)
+    top_runs = sorted(valid, key=lambda r: _score(r["stats"], metric), reverse=True)[:top_n]
+    return {
+        "metric": metric,
+        "runs": len(records),
+        "errors": len(records) - len(valid),
+        "by_params": by_params[:top_n],
+        "top_runs": top_runs,
+    }
+
+
+def _chunks(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+@contextmanager
+def _worker_pool(series: Sequence[np.ndarray], workers: int):
+    """共享K线 + 进程池；退出时（包括客户端断开）取消未开始的任务"""
+    shared = SharedBars(series)
+    # spawn 避免 fork 复制父进程中的OpenD连接线程与锁
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(shared.path, shared.offsets),
+    )
+    def cleanup():
+        pool.shutdown(wait=True, cancel_futures=True)
+        shared.close()
+
+    try:
+        yield pool
+    finally:
+        # 等待worker退出后再删除文件（新启动的worker初始化时仍要打开它），放到后台线程避免阻塞事件循环
+        threading.Thread(target=cleanup, name="sweep-cleanup", daemon=True).start()
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    return max(1, workers or settings.SWEEP_WORKERS or os.cpu_count() or 1)
+
+
+async def sweep(
+    series: Dict[str, np.ndarray],
+    strategy: str,
+    param_grid: Dict[str, Sequence[Any]],
+    metric: str = "sharpe",
+    top_n: int = 20,
+    workers: Optional[int] = None,
+    **options: Any,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    并行网格寻优，逐批产出进度事件，最后产出排序结果
+
+    - series: 股票代码 -> KLINE_DTYPE 数组
+    - options: 透传给 run_backtest（capital / commission_rate / slippage / kline_type）
+    事件: {"type": "progress", "done", "total"} ... {"type": "result", ...}
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"不支持的策略类型: {strategy}")
+    if metric not in RANK_METRICS:
+        raise ValueError(f"不支持的排序指标: {metric}")
+    codes = list(series)
+    combos = expand_grid(param_grid)
+    items = [(i, params) for i in range(len(codes)) for params in combos]
+    if len(items) > MAX_SWEEP_RUNS:
+        raise ValueError(f"回测次数过多: {len(items)} > {MAX_SWEEP_RUNS}")
+
+    workers = resolve_workers(workers)
+    # 每个worker约分到8批，兼顾负载均衡与进度粒度
+    chunk_size = max(1, min(256, math.ceil(len(items) / (workers * 8))))
+    loop = asyncio.get_running_loop()
+    records: List[Dict[str, Any]] = []
+
+    with _worker_pool([series[c] for c in codes], workers) as pool:
+        futures = [
+            loop.run_in_executor(pool, _sweep_task, strategy, chunk, options)
+            for chunk in _chunks(items, chunk_size)
+        ]
+        for future in asyncio.as_completed(futures):
+            records.extend(await future)
+            yield {"type": "progress", "done": len(records), "total": len(items)}
+
+    for r in records:
+        r["stock_code"] = codes[r.pop("symbol")]
+    yield {"type": "result", "workers": workers, **rank_results(records, metric, top_n)}
+
+
+async def walk_forward(
+    series: Dict[str, np.ndarray],
+    strategy: str,
+    param_grid: Dict[str, Sequence[Any]],
+    train_bars: int,
+    test_bars: int,
+    metric: str = "sharpe",
+    workers: Optional[int] = None,
+    **options: Any,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    并行滚动前推优化，每个 (股票, 窗口) 为一个任务
+
+    结果按股票汇总样本外表现：各测试段收益复利累计与平均指标
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"不支持的策略类型: {strategy}")
+    if metric not in RANK_METRICS:
+        raise ValueError(f"不支持的排序指标: {metric}")
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("训练段与测试段长度必须大于0")
+    codes = list(series)
+    combos = expand_grid(param_grid)
+    tasks = [(i, fold, bounds) for i, code in enumerate(codes)
+             for fold, bounds in enumerate(walk_forward_folds(len(series[code]), train_bars, test_bars))]
+    if not tasks:
+        raise ValueError("K线数量不足以划分训练段与测试段")
+    if len(tasks) * len(combos) > MAX_SWEEP_RUNS:
+        raise ValueError(f"回测次数过多: {len(tasks) * len(combos)} > {MAX_SWEEP_RUNS}")
+
+    workers = resolve_workers(workers)
+    loop = asyncio.get_running_loop()
+    folds: List[Dict[str, Any]] = []
+
+    with _worker_pool([series[c] for c in codes], workers) as pool:
+        futures = [
+            loop.run_in_executor(pool, _walk_forward_task, strategy, i, fold, bounds, combos, metric, options)
+            for i, fold, bounds in tasks
+        ]
+        for future in asyncio.as_completed(futures):
+            folds.append(await future)
+            yield {"type": "progress", "done": len(folds), "total": len(tasks)}
+
+    summary = []
+    for i, code in enumerate(codes):
+        mine = sorted((f for f in folds if f["symbol"] == i), key=lambda f: f["fold"])
+        for f in mine:
+            f["stock_code"] = code
+            del f["symbol"]
+        tested = [f["test_stats"] for f in mine if f.get("test_stats")]
+        summary.append({
+            "stock_code": code,
+            "folds": len(mine),
+            "oos_return": float(np.prod([1 + s["total_return"] for s in tested]) - 1) if tested else None,
+            f"oos_{metric}": float(np.mean([s.get(metric, 0.0) for s in tested])) if tested else None,
+        })
+    yield {"type": "result", "workers": workers, "metric": metric, "summary": summary,
+           "folds": sorted(folds, key=lambda f: (f["stock_code"], f["fold"]))}
@@ -0,0 +1,424 @@
+"""
+期权链与希腊值
+
+按 (标的, 到期日) 缓存期权链（get_option_chain，全天基本不变）与各合约快照（按快照接口单次上限分批），
+整理成列式数组后对整条链一次性向量化计算：
+
+- 隐含波动率：Black-Scholes 价格对波动率的 Newton 迭代（带二分区间保护），全链同时迭代，
+  已收敛的合约退出后续迭代
+- delta / gamma / vega / theta：同一组 d1/d2 一次算出
+- 标的报价推送时只按新的标的价格重算希腊值（隐含波动率沿用最近一次快照的解，sticky strike），
+  期权快照超过 OPTION_REFRESH_SECONDS 后才重新拉取并重解隐含波动率
+
+采用不含股息的欧式 Black-Scholes；美股个股期权为美式，深度实值合约的隐含波动率会略有偏差。
+vega 为波动率变动1个百分点的价格变化，theta 为每自然日的价格变化。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dtime
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import futu as ft
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.config import settings
+from app.services.futu_client import SNAPSHOT_BATCH_SIZE, futu_client
+from app.services.quote_bus import QuoteBus, quote_bus
+from app.services.subscription_manager import PRIORITY_LOW, SubscriptionManager, subscription_manager
+from app.services.trading_calendar import MARKET_SESSIONS, TradingCalendar, calendar_market, trading_calendar
+from app.utils.rate_limit import limiter
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+# 隐含波动率求解区间与精度
+VOL_MIN = 1e-4
+VOL_MAX = 5.0
+IV_TOLERANCE = 1e-6
+IV_MAX_ITER = 50
+
+# 期权链与到期日列表的缓存时长（秒）
+CHAIN_TTL = 3600
+
+# 读取时希腊值超过该时长（秒）按当前时间重算（时间价值衰减）
+GREEKS_MAX_AGE = 1.0
+
+# 缓存的期权链数（超出时淘汰最久未访问的，并释放标的报价订阅）
+MAX_CHAINS = 20
+
+_SQRT_2PI = np.sqrt(2 * np.pi)
+
+
+# ==================== Black-Scholes（向量化） ====================
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """标准正态分布函数（Hart 有理函数近似，双精度）"""
+    x = np.asarray(x, dtype=np.float64)
+    z = np.abs(x)
+    num = 3.52624965998911e-02
+    for c in (0.700383064443688, 6.37396220353165, 33.912866078383, 112.079291497871,
+              221.213596169931, 220.206867912376):
+        num = num * z + c
+    den = 8.83883476483184e-02
+    for c in (1.75566716318264, 16.064177579207, 86.7807322029461, 296.564248779674,
+              637.333633378831, 793.826512519948, 440.413735824752):
+        den = den * z + c
+    # 尾部用连分式
+    frac = z + 0.65
+    for c in (4, 3, 2, 1):
+        frac = z + c / frac
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tail = np.exp(-0.5 * z * z) * np.where(z < 7.07106781186547, num / den, 1 / (frac * _SQRT_2PI))
+    tail = np.where(z > 37, 0.0, tail)
+    return np.where(x > 0, 1 - tail, tail)
+
+
+def _d1_d2(spot, strike, years, rate, sigma) -> Tuple[np.ndarray, np.ndarray]:
+    sqrt_t = np.sqrt(years)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * sigma * sigma) * years) / (sigma * sqrt_t)
+    return d1, d1 - sigma * sqrt_t
+
+
+def bs_price(spot, strike, years, rate, sigma, is_call) -> np.ndarray:
+    d1, d2 = _d1_d2(spot, strike, years, rate, sigma)
+    discounted = strike * np.exp(-rate * years)
+    call = spot * norm_cdf(d1) - discounted * norm_cdf(d2)
+    # 看跌由平价关系得到
+    return np.where(is_call, call, call - spot + discounted)
+
+
+def bs_greeks(spot, strike, years, rate, sigma, is_call) -> Dict[str, np.ndarray]:
+    """delta / gamma / vega（每1个波动率百分点）/ theta（每自然日）"""
+    d1, d2 = _d1_d2(spot, strike, years, rate, sigma)
+    sqrt_t = np.sqrt(years)
+    pdf = norm_pdf(d1)
+    discounted = strike * np.exp(-rate * years)
+    cdf_d1, cdf_d2 = norm_cdf(d1), norm_cdf(d2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma = pdf / (spot * sigma * sqrt_t)
+        decay = -spot * pdf * sigma / (2 * sqrt_t)
+    theta = np.where(is_call, decay - rate * discounted * cdf_d2, decay + rate * discounted * (1 - cdf_d2))
+    return {
+        "delta": np.where(is_call, cdf_d1, cdf_d1 - 1),
+        "gamma": gamma,
+        "vega": spot * pdf * sqrt_t / 100,
+        "theta": theta / 365,
+    }
+
+
+def implied_vol(price, spot, strike, years, rate, is_call,
+                tol: float = IV_TOLERANCE, max_iter: int = IV_MAX_ITER) -> np.ndarray:
+    """
+    隐含波动率（全部合约同时 Newton 迭代）
+
+    每步按价格误差的符号收窄 [lo, hi] 区间，Newton 步落在区间外或 vega 过小时改取区间中点；
+    价格不在无套利区间内、已到期或未收敛的合约为 NaN
+    """
+    price, strike, years, is_call = (np.asarray(a, dtype=np.float64) for a in np.broadcast_arrays(
+        price, strike, years, is_call))
+    is_call = is_call.astype(bool)
+    sigma = np.full(price.shape, np.nan)
+    with np.errstate(invalid="ignore", over="ignore"):
+        discounted = strike * np.exp(-rate * years)
+        lower = np.where(is_call, np.maximum(spot - discounted, 0), np.maximum(discounted - spot, 0))
+        upper = np.where(is_call, spot, discounted)
+        active = np.flatnonzero(np.isfinite(price) & (years > 0) & (price > lower) & (price < upper))
+
+    target, k, t, call, disc = price[active], strike[active], years[active], is_call[active], discounted[active]
+    sqrt_t = np.sqrt(t)
+    # Brenner-Subrahmanyam 近似作为初值
+    s = np.clip(np.sqrt(2 * np.pi / t) * target / spot, 0.05, 2.0)
+    lo = np.full(len(active), VOL_MIN)
+    hi = np.full(len(active), VOL_MAX)
+    for _ in range(max_iter):
+        if not len(active):
+            break
+        d1 = (np.log(spot / k) + (rate + 0.5 * s * s) * t) / (s * sqrt_t)
+        model = spot * norm_cdf(d1) - disc * norm_cdf(d1 - s * sqrt_t)
+        diff = np.where(call, model, model - spot + disc) - target
+        done = (np.abs(diff) < tol) | (hi - lo < tol)
+        sigma[active[done]] = s[done]
+
+        hi = np.where(diff > 0, s, hi)
+        lo = np.where(diff < 0, s, lo)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = s - diff / (spot * norm_pdf(d1) * sqrt_t)
+        s = np.where((step > lo) & (step < hi), step, (lo + hi) / 2)
+
+        keep = ~done
+        active, target, k, t, call, disc, sqrt_t = (
+            active[keep], target[keep], k[keep], t[keep], call[keep], disc[keep], sqrt_t[keep])
+        s, lo, hi = s[keep], lo[keep], hi[keep]
+    return sigma
+
+
+# ==================== 期权链 ====================
+
+def expiry_close(market: str, expiry: str) -> datetime:
+    """到期日收市时间（带时区）"""
+    tz_name, spans = MARKET_SESSIONS[calendar_market(market)]
+    hour, minute = spans[-1][1].split(":")
+    return datetime.combine(date.fromisoformat(expiry[:10]), dtime(int(hour), int(minute)), ZoneInfo(tz_name))
+
+
+def _numeric(frame: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in frame.columns:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float64)
+
+
+@dataclass
+class OptionChain:
+    """某标的某到期日的期权链（列式）"""
+    underlying: str
+    expiry: str
+    expires_at: datetime
+    rate: float
+    codes: np.ndarray
+    names: np.ndarray
+    is_call: np.ndarray
+    strike: np.ndarray
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)  # 快照字段：bid/ask/last/price/volume/open_interest
+    spot: float = float("nan")
+    iv: Optional[np.ndarray] = None
+    greeks: Dict[str, np.ndarray] = field(default_factory=dict)
+    greeks_spot: float = float("nan")  # 计算希腊值时的标的价格
+    loaded_at: float = 0.0  # 链加载时间（monotonic）
+    quoted_at: float = 0.0  # 快照拉取时间（monotonic）
+    updated_at: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def years(self, now: datetime) -> float:
+        return (self.expires_at - now).total_seconds() / SECONDS_PER_YEAR
+
+    def apply_snapshot(self, frame: pd.DataFrame, spot: float, now: datetime):
+        """写入期权快照并重解隐含波动率与希腊值"""
+        frame = frame.set_index("code").reindex(self.codes)
+        bid, ask, last = _numeric(frame, "bid_price"), _numeric(frame, "ask_price"), _numeric(frame, "last_price")
+        # 有双边报价时取中间价，否则取最新价
+        quoted = (bid > 0) & (ask >= bid)
+        price = np.where(quoted, (bid + ask) / 2, np.where(last > 0, last, np.nan))
+        self.columns = {
+            "bid": bid, "ask": ask, "last": last, "price": price,
+            "volume": _numeric(frame, "volume"),
+            "open_interest": _numeric(frame, "option_open_interest"),
+        }
+        self.spot = spot
+        self.iv = implied_vol(price, spot, self.strike, self.years(now), self.rate, self.is_call)
+        self.quoted_at = time.monotonic()
+        self.compute_greeks(now)
+
+    def compute_greeks(self, now: datetime):
+        """按当前标的价格与已解出的隐含波动率重算希腊值（不重解隐含波动率）"""
+        self.greeks = bs_greeks(self.spot, self.strike, max(self.years(now), 0), self.rate, self.iv, self.is_call)
+        self.greeks_spot = self.spot
+        self.updated_at = now
+
+    def rows(self) -> List[Dict[str, Any]]:
+        def clean(v) -> Optional[float]:
+            return None if not np.isfinite(v) else round(float(v), 6)
+
+        values = {"iv": self.iv, **self.greeks, **self.columns}
+        return [
+            {
+                "option_code": code,
+                "name": self.names[j],
+                "option_type": "CALL" if self.is_call[j] else "PUT",
+                "strike_price": float(self.strike[j]),
+                **{name: clean(column[j]) for name, column in values.items()},
+            }
+            for j, code in enumerate(self.codes)
+        ]
+
+
+def build_chain(underlying: str, expiry: str, chain: pd.DataFrame, rate: float) -> OptionChain:
+    """get_option_chain 结果转为列式期权链（按行权价、看涨在前排序）"""
+    chain = chain.sort_values(["strike_price", "option_type"]).reset_index(drop=True)
+    return OptionChain(
+        underlying=underlying,
+        expiry=expiry,
+        expires_at=expiry_close(underlying, expiry),
+        rate=rate,
+        codes=chain["code"].to_numpy(dtype=object),
+        names=chain["name"].to_numpy(dtype=object),
+        is_call=(chain["option_type"] == ft.OptionType.CALL).to_numpy(),
+        strike=_numeric(chain, "strike_price"),
+        loaded_at=time.monotonic(),
+    )
+
+
+class OptionChains:
+    """期权链缓存（标的报价推送时增量重算希腊值）"""
+
+    def __init__(self, client, bus: QuoteBus = quote_bus, subscriptions: SubscriptionManager = subscription_manager,
+                 refresh_seconds: float = None, calendar: TradingCalendar = None):
+        self._client = client
+        self._bus = bus
+        self._subscriptions = subscriptions
+        self._refresh_seconds = settings.OPTION_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._calendar = calendar or trading_calendar
+        self._chains: Dict[Tuple[str, str], OptionChain] = {}
+        self._expiries: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._listening = False
+
+    @staticmethod
+    def rate(underlying: str) -> float:
+        return settings.OPTION_RISK_FREE_RATES.get(calendar_market(underlying), 0.0)
+
+    def _quote_ctx(self):
+        quote_ctx = self._client._quote_ctx
+        if not self._client.is_connected or quote_ctx is None:
+            raise Exception("OpenD未连接")
+        return quote_ctx
+
+    # ==================== 到期日与期权链 ====================
+
+    async def expiries(self, underlying: str) -> List[Dict[str, Any]]:
+        """未到期的到期日列表（strike_time / option_expiry_date_distance）"""
+        cached = self._expiries.get(underlying)
+        if cached is not None and time.monotonic() - cached[0] < CHAIN_TTL:
+            return cached[1]
+        quote_ctx = self._quote_ctx()
+        await limiter("get_option_expiration_date").acquire()
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(None, lambda: quote_ctx.get_option_expiration_date(underlying))
+        if ret != ft.RET_OK:
+            raise Exception(f"获取期权到期日失败: {data}")
+        rows = [
+            {"strike_time": str(row["strike_time"])[:10], "option_expiry_date_distance": int(row["option_expiry_date_distance"])}
+            for row in data.to_dict("records") if int(row["option_expiry_date_distance"]) >= 0
+        ]
+        self._expiries[underlying] = (time.monotonic(), rows)
+        return rows
+
+    async def _load_chain(self, underlying: str, expiry: str) -> OptionChain:
+        quote_ctx = self._quote_ctx()
+        await limiter("get_option_chain").acquire()
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(
+            None, lambda: quote_ctx.get_option_chain(underlying, start=expiry, end=expiry)
+        )
+        if ret != ft.RET_OK:
+            raise Exception(f"获取期权链失败: {data}")
+        if data.empty:
+            raise ValueError(f"{underlying} 在 {expiry} 没有到期的期权")
+        chain = build_chain(underlying, expiry, data, self.rate(underlying))
+        logger.info("期权链已加载: {} {} 共 {} 个合约", underlying, expiry, len(chain))
+        return chain
+
+    async def _load_snapshots(self, codes: List[str]) -> pd.DataFrame:
+        """分批拉取快照（标的放在第一批）"""
+        quote_ctx = self._quote_ctx()
+        loop = asyncio.get_event_loop()
+        rate = limiter("get_market_snapshot")
+
+        async def fetch(batch: List[str]) -> pd.DataFrame:
+            await rate.acquire()
+            ret, data = await loop.run_in_executor(None, lambda: quote_ctx.get_market_snapshot(batch))
+            if ret != ft.RET_OK:
+                raise Exception(f"获取期权快照失败: {data}")
+            return data
+
+        frames = await asyncio.gather(*(
+            fetch(codes[i:i + SNAPSHOT_BATCH_SIZE]) for i in range(0, len(codes), SNAPSHOT_BATCH_SIZE)
+        ))
+        return pd.concat(frames, ignore_index=True)
+
+    async def chain(self, underlying: str, expiry: Optional[str] = None) -> OptionChain:
+        """
+        期权链（含隐含波动率与希腊值）
+
+        expiry 为空时取最近的到期日；快照在刷新周期内复用，期间标的价格变化只重算希腊值
+        """
+        if expiry is None:
+            expiries = await self.expiries(underlying)
+            if not expiries:
+                raise ValueError(f"{underlying} 没有未到期的期权")
+            expiry = expiries[0]["strike_time"]
+        key = (underlying, expiry)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            chain = self._chains.pop(key, None)
+            now = self._calendar.now()
+            if chain is None or time.monotonic() - chain.loaded_at >= CHAIN_TTL:
+                chain = await self._load_chain(underlying, expiry)
+            # 重新插入以保持最近访问顺序
+            self._chains[key] = chain
+            await self._evict()
+
+            if time.monotonic() - chain.quoted_at >= self._refresh_seconds or chain.iv is None:
+                started = time.perf_counter()
+                frame = await self._load_snapshots([underlying, *chain.codes])
+                spot = self._pushed_spot(underlying)
+                if spot is None:
+                    row = frame.loc[frame["code"] == underlying, "last_price"]
+                    spot = float(row.iloc[0]) if len(row) else float("nan")
+                chain.apply_snapshot(frame[frame["code"] != underlying], spot, now)
+                logger.debug("期权链已刷新: {} {} {} 个合约, 耗时 {:.1f}ms",
+                             underlying, expiry, len(chain), (time.perf_counter() - started) * 1000)
+                await self._watch(underlying)
+            elif chain.spot != chain.greeks_spot or (now - chain.updated_at).total_seconds() >= GREEKS_MAX_AGE:
+                chain.compute_greeks(now)
+            return chain
+
+    # ==================== 标的报价推送 ====================
+
+    def _pushed_spot(self, underlying: str) -> Optional[float]:
+        if not self._subscriptions.is_active(underlying, ft.SubType.QUOTE):
+            return None
+        record = self._bus.latest_quote(underlying)
+        return float(record["last_price"]) if record is not None else None
+
+    async def _watch(self, underlying: str):
+        """订阅标的报价推送（低优先级，订阅不上时只在刷新快照时更新标的价格）"""
+        if not self._listening:
+            self._bus.add_listener("quote", self.on_quote)
+            self._listening = True
+        await self._subscriptions.acquire(self._consumer(underlying), [(underlying, ft.SubType.QUOTE)], PRIORITY_LOW)
+
+    async def _evict(self):
+        while len(self._chains) > MAX_CHAINS:
+            underlying, expiry = next(iter(self._chains))
+            del self._chains[(underlying, expiry)]
+            if not any(key[0] == underlying for key in self._chains):
+                await self._subscriptions.release(self._consumer(underlying))
+
+    @staticmethod
+    def _consumer(underlying: str) -> str:
+        return f"options:{underlying}"
+
+    def on_quote(self, kind: str, code: str, data: Dict[str, Any]):
+        """标的报价推送：更新已缓存期权链的标的价格并重算希腊值"""
+        try:
+            spot = float(data["last_price"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if not spot > 0:
+            return
+        now = None
+        for (underlying, _), chain in self._chains.items():
+            if underlying != code or chain.iv is None or spot == chain.spot:
+                continue
+            now = now or self._calendar.now()
+            chain.spot = spot
+            chain.compute_greeks(now)
+
+    def invalidate(self, underlying: Optional[str] = None):
+        for key in list(self._chains):
+            if underlying is None or key[0] == underlying:
+                del self._chains[key]
+
+
+# 全局期权链实例
+option_chains = OptionChains(futu_client)
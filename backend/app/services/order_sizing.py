@@ -0,0 +1,165 @@
+"""
+最大可买卖数量
+
+下单页输入代码/价格时实时估算最大可买、可卖数量，尽量不消耗交易接口额度：
+
+1. 账户状态（account_sync）在 MAX_QTY_CACHE_SECONDS 内查询过时，用缓存的现金购买力、
+   最大购买力与可卖持仓在本地计算（按每手股数向下取整）
+2. 否则查询 acctradinginfo_query（限频10次/30秒），结果换算为该标的的购买力后同样缓存，
+   之后任意价格都在本地换算；同一 (账户, 代码) 的并发请求共享同一次查询，同时在后台刷新账户状态
+
+订单推送会使账户缓存过期（见 AccountSync），成交/撤单后的首次查询回到 OpenD。
+融资购买力为账户币种，只用于同币种市场的本地估算；跨币种时只能由 OpenD 结果给出。
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.services.account_sync import AccountSync, account_sync
+from app.services.futu_client import futu_client
+from app.services.quote_bus import QuoteBus, trade_bus
+from app.services.security_master import SecurityMaster, security_master
+
+# 代码前缀 -> 交易币种
+MARKET_CURRENCIES = {"HK": "HKD", "US": "USD", "SH": "CNH", "SZ": "CNH"}
+
+
+@dataclass
+class Capacity:
+    """某账户买卖某标的的能力（金额为标的交易币种）"""
+    cash_power: float
+    margin_power: Optional[float]
+    sellable: int
+    source: str  # cache: 账户状态缓存；opend: acctradinginfo_query
+    as_of: datetime
+
+
+def max_quantities(price: float, lot_size: int, capacity: Capacity) -> Dict[str, Any]:
+    """按价格与每手股数换算最大可买/可卖股数（整手，零股单独列出）"""
+    lot_size = max(lot_size, 1)
+
+    def lots(amount: Optional[float]) -> Optional[int]:
+        if amount is None:
+            return None
+        # 容差避免 OpenD 结果换算回原价格时因浮点误差少算一手
+        return int(max(amount, 0) / (price * lot_size) + 1e-9) * lot_size
+
+    return {
+        "lot_size": lot_size,
+        "max_cash_buy": lots(capacity.cash_power),
+        "max_margin_buy": lots(capacity.margin_power),
+        "max_sell": capacity.sellable // lot_size * lot_size,
+        "odd_lot_sell": capacity.sellable % lot_size,
+        "source": capacity.source,
+        "as_of": capacity.as_of,
+    }
+
+
+def capacity_from_account(stock_code: str, positions: Dict[str, Any], balance: Dict[str, Any]) -> Optional[Capacity]:
+    """由缓存的持仓与资金得到买卖能力（缺少该币种现金购买力时为 None）"""
+    currency = MARKET_CURRENCIES.get(stock_code.split(".", 1)[0])
+    cash_power = (balance.get("cash_power") or {}).get(currency)
+    if cash_power is None:
+        return None
+    buying_power = balance.get("buying_power")
+    margin_power = buying_power if currency == balance.get("currency") and buying_power is not None else None
+    position = positions.get(stock_code)
+    return Capacity(
+        cash_power=cash_power,
+        margin_power=max(margin_power, cash_power) if margin_power is not None else None,
+        sellable=int(position["available_quantity"]) if position else 0,
+        source="cache",
+        as_of=datetime.now(),
+    )
+
+
+class OrderSizer:
+    """最大可买卖数量（账户缓存优先，OpenD查询合并与缓存）"""
+
+    def __init__(self, client, sync: AccountSync = account_sync, master: SecurityMaster = security_master,
+                 bus: Optional[QuoteBus] = None, max_age: float = None):
+        self._client = client
+        self._sync = sync
+        self._master = master
+        self.max_age = settings.MAX_QTY_CACHE_SECONDS if max_age is None else max_age
+        # (acc_id, 代码) -> (查询时间, 买卖能力)
+        self._capacities: Dict[Tuple[str, str], Tuple[float, Capacity]] = {}
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._warming: Optional[asyncio.Task] = None
+        self.queries = 0
+        if bus is not None:
+            # 订单状态变化后 OpenD 结果不再可用
+            bus.add_listener("order", lambda kind, code, data: self.invalidate())
+
+    async def max_qty(self, stock_code: str, price: float, acc_id: Optional[str] = None,
+                      order_type: str = "LIMIT") -> Dict[str, Any]:
+        if price <= 0:
+            raise ValueError("价格必须大于0")
+        acc_id = acc_id or self._client.active_account_id
+        if not acc_id:
+            raise Exception("未指定账户ID")
+        capacity = await self.capacity(acc_id, stock_code, price, order_type)
+        lot_size = await self._master.lot_size(stock_code)
+        return {"acc_id": acc_id, "stock_code": stock_code, "price": price,
+                **max_quantities(price, lot_size, capacity)}
+
+    async def capacity(self, acc_id: str, stock_code: str, price: float, order_type: str = "LIMIT") -> Capacity:
+        cached = self._sync.cached(acc_id, self.max_age)
+        if cached is not None:
+            capacity = capacity_from_account(stock_code, *cached)
+            if capacity is not None:
+                return capacity
+
+        key = (acc_id, stock_code)
+        entry = self._capacities.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.max_age:
+            return entry[1]
+
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(self._query(acc_id, stock_code, price, order_type))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+            self._warm(acc_id)
+        return await asyncio.shield(task)
+
+    async def _query(self, acc_id: str, stock_code: str, price: float, order_type: str) -> Capacity:
+        started = time.monotonic()
+        self.queries += 1
+        result = await self._client.get_max_trd_qtys(stock_code, price, order_type, acc_id=acc_id)
+        # 最大可买股数换算为购买力，之后其他价格在本地换算（整手取整会略微低估）
+        capacity = Capacity(
+            cash_power=result["max_cash_buy"] * price,
+            margin_power=result["max_cash_and_margin_buy"] * price,
+            sellable=result["max_position_sell"],
+            source="opend",
+            as_of=datetime.now(),
+        )
+        self._capacities[(acc_id, stock_code)] = (started, capacity)
+        return capacity
+
+    def _warm(self, acc_id: str):
+        """后台刷新账户状态，后续查询改为本地计算"""
+        if self._warming is not None and not self._warming.done():
+            return
+
+        async def refresh():
+            try:
+                await self._sync.refresh(acc_id)
+            except Exception as e:
+                logger.warning("[{}] 账户状态刷新失败: {}", acc_id, e)
+
+        self._warming = asyncio.ensure_future(refresh())
+
+    def invalidate(self, acc_id: Optional[str] = None):
+        for key in list(self._capacities):
+            if acc_id is None or key[0] == acc_id:
+                del self._capacities[key]
+
+
+# 全局最大可买卖数量计算实例
+order_sizer = OrderSizer(futu_client, bus=trade_bus)
@@ -0,0 +1,83 @@
+"""
+行情推送事件总线
+
+OpenD推送回调运行在SDK线程中，这里统一切换到事件循环线程后再分发给监听者。
+事件类型:
+- quote:  实时报价（StockQuoteHandlerBase）
+- ticker: 逐笔成交（TickerHandlerBase）
+- kline:  实时K线（CurKlineHandlerBase）
+
+交易推送（order: 订单状态，TradeOrderHandlerBase）使用独立的 trade_bus，不与行情事件混在一起。
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Any
+
+from app.utils.log import EventLog
+
+# 监听者签名: callback(kind, code, data)，在事件循环线程中同步调用，不应阻塞
+Listener = Callable[[str, str, Dict[str, Any]], None]
+
+EVENT_KINDS = ("quote", "ticker", "kline")
+
+_dispatch_log = EventLog("bus")
+
+
+def event_subtype(kind: str, data: Dict[str, Any]) -> str:
+    """事件对应的订阅类型（QUOTE / TICKER / K_1M 等）"""
+    if kind == "kline":
+        return data.get("k_type", "K_1M")
+    return kind.upper()
+
+
+class QuoteBus:
+    """行情推送事件总线"""
+
+    def __init__(self):
+        self._listeners: Dict[str, List[Listener]] = defaultdict(list)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._latest: Dict[str, Dict[str, Any]] = {}
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """绑定分发所在的事件循环（应用启动时调用）"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+
+    def add_listener(self, kind: str, callback: Listener):
+        """注册监听者，kind 为 '*' 时接收全部事件"""
+        self._listeners[kind].append(callback)
+
+    def remove_listener(self, kind: str, callback: Listener):
+        try:
+            self._listeners[kind].remove(callback)
+        except ValueError:
+            pass
+
+    def latest_quote(self, code: str) -> Optional[Dict[str, Any]]:
+        """最近一次推送的报价"""
+        return self._latest.get(code)
+
+    def publish(self, kind: str, code: str, data: Dict[str, Any]):
+        """发布事件，可在任意线程调用"""
+        loop = self._loop
+        if loop is None or threading.get_ident() == self._loop_thread_id:
+            self._dispatch(kind, code, data)
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(self._dispatch, kind, code, data)
+
+    def _dispatch(self, kind: str, code: str, data: Dict[str, Any]):
+        if kind == "quote":
+            self._latest[code] = data
+        for callback in (*self._listeners.get(kind, ()), *self._listeners.get("*", ())):
+            try:
+                callback(kind, code, data)
+            except Exception as e:
+                # 监听者异常可能随每条推送重复出现，限速输出
+                _dispatch_log.warning("行情事件处理异常 [{}] {}: {}", kind, code, e)
+
+
+# 全局事件总线实例
+quote_bus = QuoteBus()
+trade_bus = QuoteBus()
@@ -0,0 +1,145 @@
+"""
+下单参考数据：每手股数与最小价位
+
+在提交OpenD之前校验/规整委托价格和数量，无效订单不经网络往返、也不占用下单限频额度：
+
+- 每手股数按市场存成有序代码列表 + 整型数组，二分查找；由证券主数据加载时写入
+  （见 SecurityMaster.frame），尚未加载的市场只校验价格
+- 最小价位按价格区间存成区间上限/价位两个数组，二分查找：港股为联交所价位表（Part A），
+  美股1美元以下为0.0001、以上为0.01，A股为0.01
+
+规整时价格向不劣于原价的方向取整（买入向下、卖出向上），数量向下取整到整手；
+A股卖出允许零股（清仓余股），不校验整手。
+"""
+import math
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Tuple
+
+# 最小价位表：(区间上限, 价位)，价格 <= 上限时使用该价位（上限取值本身同时是下一档价位的整数倍）
+TICK_LADDERS: Dict[str, Tuple[array, array]] = {
+    "HK": (
+        array("d", [0.25, 0.5, 10, 20, 100, 200, 500, 1000, 2000, 5000, 9995]),
+        array("d", [0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5]),
+    ),
+    "US": (array("d", [1.0, math.inf]), array("d", [0.0001, 0.01])),
+    "CN": (array("d", [math.inf]), array("d", [0.01])),
+}
+
+# 价格范围（港股最低0.01、最高9995）
+PRICE_LIMITS = {"HK": (0.01, 9995.0), "US": (0.0001, math.inf), "CN": (0.01, math.inf)}
+
+# 代码前缀 -> 价位表市场
+TICK_MARKETS = {"HK": "HK", "US": "US", "SH": "CN", "SZ": "CN"}
+
+# 按价格规整的相对容差（浮点误差）
+_EPSILON = 1e-9
+
+
+class OrderRejected(ValueError):
+    """订单参数不合规（未提交OpenD）"""
+
+
+class _LotTable:
+    """单个市场的每手股数（有序代码 + 数组，二分查找）"""
+
+    def __init__(self, lots: Dict[str, int]):
+        self.codes = sorted(lots)
+        self.lots = array("l", (lots[c] for c in self.codes))
+
+    def get(self, code: str) -> Optional[int]:
+        i = bisect_left(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            return self.lots[i]
+        return None
+
+    def items(self) -> Dict[str, int]:
+        return dict(zip(self.codes, self.lots))
+
+
+class ReferenceData:
+    """每手股数与最小价位"""
+
+    def __init__(self):
+        self._lots: Dict[str, _LotTable] = {}
+
+    # ==================== 每手股数 ====================
+
+    def update_lots(self, market: str, codes: Iterable[str], lot_sizes: Iterable[int]):
+        """写入（合并）某市场的每手股数，整表重建后替换，查询无需加锁"""
+        lots = self._lots[market].items() if market in self._lots else {}
+        lots.update((code, int(lot)) for code, lot in zip(codes, lot_sizes) if int(lot) > 0)
+        self._lots[market] = _LotTable(lots)
+
+    def lot_size(self, stock_code: str) -> Optional[int]:
+        """每手股数（所属市场未加载或查不到时为 None）"""
+        table = self._lots.get(stock_code.split(".", 1)[0])
+        return table.get(stock_code) if table is not None else None
+
+    def loaded(self, market: str) -> int:
+        table = self._lots.get(market)
+        return len(table.codes) if table is not None else 0
+
+    # ==================== 最小价位 ====================
+
+    @staticmethod
+    def _market(stock_code: str) -> Optional[str]:
+        return TICK_MARKETS.get(stock_code.split(".", 1)[0])
+
+    def tick_size(self, stock_code: str, price: float) -> Optional[float]:
+        """price 所在区间的最小价位（不支持的市场为 None）"""
+        market = self._market(stock_code)
+        if market is None:
+            return None
+        uppers, ticks = TICK_LADDERS[market]
+        return ticks[min(bisect_left(uppers, price * (1 - _EPSILON)), len(ticks) - 1)]
+
+    def round_price(self, stock_code: str, price: float, side: str = "BUY") -> float:
+        """规整到最小价位：买入向下、卖出向上"""
+        tick = self.tick_size(stock_code, price)
+        if tick is None:
+            return price
+        steps = price / tick
+        steps = math.floor(steps + _EPSILON) if side == "BUY" else math.ceil(steps - _EPSILON)
+        # 各档上限都是本档价位的整数倍，取整结果不会越过本档
+        return round(steps * tick, 4)
+
+    def is_valid_price(self, stock_code: str, price: float) -> bool:
+        tick = self.tick_size(stock_code, price)
+        if tick is None:
+            return True
+        steps = price / tick
+        return abs(steps - round(steps)) < 1e-6
+
+    # ==================== 订单校验 ====================
+
+    def normalize_order(self, stock_code: str, side: str, price: float, quantity: int,
+                        order_type: str = "LIMIT", adjust: bool = False) -> Tuple[float, int]:
+        """
+        校验委托价格与数量，adjust=True 时规整到有效价位与整手，返回 (价格, 数量)
+
+        不合规（且不规整或规整后无效）时抛出 OrderRejected
+        """
+        market = self._market(stock_code)
+        lot_size = self.lot_size(stock_code)
+        if lot_size and quantity % lot_size and not (market == "CN" and side == "SELL"):
+            if not adjust:
+                raise OrderRejected(f"数量 {quantity} 不是每手股数 {lot_size} 的整数倍")
+            quantity = quantity // lot_size * lot_size
+        if quantity <= 0:
+            raise OrderRejected(f"数量必须为正数（每手 {lot_size or 1} 股）")
+
+        if order_type == "MARKET" or market is None:
+            return price, quantity
+        low, high = PRICE_LIMITS[market]
+        if not low <= price <= high:
+            raise OrderRejected(f"价格 {price} 超出有效范围 [{low}, {high}]")
+        if not self.is_valid_price(stock_code, price):
+            if not adjust:
+                raise OrderRejected(f"价格 {price} 不符合最小价位 {self.tick_size(stock_code, price)}")
+            price = self.round_price(stock_code, price, side)
+        return price, quantity
+
+
+# 全局参考数据实例
+reference_data = ReferenceData()
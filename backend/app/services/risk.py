@@ -0,0 +1,231 @@
+"""
+组合风险分析
+
+以本地日K线构造收益率矩阵（T×N），协方差、相关系数、个股波动率与Beta按日缓存；
+盘中持仓变化只重新计算权重向量相关的组合指标（w'Σw、R·w 等），不重建矩阵。
+"""
+import asyncio
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.services.kline_store import kline_store
+
+TRADING_DAYS = 252
+
+# 计算所需最少收益率样本数
+MIN_OBSERVATIONS = 20
+
+# 各市场默认基准指数
+BENCHMARKS = {
+    "HK": "HK.800000",
+    "US": "US..SPX",
+    "SH": "SH.000300",
+    "SZ": "SH.000300",
+}
+
+
+def returns_panel(series: Dict[str, np.ndarray], codes: List[str], lookback: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对齐多只股票的收盘价并计算日收益率
+
+    series 为 code -> KLINE_DTYPE 数组；返回 (时间戳, 收益率矩阵 T×N)。
+    停牌日沿用前一收盘价（收益为0），上市前的缺失收益记为0。
+    """
+    times = np.unique(np.concatenate([series[c]["time"] for c in codes]))[-(lookback + 1):]
+    closes = np.full((len(times), len(codes)), np.nan)
+    for j, code in enumerate(codes):
+        bars = series[code]
+        pos = np.searchsorted(times, bars["time"])
+        keep = (pos < len(times)) & (times[np.minimum(pos, len(times) - 1)] == bars["time"])
+        closes[pos[keep], j] = bars["close"][keep]
+
+    # 按列向前填充
+    idx = np.where(np.isnan(closes), 0, np.arange(len(times))[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = closes[idx, np.arange(len(codes))]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = filled[1:] / filled[:-1] - 1
+    returns[~np.isfinite(returns)] = 0.0
+    return times[1:], returns
+
+
+@dataclass
+class RiskModel:
+    """某日的收益率矩阵与协方差（与持仓权重无关的部分）"""
+    as_of: date
+    codes: List[str]
+    benchmark: str
+    returns: np.ndarray  # T×N
+    benchmark_returns: Optional[np.ndarray]  # T
+    covariance: np.ndarray = field(init=False)
+    volatility: np.ndarray = field(init=False)
+    correlation: np.ndarray = field(init=False)
+    beta: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.covariance = np.cov(self.returns, rowvar=False, ddof=1).reshape(len(self.codes), len(self.codes))
+        std = np.sqrt(np.diag(self.covariance))
+        self.volatility = std * np.sqrt(TRADING_DAYS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = self.covariance / np.outer(std, std)
+        corr[~np.isfinite(corr)] = 0.0
+        np.fill_diagonal(corr, 1.0)
+        self.correlation = corr
+
+        if self.benchmark_returns is not None:
+            b = self.benchmark_returns - self.benchmark_returns.mean()
+            var_b = b @ b / (len(b) - 1)
+            cov_b = (self.returns - self.returns.mean(axis=0)).T @ b / (len(b) - 1)
+            self.beta = cov_b / var_b if var_b > 0 else np.full(len(self.codes), np.nan)
+        else:
+            self.beta = np.full(len(self.codes), np.nan)
+
+
+def _tail_risk(pnl: np.ndarray, level: float) -> Tuple[float, float]:
+    """历史模拟 VaR / CVaR（以损失为正数）"""
+    cutoff = np.quantile(pnl, 1 - level)
+    tail = pnl[pnl <= cutoff]
+    return float(-cutoff), float(-tail.mean()) if len(tail) else float(-cutoff)
+
+
+def portfolio_risk(model: RiskModel, weights: np.ndarray, total_value: float,
+                   include_matrix: bool = True) -> Dict[str, Any]:
+    """按权重向量计算组合风险指标"""
+    cov = model.covariance
+    port_var = float(weights @ cov @ weights)
+    port_std = np.sqrt(max(port_var, 0.0))
+    pnl = model.returns @ weights
+
+    # 风险贡献：w_i * (Σw)_i / σ_p，合计为组合日波动；输出时换算为占比
+    marginal = cov @ weights
+    contribution = weights * marginal / port_std if port_std > 0 else np.zeros_like(weights)
+
+    var95, cvar95 = _tail_risk(pnl, 0.95)
+    var99, cvar99 = _tail_risk(pnl, 0.99)
+    abs_weights = np.abs(weights)
+    hhi = float(np.sum(abs_weights ** 2))
+    beta = float(np.nansum(weights * model.beta)) if not np.all(np.isnan(model.beta)) else None
+
+    report = {
+        "as_of": model.as_of,
+        "benchmark": model.benchmark,
+        "observations": len(model.returns),
+        "total_value": total_value,
+        "portfolio": {
+            "volatility": float(port_std * np.sqrt(TRADING_DAYS)),
+            "beta": beta,
+            "var_95": var95,
+            "cvar_95": cvar95,
+            "var_99": var99,
+            "cvar_99": cvar99,
+            "var_95_amount": var95 * total_value,
+            "cvar_95_amount": cvar95 * total_value,
+            "var_99_amount": var99 * total_value,
+            "cvar_99_amount": cvar99 * total_value,
+        },
+        "concentration": {
+            "hhi": hhi,
+            "effective_n": 1 / hhi if hhi > 0 else 0.0,
+            "max_weight": float(abs_weights.max()) if len(weights) else 0.0,
+            "top5_weight": float(np.sort(abs_weights)[::-1][:5].sum()),
+        },
+        "positions": [
+            {
+                "stock_code": code,
+                "weight": float(weights[i]),
+                "volatility": float(model.volatility[i]),
+                "beta": None if np.isnan(model.beta[i]) else float(model.beta[i]),
+                "risk_contribution": float(contribution[i] / port_std) if port_std > 0 else 0.0,
+            }
+            for i, code in enumerate(model.codes)
+        ],
+    }
+    if include_matrix:
+        report["correlation"] = np.round(model.correlation, 6).tolist()
+        report["covariance"] = (model.covariance * TRADING_DAYS).tolist()
+    return report
+
+
+class RiskEngine:
+    """组合风险计算（风险模型按日缓存）"""
+
+    def __init__(self, store=kline_store, lookback: int = TRADING_DAYS):
+        self._store = store
+        self._lookback = lookback
+        self._models: Dict[Tuple, RiskModel] = {}
+
+    async def _load_series(self, codes: List[str], client=None) -> Dict[str, np.ndarray]:
+        # 按自然日多取一些以覆盖节假日
+        start = (date.today() - timedelta(days=int(self._lookback * 1.6) + 10)).isoformat()
+        results = await asyncio.gather(
+            *(self._store.get(code, start, client=client) for code in codes), return_exceptions=True
+        )
+        series = {}
+        for code, result in zip(codes, results):
+            if isinstance(result, Exception):
+                logger.warning(f"风险分析获取K线失败: {code}: {result}")
+            elif len(result) > MIN_OBSERVATIONS:
+                series[code] = result
+        return series
+
+    def build_model(self, series: Dict[str, np.ndarray], codes: List[str], benchmark: str,
+                    as_of: Optional[date] = None) -> RiskModel:
+        """由K线构造风险模型，benchmark 不在 series 中时不计算Beta"""
+        panel_codes = codes + ([benchmark] if benchmark in series else [])
+        _, returns = returns_panel(series, panel_codes, self._lookback)
+        if len(returns) < MIN_OBSERVATIONS:
+            raise Exception(f"历史数据不足（{len(returns)} 个交易日）")
+        bench = returns[:, -1] if benchmark in series else None
+        return RiskModel(as_of or date.today(), codes, benchmark, returns[:, :len(codes)], bench)
+
+    async def model(self, codes: List[str], benchmark: str, client=None) -> RiskModel:
+        """当日风险模型（持仓标的集合不变时复用）"""
+        key = (date.today(), tuple(sorted(codes)), benchmark)
+        model = self._models.get(key)
+        if model is None:
+            series = await self._load_series(sorted(set(codes) | {benchmark}), client)
+            available = sorted(c for c in codes if c in series)
+            if not available:
+                raise Exception("持仓标的均无可用历史K线")
+            model = self.build_model(series, available, benchmark, key[0])
+            # 只保留当日模型
+            self._models = {k: v for k, v in self._models.items() if k[0] == key[0]}
+            self._models[key] = model
+            logger.info(f"风险模型已更新: {len(available)} 只标的, 基准 {benchmark}, {len(model.returns)} 个交易日")
+        return model
+
+    async def analyze(self, positions: List[Dict[str, Any]], benchmark: Optional[str] = None,
+                      client=None, include_matrix: bool = True,
+                      series: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+        """
+        持仓风险分析
+
+        - positions: get_positions 返回的持仓列表，按市值计算权重
+        - series: 直接指定K线（不经过K线存储与缓存，用于模拟数据）
+        """
+        values = {}
+        for p in positions:
+            if p["market_value"]:
+                values[p["stock_code"]] = values.get(p["stock_code"], 0.0) + float(p["market_value"])
+        if not values:
+            raise Exception("当前无持仓")
+        codes = sorted(values)
+        benchmark = benchmark or BENCHMARKS.get(codes[0].split(".", 1)[0], "HK.800000")
+
+        if series is not None:
+            model = self.build_model(series, [c for c in codes if c in series], benchmark)
+        else:
+            model = await self.model(codes, benchmark, client)
+        total = sum(values.values())
+        weights = np.array([values[c] for c in model.codes]) / total
+        report = portfolio_risk(model, weights, total, include_matrix)
+        report["excluded"] = [c for c in codes if c not in model.codes]
+        return report
+
+
+# 全局风险分析实例
+risk_engine = RiskEngine()
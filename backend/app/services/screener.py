@@ -0,0 +1,217 @@
+"""
+全市场选股
+
+从证券主数据取全市场代码，按快照接口单次上限分批拉取（受OpenD限频约束），
+整理成列式 float64 表后用 NumPy 向量化过滤排序。同一市场在刷新周期内的重复查询直接使用内存中的表。
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import futu as ft
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.config import settings
+from app.services.futu_client import SNAPSHOT_BATCH_SIZE, futu_client
+from app.services.security_master import security_master
+from app.services.trading_calendar import TradingCalendar, trading_calendar
+from app.utils.rate_limit import limiter
+
+# 可过滤/排序的数值字段（快照原始列 + 计算列 change_ratio）
+SCREEN_FIELDS = (
+    "last_price", "change_ratio", "volume", "turnover", "turnover_rate", "volume_ratio",
+    "amplitude", "pe_ratio", "pe_ttm_ratio", "pb_ratio", "total_market_val", "circular_market_val",
+)
+
+SCREEN_OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+# 同时在途的快照请求数
+SNAPSHOT_CONCURRENCY = 4
+
+
+@dataclass
+class MarketTable:
+    """某市场全部标的的列式快照"""
+    market: str
+    codes: np.ndarray
+    names: np.ndarray
+    suspended: np.ndarray
+    columns: Dict[str, np.ndarray]
+    updated_at: datetime
+    loaded_at: float = 0.0
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def build_table(market: str, frame: pd.DataFrame) -> MarketTable:
+    """快照DataFrame转列式表（"N/A" 等非数值记为 NaN，比较时自然被排除）"""
+    columns = {}
+    for field in SCREEN_FIELDS:
+        if field in frame.columns:
+            columns[field] = pd.to_numeric(frame[field], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            columns[field] = np.full(len(frame), np.nan)
+    prev_close = pd.to_numeric(frame["prev_close_price"], errors="coerce").to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_ratio = (columns["last_price"] - prev_close) / prev_close * 100
+    change_ratio[~(prev_close > 0)] = np.nan
+    columns["change_ratio"] = change_ratio
+
+    suspended = frame["suspension"].to_numpy(dtype=bool) if "suspension" in frame.columns \
+        else np.zeros(len(frame), dtype=bool)
+    return MarketTable(
+        market=market,
+        codes=frame["code"].to_numpy(dtype=object),
+        names=frame["name"].to_numpy(dtype=object) if "name" in frame.columns
+        else np.full(len(frame), "", dtype=object),
+        suspended=suspended,
+        columns=columns,
+        updated_at=datetime.now(),
+        loaded_at=time.monotonic(),
+    )
+
+
+def screen_table(
+    table: MarketTable,
+    filters: List[Dict[str, Any]],
+    sort_by: Optional[str] = None,
+    ascending: bool = False,
+    limit: int = 50,
+    include_suspended: bool = False,
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    向量化过滤排序
+
+    filters 为 [{"field", "op", "value"}]，各条件取交集；排序时缺失值排在最后。
+    返回 (命中数量, 前 limit 条记录)
+    """
+    mask = np.ones(len(table), dtype=bool)
+    if not include_suspended:
+        mask &= ~table.suspended
+    for item in filters:
+        field, op = item["field"], item["op"]
+        if field not in table.columns:
+            raise ValueError(f"不支持的筛选字段: {field}")
+        if op not in SCREEN_OPS:
+            raise ValueError(f"不支持的比较符: {op}")
+        mask &= SCREEN_OPS[op](table.columns[field], float(item["value"]))
+
+    index = np.flatnonzero(mask)
+    if sort_by is not None:
+        if sort_by not in table.columns:
+            raise ValueError(f"不支持的排序字段: {sort_by}")
+        values = table.columns[sort_by][index]
+        order = np.argsort(values if ascending else -values, kind="stable")
+        index = index[order]
+
+    rows = []
+    for i in index[:limit]:
+        row = {"stock_code": table.codes[i], "stock_name": table.names[i]}
+        for field, values in table.columns.items():
+            value = values[i]
+            row[field] = None if np.isnan(value) else float(value)
+        rows.append(row)
+    return len(index), rows
+
+
+class Screener:
+    """全市场选股（按市场缓存快照表）"""
+
+    def __init__(self, client, master, refresh_seconds: float = None, calendar: TradingCalendar = None):
+        self._client = client
+        self._master = master
+        self._refresh_seconds = settings.SCREENER_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._calendar = calendar or trading_calendar
+        self._tables: Dict[str, MarketTable] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _fresh(self, market: str) -> Optional[MarketTable]:
+        """刷新周期按交易时段调整（开盘/收盘前后缩短）；上次刷新后未经过交易时段时继续复用"""
+        table = self._tables.get(market)
+        if table is None:
+            return None
+        max_age = self._calendar.interval([market], self._refresh_seconds)
+        if self._calendar.is_stale(market, time.monotonic() - table.loaded_at, max_age):
+            return None
+        return table
+
+    async def table(self, market: str = "HK") -> MarketTable:
+        """市场快照表（刷新周期内复用，并发请求只触发一次刷新）"""
+        await self._calendar.ensure([market])
+        table = self._fresh(market)
+        if table is not None:
+            return table
+        lock = self._locks.setdefault(market, asyncio.Lock())
+        async with lock:
+            table = self._fresh(market)
+            if table is None:
+                started = time.perf_counter()
+                table = build_table(market, await self._load_snapshots(market))
+                self._tables[market] = table
+                logger.info(f"选股快照已刷新: {market} {len(table)} 只, 耗时 {time.perf_counter() - started:.2f}s")
+            return table
+
+    async def _load_snapshots(self, market: str) -> pd.DataFrame:
+        codes = await self._master.codes(market)
+        quote_ctx = self._client._quote_ctx
+        if not self._client.is_connected or quote_ctx is None:
+            raise Exception("OpenD未连接")
+
+        loop = asyncio.get_event_loop()
+        rate = limiter("get_market_snapshot")
+        semaphore = asyncio.Semaphore(SNAPSHOT_CONCURRENCY)
+
+        async def fetch(batch: List[str]) -> pd.DataFrame:
+            async with semaphore:
+                await rate.acquire()
+                ret, data = await loop.run_in_executor(None, lambda: quote_ctx.get_market_snapshot(batch))
+            if ret != ft.RET_OK:
+                raise Exception(f"获取快照失败: {data}")
+            return data
+
+        frames = await asyncio.gather(*(
+            fetch(codes[i:i + SNAPSHOT_BATCH_SIZE]) for i in range(0, len(codes), SNAPSHOT_BATCH_SIZE)
+        ))
+        if not frames:
+            raise Exception(f"市场 {market} 无可选标的")
+        return pd.concat(frames, ignore_index=True)
+
+    async def screen(
+        self,
+        market: str = "HK",
+        filters: List[Dict[str, Any]] = (),
+        sort_by: Optional[str] = None,
+        ascending: bool = False,
+        limit: int = 50,
+        include_suspended: bool = False,
+    ) -> Dict[str, Any]:
+        table = await self.table(market)
+        matched, rows = screen_table(table, list(filters), sort_by, ascending, limit, include_suspended)
+        return {
+            "market": market,
+            "total": len(table),
+            "matched": matched,
+            "updated_at": table.updated_at,
+            "rows": rows,
+        }
+
+    def invalidate(self, market: Optional[str] = None):
+        for key in list(self._tables):
+            if market is None or key == market:
+                del self._tables[key]
+
+
+# 全局选股实例
+screener = Screener(futu_client, security_master)
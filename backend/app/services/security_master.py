@@ -0,0 +1,130 @@
+"""
+证券主数据
+
+按市场缓存 get_stock_basicinfo 的结果（代码、名称、每手股数等），全天基本不变，
+到期后下次访问时重新加载；上次加载后未经过交易时段（夜间、周末）时不重新加载。
+每手股数同时写入下单参考数据（reference_data），供下单前校验。
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+import futu as ft
+import pandas as pd
+from loguru import logger
+
+from app.services.futu_client import futu_client
+from app.services.reference_data import ReferenceData, reference_data
+from app.services.trading_calendar import TradingCalendar, trading_calendar
+from app.utils.rate_limit import limiter
+
+# 市场前缀 -> ft.Market
+MARKETS = {
+    "HK": ft.Market.HK,
+    "US": ft.Market.US,
+    "SH": ft.Market.SH,
+    "SZ": ft.Market.SZ,
+}
+
+# 主数据缓存时长（秒）
+SECURITY_MASTER_TTL = 6 * 3600
+
+# get_owner_plate 单次最多200只
+OWNER_PLATE_BATCH_SIZE = 200
+
+
+class SecurityMaster:
+    """证券主数据缓存"""
+
+    def __init__(self, client, ttl: float = SECURITY_MASTER_TTL, calendar: TradingCalendar = None,
+                 reference: ReferenceData = None):
+        self._client = client
+        self._ttl = ttl
+        self._calendar = calendar or trading_calendar
+        self._reference = reference or reference_data
+        self._frames: Dict[Tuple[str, str], Tuple[float, pd.DataFrame]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        # 代码 -> 所属行业板块名称（查不到时为空字符串）
+        self._industries: Dict[str, str] = {}
+
+    async def frame(self, market: str = "HK", stock_type: str = ft.SecurityType.STOCK) -> pd.DataFrame:
+        """市场全部证券（get_stock_basicinfo 原始DataFrame）"""
+        if market not in MARKETS:
+            raise ValueError(f"不支持的市场: {market}")
+        key = (market, stock_type)
+        cached = self._frames.get(key)
+        if cached is not None and not self._expired(market, cached[0]):
+            return cached[1]
+
+        await self._calendar.ensure([market])
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self._frames.get(key)
+            if cached is not None and not self._expired(market, cached[0]):
+                return cached[1]
+            frame = await self._load(market, stock_type)
+            self._frames[key] = (time.monotonic(), frame)
+            if "lot_size" in frame.columns:
+                self._reference.update_lots(market, frame["code"], frame["lot_size"])
+            logger.info(f"证券主数据已加载: {market} {stock_type} 共 {len(frame)} 只")
+            return frame
+
+    def _expired(self, market: str, loaded_at: float) -> bool:
+        return self._calendar.is_stale(market, time.monotonic() - loaded_at, self._ttl)
+
+    async def _load(self, market: str, stock_type: str) -> pd.DataFrame:
+        quote_ctx = self._client._quote_ctx
+        if not self._client.is_connected or quote_ctx is None:
+            raise Exception("OpenD未连接")
+        loop = asyncio.get_event_loop()
+        ret, data = await loop.run_in_executor(
+            None,
+            lambda: quote_ctx.get_stock_basicinfo(market=MARKETS[market], stock_type=stock_type)
+        )
+        if ret != ft.RET_OK:
+            raise Exception(f"获取证券列表失败: {data}")
+        if "delisting" in data.columns:
+            data = data[~data["delisting"].astype(bool)]
+        return data.reset_index(drop=True)
+
+    async def codes(self, market: str = "HK", stock_type: str = ft.SecurityType.STOCK) -> List[str]:
+        return (await self.frame(market, stock_type))["code"].tolist()
+
+    async def lot_size(self, stock_code: str) -> int:
+        """每手股数（非股票或查不到时为1）"""
+        market = stock_code.split(".", 1)[0]
+        try:
+            frame = await self.frame(market)
+        except Exception as e:
+            logger.warning(f"获取每手股数失败: {stock_code}: {e}")
+            return 1
+        row = frame.loc[frame["code"] == stock_code, "lot_size"]
+        return int(row.iloc[0]) if len(row) and int(row.iloc[0]) > 0 else 1
+
+    async def industries(self, codes: List[str]) -> Dict[str, str]:
+        """所属行业板块（get_owner_plate 中 plate_type=INDUSTRY 的第一个），未连接时返回已缓存部分"""
+        missing = [c for c in dict.fromkeys(codes) if c not in self._industries]
+        quote_ctx = self._client._quote_ctx
+        if missing and self._client.is_connected and quote_ctx is not None:
+            loop = asyncio.get_event_loop()
+            for i in range(0, len(missing), OWNER_PLATE_BATCH_SIZE):
+                batch = missing[i:i + OWNER_PLATE_BATCH_SIZE]
+                await limiter("get_owner_plate").acquire()
+                ret, data = await loop.run_in_executor(None, lambda: quote_ctx.get_owner_plate(batch))
+                if ret != ft.RET_OK:
+                    logger.warning(f"获取所属板块失败: {data}")
+                    break
+                industry = data[data["plate_type"] == ft.Plate.INDUSTRY].drop_duplicates("code")
+                self._industries.update(dict.fromkeys(batch, ""))
+                self._industries.update(zip(industry["code"], industry["plate_name"]))
+        return {c: self._industries[c] for c in codes if self._industries.get(c)}
+
+    def invalidate(self, market: Optional[str] = None):
+        """清除缓存（market 为空时清除全部）"""
+        for key in list(self._frames):
+            if market is None or key[0] == market:
+                del self._frames[key]
+
+
+# 全局证券主数据实例
+security_master = SecurityMaster(futu_client)
@@ -0,0 +1,379 @@
+"""
+实盘策略运行时
+
+- 所有策略共用 QuoteBus 一路行情，订阅经 SubscriptionManager 按 (代码, 订阅类型) 引用计数，
+  多个策略关注同一标的只订阅一次，策略订阅为高优先级不会因额度不足被淘汰
+- 每个策略一个有界队列 + 一个消费协程，队列满时丢弃最旧事件，慢策略不会阻塞行情分发
+- 下单统一走 FutuClient.place_order（dry_run 时只记录不下单），数量按每手股数取整
+- 统计每个策略的事件数、丢弃数、处理延迟（入队到处理完成）与吞吐
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+from app.services.backtest import STRATEGIES
+from app.services.futu_client import FutuClient, futu_client
+from app.services.quote_bus import QuoteBus, event_subtype, quote_bus
+from app.services.security_master import SecurityMaster, security_master
+from app.services.subscription_manager import (
+    PRIORITY_HIGH, SubKey, SubscriptionManager, subscription_manager,
+)
+
+# 每个策略的事件队列长度
+DEFAULT_QUEUE_SIZE = 1024
+
+# 延迟统计保留的最近样本数
+LATENCY_SAMPLES = 1024
+
+
+class StrategyContext:
+    """策略可用的运行时接口"""
+
+    def __init__(self, runtime: "StrategyRuntime", strategy: "Strategy"):
+        self._runtime = runtime
+        self._strategy = strategy
+
+    async def place_order(self, stock_code: str, side: str, price: float, quantity: int,
+                          order_type: str = "LIMIT") -> Dict[str, Any]:
+        """下单（dry_run 策略只记录委托）"""
+        strategy = self._strategy
+        order = {
+            "stock_code": stock_code,
+            "side": side,
+            "price": price,
+            "quantity": quantity,
+            "order_type": order_type,
+            "created_at": datetime.now(),
+        }
+        if strategy.dry_run:
+            order["order_id"] = f"DRY-{strategy.strategy_id}-{len(strategy.orders) + 1}"
+            logger.info(f"[策略 {strategy.name}] 模拟下单 {side} {stock_code} {quantity}@{price}")
+        else:
+            result = await self._runtime.client.place_order(
+                stock_code, side, price, quantity, order_type, acc_id=strategy.acc_id
+            )
+            order["order_id"] = result["order_id"]
+            logger.info(f"[策略 {strategy.name}] 下单 {side} {stock_code} {quantity}@{price} -> {order['order_id']}")
+        strategy.orders.append(order)
+        self._runtime.stats(strategy.strategy_id).orders += 1
+        return order
+
+    async def lot_size(self, stock_code: str) -> int:
+        """每手股数（查不到时为1）"""
+        return await self._runtime.master.lot_size(stock_code)
+
+
+class Strategy:
+    """
+    策略基类
+
+    子类声明 symbols / subtypes 并实现 on_quote / on_bar / on_ticker，
+    处理函数在策略自己的协程中串行执行，可以 await 下单。
+    """
+
+    def __init__(self, strategy_id: str, name: str, symbols: List[str], subtypes: List[str],
+                 dry_run: bool = True, acc_id: Optional[str] = None):
+        self.strategy_id = strategy_id
+        self.name = name
+        self.symbols = list(symbols)
+        self.subtypes = list(subtypes)
+        self.dry_run = dry_run
+        self.acc_id = acc_id
+        self.orders: List[Dict[str, Any]] = []
+
+    @property
+    def subscriptions(self) -> Set[SubKey]:
+        return {(code, subtype) for code in self.symbols for subtype in self.subtypes}
+
+    async def on_start(self, ctx: StrategyContext):
+        pass
+
+    async def on_stop(self, ctx: StrategyContext):
+        pass
+
+    async def on_quote(self, ctx: StrategyContext, code: str, data: Dict[str, Any]):
+        pass
+
+    async def on_ticker(self, ctx: StrategyContext, code: str, data: Dict[str, Any]):
+        pass
+
+    async def on_bar(self, ctx: StrategyContext, code: str, data: Dict[str, Any]):
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        """策略状态（供API展示）"""
+        return {}
+
+
+class SignalStrategy(Strategy):
+    """
+    信号策略：复用回测的仓位信号（MA / MACD / GRID / DCA）
+
+    每根K线收盘（下一根K线的首次推送到达）时按收盘价序列计算目标仓位，
+    目标仓位变化时按最新价下限价单（数量按股取整）。
+    """
+
+    def __init__(self, strategy_id: str, name: str, strategy_type: str, stock_code: str,
+                 capital: float, params: Optional[Dict[str, Any]] = None, kline_type: str = "K_1M",
+                 history: int = 500, dry_run: bool = True, acc_id: Optional[str] = None):
+        if strategy_type not in STRATEGIES:
+            raise ValueError(f"不支持的策略类型: {strategy_type}")
+        super().__init__(strategy_id, name, [stock_code], [kline_type], dry_run=dry_run, acc_id=acc_id)
+        self.strategy_type = strategy_type
+        self.stock_code = stock_code
+        self.capital = capital
+        self.params = dict(params or {})
+        self.kline_type = kline_type
+        self._signal = STRATEGIES[strategy_type]
+        # 提前校验参数，避免运行后才报错
+        self._signal(np.linspace(1.0, 2.0, 8), **self.params)
+        self._closes: Deque[float] = deque(maxlen=history)
+        self._bar_time: Optional[str] = None
+        self._bar_close: Optional[float] = None
+        self.position = 0.0  # 目标仓位比例
+        self.shares = 0
+        self.cash = capital
+        self.last_price: Optional[float] = None
+
+    async def on_bar(self, ctx: StrategyContext, code: str, data: Dict[str, Any]):
+        time_key = data["time_key"]
+        close = float(data["close"])
+        self.last_price = close
+        if self._bar_time is not None and time_key != self._bar_time:
+            # 上一根K线已收盘
+            self._closes.append(self._bar_close)
+            await self._rebalance(ctx, close)
+        self._bar_time = time_key
+        self._bar_close = close
+
+    async def _rebalance(self, ctx: StrategyContext, price: float):
+        target = float(self._signal(np.fromiter(self._closes, dtype="f8"), **self.params)[-1])
+        if np.isnan(target) or abs(target - self.position) < 1e-9:
+            return
+        equity = self.cash + self.shares * price
+        quantity = int(abs(target * equity - self.shares * price) / price)
+        if quantity <= 0:
+            return
+        side = "BUY" if target > self.position else "SELL"
+        if side == "SELL":
+            quantity = min(quantity, self.shares)
+        # 按整手下单，不足一手时本根K线不调仓
+        lot_size = await ctx.lot_size(self.stock_code)
+        quantity = quantity // lot_size * lot_size
+        if quantity <= 0:
+            return
+        await ctx.place_order(self.stock_code, side, price, quantity)
+        # 按委托价估算持仓（未按成交回报修正）
+        signed = quantity if side == "BUY" else -quantity
+        self.shares += signed
+        self.cash -= signed * price
+        self.position = target
+
+    def snapshot(self) -> Dict[str, Any]:
+        price = self.last_price or 0.0
+        equity = self.cash + self.shares * price
+        return {
+            "type": self.strategy_type,
+            "stock_code": self.stock_code,
+            "capital": self.capital,
+            "params": self.params,
+            "kline_type": self.kline_type,
+            "position": self.position,
+            "shares": self.shares,
+            "profit": equity - self.capital if self.last_price else 0.0,
+            "bars": len(self._closes),
+        }
+
+
+@dataclass
+class RunnerStats:
+    """单个策略的运行统计"""
+    received: int = 0
+    processed: int = 0
+    dropped: int = 0
+    errors: int = 0
+    orders: int = 0
+    started_at: Optional[float] = None
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        samples = np.array(self.latencies) * 1000 if self.latencies else None
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "orders": self.orders,
+            "throughput": self.processed / elapsed if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "p50": float(np.percentile(samples, 50)),
+                "p99": float(np.percentile(samples, 99)),
+                "max": float(samples.max()),
+            } if samples is not None else None,
+        }
+
+
+class _Runner:
+    """单个策略的事件队列与消费协程"""
+
+    def __init__(self, strategy: Strategy, ctx: StrategyContext, queue_size: int):
+        self.strategy = strategy
+        self.ctx = ctx
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = RunnerStats()
+        self.task: Optional[asyncio.Task] = None
+        self._handlers = {
+            "quote": strategy.on_quote,
+            "ticker": strategy.on_ticker,
+            "kline": strategy.on_bar,
+        }
+
+    def offer(self, kind: str, code: str, data: Dict[str, Any], enqueued_at: float):
+        self.stats.received += 1
+        if self.queue.full():
+            # 丢弃最旧的事件，保留最新行情
+            self.queue.get_nowait()
+            self.stats.dropped += 1
+        self.queue.put_nowait((kind, code, data, enqueued_at))
+
+    async def run(self):
+        self.stats.started_at = time.monotonic()
+        while True:
+            kind, code, data, enqueued_at = await self.queue.get()
+            try:
+                await self._handlers[kind](self.ctx, code, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"[策略 {self.strategy.name}] 处理 {kind} {code} 异常: {e}")
+            self.stats.processed += 1
+            self.stats.latencies.append(time.perf_counter() - enqueued_at)
+
+
+class StrategyRuntime:
+    """策略运行时"""
+
+    def __init__(self, bus: QuoteBus, client: FutuClient, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 subscriptions: Optional[SubscriptionManager] = None, master: Optional[SecurityMaster] = None):
+        self.client = client
+        self.subscriptions = subscriptions or SubscriptionManager(client)
+        self.master = master or security_master
+        self._bus = bus
+        self._queue_size = queue_size
+        self._strategies: Dict[str, Strategy] = {}
+        self._runners: Dict[str, _Runner] = {}
+        self._stats: Dict[str, RunnerStats] = {}
+        self._routes: Dict[SubKey, Set[_Runner]] = defaultdict(set)
+        self._lock = asyncio.Lock()
+        bus.add_listener("*", self._on_event)
+
+    # ==================== 策略管理 ====================
+
+    def add(self, strategy: Strategy):
+        if strategy.strategy_id in self._strategies:
+            raise ValueError(f"策略已存在: {strategy.strategy_id}")
+        self._strategies[strategy.strategy_id] = strategy
+        self._stats[strategy.strategy_id] = RunnerStats()
+
+    def get(self, strategy_id: str) -> Optional[Strategy]:
+        return self._strategies.get(strategy_id)
+
+    def is_running(self, strategy_id: str) -> bool:
+        return strategy_id in self._runners
+
+    def stats(self, strategy_id: str) -> RunnerStats:
+        runner = self._runners.get(strategy_id)
+        return runner.stats if runner else self._stats[strategy_id]
+
+    def list_strategies(self) -> List[Dict[str, Any]]:
+        return [self.describe(sid) for sid in self._strategies]
+
+    def describe(self, strategy_id: str) -> Dict[str, Any]:
+        strategy = self._strategies[strategy_id]
+        return {
+            "id": strategy_id,
+            "name": strategy.name,
+            "enabled": self.is_running(strategy_id),
+            "dry_run": strategy.dry_run,
+            "symbols": strategy.symbols,
+            "subtypes": strategy.subtypes,
+            "stats": self.stats(strategy_id).to_dict(),
+            **strategy.snapshot(),
+        }
+
+    async def remove(self, strategy_id: str):
+        await self.stop(strategy_id)
+        self._strategies.pop(strategy_id, None)
+        self._stats.pop(strategy_id, None)
+
+    async def start(self, strategy_id: str):
+        """启动策略：订阅所需行情并开始消费事件"""
+        strategy = self._strategies.get(strategy_id)
+        if strategy is None:
+            raise ValueError(f"策略不存在: {strategy_id}")
+        if strategy_id in self._runners:
+            return
+        runner = _Runner(strategy, StrategyContext(self, strategy), self._queue_size)
+        keys = strategy.subscriptions
+        async with self._lock:
+            consumer = f"strategy:{strategy_id}"
+            active = await self.subscriptions.acquire(consumer, keys, PRIORITY_HIGH)
+            if self.client.is_connected and active != keys:
+                await self.subscriptions.release(consumer)
+                raise Exception(f"订阅失败或额度不足: {sorted(keys - active)}")
+            for key in keys:
+                self._routes[key].add(runner)
+        self._runners[strategy_id] = runner
+        await strategy.on_start(runner.ctx)
+        runner.task = asyncio.create_task(runner.run(), name=f"strategy-{strategy_id}")
+        logger.info(f"[策略 {strategy.name}] 已启动，订阅 {sorted(keys)}")
+
+    async def stop(self, strategy_id: str):
+        runner = self._runners.pop(strategy_id, None)
+        if runner is None:
+            return
+        keys = runner.strategy.subscriptions
+        async with self._lock:
+            for key in keys:
+                self._routes[key].discard(runner)
+                if not self._routes[key]:
+                    del self._routes[key]
+            await self.subscriptions.release(f"strategy:{strategy_id}")
+        runner.task.cancel()
+        try:
+            await runner.task
+        except asyncio.CancelledError:
+            pass
+        self._stats[strategy_id] = runner.stats
+        await runner.strategy.on_stop(runner.ctx)
+        logger.info(f"[策略 {runner.strategy.name}] 已停止")
+
+    async def shutdown(self):
+        for strategy_id in list(self._runners):
+            await self.stop(strategy_id)
+
+    # ==================== 订阅与分发 ====================
+
+    @property
+    def subscription_count(self) -> int:
+        return len(self._routes)
+
+    def _on_event(self, kind: str, code: str, data: Dict[str, Any]):
+        runners = self._routes.get((code, event_subtype(kind, data)))
+        if not runners:
+            return
+        now = time.perf_counter()
+        for runner in runners:
+            runner.offer(kind, code, data, now)
+
+
+# 全局策略运行时
+strategy_runtime = StrategyRuntime(quote_bus, futu_client, subscriptions=subscription_manager)
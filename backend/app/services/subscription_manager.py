@@ -0,0 +1,243 @@
+"""
+行情订阅额度管理
+
+OpenD按账户等级限制同时持有的 (代码, 订阅类型) 订阅数量，且订阅后至少保持1分钟才能退订。
+所有消费者（WebSocket、策略等）的订阅在此按 (代码, 订阅类型) 统一做引用计数：
+
+- 首个消费者触发OpenD订阅；最后一个消费者释放后进入空闲，到达最短持有时间后才退订
+  （期间再次使用无需重新订阅）
+- 额度不足时先回收空闲订阅，再按最近使用时间（LRU）淘汰不高于请求方优先级的订阅；
+  高优先级（策略）订阅不会被淘汰
+- 被淘汰或暂时订阅不上的条目保持登记（pending），额度释放后按优先级、最近使用时间自动补订
+- 消费者通过 is_active() 判断推送是否可用，不可用时自行退回快照轮询
+
+额度与LRU状态在本进程内维护。共享行情模式（MARKET_DATA_MODE=shared）下多个 API worker
+经同一个行情进程订阅，额度按 API_WORKERS 平分（见 worker_quota），各 worker 合计不超过OpenD额度；
+不同 worker 订阅同一条目时行情进程只订阅一次，平分偏保守。
+"""
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.services.futu_client import futu_client
+
+SubKey = Tuple[str, str]  # (code, subtype)
+
+# 消费者优先级
+PRIORITY_LOW = 0      # 行情展示（WebSocket），可被淘汰并退回快照轮询
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2     # 依赖推送的消费者（策略），不参与淘汰
+
+
+@dataclass
+class _Entry:
+    consumers: Dict[str, int] = field(default_factory=dict)  # 消费者 -> 优先级
+    subscribed_at: Optional[float] = None  # None 表示尚未订阅（pending）
+    last_used: float = 0.0
+
+    @property
+    def priority(self) -> int:
+        """条目优先级取消费者中最高者，空闲条目为 -1"""
+        return max(self.consumers.values(), default=-1)
+
+
+def worker_quota(quota: int = None, mode: str = None, workers: int = None) -> int:
+    """本进程可用的订阅额度：共享行情模式下按 worker 数平分（至少1）"""
+    quota = settings.SUBSCRIPTION_QUOTA if quota is None else quota
+    mode = mode or settings.MARKET_DATA_MODE
+    workers = settings.API_WORKERS if workers is None else workers
+    if mode == "shared" and workers > 1:
+        return max(quota // workers, 1)
+    return quota
+
+
+def _group_by_subtype(keys) -> Dict[str, List[str]]:
+    grouped: Dict[str, List[str]] = defaultdict(list)
+    for code, subtype in sorted(keys):
+        grouped[subtype].append(code)
+    return grouped
+
+
+class SubscriptionManager:
+    """订阅引用计数 + 额度管理"""
+
+    def __init__(self, client, quota: Optional[int] = None,
+                 min_hold: float = settings.SUBSCRIPTION_MIN_HOLD_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._client = client
+        self.quota = worker_quota() if quota is None else quota
+        self.min_hold = min_hold
+        self._clock = clock
+        self._entries: Dict[SubKey, _Entry] = {}
+        self._consumers: Dict[str, Set[SubKey]] = defaultdict(set)
+        self._used = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.evictions = 0
+
+    # ==================== 查询 ====================
+
+    @property
+    def used(self) -> int:
+        """已占用的OpenD订阅额度"""
+        return self._used
+
+    def is_active(self, code: str, subtype: str) -> bool:
+        """该条目当前是否已在OpenD订阅（推送可用）"""
+        entry = self._entries.get((code, subtype))
+        return entry is not None and entry.subscribed_at is not None
+
+    def keys(self, consumer: str) -> Set[SubKey]:
+        return set(self._consumers.get(consumer, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries.values()
+        return {
+            "quota": self.quota,
+            "used": self._used,
+            "idle": sum(1 for e in entries if not e.consumers),
+            "pending": sum(1 for e in entries if e.subscribed_at is None),
+            "consumers": len(self._consumers),
+            "evictions": self.evictions,
+        }
+
+    # ==================== 登记与释放 ====================
+
+    async def acquire(self, consumer: str, keys: Iterable[SubKey], priority: int = PRIORITY_NORMAL) -> Set[SubKey]:
+        """登记消费者并尽量完成订阅，返回其中已订阅（推送可用）的条目"""
+        keys = set(keys)
+        async with self._lock:
+            now = self._clock()
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = _Entry()
+                entry.consumers[consumer] = priority
+                entry.last_used = now
+            self._consumers[consumer] |= keys
+            pending = sorted(k for k in keys if self._entries[k].subscribed_at is None)
+            if pending and self._client.is_connected:
+                shortage = len(pending) - (self.quota - self._used)
+                if shortage > 0:
+                    await self._evict(shortage, priority, now)
+                await self._subscribe(pending[:max(self.quota - self._used, 0)], now)
+                missing = sum(1 for k in pending if self._entries[k].subscribed_at is None)
+                if missing:
+                    logger.warning(f"订阅额度不足（{self._used}/{self.quota}），{consumer} 有 {missing} 个订阅等待空闲额度")
+            return {k for k in keys if self._entries[k].subscribed_at is not None}
+
+    async def release(self, consumer: str, keys: Optional[Iterable[SubKey]] = None):
+        """释放消费者的订阅（keys 为空时释放全部）；空闲条目到达最短持有时间后退订"""
+        async with self._lock:
+            held = self._consumers.get(consumer, set())
+            keys = set(held) if keys is None else set(keys) & held
+            now = self._clock()
+            for key in keys:
+                entry = self._entries[key]
+                entry.consumers.pop(consumer, None)
+                entry.last_used = now
+                if not entry.consumers and entry.subscribed_at is None:
+                    del self._entries[key]
+            held -= keys
+            if not held:
+                self._consumers.pop(consumer, None)
+            await self._reap(now)
+
+    async def reap(self):
+        """退订到期的空闲条目，并用空出的额度补订等待中的条目"""
+        async with self._lock:
+            await self._reap(self._clock())
+
+    # ==================== 内部实现 ====================
+
+    async def _reap(self, now: float):
+        idle = [k for k, e in self._entries.items() if not e.consumers and e.subscribed_at is not None]
+        due = [k for k in idle if now - self._entries[k].subscribed_at >= self.min_hold]
+        if due:
+            await self._unsubscribe(due)
+        await self._promote(now)
+        # 未到期的空闲条目到期时再检查
+        waiting = [self._entries[k].subscribed_at + self.min_hold - now
+                   for k in idle if k in self._entries and self._entries[k].subscribed_at is not None]
+        self._schedule(min(waiting) if waiting else None)
+
+    async def _promote(self, now: float):
+        free = self.quota - self._used
+        if free <= 0 or not self._client.is_connected:
+            return
+        pending = [k for k, e in self._entries.items() if e.consumers and e.subscribed_at is None]
+        if pending:
+            pending.sort(key=lambda k: (-self._entries[k].priority, -self._entries[k].last_used))
+            await self._subscribe(pending[:free], now)
+
+    async def _evict(self, needed: int, priority: int, now: float) -> int:
+        """
+        回收额度：先空闲条目，再按最近使用时间从旧到新淘汰不高于 priority 的非高优先级条目
+
+        未到最短持有时间的条目无法退订，不参与回收
+        """
+        candidates = []
+        for key, entry in self._entries.items():
+            if entry.subscribed_at is None or now - entry.subscribed_at < self.min_hold:
+                continue
+            level = entry.priority
+            if level >= PRIORITY_HIGH or level > priority:
+                continue
+            candidates.append((level >= 0, entry.last_used, key))
+        candidates.sort()
+        victims = [key for _, _, key in candidates[:needed]]
+        active = {k for k in victims if self._entries[k].consumers}
+        freed = await self._unsubscribe(victims)
+        evicted = [k for k in freed if k in active]
+        if evicted:
+            self.evictions += len(evicted)
+            logger.info(f"订阅额度不足，淘汰最久未使用的订阅: {evicted}")
+        return len(freed)
+
+    async def _subscribe(self, keys: List[SubKey], now: float):
+        for subtype, codes in _group_by_subtype(keys).items():
+            try:
+                await self._client.subscribe(codes, [subtype])
+            except Exception as e:
+                logger.warning(f"订阅 {subtype} {codes} 失败: {e}")
+                continue
+            for code in codes:
+                self._entries[(code, subtype)].subscribed_at = now
+            self._used += len(codes)
+
+    async def _unsubscribe(self, keys: List[SubKey]) -> List[SubKey]:
+        """退订并更新登记，返回成功退订的条目（断开连接时订阅已随连接失效，直接清除）"""
+        freed = []
+        for subtype, codes in _group_by_subtype(keys).items():
+            if self._client.is_connected:
+                try:
+                    await self._client.unsubscribe(codes, [subtype])
+                except Exception as e:
+                    logger.debug(f"退订 {subtype} {codes} 失败: {e}")
+                    continue
+            for code in codes:
+                key = (code, subtype)
+                entry = self._entries[key]
+                entry.subscribed_at = None
+                if not entry.consumers:
+                    del self._entries[key]
+                freed.append(key)
+            self._used -= len(codes)
+        return freed
+
+    def _schedule(self, delay: Optional[float]):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if delay is not None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(max(delay, 0.0), lambda: loop.create_task(self.reap()))
+
+
+# 全局订阅管理器（WebSocket与策略共用一份额度）
+subscription_manager = SubscriptionManager(futu_client)
@@ -0,0 +1,267 @@
+"""
+交易日历与交易时段
+
+按 (市场, 年份) 缓存 request_trading_days 的结果，结合各市场交易时段判断当前所处阶段，
+供周期任务（WebSocket轮询、选股快照刷新、证券主数据重载等）调度：
+
+- 交易时段内按基础间隔运行，开盘/收盘前后 EDGE_MINUTES 分钟内加快
+- 午休、收盘后、非交易日暂停，休眠到下一时段开始（最长 MAX_IDLE_SECONDS，之后重新判断）
+- 缓存数据在两次加载之间没有经过任何交易时段时视为未过期
+
+OpenD未连接或查询失败时按周一至周五为交易日处理（不含节假日），稍后重试。
+"""
+import asyncio
+import time
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import futu as ft
+from loguru import logger
+
+from app.services.futu_client import futu_client
+from app.utils.rate_limit import limiter
+
+# 代码前缀 -> 日历市场（A股沪深共用一个日历）
+CODE_MARKETS = {"HK": "HK", "US": "US", "SH": "CN", "SZ": "CN", "CN": "CN"}
+
+TRADE_DATE_MARKETS = {
+    "HK": ft.TradeDateMarket.HK,
+    "US": ft.TradeDateMarket.US,
+    "CN": ft.TradeDateMarket.CN,
+}
+
+# 各市场时区与常规交易时段（当地时间，港股含收市竞价时段）
+MARKET_SESSIONS: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {
+    "HK": ("Asia/Hong_Kong", [("09:30", "12:00"), ("13:00", "16:10")]),
+    "US": ("America/New_York", [("09:30", "16:00")]),
+    "CN": ("Asia/Shanghai", [("09:30", "11:30"), ("13:00", "15:00")]),
+}
+
+# 半日市（trade_date_type=MORNING）收市时间
+HALF_DAY_CLOSE = {"HK": "12:10", "US": "13:00", "CN": "11:30"}
+
+# 开盘后/收盘前加快刷新的时长（分钟）与间隔系数
+EDGE_MINUTES = 15
+EDGE_FACTOR = 0.5
+
+# 休市期间单次最长休眠（秒）
+MAX_IDLE_SECONDS = 300
+
+# 交易日缓存时长；查询失败后的重试间隔（秒）
+CALENDAR_TTL = 24 * 3600
+CALENDAR_RETRY_SECONDS = 600
+
+# 阶段
+PHASE_OPEN = "OPEN"
+PHASE_BREAK = "BREAK"      # 午休
+PHASE_CLOSED = "CLOSED"    # 开盘前、收盘后或非交易日
+
+
+def calendar_market(market_or_code: str) -> str:
+    """代码或市场前缀对应的日历市场，如 HK.00700 -> HK，SZ -> CN"""
+    prefix = market_or_code.split(".", 1)[0].upper()
+    market = CODE_MARKETS.get(prefix)
+    if market is None:
+        raise ValueError(f"不支持的市场: {market_or_code}")
+    return market
+
+
+def _clock_time(value: str) -> dtime:
+    hour, minute = value.split(":")
+    return dtime(int(hour), int(minute))
+
+
+class TradingCalendar:
+    """交易日历缓存与时段计算"""
+
+    def __init__(self, client, clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc)):
+        self._client = client
+        self._clock = clock
+        # (市场, 年份) -> {交易日: trade_date_type}
+        self._days: Dict[Tuple[str, int], Dict[date, str]] = {}
+        self._loaded_at: Dict[Tuple[str, int], float] = {}
+        self._failed_at: Dict[Tuple[str, int], float] = {}
+        self._locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+
+    def now(self) -> datetime:
+        return self._clock()
+
+    # ==================== 交易日 ====================
+
+    async def ensure(self, markets: Iterable[str], year: Optional[int] = None):
+        """加载当年（或指定年份）交易日，已缓存或最近失败过时直接返回"""
+        year = year or self.now().year
+        for market in {calendar_market(m) for m in markets}:
+            key = (market, year)
+            if not self._expired(key):
+                continue
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                if self._expired(key):
+                    await self._load(key)
+
+    def _expired(self, key: Tuple[str, int]) -> bool:
+        now = time.monotonic()
+        failed = self._failed_at.get(key)
+        if failed is not None and now - failed < CALENDAR_RETRY_SECONDS:
+            return False
+        loaded = self._loaded_at.get(key)
+        return loaded is None or now - loaded >= CALENDAR_TTL
+
+    async def _load(self, key: Tuple[str, int]):
+        market, year = key
+        quote_ctx = self._client._quote_ctx
+        if not self._client.is_connected or quote_ctx is None:
+            self._failed_at[key] = time.monotonic()
+            return
+        await limiter("request_trading_days").acquire()
+        loop = asyncio.get_event_loop()
+        try:
+            ret, data = await loop.run_in_executor(
+                None,
+                lambda: quote_ctx.request_trading_days(
+                    market=TRADE_DATE_MARKETS[market], start=f"{year}-01-01", end=f"{year}-12-31"
+                )
+            )
+        except Exception as e:
+            ret, data = ft.RET_ERROR, e
+        if ret != ft.RET_OK:
+            logger.warning("[{}] 获取{}年交易日失败，按工作日处理: {}", market, year, data)
+            self._failed_at[key] = time.monotonic()
+            return
+        self._days[key] = {
+            date.fromisoformat(str(row["time"])[:10]): row.get("trade_date_type", ft.TradeDateType.WHOLE)
+            for row in data
+        }
+        self._loaded_at[key] = time.monotonic()
+        self._failed_at.pop(key, None)
+        logger.info("[{}] {}年交易日已加载: {} 天", market, year, len(self._days[key]))
+
+    def day_type(self, market: str, day: date) -> Optional[str]:
+        """交易日类型（WHOLE / MORNING / AFTERNOON），非交易日为 None"""
+        market = calendar_market(market)
+        days = self._days.get((market, day.year))
+        if days is None:
+            return ft.TradeDateType.WHOLE if day.weekday() < 5 else None
+        return days.get(day)
+
+    async def trading_days(self, market: str, start: date, end: date) -> List[Dict[str, str]]:
+        """区间内交易日列表（跨年时逐年加载）"""
+        for year in range(start.year, end.year + 1):
+            await self.ensure([market], year)
+        result = []
+        day = start
+        while day <= end:
+            day_type = self.day_type(market, day)
+            if day_type is not None:
+                result.append({"date": day.isoformat(), "trade_date_type": day_type})
+            day += timedelta(days=1)
+        return result
+
+    # ==================== 交易时段 ====================
+
+    def sessions(self, market: str, day: date) -> List[Tuple[datetime, datetime]]:
+        """某日的交易时段（带时区），非交易日为空"""
+        market = calendar_market(market)
+        day_type = self.day_type(market, day)
+        if day_type is None:
+            return []
+        tz_name, spans = MARKET_SESSIONS[market]
+        spans = [(_clock_time(start), _clock_time(end)) for start, end in spans]
+        noon = dtime(12)
+        if day_type == ft.TradeDateType.MORNING:
+            # 半日市：只有上午时段，收市时间提前
+            spans = [span for span in spans if span[0] < noon]
+            spans[-1] = (spans[-1][0], _clock_time(HALF_DAY_CLOSE[market]))
+        elif day_type == ft.TradeDateType.AFTERNOON:
+            spans = [span for span in spans if span[0] >= noon] or spans
+        tz = ZoneInfo(tz_name)
+        return [(datetime.combine(day, start, tz), datetime.combine(day, end, tz)) for start, end in spans]
+
+    def _local_date(self, market: str, moment: datetime) -> date:
+        return moment.astimezone(ZoneInfo(MARKET_SESSIONS[calendar_market(market)][0])).date()
+
+    def phase(self, market: str, now: Optional[datetime] = None) -> str:
+        now = now or self.now()
+        sessions = self.sessions(market, self._local_date(market, now))
+        if any(start <= now < end for start, end in sessions):
+            return PHASE_OPEN
+        if sessions and sessions[0][0] <= now < sessions[-1][1]:
+            return PHASE_BREAK
+        return PHASE_CLOSED
+
+    def next_open(self, market: str, now: Optional[datetime] = None) -> Optional[datetime]:
+        """下一个时段开始时间（当前处于时段内时返回当前时段开始时间），两周内无交易日时为 None"""
+        now = now or self.now()
+        day = self._local_date(market, now)
+        for offset in range(15):
+            for start, end in self.sessions(market, day + timedelta(days=offset)):
+                if now < end:
+                    return start
+        return None
+
+    def status(self, market: str, now: Optional[datetime] = None) -> Dict[str, object]:
+        now = now or self.now()
+        next_open = self.next_open(market, now)
+        return {
+            "market": calendar_market(market),
+            "phase": self.phase(market, now),
+            "next_open": next_open if next_open and next_open > now else None,
+            "sessions": [
+                {"start": start, "end": end}
+                for start, end in self.sessions(market, self._local_date(market, now))
+            ],
+        }
+
+    def traded_between(self, market: str, start: datetime, end: datetime) -> bool:
+        """start 到 end 之间是否经过交易时段（行情/主数据可能发生变化）"""
+        if end - start > timedelta(days=7):
+            return True
+        day = self._local_date(market, start)
+        last = self._local_date(market, end)
+        while day <= last:
+            if any(s < end and start < e for s, e in self.sessions(market, day)):
+                return True
+            day += timedelta(days=1)
+        return False
+
+    # ==================== 调度 ====================
+
+    def interval(self, markets: Iterable[str], base: float, now: Optional[datetime] = None) -> float:
+        """
+        周期任务的下次运行间隔（取各市场中最短者）
+
+        交易时段内为 base（开盘后/收盘前 EDGE_MINUTES 分钟内乘以 EDGE_FACTOR），
+        时段外为距下一时段开始的秒数，不超过 MAX_IDLE_SECONDS 且不小于 base
+        """
+        now = now or self.now()
+        edge = timedelta(minutes=EDGE_MINUTES)
+        delays = []
+        for market in {calendar_market(m) for m in markets}:
+            sessions = self.sessions(market, self._local_date(market, now))
+            if any(start <= now < end for start, end in sessions):
+                near_edge = now - sessions[0][0] < edge or sessions[-1][1] - now <= edge
+                delays.append(base * EDGE_FACTOR if near_edge else base)
+                continue
+            next_open = self.next_open(market, now)
+            idle = MAX_IDLE_SECONDS if next_open is None else (next_open - now).total_seconds()
+            delays.append(min(max(idle, base), max(MAX_IDLE_SECONDS, base)))
+        return min(delays) if delays else base
+
+    async def delay(self, markets: Iterable[str], base: float) -> float:
+        """加载所需日历后计算下次运行间隔"""
+        markets = list(markets)
+        await self.ensure(markets)
+        return self.interval(markets, base)
+
+    def is_stale(self, market: str, age: float, max_age: float, now: Optional[datetime] = None) -> bool:
+        """缓存数据是否需要刷新：超过 max_age 且加载以来经过了交易时段（休市期间数据不会变化）"""
+        if age < max_age:
+            return False
+        now = now or self.now()
+        return self.traded_between(market, now - timedelta(seconds=age), now)
+
+
+# 全局交易日历实例
+trading_calendar = TradingCalendar(futu_client)
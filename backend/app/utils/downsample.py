@@ -0,0 +1,73 @@
+"""
+图表降采样
+
+输出点数固定为 n，与原始区间长度无关：
+
+- ohlc_buckets: 按下标等分为 n 个桶聚合成K线（开=首根开盘，收=末根收盘，高/低取桶内极值，
+  量额求和），区间内的最高/最低价不会丢失，适用于K线图
+- lttb_indices: Largest-Triangle-Three-Buckets，逐桶选出与前一选中点、后一桶均值构成最大三角形的点，
+  保持折线形状，适用于收盘价/净值等折线图
+
+两者都直接作用于K线结构化数组（KLINE_DTYPE）的字段，桶内计算全部向量化。
+"""
+import numpy as np
+
+
+def ohlc_buckets(bars: np.ndarray, n: int) -> np.ndarray:
+    """K线聚合为 n 根（不足 n 根时原样返回）"""
+    length = len(bars)
+    if n <= 0 or length <= n:
+        return bars
+    starts = np.arange(n) * length // n
+    ends = np.append(starts[1:], length) - 1
+    out = np.empty(n, dtype=bars.dtype)
+    out["time"] = bars["time"][starts]
+    out["open"] = bars["open"][starts]
+    out["close"] = bars["close"][ends]
+    out["high"] = np.maximum.reduceat(bars["high"], starts)
+    out["low"] = np.minimum.reduceat(bars["low"], starts)
+    out["volume"] = np.add.reduceat(bars["volume"], starts)
+    out["turnover"] = np.add.reduceat(bars["turnover"], starts)
+    return out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    LTTB 选点，返回升序下标（始终包含首尾两点）
+
+    三角形面积 |ax·(y - cy) + ay·(cx - x) + (x·cy - cx·y)| 中只有 (ax, ay) 依赖上一桶的选择，
+    其余各项对所有桶一次性算好，逐桶循环只剩一次乘加与 argmax。
+    """
+    length = len(x)
+    if n >= length or length <= 2:
+        return np.arange(length)
+    if n < 3:
+        return np.array([0, length - 1])[:max(n, 1)]
+    x = np.asarray(x, dtype="f8")
+    y = np.asarray(y, dtype="f8")
+
+    # 中间 length-2 个点等分为 n-2 个桶，edges[b]:edges[b+1] 为第 b 个桶
+    buckets = n - 2
+    edges = 1 + np.arange(buckets + 1) * (length - 2) // buckets
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x[:length - 1], edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y[:length - 1], edges[:-1]) / sizes
+    # 每个桶的参照点为下一个桶的均值，最后一个桶参照终点
+    cx = np.append(avg_x[1:], x[-1])[:, None]
+    cy = np.append(avg_y[1:], y[-1])[:, None]
+
+    # 各桶长度最多相差1，补齐为矩阵（不足的位置重复桶内最后一个点，不影响 argmax）
+    idx = np.minimum(edges[:-1, None] + np.arange(sizes.max()), (edges[1:] - 1)[:, None])
+    bx, by = x[idx], y[idx]
+    p = by - cy
+    q = cx - bx
+    r = bx * cy - cx * by
+
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    a = 0
+    for b in range(buckets):
+        area = np.abs(x[a] * p[b] + y[a] * q[b] + r[b])
+        a = idx[b, area.argmax()]
+        selected[b + 1] = a
+    return selected
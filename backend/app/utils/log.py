@@ -0,0 +1,249 @@
+"""
+非阻塞日志管道
+
+loguru 默认的 stderr 输出在调用线程内同步格式化并写出，行情/订单推送路径上记录日志会直接阻塞事件循环或SDK回调线程。
+setup_logging() 将输出替换为 QueueSink：
+
+- 调用方只把 loguru 的 record 放入有界队列（满时丢弃并计数，不等待）
+- 后台线程批量渲染为文本或JSON行，写入标准输出或文件；异常堆栈也在后台线程格式化
+- 消息使用 loguru 的 "{}" 占位参数，级别未启用时不做格式化
+
+高频事件（推送、WebSocket）通过 EventLog 按类别采样与限速，被丢弃的事件在级别判断之后直接返回，
+下一条放行的日志带上期间被抑制的条数。
+
+不使用 loguru 的 enqueue=True：它经 multiprocessing 管道逐条 pickle，调用方开销比内存队列高一个数量级。
+"""
+import atexit
+import json
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+from loguru import logger
+
+from app.config import settings
+
+# 队列结束标记
+_STOP = object()
+
+# 后台线程单次最多写出的日志条数
+BATCH_SIZE = 256
+
+TEXT_FORMAT = "{time} | {level:<8} | {name}:{function}:{line} - {message}"
+
+
+def _passthrough(record) -> str:
+    # 可调用的 format 不会自动追加异常堆栈，堆栈由后台线程格式化
+    return "{message}"
+
+
+def _exception_text(record) -> Optional[str]:
+    exc = record["exception"]
+    if exc is None:
+        return None
+    return "".join(traceback.format_exception(exc.type, exc.value, exc.traceback)).rstrip()
+
+
+def render_text(record) -> str:
+    line = TEXT_FORMAT.format(
+        time=record["time"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        level=record["level"].name,
+        name=record["name"],
+        function=record["function"],
+        line=record["line"],
+        message=record["message"],
+    )
+    extra = record["extra"]
+    if extra:
+        line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+    exc = _exception_text(record)
+    return f"{line}\n{exc}\n" if exc else line + "\n"
+
+
+def render_json(record) -> str:
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    data.update(record["extra"])
+    exc = _exception_text(record)
+    if exc:
+        data["exception"] = exc
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+class QueueSink:
+    """loguru 接收端：入队即返回，由后台线程渲染并写出"""
+
+    def __init__(self, stream: TextIO, json_output: bool = False, capacity: int = settings.LOG_QUEUE_SIZE):
+        self._stream = stream
+        self._render: Callable[[Any], str] = render_json if json_output else render_text
+        self._queue: "queue.Queue" = queue.Queue(maxsize=capacity)
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+
+    def __call__(self, message):
+        try:
+            self._queue.put_nowait(message.record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """写完队列中剩余日志后退出"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            self._write([r for r in batch if r is not _STOP])
+            if stop:
+                return
+
+    def _write(self, records: List[Any]):
+        if not records:
+            return
+        lines = []
+        for record in records:
+            try:
+                lines.append(self._render(record))
+            except Exception as e:
+                lines.append(f"日志渲染失败: {e!r} {record.get('message')!r}\n")
+        try:
+            self._stream.write("".join(lines))
+            self._stream.flush()
+        except Exception:
+            # 输出不可用时丢弃，不影响调用方
+            self.dropped += len(records)
+            return
+        self.written += len(records)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+
+class EventLog:
+    """
+    高频事件日志：按类别采样 + 令牌桶限速
+
+    sample_rate 为放行比例；rate 为每秒最多放行条数（突发上限相同），None 表示不限速。
+    """
+
+    def __init__(self, category: str, sample_rate: Optional[float] = None, rate: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.category = category
+        self.sample_rate = settings.LOG_SAMPLE_RATES.get(category, 1.0) if sample_rate is None else sample_rate
+        self.rate = settings.LOG_RATE_LIMITS.get(category) if rate is None else rate
+        self._clock = clock
+        self._tokens = float(self.rate or 0)
+        self._updated = clock()
+        self.suppressed = 0
+        # 记录调用 debug()/info()/warning() 的位置
+        self._logger = logger.bind(category=category).opt(depth=2)
+        _event_logs[category] = self
+
+    def allow(self) -> bool:
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.suppressed += 1
+            return False
+        if self.rate:
+            now = self._clock()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.suppressed += 1
+                return False
+            self._tokens -= 1
+        return True
+
+    def _log(self, level: str, message: str, *args, **kwargs):
+        if _LEVEL_NO[level] < _level_no or not self.allow():
+            return
+        if self.suppressed:
+            kwargs["suppressed"] = self.suppressed
+            self.suppressed = 0
+        self._logger.log(level, message, *args, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs):
+        self._log("DEBUG", message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs):
+        self._log("INFO", message, *args, **kwargs)
+
+    def warning(self, message: str, *args, **kwargs):
+        self._log("WARNING", message, *args, **kwargs)
+
+
+# 已创建的事件日志（类别 -> 实例），用于统计
+_event_logs: Dict[str, EventLog] = {}
+
+_LEVEL_NO = {name: logger.level(name).no for name in ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")}
+
+# 当前输出级别，EventLog 据此在采样前跳过未启用的级别
+_level_no = 0
+
+_sink: Optional[QueueSink] = None
+_handler_id: Optional[int] = None
+
+
+def setup_logging(level: str = settings.LOG_LEVEL, json_output: bool = settings.LOG_JSON,
+                  log_file: str = settings.LOG_FILE) -> QueueSink:
+    """替换 loguru 默认输出为异步队列输出（重复调用时先关闭旧的输出）"""
+    global _sink, _handler_id, _level_no
+    shutdown_logging()
+    level = level.upper()
+    stream = open(log_file, "a", encoding="utf-8", buffering=1 << 16) if log_file else sys.stdout
+    _sink = QueueSink(stream, json_output)
+    logger.remove()
+    _handler_id = logger.add(_sink, level=level, format=_passthrough, catch=False)
+    _level_no = _LEVEL_NO[level]
+    _sink.start()
+    return _sink
+
+
+def shutdown_logging():
+    """写完剩余日志并关闭输出，之后的日志恢复为同步输出到 stderr"""
+    global _sink, _handler_id, _level_no
+    if _sink is None:
+        return
+    logger.remove(_handler_id)
+    _sink.stop()
+    if _sink._stream is not sys.stdout:
+        _sink._stream.close()
+    _sink = _handler_id = None
+    _level_no = 0
+    logger.add(sys.stderr, level=settings.LOG_LEVEL.upper())
+
+
+def log_stats() -> Dict[str, Any]:
+    """日志队列与各类别抑制条数"""
+    return {
+        "sink": _sink.stats() if _sink else None,
+        "suppressed": {category: log.suppressed for category, log in _event_logs.items()},
+    }
+
+
+atexit.register(shutdown_logging)
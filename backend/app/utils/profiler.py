@@ -0,0 +1,286 @@
+"""
+按需请求采样分析
+
+运行时通过 /api/admin/profiler 开启，按比例或按路由前缀挑选请求，对其做挂钟时间采样：
+
+- 请求协程在事件循环上运行时，采样事件循环线程的调用栈
+- 请求协程挂起时，采样协程的 await 链；若其提交到线程池的任务正在执行（run_in_executor），
+  接上执行线程的调用栈，富途SDK内的耗时即体现为 futu 包内的栈帧
+- 结果以折叠栈（"a;b;c 次数"，可直接生成火焰图）保存在有界内存中
+
+未开启时中间件只做一次布尔判断；线程池任务归属通过 ProfiledThreadPoolExecutor 在提交时记录，
+未处于采样中的请求只多一次 ContextVar 读取。
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import futu as ft
+
+from app.config import settings
+
+# 请求中不参与采样的路径前缀（管理接口本身）
+EXCLUDED_PREFIXES = ("/api/admin",)
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+# 富途SDK安装目录，调用栈中位于此目录的帧计为SDK耗时
+_SDK_DIR = str(Path(ft.__file__).parent)
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name})"
+
+
+def _is_sdk(frame) -> bool:
+    return frame.f_code.co_filename.startswith(_SDK_DIR)
+
+
+@dataclass
+class RequestProfile:
+    """单个请求的采样结果"""
+    profile_id: int
+    method: str
+    path: str
+    interval: float
+    started_at: datetime = field(default_factory=datetime.now)
+    status: Optional[int] = None
+    duration_ms: float = 0.0
+    samples: Counter = field(default_factory=Counter)
+    cpu_samples: int = 0
+    executor_samples: int = 0
+    sdk_samples: int = 0
+    # 当前正在线程池中执行本请求任务的线程
+    threads: Set[int] = field(default_factory=set)
+
+    def folded(self) -> str:
+        """折叠栈格式（flamegraph.pl / speedscope 可直接导入）"""
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        ms = self.interval * 1000
+        return {
+            "id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "samples": sum(self.samples.values()),
+            "interval_ms": ms,
+            "cpu_ms": round(self.cpu_samples * ms, 3),
+            "executor_ms": round(self.executor_samples * ms, 3),
+            "sdk_ms": round(self.sdk_samples * ms, 3),
+        }
+
+
+class _Sampler(threading.Thread):
+    """按固定间隔采样一个请求"""
+
+    def __init__(self, profile: RequestProfile, task: asyncio.Task, root_frame, loop_thread: int):
+        super().__init__(name=f"profiler-{profile.profile_id}", daemon=True)
+        self._profile = profile
+        self._task = task
+        self._root = root_frame
+        self._loop_thread = loop_thread
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        while not self._stop_event.wait(self._profile.interval):
+            self.sample()
+
+    def sample(self):
+        profile = self._profile
+        frames = sys._current_frames()
+        running = self._thread_stack(frames.get(self._loop_thread))
+        if running is not None:
+            profile.cpu_samples += 1
+            profile.samples[";".join(_label(f) for f in running)] += 1
+            return
+
+        base = [_label(f) for f in self._await_chain()]
+        workers = [frames[t] for t in list(profile.threads) if t in frames]
+        if not workers:
+            profile.samples[";".join(base + ["[await]"])] += 1
+            return
+        profile.executor_samples += 1
+        sdk = False
+        for leaf in workers:
+            stack = []
+            for frame in _walk(leaf):
+                if frame.f_code is _run_tracked.__code__:
+                    break
+                stack.append(frame)
+            stack.reverse()
+            sdk = sdk or any(_is_sdk(f) for f in stack)
+            profile.samples[";".join(base + ["[run_in_executor]"] + [_label(f) for f in stack])] += 1
+        if sdk:
+            profile.sdk_samples += 1
+
+    def _thread_stack(self, leaf) -> Optional[List[Any]]:
+        """事件循环线程正在运行本请求时返回根帧以下的调用栈（外层在前）"""
+        stack = []
+        for frame in _walk(leaf):
+            if frame is self._root:
+                return list(reversed(stack))
+            stack.append(frame)
+        return None
+
+    def _await_chain(self) -> List[Any]:
+        """挂起中请求的协程 await 链（从中间件以下开始）"""
+        chain = []
+        coro = self._task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            chain.append(frame)
+            coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        for i, frame in enumerate(chain):
+            if frame is self._root:
+                return chain[i + 1:]
+        return chain
+
+
+def _walk(frame):
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+
+
+class RequestProfiler:
+    """采样配置与有界结果存储"""
+
+    def __init__(self, capacity: int = settings.PROFILER_MAX_PROFILES,
+                 interval: float = settings.PROFILER_INTERVAL_MS / 1000):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.routes: List[str] = []
+        self.interval = interval
+        self.capacity = capacity
+        self._profiles: "OrderedDict[int, RequestProfile]" = OrderedDict()
+        self._ids = count(1)
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                  routes: Optional[List[str]] = None, interval_ms: Optional[float] = None):
+        if sample_rate is not None:
+            if not 0 < sample_rate <= 1:
+                raise ValueError("sample_rate 取值范围为 (0, 1]")
+            self.sample_rate = sample_rate
+        if interval_ms is not None:
+            if interval_ms < 1:
+                raise ValueError("采样间隔不能小于1毫秒")
+            self.interval = interval_ms / 1000
+        if routes is not None:
+            self.routes = list(routes)
+        if enabled is not None:
+            self.enabled = enabled
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "routes": self.routes,
+            "interval_ms": self.interval * 1000,
+            "capacity": self.capacity,
+        }
+
+    def should_profile(self, path: str) -> bool:
+        if path.startswith(EXCLUDED_PREFIXES):
+            return False
+        if self.routes and not any(path.startswith(r) for r in self.routes):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self, method: str, path: str, task: asyncio.Task, root_frame) -> _Sampler:
+        profile = RequestProfile(next(self._ids), method, path, self.interval)
+        sampler = _Sampler(profile, task, root_frame, threading.get_ident())
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: _Sampler, duration: float, status: Optional[int]):
+        sampler.stop()
+        profile = sampler._profile
+        profile.duration_ms = duration * 1000
+        profile.status = status
+        self._profiles[profile.profile_id] = profile
+        while len(self._profiles) > self.capacity:
+            self._profiles.popitem(last=False)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        return [p.summary() for p in reversed(self._profiles.values())]
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        return self._profiles.get(profile_id)
+
+    def clear(self):
+        self._profiles.clear()
+
+
+class ProfiledThreadPoolExecutor(ThreadPoolExecutor):
+    """记录采样中请求提交的任务在哪个线程执行（用于默认执行器）"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return super().submit(fn, *args, **kwargs)
+        return super().submit(_run_tracked, profile, fn, args, kwargs)
+
+
+def _run_tracked(profile: RequestProfile, fn, args, kwargs):
+    ident = threading.get_ident()
+    profile.threads.add(ident)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profile.threads.discard(ident)
+
+
+class ProfilerMiddleware:
+    """ASGI中间件（不经 BaseHTTPMiddleware，保证端点与中间件运行在同一个任务中）"""
+
+    def __init__(self, app, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if not profiler.enabled or scope["type"] != "http" or not profiler.should_profile(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        sampler = profiler.start(scope["method"], scope["path"], asyncio.current_task(), sys._getframe())
+        token = _current_profile.set(sampler._profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            profiler.finish(sampler, time.perf_counter() - started, status)
+
+
+# 全局请求采样器
+request_profiler = RequestProfiler()
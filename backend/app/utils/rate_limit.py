@@ -0,0 +1,74 @@
+"""
+OpenD接口限频
+
+OpenD对部分接口按30秒滑动窗口限频（超出后返回错误），这里在本进程内预先排队，
+保证请求不超过额度。多个API worker各自计数，共享行情模式下应只由行情进程调用高频接口。
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+# 接口 -> (次数, 窗口秒数)，见富途OpenAPI文档各接口“接口限制”
+OPEND_RATE_LIMITS: Dict[str, Tuple[int, float]] = {
+    "get_market_snapshot": (60, 30.0),
+    "request_history_kline": (60, 30.0),
+    "get_rehab": (60, 30.0),
+    "place_order": (15, 30.0),
+    "modify_order": (20, 30.0),
+    "acctradinginfo_query": (10, 30.0),
+    "get_option_chain": (10, 30.0),
+    "get_option_expiration_date": (60, 30.0),
+    "get_owner_plate": (10, 30.0),
+    "request_trading_days": (30, 30.0),
+    "history_order_list_query": (10, 30.0),
+    "history_deal_list_query": (10, 30.0),
+}
+
+
+class RateLimiter:
+    """
+    滑动窗口限流：window 秒内最多 limit 次
+
+    调用时同步预约时间槽（不持有锁，可在不同事件循环中使用），需要等待时再 sleep。
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._slots: Deque[float] = deque()
+
+    def reserve(self) -> float:
+        """预约一个调用时间槽，返回需要等待的秒数"""
+        now = time.monotonic()
+        while self._slots and self._slots[0] <= now - self.window:
+            self._slots.popleft()
+        if len(self._slots) < self.limit:
+            slot = now
+        else:
+            slot = max(now, self._slots[-self.limit] + self.window)
+        self._slots.append(slot)
+        return slot - now
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @property
+    def pending(self) -> int:
+        """窗口内已预约（含尚未到时间）的调用数"""
+        now = time.monotonic()
+        return sum(1 for slot in self._slots if slot > now - self.window)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def limiter(name: str) -> RateLimiter:
+    """按接口名获取本进程共享的限流器"""
+    found = _limiters.get(name)
+    if found is None:
+        limit, window = OPEND_RATE_LIMITS[name]
+        found = _limiters[name] = RateLimiter(limit, window)
+    return found
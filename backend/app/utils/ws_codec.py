@@ -0,0 +1,186 @@
+"""
+WebSocket行情编码
+
+两种协议，通过 Sec-WebSocket-Protocol（或 ?protocol= 查询参数）协商:
+
+- quote.json（默认）: 每条消息为完整行情JSON，与原有格式一致
+- quote.msgpack-delta.v1: MessagePack二进制帧，价格按整数缩放，只发送变化字段，
+  定期发送关键帧用于重同步
+
+msgpack-delta 帧结构:
+    关键帧 {"t": "K", "seq", "ts", "fields", "scales", "sym": [code], "name": [name], "rows": [[v, ...]]}
+    增量帧 {"t": "D", "seq", "ts", "rows": [[sym_idx, field_idx, v, field_idx, v, ...]]}
+
+ts 为服务端毫秒时间戳，sym_idx 为最近一次关键帧 sym 中的下标，
+实际值 = v / scales[field_idx]。客户端发送文本 "resync" 可请求下一帧为关键帧。
+"""
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，未安装时仅支持JSON协议
+    msgpack = None
+
+PROTOCOL_JSON = "quote.json"
+PROTOCOL_MSGPACK_DELTA = "quote.msgpack-delta.v1"
+
+# (字段名, 缩放倍数)
+DELTA_FIELDS = (
+    ("current_price", 1000),
+    ("open_price", 1000),
+    ("high_price", 1000),
+    ("low_price", 1000),
+    ("prev_close_price", 1000),
+    ("volume", 1),
+    ("turnover", 1),
+    ("change", 1000),
+    ("change_ratio", 10000),
+)
+_FIELD_NAMES = [name for name, _ in DELTA_FIELDS]
+_SCALES = [scale for _, scale in DELTA_FIELDS]
+
+
+def available_protocols() -> List[str]:
+    if msgpack is None:
+        return [PROTOCOL_JSON]
+    return [PROTOCOL_MSGPACK_DELTA, PROTOCOL_JSON]
+
+
+def negotiate(requested: Iterable[str]) -> Optional[str]:
+    """按服务端优先级从客户端请求的协议中选择一个，无匹配返回None（使用默认JSON）"""
+    requested = {p.strip() for p in requested if p}
+    for protocol in available_protocols():
+        if protocol in requested:
+            return protocol
+    return None
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+class JsonQuoteEncoder:
+    """默认JSON协议：单只股票发送对象，多只股票发送数组"""
+
+    protocol = PROTOCOL_JSON
+    binary = False
+
+    def __init__(self, single: bool = False):
+        self._single = single
+
+    def encode(self, quotes: List[Dict[str, Any]]) -> str:
+        payload = quotes[0] if self._single and quotes else quotes
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+    def request_keyframe(self):
+        pass
+
+
+class DeltaQuoteEncoder:
+    """MessagePack增量协议编码器（每个连接一个实例）"""
+
+    protocol = PROTOCOL_MSGPACK_DELTA
+    binary = True
+
+    def __init__(self, keyframe_interval: int = 30):
+        if msgpack is None:
+            raise RuntimeError("未安装 msgpack，无法使用增量协议")
+        self._keyframe_interval = keyframe_interval
+        self._seq = 0
+        self._since_keyframe = 0
+        self._force_keyframe = True
+        self._symbols: Dict[str, int] = {}
+        self._last: List[Optional[List[int]]] = []
+
+    def request_keyframe(self):
+        self._force_keyframe = True
+
+    @staticmethod
+    def _scaled(quote: Dict[str, Any]) -> List[int]:
+        return [round(float(quote[name]) * scale) for name, scale in DELTA_FIELDS]
+
+    def encode(self, quotes: List[Dict[str, Any]]) -> bytes:
+        self._seq += 1
+        ts = int(time.time() * 1000)
+        rows = [self._scaled(q) for q in quotes]
+
+        keyframe = (
+            self._force_keyframe
+            or self._since_keyframe >= self._keyframe_interval
+            or any(q["stock_code"] not in self._symbols for q in quotes)
+        )
+        if keyframe:
+            self._symbols = {q["stock_code"]: i for i, q in enumerate(quotes)}
+            self._last = rows
+            self._since_keyframe = 0
+            self._force_keyframe = False
+            frame = {
+                "t": "K",
+                "seq": self._seq,
+                "ts": ts,
+                "fields": _FIELD_NAMES,
+                "scales": _SCALES,
+                "sym": [q["stock_code"] for q in quotes],
+                "name": [q["stock_name"] for q in quotes],
+                "rows": rows,
+            }
+        else:
+            self._since_keyframe += 1
+            changed = []
+            for quote, row in zip(quotes, rows):
+                idx = self._symbols[quote["stock_code"]]
+                last = self._last[idx]
+                diff = [idx]
+                for field_idx, value in enumerate(row):
+                    if value != last[field_idx]:
+                        diff += (field_idx, value)
+                if len(diff) > 1:
+                    changed.append(diff)
+                    self._last[idx] = row
+            frame = {"t": "D", "seq": self._seq, "ts": ts, "rows": changed}
+        return msgpack.packb(frame, use_bin_type=True)
+
+
+class DeltaQuoteDecoder:
+    """增量协议参考解码器，维护完整行情状态"""
+
+    def __init__(self):
+        self.seq = 0
+        self._symbols: List[str] = []
+        self._names: List[str] = []
+        self._rows: List[List[int]] = []
+        self._scales: List[int] = _SCALES
+
+    def decode(self, data: bytes) -> Dict[str, Dict[str, Any]]:
+        frame = msgpack.unpackb(data, raw=False)
+        if frame["t"] == "K":
+            self._symbols, self._names = frame["sym"], frame["name"]
+            self._rows = [list(r) for r in frame["rows"]]
+            self._scales = frame["scales"]
+        else:
+            if frame["seq"] != self.seq + 1:
+                raise ValueError(f"帧序号不连续: {self.seq} -> {frame['seq']}，需要重同步")
+            for diff in frame["rows"]:
+                row = self._rows[diff[0]]
+                for i in range(1, len(diff), 2):
+                    row[diff[i]] = diff[i + 1]
+        self.seq = frame["seq"]
+        return {
+            code: {
+                "stock_code": code,
+                "stock_name": name,
+                **{f: v / s for f, v, s in zip(_FIELD_NAMES, row, self._scales)},
+                "updated_at": frame["ts"],
+            }
+            for code, name, row in zip(self._symbols, self._names, self._rows)
+        }
+
+
+def create_encoder(protocol: Optional[str], single: bool = False) -> Union[JsonQuoteEncoder, DeltaQuoteEncoder]:
+    if protocol == PROTOCOL_MSGPACK_DELTA:
+        return DeltaQuoteEncoder()
+    return JsonQuoteEncoder(single=single)
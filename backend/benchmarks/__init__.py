@@ -0,0 +1,13 @@
+"""
+性能基准测试
+
+用与OpenD返回格式一致的合成DataFrame驱动热点路径，结果以JSON基线保存并支持回归比对。
+
+仓库中提交的 benchmarks/baseline.json 为当前基线（meta 中记录了生成时的Python/NumPy/pandas版本与机器信息，
+跨机器比对时绝对耗时仅供参考）。热点路径有意优化后，重新生成并随改动一起提交。
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks run --compare benchmarks/baseline.json --threshold 0.1
+    python -m benchmarks run --output benchmarks/baseline.json      # 更新基线
+    python -m benchmarks compare benchmarks/baseline.json current.json
+"""
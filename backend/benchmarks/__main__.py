@@ -0,0 +1,66 @@
+"""
+基准测试命令行入口
+
+    python -m benchmarks list
+    python -m benchmarks run [-k CASE ...] [--output FILE] [--compare BASELINE] [--threshold 0.1]
+    python -m benchmarks compare BASELINE CURRENT [--threshold 0.1]
+
+比对出现回归时以退出码 1 结束，便于在CI中使用。
+"""
+import argparse
+import sys
+
+from benchmarks import runner
+from benchmarks.cases import CASES
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="热点路径性能基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="列出所有用例")
+
+    p_run = sub.add_parser("run", help="运行基准")
+    p_run.add_argument("-k", "--case", action="append", dest="cases", choices=sorted(CASES), help="只运行指定用例")
+    p_run.add_argument("--rounds", type=int, default=5)
+    p_run.add_argument("--warmup", type=int, default=3)
+    p_run.add_argument("--output", "-o", help="结果保存路径（JSON）")
+    p_run.add_argument("--compare", help="与指定基线比对")
+    p_run.add_argument("--threshold", type=float, default=0.10, help="回归阈值，默认 0.10 即慢 10%%")
+
+    p_cmp = sub.add_parser("compare", help="比对两份结果")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, case in CASES.items():
+            print(f"{name:<34} x{case.number}")
+        return 0
+
+    if args.command == "run":
+        result = runner.run(args.cases, rounds=args.rounds, warmup=args.warmup)
+        if args.output:
+            runner.save(result, args.output)
+            print(f"[OK] 结果已保存: {args.output}")
+        if not args.compare:
+            for name, r in result["results"].items():
+                print(f"{name:<34}{r['median_us']:>14.1f} us  (min {r['min_us']:.1f})")
+            return 0
+        baseline, current = runner.load(args.compare), result
+    else:
+        baseline, current = runner.load(args.baseline), runner.load(args.current)
+
+    rows = runner.compare(baseline, current, threshold=args.threshold)
+    print(runner.format_table(rows))
+    regressions = [r for r in rows if r["status"] == "regression"]
+    if regressions:
+        print(f"[WARN] {len(regressions)} 个用例回归超过 {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
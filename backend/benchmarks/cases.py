@@ -0,0 +1,401 @@
+"""
+基准用例
+
+每个用例返回一个无参可调用对象（同步函数或协程函数），由 runner 负责计时。
+"""
+import json
+from datetime import datetime
+from typing import Callable, Dict, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from app.api.market import Quote, KLine, _mock_option_chain
+from app.services.export import KLINE_EXPORT_COLUMNS, FrameEncoder, kline_frames, stream_frames
+from app.services.factors import compute_factors
+from app.services.futu_client import FutuClient
+from app.services.kline_store import KLINE_DTYPE, REHAB_DTYPE, adjust_bars
+from app.services.market_recorder import events_to_records
+from app.services.reference_data import ReferenceData
+from app.services.risk import RiskEngine, portfolio_risk
+from app.services.screener import build_table, screen_table
+from app.utils import ws_codec
+from app.utils.downsample import lttb_indices, ohlc_buckets
+from benchmarks import fixtures
+
+
+class Case(NamedTuple):
+    """基准用例定义"""
+    name: str
+    factory: Callable[[], Callable]
+    number: int  # 每轮执行次数
+
+
+CASES: Dict[str, Case] = {}
+
+
+def benchmark(name: str, number: int = 100):
+    """注册基准用例"""
+    def decorator(factory: Callable[[], Callable]) -> Callable[[], Callable]:
+        CASES[name] = Case(name, factory, number)
+        return factory
+    return decorator
+
+
+def make_client(
+    watchlist: int = 300,
+    kline_num: int = 1000,
+    basicinfo_num: int = 2700,
+    orders: int = 500,
+    positions: int = 100,
+) -> FutuClient:
+    """创建挂载合成上下文的客户端（不连接OpenD）"""
+    client = FutuClient()
+    codes = fixtures.make_codes(watchlist)
+    client._quote_ctx = fixtures.FakeQuoteContext(
+        snapshot=fixtures.make_snapshot_frame(codes),
+        kline=fixtures.make_kline_frame(codes[0], kline_num),
+        basicinfo=fixtures.make_basicinfo_frame(basicinfo_num),
+    )
+    client._trade_contexts.put("HK", fixtures.FakeTradeContext(
+        orders=fixtures.make_order_frame(orders),
+        positions=fixtures.make_position_frame(positions),
+    ))
+    client._is_connected = True
+    client._trade_enabled = True
+    client._registry.load([{"acc_id": "1000001", "trd_env": "SIMULATE", "acc_type": "CASH",
+                            "acc_status": "ACTIVE", "trdmarket_auth": ["HK"]}])
+    client._active_account_id = "1000001"
+    return client
+
+
+# ==================== 行情 ====================
+
+@benchmark("quote.snapshot_to_quote", number=200)
+def bench_snapshot_to_quote():
+    client = make_client()
+
+    async def run():
+        Quote(**await client.get_quote("HK.00001"))
+    return run
+
+
+@benchmark("kline.convert_100", number=50)
+def bench_kline_100():
+    client = make_client(kline_num=100)
+
+    async def run():
+        [KLine(**k) for k in await client.get_kline("HK.00001")]
+    return run
+
+
+@benchmark("kline.convert_1000", number=10)
+def bench_kline_1000():
+    client = make_client(kline_num=1000)
+
+    async def run():
+        [KLine(**k) for k in await client.get_kline("HK.00001")]
+    return run
+
+
+@benchmark("search.filter_hk", number=10)
+def bench_search():
+    client = make_client(basicinfo_num=2700)
+
+    async def run():
+        await client.search_stock("腾讯")
+    return run
+
+
+@benchmark("screener.build_hk_2700", number=10)
+def bench_screener_build():
+    # 全市场快照整理为列式表（不含网络请求）
+    frame = fixtures.make_snapshot_frame(fixtures.make_codes(2700))
+
+    def run():
+        build_table("HK", frame)
+    return run
+
+
+@benchmark("screener.filter_hk_2700", number=100)
+def bench_screener_filter():
+    table = build_table("HK", fixtures.make_snapshot_frame(fixtures.make_codes(2700)))
+    filters = [
+        {"field": "change_ratio", "op": ">", "value": 1},
+        {"field": "volume_ratio", "op": ">=", "value": 1.5},
+        {"field": "pe_ttm_ratio", "op": "<", "value": 30},
+        {"field": "total_market_val", "op": ">", "value": 1e10},
+    ]
+
+    def run():
+        screen_table(table, filters, sort_by="turnover", limit=50)
+    return run
+
+
+@benchmark("recorder.encode_quotes_1000", number=20)
+def bench_recorder_encode():
+    # 录制线程每批推送转换为定长记录
+    events = [(1704187800_000_000_000 + i, {
+        "code": "HK.00700", "data_date": "2024-01-02", "data_time": "09:30:00",
+        "last_price": 350.2, "open_price": 350.0, "high_price": 351.0, "low_price": 349.0,
+        "prev_close_price": 348.0, "volume": 1000 + i, "turnover": 350000.0,
+    }) for i in range(1000)]
+
+    def run():
+        events_to_records("quote", events)
+    return run
+
+
+@benchmark("export.kline_csv_100k", number=3)
+def bench_export_kline_csv():
+    # 10万根1分钟K线按块编码为CSV
+    bars = np.zeros(100_000, dtype=KLINE_DTYPE)
+    bars["time"] = 1704187800 + np.arange(len(bars)) * 60
+    bars["close"] = 350 + np.random.default_rng(fixtures.SEED).normal(0, 1, len(bars))
+
+    def run():
+        for _ in stream_frames(kline_frames("HK.00700", bars), FrameEncoder("csv", KLINE_EXPORT_COLUMNS)):
+            pass
+    return run
+
+
+
+def _minute_bars(n: int) -> np.ndarray:
+    bars = np.zeros(n, dtype=KLINE_DTYPE)
+    bars["time"] = 1704187800 + np.arange(n) * 60
+    bars["close"] = 350 + np.random.default_rng(fixtures.SEED).normal(0, 0.1, n).cumsum()
+    bars["high"] = bars["close"] + 0.05
+    bars["low"] = bars["close"] - 0.05
+    return bars
+
+
+@benchmark("kline.adjust_qfq_500k", number=10)
+def bench_kline_adjust():
+    # 50万根1分钟K线按40次除权的复权因子表换算前复权价格
+    bars = _minute_bars(500_000)
+    rehab = np.zeros(40, dtype=REHAB_DTYPE)
+    rehab["time"] = np.linspace(bars["time"][0], bars["time"][-1], 40).astype("i8")
+    rehab["fwd_a"] = 0.98
+    rehab["fwd_b"] = -0.5
+
+    def run():
+        adjust_bars(bars, rehab, "qfq")
+    return run
+
+
+@benchmark("downsample.ohlc_500k", number=10)
+def bench_downsample_ohlc():
+    # 50万根1分钟K线聚合为2000根
+    bars = _minute_bars(500_000)
+
+    def run():
+        ohlc_buckets(bars, 2000)
+    return run
+
+
+@benchmark("downsample.lttb_500k", number=10)
+def bench_downsample_lttb():
+    bars = _minute_bars(500_000)
+
+    def run():
+        lttb_indices(bars["time"], bars["close"], 2000)
+    return run
+
+
+@benchmark("factors.compute_3000x1260", number=1)
+def bench_factors_compute():
+    # 3000只 × 5年日线面板计算全部因子
+    rng = np.random.default_rng(fixtures.SEED)
+    close = (50 * np.exp(np.cumsum(rng.normal(0, 0.02, (1260, 3000)), axis=0))).astype(np.float32)
+    turnover = rng.uniform(1e6, 1e8, close.shape).astype(np.float32)
+
+    def run():
+        compute_factors(close, turnover)
+    return run
+
+@benchmark("options.refresh_chain_1000", number=10)
+def bench_options_refresh():
+    # 1000个合约的期权链：写入快照、重解隐含波动率与希腊值
+    chain = _mock_option_chain("US.AAPL", None, n=500)
+    snapshot = pd.DataFrame({
+        "code": chain.codes,
+        "bid_price": chain.columns["bid"],
+        "ask_price": chain.columns["ask"],
+        "last_price": chain.columns["last"],
+    })
+    now = chain.updated_at
+
+    def run():
+        chain.apply_snapshot(snapshot, chain.spot, now)
+    return run
+
+
+@benchmark("options.greeks_tick_1000", number=50)
+def bench_options_greeks():
+    # 标的报价变化时只重算希腊值
+    chain = _mock_option_chain("US.AAPL", None, n=500)
+    now = chain.updated_at
+
+    def run():
+        chain.spot *= 1.0001
+        chain.compute_greeks(now)
+    return run
+
+# ==================== 交易/账户 ====================
+
+@benchmark("trade.orders_convert_500", number=10)
+def bench_orders():
+    client = make_client(orders=500)
+
+    async def run():
+        await client.get_orders()
+    return run
+
+
+@benchmark("trade.normalize_orders_1000", number=20)
+def bench_normalize_orders():
+    basicinfo = fixtures.make_basicinfo_frame(2700)
+    reference = ReferenceData()
+    reference.update_lots("HK", basicinfo["code"], basicinfo["lot_size"])
+    rng = np.random.default_rng(fixtures.SEED)
+    orders = [(code, "BUY" if rng.random() < 0.5 else "SELL", float(price), int(lot) * 3)
+              for code, lot, price in zip(basicinfo["code"][:1000], basicinfo["lot_size"][:1000],
+                                          np.round(rng.uniform(0.1, 600, 1000), 3))]
+
+    def run():
+        for code, side, price, quantity in orders:
+            reference.normalize_order(code, side, price, quantity, adjust=True)
+    return run
+
+
+@benchmark("account.positions_convert_100", number=20)
+def bench_positions():
+    client = make_client(positions=100)
+
+    async def run():
+        await client.get_positions()
+    return run
+
+
+def _risk_series(n: int, days: int = 260):
+    rng = np.random.default_rng(fixtures.SEED)
+    market = rng.normal(0, 0.01, days)
+    times = 1704153600 + np.arange(days) * 86400
+    series = {}
+    for code in fixtures.make_codes(n) + ["HK.800000"]:
+        bars = np.zeros(days, dtype=KLINE_DTYPE)
+        bars["time"] = times
+        bars["close"] = 100 * np.exp(np.cumsum(rng.uniform(0.5, 1.5) * market + rng.normal(0, 0.015, days)))
+        series[code] = bars
+    return series
+
+
+@benchmark("risk.build_model_300", number=10)
+def bench_risk_build():
+    # 每日一次：收益率矩阵、协方差、相关系数、Beta
+    series = _risk_series(300)
+    codes = fixtures.make_codes(300)
+    engine = RiskEngine()
+
+    def run():
+        engine.build_model(series, codes, "HK.800000")
+    return run
+
+
+@benchmark("risk.reweight_300", number=50)
+def bench_risk_reweight():
+    # 盘中：只更新权重向量
+    codes = fixtures.make_codes(300)
+    model = RiskEngine().build_model(_risk_series(300), codes, "HK.800000")
+    weights = np.random.default_rng(fixtures.SEED).dirichlet(np.ones(300))
+
+    def run():
+        portfolio_risk(model, weights, 1e8, include_matrix=False)
+    return run
+
+
+# ==================== WebSocket序列化 ====================
+
+def _quotes(n: int):
+    client = make_client(watchlist=n)
+    frame = client._quote_ctx._snapshot
+    quotes = []
+    for code in frame["code"]:
+        row = frame.loc[code]
+        price = float(row["last_price"])
+        prev_close = float(row["prev_close_price"])
+        quotes.append(Quote(
+            stock_code=code,
+            stock_name=row["name"],
+            current_price=price,
+            open_price=price,
+            high_price=float(row["high_price"]),
+            low_price=float(row["low_price"]),
+            prev_close_price=prev_close,
+            volume=int(row["volume"]),
+            turnover=float(row["turnover"]),
+            change=price - prev_close,
+            change_ratio=(price - prev_close) / prev_close * 100,
+            updated_at=datetime(2024, 1, 2, 15, 59, 59),
+        ))
+    return quotes
+
+
+def _send_json(data) -> str:
+    # 与 starlette WebSocket.send_json 相同的编码参数
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+@benchmark("ws.serialize_quote", number=2000)
+def bench_ws_quote():
+    quote = _quotes(1)[0]
+
+    def run():
+        _send_json(quote.model_dump(mode="json"))
+    return run
+
+
+@benchmark("ws.serialize_watchlist_300", number=20)
+def bench_ws_watchlist():
+    quotes = _quotes(300)
+
+    def run():
+        for quote in quotes:
+            _send_json(quote.model_dump(mode="json"))
+    return run
+
+
+def _watchlist_ticks(n: int):
+    """两组交替的自选股行情，约10%股票每秒有变化"""
+    base = [q.model_dump() for q in _quotes(n)]
+    ticked = [dict(q) for q in base]
+    for q in ticked[::10]:
+        q["current_price"] = round(q["current_price"] + 0.05, 3)
+        q["volume"] += 1000
+    return base, ticked
+
+
+@benchmark("ws.json_watchlist_300", number=20)
+def bench_ws_json_watchlist():
+    base, ticked = _watchlist_ticks(300)
+    encoder = ws_codec.JsonQuoteEncoder()
+    frames = [base, ticked]
+    state = {"i": 0}
+
+    def run():
+        state["i"] ^= 1
+        encoder.encode(frames[state["i"]])
+    return run
+
+
+@benchmark("ws.msgpack_delta_watchlist_300", number=20)
+def bench_ws_delta_watchlist():
+    base, ticked = _watchlist_ticks(300)
+    encoder = ws_codec.DeltaQuoteEncoder(keyframe_interval=30)
+    frames = [base, ticked]
+    state = {"i": 0}
+
+    def run():
+        state["i"] ^= 1
+        encoder.encode(frames[state["i"]])
+    return run
@@ -0,0 +1,244 @@
+"""
+合成行情/交易数据
+
+按OpenD接口的实际列结构生成DataFrame，固定随机种子保证每次运行输入一致。
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import futu as ft
+
+from app.services.kline_store import KLINE_DTYPE, to_epoch
+
+SEED = 20240101
+
+
+def _rng(offset: int = 0) -> np.random.Generator:
+    return np.random.default_rng(SEED + offset)
+
+
+def make_codes(n: int, market: str = "HK") -> List[str]:
+    """生成股票代码列表"""
+    if market == "HK":
+        return [f"HK.{i:05d}" for i in range(1, n + 1)]
+    return [f"{market}.S{i:04d}" for i in range(1, n + 1)]
+
+
+def make_snapshot_frame(codes: List[str]) -> pd.DataFrame:
+    """get_market_snapshot 返回结构"""
+    rng = _rng(1)
+    n = len(codes)
+    prev_close = np.round(rng.uniform(1, 500, n), 3)
+    last = np.round(prev_close * (1 + rng.normal(0, 0.02, n)), 3)
+    high = np.round(np.maximum(last, prev_close) * (1 + rng.uniform(0, 0.02, n)), 3)
+    low = np.round(np.minimum(last, prev_close) * (1 - rng.uniform(0, 0.02, n)), 3)
+    volume = rng.integers(0, 50_000_000, n)
+    frame = pd.DataFrame({
+        "code": codes,
+        "name": [f"股票{i}" for i in range(n)],
+        "update_time": "2024-01-02 15:59:59",
+        "last_price": last,
+        "open_price": np.round(prev_close * (1 + rng.normal(0, 0.01, n)), 3),
+        "high_price": high,
+        "low_price": low,
+        "prev_close_price": prev_close,
+        "volume": volume,
+        "turnover": np.round(volume * last, 2),
+        "turnover_rate": np.round(rng.uniform(0, 5, n), 3),
+        "suspension": False,
+        "listing_date": "2004-06-16",
+        "lot_size": rng.choice([100, 200, 500, 1000, 2000], n),
+        "price_spread": 0.2,
+        "stock_owner": "N/A",
+        "ask_price": np.round(last * 1.001, 3),
+        "bid_price": np.round(last * 0.999, 3),
+        "ask_vol": rng.integers(100, 100_000, n),
+        "bid_vol": rng.integers(100, 100_000, n),
+        "amplitude": np.round((high - low) / prev_close * 100, 3),
+        "avg_price": np.round((high + low) / 2, 3),
+        "bid_ask_ratio": np.round(rng.uniform(-100, 100, n), 3),
+        "volume_ratio": np.round(rng.uniform(0, 5, n), 3),
+        "highest52weeks_price": np.round(high * 1.3, 3),
+        "lowest52weeks_price": np.round(low * 0.7, 3),
+        "pe_ratio": np.round(rng.uniform(-20, 80, n), 3),
+        "pb_ratio": np.round(rng.uniform(0.2, 10, n), 3),
+        "pe_ttm_ratio": np.round(rng.uniform(-20, 80, n), 3),
+        "total_market_val": np.round(rng.uniform(1e8, 4e12, n), 2),
+        "circular_market_val": np.round(rng.uniform(1e8, 4e12, n), 2),
+        "sec_status": "NORMAL",
+    })
+    # 停牌/新股等情况下OpenD会返回字符串 "N/A"
+    frame["open_price"] = frame["open_price"].astype(object)
+    frame.loc[frame.index[::50], "open_price"] = "N/A"
+    return frame
+
+
+def make_kline_frame(code: str, num: int) -> pd.DataFrame:
+    """get_cur_kline / request_history_kline 返回结构"""
+    rng = _rng(2)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, num)))
+    open_ = close * (1 + rng.normal(0, 0.005, num))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, num))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, num))
+    volume = rng.integers(1_000_000, 20_000_000, num)
+    start = datetime(2024, 1, 2)
+    times = [(start + timedelta(days=i)).strftime("%Y-%m-%d 00:00:00") for i in range(num)]
+    return pd.DataFrame({
+        "code": code,
+        "name": "腾讯控股",
+        "time_key": times,
+        "open": np.round(open_, 3),
+        "close": np.round(close, 3),
+        "high": np.round(high, 3),
+        "low": np.round(low, 3),
+        "volume": volume,
+        "turnover": np.round(volume * close, 2),
+        "pe_ratio": 15.0,
+        "turnover_rate": np.round(rng.uniform(0, 0.01, num), 5),
+        "last_close": np.round(np.concatenate([[close[0]], close[:-1]]), 3),
+    })
+
+
+def make_bars(close: Sequence[float], times: Optional[Sequence] = None, start: str = "2024-01-01",
+              step: int = 86400, **fields) -> np.ndarray:
+    """
+    K线结构化数组（KLINE_DTYPE，同 kline_store）
+
+    - times: 每根K线的时间（秒数或日期），不传时从 start 起每 step 秒一根
+    - fields: open/high/low/volume/turnover 等其他字段，未给出的开/高/低价取收盘价
+    """
+    close = np.asarray(close, dtype="f8")
+    bars = np.zeros(len(close), dtype=KLINE_DTYPE)
+    if times is None:
+        bars["time"] = to_epoch(start) + np.arange(len(close)) * step
+    else:
+        times = np.asarray(times)
+        if not np.issubdtype(times.dtype, np.integer):
+            times = pd.to_datetime(times).to_numpy().astype("datetime64[s]").astype("i8")
+        bars["time"] = times
+    bars["close"] = close
+    for field in ("open", "high", "low"):
+        bars[field] = fields.pop(field, close)
+    for field, values in fields.items():
+        bars[field] = values
+    return bars
+
+
+def make_basicinfo_frame(n: int) -> pd.DataFrame:
+    """get_stock_basicinfo 返回结构"""
+    rng = _rng(3)
+    return pd.DataFrame({
+        "code": make_codes(n),
+        "name": [f"公司{i}控股" if i % 7 else f"腾讯{i}" for i in range(n)],
+        "lot_size": rng.choice([100, 200, 500, 1000, 2000], n),
+        "stock_type": "STOCK",
+        "stock_child_type": "N/A",
+        "stock_owner": "",
+        "option_type": "N/A",
+        "strike_time": "",
+        "strike_price": np.nan,
+        "suspension": False,
+        "listing_date": "2004-06-16",
+        "stock_id": rng.integers(1, 10**12, n),
+        "delisting": False,
+        "index_option_type": "N/A",
+        "main_contract": False,
+        "last_trade_time": "",
+        "exchange_type": "HK_MAINBOARD",
+    })
+
+
+def make_order_frame(n: int) -> pd.DataFrame:
+    """order_list_query 返回结构"""
+    rng = _rng(4)
+    qty = rng.integers(1, 50, n) * 100
+    created = datetime(2024, 1, 2, 9, 30)
+    times = [(created + timedelta(seconds=int(s))).strftime("%Y-%m-%d %H:%M:%S.000")
+             for s in np.sort(rng.integers(0, 6 * 3600, n))]
+    return pd.DataFrame({
+        "trd_side": rng.choice(["BUY", "SELL"], n),
+        "order_type": "NORMAL",
+        "order_status": rng.choice(["SUBMITTED", "FILLED_ALL", "CANCELLED_ALL"], n),
+        "order_id": [str(7_000_000_000_000_000 + i) for i in range(n)],
+        "code": rng.choice(make_codes(50), n),
+        "stock_name": "腾讯控股",
+        "qty": qty.astype(float),
+        "price": np.round(rng.uniform(50, 500, n), 2),
+        "create_time": times,
+        "updated_time": times,
+        "dealt_qty": (qty * rng.integers(0, 2, n)).astype(float),
+        "dealt_avg_price": 0.0,
+        "last_err_msg": "",
+        "remark": "",
+        "time_in_force": "DAY",
+        "fill_outside_rth": "N/A",
+        "aux_price": "N/A",
+        "trail_type": "N/A",
+        "trail_value": "N/A",
+        "trail_spread": "N/A",
+        "currency": "HKD",
+    })
+
+
+def make_position_frame(n: int) -> pd.DataFrame:
+    """position_list_query 返回结构"""
+    rng = _rng(5)
+    qty = (rng.integers(1, 100, n) * 100).astype(float)
+    cost = np.round(rng.uniform(10, 500, n), 3)
+    nominal = np.round(cost * (1 + rng.normal(0, 0.1, n)), 3)
+    market_val = np.round(qty * nominal, 2)
+    pl_val = np.round(market_val - qty * cost, 2)
+    return pd.DataFrame({
+        "code": make_codes(n),
+        "stock_name": [f"股票{i}" for i in range(n)],
+        "position_market": "HK",
+        "qty": qty,
+        "can_sell_qty": qty,
+        "cost_price": cost,
+        "cost_price_valid": True,
+        "market_val": market_val,
+        "nominal_price": nominal,
+        "pl_ratio": np.round(pl_val / (qty * cost) * 100, 3),
+        "pl_ratio_valid": True,
+        "pl_val": pl_val,
+        "pl_val_valid": True,
+        "today_buy_qty": 0.0,
+        "today_sell_qty": 0.0,
+        "position_side": "LONG",
+        "currency": "HKD",
+    })
+
+
+class FakeQuoteContext:
+    """返回固定合成数据的行情上下文"""
+
+    def __init__(self, snapshot: pd.DataFrame, kline: pd.DataFrame, basicinfo: pd.DataFrame):
+        self._snapshot = snapshot.set_index("code", drop=False)
+        self._kline = kline
+        self._basicinfo = basicinfo
+
+    def get_market_snapshot(self, code_list):
+        return ft.RET_OK, self._snapshot.loc[code_list].reset_index(drop=True)
+
+    def get_cur_kline(self, code, num, ktype=None, **kwargs):
+        # 忽略 num，序列长度由构造时的合成数据决定
+        return ft.RET_OK, self._kline
+
+    def get_stock_basicinfo(self, market, **kwargs):
+        return ft.RET_OK, self._basicinfo
+
+
+class FakeTradeContext:
+    """返回固定合成数据的交易上下文"""
+
+    def __init__(self, orders: pd.DataFrame, positions: pd.DataFrame):
+        self._orders = orders
+        self._positions = positions
+
+    def order_list_query(self, **kwargs):
+        return ft.RET_OK, self._orders
+
+    def position_list_query(self, **kwargs):
+        return ft.RET_OK, self._positions
@@ -0,0 +1,109 @@
+"""
+基准计时与基线比对
+"""
+import asyncio
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.cases import CASES, Case
+
+
+async def _measure(fn, number: int) -> float:
+    """执行 number 次并返回平均单次耗时（秒）"""
+    is_async = asyncio.iscoroutinefunction(fn)
+    start = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await fn()
+    else:
+        for _ in range(number):
+            fn()
+    return (time.perf_counter() - start) / number
+
+
+async def _run_case(case: Case, rounds: int, warmup: int) -> Dict[str, Any]:
+    fn = case.factory()
+    for _ in range(warmup):
+        await _measure(fn, 1)
+    samples = [await _measure(fn, case.number) for _ in range(rounds)]
+    return {
+        "number": case.number,
+        "rounds": rounds,
+        "min_us": round(min(samples) * 1e6, 3),
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "stdev_us": round(statistics.pstdev(samples) * 1e6, 3),
+    }
+
+
+def run(names: Optional[Iterable[str]] = None, rounds: int = 5, warmup: int = 3) -> Dict[str, Any]:
+    """运行基准用例，返回可直接保存为JSON的结果"""
+    selected = [CASES[n] for n in names] if names else list(CASES.values())
+
+    async def _run_all():
+        return {case.name: await _run_case(case, rounds, warmup) for case in selected}
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+        },
+        "results": asyncio.run(_run_all()),
+    }
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(result: Dict[str, Any], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.10,
+    metric: str = "median_us",
+) -> List[Dict[str, Any]]:
+    """
+    比对两次结果
+
+    ratio = current / baseline，ratio > 1 + threshold 记为回归，< 1 - threshold 记为提升
+    """
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append({"name": name, "baseline": None, "current": cur[metric], "ratio": None, "status": "new"})
+            continue
+        ratio = cur[metric] / base[metric] if base[metric] else float("inf")
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({"name": name, "baseline": base[metric], "current": cur[metric], "ratio": ratio, "status": status})
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'case':<34}{'baseline(us)':>14}{'current(us)':>14}{'ratio':>9}  status"]
+    for r in rows:
+        base = f"{r['baseline']:.1f}" if r["baseline"] is not None else "-"
+        ratio = f"{r['ratio']:.2f}x" if r["ratio"] is not None else "-"
+        lines.append(f"{r['name']:<34}{base:>14}{r['current']:>14.1f}{ratio:>9}  {r['status']}")
+    return "\n".join(lines)
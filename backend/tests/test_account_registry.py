@@ -0,0 +1,146 @@
+"""
+账户路由测试
+"""
+import asyncio
+
+import futu as ft
+import pandas as pd
+import pytest
+
+from app.services import account_registry
+from app.services import futu_client as futu_client_module
+from app.services.futu_client import FutuClient
+from app.services.account_registry import AccountRegistry, TradeContextPool, parse_market_auth
+
+
+class _StubTradeContext:
+    created = []
+
+    def __init__(self, host, port):
+        _StubTradeContext.created.append(self)
+        self.unlocked = False
+
+    def unlock_trade(self, password):
+        self.unlocked = True
+        return ft.RET_OK, None
+
+    def close(self):
+        pass
+
+
+class TestAccountRegistry:
+    """账户注册表测试"""
+
+    def test_parse_market_auth(self):
+        """测试市场权限解析（HKCC 不应被识别为 HK）"""
+        assert parse_market_auth(["HKCC"]) == {"HKCC"}
+        assert parse_market_auth("['HK', 'US']") == {"HK", "US"}
+        assert parse_market_auth("") == frozenset()
+
+    def test_lookup_and_routing(self):
+        """测试按账户与股票代码选择市场"""
+        registry = AccountRegistry()
+        registry.load([
+            {"acc_id": "1", "trd_env": "REAL", "trdmarket_auth": ["US"]},
+            {"acc_id": "2", "trd_env": "SIMULATE", "trdmarket_auth": ["HK", "US", "HKCC"]},
+            {"acc_id": "3", "trd_env": "REAL", "trdmarket_auth": ["HKCC"]},
+        ])
+        us_only, multi, hkcc = registry.get("1"), registry.get("2"), registry.get("3")
+        assert us_only.primary_market == "US"
+        assert multi.trd_env == ft.TrdEnv.SIMULATE
+        assert multi.market_for_code("US.AAPL") == "US"
+        assert multi.market_for_code("SH.600519") == "HKCC"
+        assert multi.market_for_code(None) == "HK"
+        assert hkcc.primary_market == "HKCC"
+        assert registry.get("404") is None
+        assert registry.accounts[1]["trdmarket_auth"] == "HK,US,HKCC"
+
+
+class TestTradeContextPool:
+    """交易上下文池测试"""
+
+    def test_lazy_create_and_unlock(self, monkeypatch):
+        """测试按需创建、复用并继承解锁状态"""
+        monkeypatch.setattr(account_registry, "TRADE_CONTEXT_FACTORIES", {
+            "HK": _StubTradeContext, "US": _StubTradeContext, "CN": _StubTradeContext,
+        })
+        _StubTradeContext.created = []
+        pool = TradeContextPool("127.0.0.1", 11111, password="secret")
+        assert not pool.is_open
+
+        pool.unlock("HK")
+        assert len(_StubTradeContext.created) == 1
+        cn = pool.get("CN")
+        assert cn.unlocked
+        assert pool.get("CN") is cn
+        assert len(_StubTradeContext.created) == 2
+
+    def test_unlock_failure_not_cached(self, monkeypatch):
+        """测试懒创建时解锁失败会报错且不缓存上下文"""
+        class _LockedContext(_StubTradeContext):
+            def unlock_trade(self, password):
+                return ft.RET_ERROR, "密码错误"
+
+        monkeypatch.setattr(account_registry, "TRADE_CONTEXT_FACTORIES", {"US": _LockedContext})
+        pool = TradeContextPool("127.0.0.1", 11111, password="secret")
+        pool.unlocked = True
+        with pytest.raises(Exception, match="交易解锁失败"):
+            pool.get("US")
+        assert not pool.is_open
+
+
+class _OrderContext:
+    def __init__(self, rows=None, error=None):
+        self.rows = rows or []
+        self.error = error
+
+    def order_list_query(self, **kwargs):
+        if self.error:
+            raise self.error
+        return ft.RET_OK, pd.DataFrame(self.rows, columns=[
+            "order_id", "code", "stock_name", "trd_side", "order_type", "price", "qty",
+            "dealt_qty", "order_status", "create_time", "updated_time",
+        ])
+
+
+def _order(order_id, code, status):
+    return [order_id, code, code, "BUY", "NORMAL", 1.0, 100, 0, status,
+            "2024-01-02 09:30:00", "2024-01-02 09:30:00"]
+
+
+class TestOrderRouting:
+    """订单查询与市场路由测试"""
+
+    def _client(self, contexts):
+        client = FutuClient(mode="direct")
+        client._is_connected = True
+        for market, ctx in contexts.items():
+            client._trade_contexts.put(market, ctx)
+        client._registry.load([{"acc_id": "1", "trd_env": "REAL", "trdmarket_auth": list(contexts)}])
+        client._active_account_id = "1"
+        return client
+
+    def test_failing_market_skipped(self):
+        """测试单个市场失败时仍返回其他市场订单"""
+        client = self._client({
+            "HK": _OrderContext([_order("1001", "HK.00700", "SUBMITTED")]),
+            "US": _OrderContext([_order("2001", "US.AAPL", "FILLED_ALL")]),
+            "CN": _OrderContext(error=ConnectionError("no CN connectivity")),
+        })
+        orders = asyncio.run(client.get_orders())
+        assert [o["order_id"] for o in orders] == ["1001", "2001"]
+        # 终态订单不保留路由
+        assert dict(client._order_markets) == {("1", "1001"): "HK"}
+
+    def test_all_markets_failing_raises(self):
+        client = self._client({"HK": _OrderContext(error=ConnectionError("down"))})
+        with pytest.raises(Exception, match="获取订单列表失败"):
+            asyncio.run(client.get_orders())
+
+    def test_order_market_cache_bounded(self, monkeypatch):
+        monkeypatch.setattr(futu_client_module, "ORDER_MARKET_CACHE_SIZE", 3)
+        client = self._client({"HK": _OrderContext()})
+        entry = client._registry.get("1")
+        for order_id in range(5):
+            client._remember_order_market(entry, order_id, "HK")
+        assert list(client._order_markets) == [("1", "2"), ("1", "3"), ("1", "4")]
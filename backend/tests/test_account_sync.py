@@ -0,0 +1,127 @@
+"""
+账户增量同步测试
+"""
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.account_sync import AccountSync
+from app.services.futu_client import futu_client
+from app.services.quote_bus import QuoteBus
+
+
+def _order(order_id, status="SUBMITTED", filled=0):
+    return {"order_id": order_id, "stock_code": "HK.00700", "status": status, "filled_quantity": filled}
+
+
+def _position(code, price):
+    return {"stock_code": code, "quantity": 100, "current_price": price}
+
+
+class _Client:
+    def __init__(self):
+        self.calls = 0
+        self.positions = [_position("HK.00700", 360.0)]
+
+    async def get_orders(self, acc_id=None):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [_order("1")]
+
+    async def get_positions(self, acc_id=None):
+        return list(self.positions)
+
+    async def get_acc_info(self, acc_id=None):
+        return {"cash": 1000.0, "updated_at": time.time()}
+
+
+class TestAccountSync:
+    """账户同步测试"""
+
+    def test_versions_and_deltas(self):
+        """测试版本号递增与增量返回"""
+        sync = AccountSync(_Client())
+        v1 = sync.apply("A", orders=[_order("1"), _order("2")], positions=[_position("HK.00700", 360.0),
+                                                                           _position("HK.09988", 75.0)],
+                        balance={"cash": 1000.0, "updated_at": 1})
+        assert v1 == 1
+        # 相同数据不产生新版本（updated_at 不参与比较）
+        assert sync.apply("A", orders=[_order("1"), _order("2")], balance={"cash": 1000.0, "updated_at": 2}) == 1
+
+        v2 = sync.apply("A", positions=[_position("HK.00700", 361.0)], balance={"cash": 900.0})
+        delta = sync.changes("A", since=v1, epoch=sync.epoch)
+        assert v2 == 2 and not delta["full"]
+        assert delta["orders"] == []
+        assert delta["positions"] == [_position("HK.00700", 361.0)]
+        assert delta["removed_positions"] == ["HK.09988"]
+        assert delta["balance"] == {"cash": 900.0}
+
+        assert sync.changes("A", since=v2, epoch=sync.epoch)["positions"] == []
+        # epoch 不符（服务重启）返回全量
+        full = sync.changes("A", since=v2, epoch="old")
+        assert full["full"] and len(full["orders"]) == 2 and full["removed_positions"] == []
+
+    def test_refresh_coalesced_across_clients(self):
+        """测试多个客户端的刷新请求合并为一次"""
+        client = _Client()
+        sync = AccountSync(client, min_interval=60)
+
+        async def run():
+            results = await asyncio.gather(*(sync.sync("A") for _ in range(5)))
+            again = await sync.sync("A", since=results[0]["version"], epoch=sync.epoch)
+            return results, again
+
+        results, again = asyncio.run(run())
+        assert client.calls == 1
+        assert all(r["version"] == 1 for r in results)
+        assert again["orders"] == [] and again["version"] == 1
+
+    def test_long_poll_woken_by_order_push(self):
+        """测试订单推送唤醒长轮询"""
+        bus = QuoteBus()
+        sync = AccountSync(_Client(), bus=bus, min_interval=60)
+
+        async def run():
+            first = await sync.sync("A")
+            started = time.perf_counter()
+
+            async def push():
+                await asyncio.sleep(0.05)
+                bus.publish("order", "HK.00700", {
+                    "order_id": "1", "code": "HK.00700", "stock_name": "腾讯控股", "trd_side": "BUY",
+                    "order_type": "NORMAL", "price": 350.0, "qty": 100, "dealt_qty": 100,
+                    "order_status": "FILLED_ALL", "create_time": "2024-01-02 09:30:00",
+                    "updated_time": "2024-01-02 09:31:00",
+                })
+
+            asyncio.ensure_future(push())
+            delta = await sync.sync("A", since=first["version"], epoch=sync.epoch, wait=5, refresh=False)
+            return delta, time.perf_counter() - started
+
+        delta, elapsed = asyncio.run(run())
+        assert elapsed < 1
+        assert delta["version"] == 2 and [o["status"] for o in delta["orders"]] == ["FILLED_ALL"]
+
+    def test_long_poll_times_out_without_changes(self):
+        """测试无变化时长轮询超时返回"""
+        sync = AccountSync(_Client(), min_interval=0.05)
+        sync.apply("A", orders=[_order("1")])
+
+        async def run():
+            return await sync.sync("A", since=1, epoch=sync.epoch, wait=0.2, refresh=False)
+
+        delta = asyncio.run(run())
+        assert delta["version"] == 1 and delta["orders"] == []
+
+    def test_sync_api_mock(self, monkeypatch):
+        """测试模拟模式下的同步接口"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        client = TestClient(app)
+        first = client.get("/api/sync").json()
+        assert first["full"] and len(first["orders"]) == 2 and first["balance"]["cash"] == 50000.0
+
+        delta = client.get("/api/sync", params={"since": first["version"], "epoch": first["epoch"]}).json()
+        assert not delta["full"] and delta["orders"] == [] and delta["positions"] == []
+        assert client.get("/api/sync", params={"wait": 60}).status_code == 422
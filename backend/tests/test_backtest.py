@@ -0,0 +1,109 @@
+"""
+回测引擎与K线存储测试
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import backtest
+from app.services.futu_client import futu_client
+from app.services.kline_store import KLineStore
+from benchmarks.fixtures import make_bars
+
+
+class TestBacktestEngine:
+    """回测引擎测试"""
+
+    def test_sma_matches_rolling_mean(self):
+        """测试SMA与滚动均值一致"""
+        values = np.arange(1.0, 11.0)
+        out = backtest.sma(values, 3)
+        assert np.isnan(out[:2]).all()
+        assert np.allclose(out[2:], [(v - 1 + v + v - 2) / 3 for v in values[2:]])
+
+    def test_ma_signal_uses_only_past_prices(self):
+        """测试均线信号只使用历史价格"""
+        close = np.linspace(10, 20, 60)
+        full = backtest.signal_ma(close, fast=3, slow=10)
+        truncated = backtest.signal_ma(close[:40], fast=3, slow=10)
+        assert np.array_equal(full[:40], truncated)
+
+    def test_buy_and_hold_without_costs_tracks_price(self):
+        """测试无成本时买入持有净值跟随价格"""
+        close = np.array([10.0, 11.0, 12.1, 9.0, 13.5])
+        sim = backtest.simulate(close, np.ones(len(close)), 1000.0, commission_rate=0, slippage=0)
+        assert sim["equity"][-1] == pytest.approx(1000.0 * close[-1] / close[0])
+
+    def test_costs_reduce_equity(self):
+        """测试手续费与滑点降低净值"""
+        bars = make_bars(100 + np.sin(np.arange(200) / 5) * 10)
+        free = backtest.run_backtest(bars, "MA", {"fast": 3, "slow": 8}, commission_rate=0, slippage=0)
+        paid = backtest.run_backtest(bars, "MA", {"fast": 3, "slow": 8})
+        assert paid.stats["trade_count"] == free.stats["trade_count"] > 0
+        assert paid.equity[-1] < free.equity[-1]
+
+    def test_unknown_strategy_rejected(self):
+        """测试未知策略被拒绝"""
+        with pytest.raises(ValueError):
+            backtest.run_backtest(make_bars([1.0, 2.0]), "UNKNOWN")
+
+    def test_kline_store_roundtrip(self, tmp_path):
+        """测试K线存储写入后可读回并只补缺失区间"""
+        store = KLineStore(str(tmp_path))
+        store.save("HK.00700", make_bars([1.0, 2.0, 3.0], start="2024-01-02"), coverage=("2024-01-02", "2024-01-04"))
+        store.save("HK.00700", make_bars([5.0], start="2024-01-03"))
+
+        reopened = KLineStore(str(tmp_path))
+        bars = reopened.query("HK.00700", "2024-01-03", "2024-01-04")
+        assert list(bars["close"]) == [5.0, 3.0]
+        assert reopened._missing_ranges(("HK.00700", "K_DAY"), "2024-01-01", "2024-01-04") == [
+            ("2024-01-01", "2024-01-02")
+        ]
+
+
+class TestBacktestAPI:
+    """回测API测试"""
+
+    def test_backtest_api_mock_mode(self, monkeypatch):
+        """测试模拟模式下的回测接口"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        client = TestClient(app)
+        resp = client.post("/api/strategy/backtest", json={
+            "stock_code": "HK.TEST0",
+            "strategy_type": "MACD",
+            "start_date": "2023-01-01",
+            "end_date": "2023-12-31",
+        })
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["bars"] == len(data["equity_curve"]) > 200
+        assert "sharpe" in data["stats"]
+
+        resp = client.post("/api/strategy/backtest", json={
+            "stock_code": "HK.TEST0", "strategy_type": "MA", "params": {"bogus": 1},
+        })
+        assert resp.status_code == 400
+
+    @pytest.mark.parametrize("strategy,params", [
+        ("MA", {"fast": 0}),
+        ("MACD", {"signal": -1}),
+        ("GRID", {"levels": 0}),
+        ("DCA", {"interval": 0}),
+    ])
+    def test_non_positive_params_rejected(self, strategy, params):
+        """测试非正策略参数被拒绝"""
+        with pytest.raises(ValueError):
+            backtest.run_backtest(make_bars(np.linspace(1, 2, 50)), strategy, params)
+
+    @pytest.mark.parametrize("body", [
+        {"capital": 0},
+        {"start_date": "not-a-date"},
+        {"strategy_type": "GRID", "params": {"levels": 0}},
+        {"start_date": "2024-02-01", "end_date": "2024-01-01"},
+    ])
+    def test_backtest_api_rejects_invalid_input(self, monkeypatch, body):
+        """测试回测接口拒绝非法输入"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        resp = TestClient(app).post("/api/strategy/backtest", json={"stock_code": "HK.TEST0", **body})
+        assert resp.status_code in (400, 422)
@@ -0,0 +1,24 @@
+"""
+基准比对测试
+"""
+from benchmarks import runner
+
+
+def _result(**medians):
+    return {"meta": {}, "results": {k: {"median_us": v} for k, v in medians.items()}}
+
+
+class TestBenchmarkCompare:
+    """基线比对测试"""
+
+    def test_flags_regression_over_threshold(self):
+        """测试超过阈值判定为回归"""
+        rows = runner.compare(_result(a=100.0, b=100.0), _result(a=125.0, b=105.0), threshold=0.1)
+        status = {r["name"]: r["status"] for r in rows}
+        assert status == {"a": "regression", "b": "ok"}
+
+    def test_improved_and_new_cases(self):
+        """测试性能提升与新增用例"""
+        rows = runner.compare(_result(a=100.0), _result(a=50.0, c=10.0), threshold=0.1)
+        status = {r["name"]: r["status"] for r in rows}
+        assert status == {"a": "improved", "c": "new"}
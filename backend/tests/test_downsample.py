@@ -0,0 +1,108 @@
+"""
+图表降采样测试
+"""
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.api import market
+from app.main import app
+from app.services.futu_client import futu_client
+from app.utils.downsample import lttb_indices, ohlc_buckets
+from benchmarks.fixtures import make_bars
+
+
+def _bars(n):
+    """1分钟K线随机游走"""
+    rng = np.random.default_rng(7)
+    close = 350 + rng.normal(0, 1, n).cumsum()
+    volume = rng.integers(100, 1000, n)
+    return make_bars(close, start="2024-01-02 09:30", step=60, open=close - 0.1,
+                     high=close + rng.uniform(0, 1, n), low=close - rng.uniform(0, 1, n),
+                     volume=volume, turnover=volume * close)
+
+
+def _lttb_reference(x, y, n):
+    """逐点实现的LTTB，用于校验向量化版本"""
+    length = len(x)
+    edges = [1 + b * (length - 2) // (n - 2) for b in range(n - 1)]
+    selected = [0]
+    a = 0
+    for b in range(n - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 1 < n - 2:
+            nxt = range(edges[b + 1], edges[b + 2])
+            cx = sum(x[i] for i in nxt) / len(nxt)
+            cy = sum(y[i] for i in nxt) / len(nxt)
+        else:
+            cx, cy = x[-1], y[-1]
+        areas = [abs((x[a] - cx) * (y[i] - y[a]) - (x[a] - x[i]) * (cy - y[a])) for i in range(lo, hi)]
+        a = lo + int(np.argmax(areas))
+        selected.append(a)
+    return selected + [length - 1]
+
+
+class TestDownsample:
+    """K线降采样测试"""
+
+    def test_ohlc_buckets_preserve_extremes_and_totals(self):
+        """测试OHLC分桶保留极值与成交量合计"""
+        bars = _bars(1003)
+        out = ohlc_buckets(bars, 100)
+        assert len(out) == 100
+        assert out["high"].max() == bars["high"].max()
+        assert out["low"].min() == bars["low"].min()
+        assert out["volume"].sum() == bars["volume"].sum()
+        assert out["time"][0] == bars["time"][0] and out["open"][0] == bars["open"][0]
+        assert out["close"][-1] == bars["close"][-1]
+        assert np.all(np.diff(out["time"]) > 0)
+        assert len(ohlc_buckets(bars[:50], 100)) == 50
+
+    def test_lttb_matches_reference(self):
+        """测试向量化LTTB与参照实现一致"""
+        bars = _bars(997)
+        x, y = bars["time"].astype("f8"), bars["close"]
+        indices = lttb_indices(x, y, 50)
+        assert len(indices) == 50
+        assert indices.tolist() == _lttb_reference(x.tolist(), y.tolist(), 50)
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        """测试LTTB保留首尾点与尖峰"""
+        y = np.zeros(1000)
+        y[337] = 100.0
+        indices = lttb_indices(np.arange(1000), y, 20)
+        assert indices[0] == 0 and indices[-1] == 999
+        assert 337 in indices
+        assert np.all(np.diff(indices) > 0)
+        assert lttb_indices(np.arange(5), np.arange(5), 10).tolist() == [0, 1, 2, 3, 4]
+
+    def test_kline_api_downsamples(self, monkeypatch):
+        """测试K线接口按点数降采样"""
+        bars = _bars(5000)
+        frame = pd.DataFrame({
+            "code": "HK.00700",
+            "time_key": pd.to_datetime(bars["time"], unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+            **{f: bars[f] for f in ("open", "high", "low", "close", "volume", "turnover")},
+        })
+
+        async def get_kline_frame(code, start=None, end=None, ktype="K_DAY"):
+            return frame
+
+        monkeypatch.setattr(futu_client, "_is_connected", True)
+        monkeypatch.setattr(futu_client, "get_kline_frame", get_kline_frame)
+        market._kline_cache.clear()
+        client = TestClient(app)
+
+        full = client.get("/api/market/kline/HK.00700", params={"kline_type": "K_1M"})
+        ohlc = client.get("/api/market/kline/HK.00700", params={"kline_type": "K_1M", "max_points": 500})
+        lttb = client.get("/api/market/kline/HK.00700",
+                          params={"kline_type": "K_1M", "max_points": 500, "downsample": "lttb"})
+        market._kline_cache.clear()
+
+        assert len(full.json()) == 5000
+        assert len(ohlc.json()) == 500 and len(lttb.json()) == 500
+        assert max(k["high_price"] for k in ohlc.json()) == bars["high"].max()
+        assert ohlc.json()[0]["timestamp"] == full.json()[0]["timestamp"]
+        assert lttb.json()[-1] == full.json()[-1]
+        assert len({full.headers["etag"], ohlc.headers["etag"], lttb.headers["etag"]}) == 3
+        assert client.get("/api/market/kline/HK.00700", params={"max_points": 5}).status_code == 422
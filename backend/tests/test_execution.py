@@ -0,0 +1,197 @@
+"""
+算法执行测试
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.execution import ExecutionEngine, twap_schedule, vwap_schedule
+from app.services.quote_bus import QuoteBus
+from benchmarks.fixtures import make_bars
+
+
+class _FakeClient:
+    """记录下单/改单/撤单；auto_fill 时立即推送全部成交"""
+
+    def __init__(self, trades: QuoteBus, auto_fill=True):
+        self.trades = trades
+        self.auto_fill = auto_fill
+        self.placed = []
+        self.modified = []
+        self.cancelled = []
+
+    async def place_order(self, stock_code, side, price, quantity, order_type="LIMIT", acc_id=None):
+        order_id = str(len(self.placed) + 1)
+        self.placed.append((order_id, price, quantity))
+        if self.auto_fill:
+            asyncio.get_running_loop().call_soon(self.fill, order_id, quantity, price)
+        return {"order_id": order_id}
+
+    def fill(self, order_id, quantity, price=10.0):
+        self.trades.publish("order", "HK.00700", {
+            "order_id": order_id, "dealt_qty": float(quantity), "dealt_avg_price": price,
+            "order_status": "FILLED_ALL",
+        })
+
+    async def modify_order(self, order_id, price, quantity, acc_id=None):
+        self.modified.append((order_id, price, quantity))
+
+    async def cancel_order(self, order_id, acc_id=None):
+        self.cancelled.append(order_id)
+
+    async def get_quote(self, stock_code):
+        return {"current_price": 10.0}
+
+    async def get_orders(self, acc_id=None):
+        return []
+
+
+class _Master:
+    async def lot_size(self, code):
+        return 100
+
+
+def _engine(auto_fill=True, **kwargs):
+    trades, quotes = QuoteBus(), QuoteBus()
+    client = _FakeClient(trades, auto_fill)
+    engine = ExecutionEngine(client, bus=trades, quotes=quotes, master=_Master(), tick_seconds=0.01, **kwargs)
+    return engine, client, quotes
+
+
+class TestExecutionSchedule:
+    """算法单排程测试"""
+
+    def test_twap_schedule_targets(self):
+        """测试TWAP排程的时间点与累计目标"""
+        times, frac = twap_schedule(0.0, 100.0, 4)
+        assert times.tolist() == [0, 25, 50, 75] and frac.tolist() == [0.25, 0.5, 0.75, 1.0]
+
+    def test_vwap_schedule_follows_volume_profile(self):
+        """测试VWAP排程跟随历史成交量分布"""
+        start = datetime(2024, 1, 2, 9, 30)
+        days = [datetime(2024, 1, 1) - timedelta(days=d) for d in range(3)]
+        minutes = np.array([(d + timedelta(hours=9, minutes=30 + m)).timestamp() for d in days for m in range(10)])
+        # 按本机时区换算成“当地时间按UTC计”的秒数
+        local = [int((datetime.fromtimestamp(t) - datetime(1970, 1, 1)).total_seconds()) for t in minutes]
+        bars = make_bars(np.zeros(len(minutes)), local, volume=np.tile([300] * 5 + [100] * 5, 3))
+        times, frac = vwap_schedule(bars, start.timestamp(), start.timestamp() + 600)
+        assert times[0] == start.timestamp() and len(times) == 2
+        assert frac == pytest.approx([0.75, 1.0])
+
+
+class TestExecutionEngine:
+    """算法单执行引擎测试"""
+
+    def test_twap_parent_completes_in_slices(self):
+        """测试TWAP母单分片下单直至完成"""
+        engine, client, _ = _engine()
+
+        async def run():
+            parent = await engine.submit("HK.00700", "BUY", 1000, "TWAP",
+                                         end_at=datetime.now() + timedelta(seconds=0.2), slices=4)
+            while parent.is_active:
+                await asyncio.sleep(0.01)
+            await engine.shutdown()
+            return parent
+
+        parent = asyncio.run(run())
+        assert parent.status == "FILLED" and parent.filled == 1000
+        assert [q for _, _, q in client.placed] == [200, 300, 200, 300]
+        assert parent.avg_price == pytest.approx(10.0)
+
+    def test_iceberg_shows_only_display_quantity(self):
+        """测试冰山单只挂出显示数量"""
+        engine, client, _ = _engine(auto_fill=False)
+
+        async def run():
+            parent = await engine.submit("HK.00700", "SELL", 500, "ICEBERG", display_quantity=200)
+            for _ in range(3):
+                await asyncio.sleep(0.05)
+                assert parent.working <= 200
+                order_id, price, qty = client.placed[-1]
+                client.fill(order_id, qty, price)
+            await asyncio.sleep(0.05)
+            await engine.shutdown()
+            return parent
+
+        parent = asyncio.run(run())
+        assert [q for _, _, q in client.placed] == [200, 200, 100]
+        assert parent.status == "FILLED"
+
+    def test_stale_child_replaced_and_cancel(self):
+        """测试过期子单被替换，撤销母单时一并撤销子单"""
+        engine, client, quotes = _engine(auto_fill=False, replace_seconds=0.05)
+
+        async def run():
+            quotes.publish("quote", "HK.00700", {"code": "HK.00700", "last_price": 10.0})
+            parent = await engine.submit("HK.00700", "BUY", 300, "ICEBERG", display_quantity=300, limit_price=10.5)
+            await asyncio.sleep(0.03)
+            quotes.publish("quote", "HK.00700", {"code": "HK.00700", "last_price": 11.0})
+            await asyncio.sleep(0.1)
+            # 部分成交后撤销母单
+            client.trades.publish("order", "HK.00700", {"order_id": "1", "dealt_qty": 100.0, "order_status": "FILLED_PART"})
+            cancelled = await engine.cancel(parent.algo_id)
+            await engine.shutdown()
+            return cancelled
+
+        parent = asyncio.run(run())
+        # 买入改价不超过母单限价
+        assert client.modified[0] == ("1", 10.5, 300)
+        assert client.cancelled == ["1"]
+        assert parent.status == "CANCELLED" and parent.filled == 100
+
+    def test_failed_parent_cancels_open_children(self):
+        """测试母单失败时撤销未成交子单"""
+        engine, client, quotes = _engine(auto_fill=False, replace_seconds=0.0)
+
+        async def modify_order(order_id, price, quantity, acc_id=None):
+            raise Exception("改单失败")
+
+        client.modify_order = modify_order
+
+        async def run():
+            quotes.publish("quote", "HK.00700", {"code": "HK.00700", "last_price": 10.0})
+            parent = await engine.submit("HK.00700", "BUY", 300, "ICEBERG", display_quantity=300)
+            await asyncio.sleep(0.03)
+            quotes.publish("quote", "HK.00700", {"code": "HK.00700", "last_price": 10.2})
+            while parent.is_active:
+                await asyncio.sleep(0.01)
+            await engine.shutdown()
+            return parent
+
+        parent = asyncio.run(run())
+        assert parent.status == "FAILED" and len(parent.errors) == 5
+        assert client.cancelled == ["1"] and parent.children["1"].status == "CANCELLED_ALL"
+
+    def test_delayed_start_places_nothing_before_start_at(self):
+        """测试开始时间之前不下子单"""
+        engine, client, _ = _engine(auto_fill=False)
+
+        async def run():
+            start = datetime.now() + timedelta(seconds=0.1)
+            parent = await engine.submit("HK.00700", "BUY", 300, "ICEBERG", display_quantity=100, start_at=start)
+            await asyncio.sleep(0.05)
+            before = list(client.placed)
+            await asyncio.sleep(0.1)
+            await engine.shutdown()
+            return before, parent
+
+        before, parent = asyncio.run(run())
+        assert before == [] and [q for _, _, q in client.placed] == [100]
+        assert parent.is_active
+
+    def test_submit_validation(self):
+        """测试提交参数校验"""
+        engine, _, _ = _engine()
+
+        async def run(**kwargs):
+            await engine.submit("HK.00700", "BUY", **kwargs)
+
+        with pytest.raises(ValueError):
+            asyncio.run(run(quantity=150, algo="TWAP", end_at=datetime.now() + timedelta(minutes=1)))
+        with pytest.raises(ValueError):
+            asyncio.run(run(quantity=200, algo="TWAP"))
+        with pytest.raises(ValueError):
+            asyncio.run(run(quantity=200, algo="ICEBERG"))
@@ -0,0 +1,122 @@
+"""
+数据导出测试
+"""
+import asyncio
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.api import export as export_api
+from app.main import app
+from app.services.export import FrameEncoder, history_frames, history_windows, kline_frames, stream_frames
+from app.services.futu_client import futu_client
+from app.services.kline_store import REHAB_DTYPE, KLineStore, adjust_bars
+from benchmarks.fixtures import make_bars
+
+
+def _bars(n):
+    """收盘价依次为 1..n 的日K线"""
+    return make_bars(np.arange(n) + 1.0)
+
+
+class TestExportStreams:
+    """数据导出测试"""
+
+    def test_kline_frames_chunks_and_formats_time(self):
+        """测试K线按块切分并格式化时间"""
+        frames = list(kline_frames("HK.00700", _bars(25), chunk_rows=10))
+        assert [len(f) for f in frames] == [10, 10, 5]
+        assert frames[0]["time_key"].iloc[0] == "2024-01-01 00:00:00"
+        assert frames[2]["close"].iloc[-1] == 25
+
+    def test_csv_stream_header_first_and_round_trip(self):
+        """测试CSV流先输出表头且可完整读回"""
+        encoder = FrameEncoder("csv", ["code", "time_key", "close"])
+        chunks = stream_frames(kline_frames("HK.00700", _bars(25), chunk_rows=10), encoder)
+        assert next(chunks) == b"code,time_key,close\n"
+        frame = pd.read_csv(io.BytesIO(b"code,time_key,close\n" + b"".join(chunks)))
+        assert len(frame) == 25 and encoder.rows == 25
+        assert frame["close"].tolist() == list(range(1, 26))
+
+    def test_ndjson_stream(self):
+        """测试NDJSON流输出"""
+        encoder = FrameEncoder("ndjson", ["code", "close", "missing"])
+        body = b"".join(stream_frames(kline_frames("HK.00700", _bars(3)), encoder)).decode()
+        rows = [json.loads(line) for line in body.splitlines()]
+        assert rows[2] == {"code": "HK.00700", "close": 3.0, "missing": None}
+
+    def test_scan_memory_maps_uncached_series(self, tmp_path):
+        """测试未缓存的序列以内存映射方式扫描"""
+        KLineStore(str(tmp_path)).save("HK.00700", _bars(40))
+        store = KLineStore(str(tmp_path))
+        view, rehab = store.scan("HK.00700", "2024-01-11", "2024-01-20")
+        assert isinstance(view.base, np.memmap) or isinstance(view, np.memmap)
+        assert len(view) == 10 and view["close"][0] == 11 and len(rehab) == 0
+        assert not store._cache
+        assert len(store.scan("HK.99999")[0]) == 0
+
+    def test_kline_frames_adjust_per_chunk(self):
+        """测试逐块复权与整体复权结果一致"""
+        bars = _bars(25)
+        rehab = np.zeros(2, dtype=REHAB_DTYPE)
+        rehab["time"] = bars["time"][[7, 18]]
+        rehab["fwd_a"], rehab["fwd_b"] = [0.5, 0.9], [-0.2, 0.0]
+        rehab["bwd_a"], rehab["bwd_b"] = [2.0, 1.1], [0.4, 0.0]
+        for autype in ("qfq", "hfq"):
+            chunked = pd.concat(kline_frames("HK.00700", bars, chunk_rows=10, rehab=rehab, autype=autype))
+            np.testing.assert_allclose(chunked["close"], adjust_bars(bars, rehab, autype)["close"])
+
+    def test_history_windows_cover_range_without_overlap(self):
+        """测试历史窗口覆盖整个区间且互不重叠"""
+        windows = history_windows("2024-01-01", "2024-03-05", days=30)
+        assert windows[0] == ("2024-01-01 00:00:00", "2024-01-30 23:59:59")
+        assert windows[-1] == ("2024-03-01 00:00:00", "2024-03-05 23:59:59")
+        assert len(windows) == 3
+
+    def test_history_frames_query_per_window(self):
+        """测试历史订单按窗口分段查询"""
+        class _Client:
+            calls = []
+
+            async def get_history_frame(self, kind, start, end, acc_id=None):
+                self.calls.append((kind, start))
+                return pd.DataFrame({"order_id": [start]}) if start.startswith("2024-01-01") else pd.DataFrame()
+
+        async def run():
+            return [f async for f in history_frames(_Client(), "orders", "2024-01-01", "2024-02-20")]
+
+        frames = asyncio.run(run())
+        assert len(_Client.calls) == 2 and len(frames) == 1
+
+
+class TestExportAPI:
+    """导出API测试"""
+
+    def test_export_kline_api(self, tmp_path, monkeypatch):
+        """测试K线导出接口"""
+        store = KLineStore(str(tmp_path))
+        store.save("HK.00700", _bars(30))
+        monkeypatch.setattr(export_api, "kline_store", store)
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        client = TestClient(app)
+
+        resp = client.get("/api/export/kline", params={"codes": "HK.00700,HK.09988", "start_date": "2024-01-21"})
+        assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/csv")
+        assert 'filename="kline_K_DAY.csv"' in resp.headers["content-disposition"]
+        lines = resp.text.splitlines()
+        assert lines[0] == "code,time_key,open,high,low,close,volume,turnover" and len(lines) == 11
+
+        assert client.get("/api/export/kline", params={"codes": "HK.00700", "format": "xml"}).status_code == 400
+
+    def test_export_orders_api_mock(self, monkeypatch):
+        """测试模拟模式下的订单导出接口"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        client = TestClient(app)
+        resp = client.get("/api/export/deals", params={"format": "ndjson"})
+        assert resp.status_code == 200
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [r["code"] for r in rows] == ["HK.00700", "HK.09988"]
+        assert client.get("/api/export/orders", params={"start_date": "2024-02-01", "end_date": "2024-01-01"}).status_code == 400
@@ -0,0 +1,144 @@
+"""
+横截面因子引擎测试
+"""
+import asyncio
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import factors
+from app.services.factors import FactorEngine, cs_rank, cs_zscore, pct_change, rolling_mean, rolling_std
+from app.services.kline_store import KLineStore
+from benchmarks.fixtures import make_bars
+
+
+def _bars(days: pd.DatetimeIndex, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, len(days))))
+    return make_bars(close, days, turnover=rng.uniform(1e6, 1e8, len(days)))
+
+
+def _store(tmp_path, codes, days):
+    store = KLineStore(str(tmp_path))
+    for i, code in enumerate(codes):
+        store.save(code, _bars(days, i))
+    return store
+
+
+class TestFactorOperators:
+    """因子算子测试"""
+
+    def test_operators_match_pandas(self):
+        """测试因子算子与pandas计算一致"""
+        rng = np.random.default_rng(0)
+        x = rng.normal(size=(300, 6)).astype(np.float32)
+        x[rng.random(x.shape) < 0.05] = np.nan
+        frame = pd.DataFrame(x.astype(np.float64))
+
+        np.testing.assert_allclose(rolling_mean(x, 20), frame.rolling(20, min_periods=16).mean(), rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(rolling_std(x, 20), frame.rolling(20, min_periods=16).std(), rtol=1e-3, atol=1e-4)
+        np.testing.assert_allclose(pct_change(x + 10, 5), (frame + 10).pct_change(5, fill_method=None), rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(cs_rank(x), frame.rank(axis=1, pct=False).sub(1).div(frame.count(axis=1).sub(1), axis=0))
+
+    def test_cs_zscore_within_groups(self):
+        """测试分组内截面标准化"""
+        x = np.array([[1.0, 2.0, 3.0, 100.0, 200.0, np.nan]], dtype=np.float32)
+        groups = np.array([0, 0, 0, 1, 1, 1])
+        z = cs_zscore(x, groups)[0]
+        np.testing.assert_allclose(z[:3], [-1, 0, 1])
+        np.testing.assert_allclose(z[3:5], [-np.sqrt(0.5), np.sqrt(0.5)], rtol=1e-6)
+        assert np.isnan(z[5])
+        # 单组只有一个有效样本
+        assert np.isnan(cs_zscore(np.array([[1.0, np.nan]]), np.array([0, 1]))[0, 0])
+
+
+class TestFactorEngine:
+    """因子引擎测试"""
+
+    def test_incremental_update_matches_full_build(self, tmp_path):
+        """测试增量更新与全量构建结果一致"""
+        codes = ["HK.00001", "HK.00002", "US.AAPL", "US.MSFT"]
+        days = pd.bdate_range(end="2026-10-16", periods=400)
+        store = _store(tmp_path, codes[1:], days)
+        # 港股 10-13 休市
+        store.save(codes[0], _bars(days.drop(pd.Timestamp("2026-10-13")), 9))
+        engine = FactorEngine(store, max_days=360)
+
+        panel = engine.build(codes, end="2026-10-09")
+        assert engine.update(panel) == 5
+        full = engine.build(codes, end="2026-10-16")
+
+        np.testing.assert_array_equal(panel.times, full.times)
+        np.testing.assert_allclose(panel.close, full.close, rtol=1e-6)
+        for name in factors.FACTORS:
+            np.testing.assert_allclose(panel.factors[name][-5:], full.factors[name][-5:], rtol=1e-4, equal_nan=True)
+        assert engine.update(panel) == 0
+
+    def test_update_rescales_qfq_history(self, tmp_path):
+        """测试除权后重算前复权历史"""
+        days = pd.bdate_range(end="2026-10-16", periods=300)
+        store = _store(tmp_path, ["HK.00700"], days)
+        engine = FactorEngine(store, max_days=300)
+        panel = engine.build(["HK.00700"], end="2026-10-15")
+        before = panel.close.copy()
+
+        # 除权后前复权价格整体减半
+        bars = store.load("HK.00700").copy()
+        bars["close"] /= 2
+        store.save("HK.00700", bars)
+        engine.update(panel)
+        np.testing.assert_allclose(panel.close[:-1], before / 2, rtol=1e-5)
+        np.testing.assert_allclose(panel.close[-1], bars["close"][-1], rtol=1e-6)
+
+    def test_apanel_fills_missing_daily_bars(self, tmp_path):
+        """测试计算面板前补齐缺失的日K线"""
+        codes = ["HK.00001", "HK.00002", "HK.00003"]
+        days = pd.bdate_range(end=date.today(), periods=300)
+
+        class _Client:
+            is_connected = True
+
+            def __init__(self):
+                self.requested = []
+
+            async def request_history_kline(self, code, start, end, ktype, autype):
+                self.requested.append(code)
+                bars = _bars(days, len(self.requested))
+                return pd.DataFrame({"time_key": days.strftime("%Y-%m-%d 00:00:00"),
+                                     **{f: bars[f] for f in ("open", "high", "low", "close", "volume", "turnover")}})
+
+            async def get_rehab(self, code):
+                return pd.DataFrame(columns=["ex_div_date"])
+
+        client = _Client()
+        engine = FactorEngine(KLineStore(str(tmp_path)), max_days=300, client=client)
+        panel = asyncio.run(engine.apanel(codes))
+        assert sorted(client.requested) == codes and panel.close.shape == (300, 3)
+        # 已覆盖的区间不重复拉取
+        asyncio.run(engine.apanel(codes))
+        assert len(client.requested) == 3
+
+    def test_factors_api(self, tmp_path, monkeypatch):
+        """测试因子接口"""
+        codes = [f"HK.{i:05d}" for i in range(1, 31)]
+        days = pd.bdate_range(end=date.today(), periods=300)
+        engine = FactorEngine(_store(tmp_path, codes, days), max_days=300)
+        monkeypatch.setattr("app.api.market.factor_engine", engine)
+
+        client = TestClient(app)
+        assert set(client.get("/api/market/factors").json()) == set(factors.FACTORS)
+        response = client.post("/api/market/factors", json={
+            "codes": codes, "factors": ["reversal", "volatility"], "sort_by": "reversal_z", "limit": 10,
+        })
+        data = response.json()
+        assert response.status_code == 200 and data["total"] == 30 and data["groups"] == 1
+        values = [r["reversal_z"] for r in data["rows"]]
+        assert len(values) == 10 and values == sorted(values, reverse=True)
+        assert "momentum" not in data["rows"][0]
+
+        assert client.post("/api/market/factors", json={"codes": codes, "factors": ["alpha"]}).status_code == 400
+        assert client.post("/api/market/factors", json={"codes": codes, "trade_date": "2000-01-01"}).status_code == 400
+        assert client.post("/api/market/factors", json={"codes": codes, "sort_by": "beta"}).status_code == 400
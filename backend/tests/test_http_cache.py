@@ -0,0 +1,93 @@
+"""
+K线HTTP缓存测试
+"""
+import futu as ft
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import market
+from app.main import app
+from app.services.futu_client import futu_client
+
+
+client = TestClient(app)
+
+
+class _StubQuoteContext:
+    def __init__(self):
+        self.calls = 0
+        self.frame = pd.DataFrame({
+            "code": "HK.00700",
+            "time_key": ["2024-01-02 00:00:00", "2024-01-03 00:00:00"],
+            "open": [350.0, 352.0],
+            "close": [352.0, 355.0],
+            "high": [353.0, 356.0],
+            "low": [349.0, 351.0],
+            "volume": [1000, 2000],
+            "turnover": [352000.0, 710000.0],
+        })
+
+    def get_cur_kline(self, code, num, ktype=None, **kwargs):
+        self.calls += 1
+        return ft.RET_OK, self.frame
+
+    def request_history_kline(self, code, start=None, end=None, ktype=None, page_req_key=None, **kwargs):
+        self.calls += 1
+        day = self.frame["time_key"].str[:10]
+        mask = (day >= (start or "")) & (day <= (end or "9999"))
+        return ft.RET_OK, self.frame[mask].reset_index(drop=True), None
+
+
+@pytest.fixture
+def connected(monkeypatch):
+    stub = _StubQuoteContext()
+    monkeypatch.setattr(futu_client, "_is_connected", True)
+    monkeypatch.setattr(futu_client, "_quote_ctx", stub)
+    market._kline_cache.clear()
+    yield stub
+    market._kline_cache.clear()
+
+
+class TestKlineCaching:
+    """K线条件请求测试"""
+
+    def test_etag_and_not_modified(self, connected):
+        """测试ETag与304"""
+        first = client.get("/api/market/kline/HK.00700")
+        assert first.status_code == 200
+        assert first.headers["cache-control"] == "private, max-age=60"
+        etag = first.headers["etag"]
+        assert len(first.json()) == 2
+
+        second = client.get("/api/market/kline/HK.00700", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+
+    def test_last_bar_change_updates_etag(self, connected):
+        """测试最新K线变化后ETag改变"""
+        etag = client.get("/api/market/kline/HK.00700").headers["etag"]
+        connected.frame.loc[1, "close"] = 356.0
+        response = client.get("/api/market/kline/HK.00700", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()[-1]["close_price"] == 356.0
+
+    def test_closed_range_served_without_upstream(self, connected):
+        """测试已结束的历史区间直接由缓存返回"""
+        url = "/api/market/kline/HK.00700?start_date=2024-01-01&end_date=2024-01-31"
+        first = client.get(url)
+        assert first.headers["cache-control"] == "public, max-age=86400"
+        second = client.get(url)
+        assert second.content == first.content
+        assert connected.calls == 1
+
+    def test_closed_range_only_returns_bars_in_range(self, connected):
+        """测试历史区间按日期拉取，不返回区间外的最新K线"""
+        connected.frame.loc[len(connected.frame)] = [
+            "HK.00700", "2026-10-19 00:00:00", 400.0, 401.0, 402.0, 399.0, 3000, 1203000.0,
+        ]
+        response = client.get("/api/market/kline/HK.00700?start_date=2024-01-03&end_date=2024-01-31")
+        assert response.status_code == 200
+        days = [k["timestamp"][:10] for k in response.json()]
+        assert days == ["2024-01-03"]
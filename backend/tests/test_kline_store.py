@@ -0,0 +1,107 @@
+"""
+K线本地复权测试
+"""
+import asyncio
+
+import futu as ft
+import numpy as np
+import pandas as pd
+
+from app.services.kline_store import KLineStore, adjust_bars, rehab_to_table
+from benchmarks.fixtures import make_bars
+
+
+def _bars(days):
+    base = 100.0 + np.arange(len(days))
+    return make_bars(base + 3, days, open=base, high=base + 1, low=base + 2, volume=1000)
+
+
+# 2024-01-04 每股派息2元，2024-01-08 一拆二
+REHAB = pd.DataFrame({
+    "ex_div_date": ["2024-01-08", "2024-01-04"],
+    "forward_adj_factorA": [0.5, 1.0],
+    "forward_adj_factorB": [0.0, -2.0],
+    "backward_adj_factorA": [2.0, 1.0],
+    "backward_adj_factorB": [0.0, 2.0],
+})
+
+DAYS = ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05", "2024-01-08", "2024-01-09"]
+
+
+def _sequential(price, time, rehab, autype):
+    """逐次作用除权事件（参照实现）"""
+    if autype == "qfq":
+        for event in rehab:
+            if event["time"] > time:
+                price = price * event["fwd_a"] + event["fwd_b"]
+    else:
+        for event in rehab[::-1]:
+            if event["time"] <= time:
+                price = price * event["bwd_a"] + event["bwd_b"]
+    return price
+
+
+class _Client:
+    is_connected = True
+
+    def __init__(self):
+        self.kline_calls = []
+        self.rehab_calls = 0
+
+    async def request_history_kline(self, code, start, end, ktype, autype):
+        self.kline_calls.append(autype)
+        days = [d for d in DAYS if start <= d <= end]
+        return pd.DataFrame({"time_key": [f"{d} 00:00:00" for d in days],
+                             **{f: _bars(days)[f] for f in ("open", "high", "low", "close", "volume", "turnover")}})
+
+    async def get_rehab(self, code):
+        self.rehab_calls += 1
+        return REHAB
+
+
+class TestKLineStore:
+    """K线存储与复权测试"""
+
+    def test_adjust_matches_sequential_factors(self):
+        """测试累积复权因子与逐次除权结果一致"""
+        rehab = rehab_to_table(REHAB)
+        bars = _bars(DAYS)
+        for autype in ("qfq", "hfq"):
+            adjusted = adjust_bars(bars, rehab, autype)
+            expected = [_sequential(b["close"], b["time"], rehab, autype) for b in bars]
+            np.testing.assert_allclose(adjusted["close"], expected)
+            np.testing.assert_array_equal(adjusted["volume"], bars["volume"])
+        # 除权日之前的价格先减派息再折半，之后不变
+        np.testing.assert_allclose(adjust_bars(bars, rehab, "qfq")["close"], [50.5, 51.0, 52.5, 53.0, 107.0, 108.0])
+        np.testing.assert_allclose(adjust_bars(bars, rehab, "hfq")["close"], [103.0, 104.0, 107.0, 108.0, 216.0, 218.0])
+        assert adjust_bars(bars, rehab, "none") is bars
+
+    def test_store_fetches_raw_once_for_all_autypes(self, tmp_path):
+        """测试各复权类型共用一次原始K线请求"""
+        store = KLineStore(str(tmp_path), rehab_refresh_days=7)
+        client = _Client()
+
+        async def run():
+            return {autype: await store.get("HK.00700", "2024-01-02", "2024-01-09", autype=autype, client=client)
+                    for autype in ("qfq", "hfq", "none", "qfq")}
+
+        series = asyncio.run(run())
+        assert client.kline_calls == [ft.AuType.NONE] and client.rehab_calls == 1
+        assert series["qfq"]["close"][0] == 50.5 and series["hfq"]["close"][-1] == 218.0
+        np.testing.assert_array_equal(series["none"]["close"], _bars(DAYS)["close"])
+
+        # 重新打开后复权因子表从磁盘读取
+        reopened = KLineStore(str(tmp_path))
+        np.testing.assert_array_equal(reopened.query("HK.00700", autype="qfq"), series["qfq"])
+
+    def test_rehab_refresh_policy(self, tmp_path):
+        """测试复权因子的刷新策略"""
+        store = KLineStore(str(tmp_path), rehab_refresh_days=7)
+        assert store.rehab_stale("HK.00700")
+        store.save_rehab("HK.00700", rehab_to_table(REHAB), fetched="2024-01-03")
+        assert not store.rehab_stale("HK.00700", today="2024-01-03")
+        # 已知的除权日 2024-01-04 过后刷新
+        assert store.rehab_stale("HK.00700", today="2024-01-04")
+        store.save_rehab("HK.00700", rehab_to_table(REHAB), fetched="2024-01-08")
+        assert not store.rehab_stale("HK.00700", today="2024-01-14")
+        assert store.rehab_stale("HK.00700", today="2024-01-15")
@@ -0,0 +1,112 @@
+"""
+日志管道测试
+"""
+import io
+import json
+import threading
+
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app.main import app
+from app.utils import log
+from app.utils.log import EventLog, QueueSink, setup_logging, shutdown_logging
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _capture(json_output=True, capacity=100):
+    stream = io.StringIO()
+    sink = QueueSink(stream, json_output, capacity)
+    handler = logger.add(sink, level="DEBUG", format=log._passthrough)
+    return stream, sink, handler
+
+
+class TestLogging:
+    """日志测试"""
+
+    def test_queue_sink_renders_json_in_writer_thread(self):
+        """测试队列输出在写线程中渲染JSON"""
+        stream, sink, handler = _capture()
+        writers = []
+        sink._render = lambda record: writers.append(threading.current_thread().name) or log.render_json(record)
+        sink.start()
+        try:
+            logger.bind(order_id="1001").info("下单 {} {}", "HK.00700", 100)
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logger.exception("失败")
+        finally:
+            logger.remove(handler)
+            sink.stop()
+
+        rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert rows[0]["message"] == "下单 HK.00700 100" and rows[0]["order_id"] == "1001"
+        assert rows[0]["level"] == "INFO" and rows[0]["function"] == "test_queue_sink_renders_json_in_writer_thread"
+        assert "ZeroDivisionError" in rows[1]["exception"]
+        assert writers == ["log-writer", "log-writer"]
+        assert sink.written == 2
+
+    def test_queue_sink_drops_when_full(self):
+        """测试队列满时丢弃日志并计数"""
+        stream, sink, handler = _capture(json_output=False, capacity=2)
+        try:
+            for i in range(5):
+                logger.info("消息 {}", i)
+        finally:
+            logger.remove(handler)
+        assert sink.dropped == 3
+        sink.start()
+        sink.stop()
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 2 and lines[1].endswith("消息 1")
+
+    def test_event_log_rate_limit_reports_suppressed(self):
+        """测试事件日志限速并报告被抑制的条数"""
+        stream, sink, handler = _capture()
+        clock = _Clock()
+        events = EventLog("test_rate", sample_rate=1.0, rate=2, clock=clock)
+        try:
+            for i in range(5):
+                events.info("推送 {}", i)
+            clock.now = 1.0
+            events.info("推送 {}", 5)
+        finally:
+            logger.remove(handler)
+        sink.start()
+        sink.stop()
+        rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [r["message"] for r in rows] == ["推送 0", "推送 1", "推送 5"]
+        assert rows[2]["suppressed"] == 3 and rows[2]["category"] == "test_rate"
+        assert rows[2]["function"] == "test_event_log_rate_limit_reports_suppressed"
+
+    def test_event_log_sampling_and_level_gate(self, monkeypatch):
+        """测试事件日志采样与级别过滤"""
+        monkeypatch.setattr(log, "_level_no", log._LEVEL_NO["INFO"])
+        events = EventLog("test_sample", sample_rate=0.1, rate=0)
+        for _ in range(1000):
+            events.debug("不输出")
+        assert events.suppressed == 0
+        passed = sum(events.allow() for _ in range(2000))
+        assert 100 < passed < 300
+
+    def test_setup_logging_to_file(self, tmp_path):
+        """测试日志输出到文件"""
+        path = tmp_path / "app.log"
+        sink = setup_logging("info", json_output=True, log_file=str(path))
+        try:
+            logger.debug("不输出")
+            logger.info("启动 {}", 1)
+            assert TestClient(app).get("/api/admin/logging").json()["sink"]["dropped"] == 0
+        finally:
+            shutdown_logging()
+        rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert [r["message"] for r in rows] == ["启动 1"]
+        assert sink.written == 1 and log._sink is None
@@ -0,0 +1,172 @@
+"""
+共享行情进程测试
+"""
+import asyncio
+import threading
+import time
+
+import futu as ft
+import pandas as pd
+import pytest
+
+from app.services.futu_client import FutuClient
+from app.services.market_data import RemoteQuoteContext, encode_frame, parse_address, unpack_payload, _HEADER
+from app.services.market_data_server import MarketDataServer
+from app.services.quote_bus import QuoteBus
+from app.services.subscription_manager import SubscriptionManager
+
+
+class _StubQuoteContext:
+    def __init__(self):
+        self.subscribe_calls = []
+
+    def get_market_snapshot(self, code_list):
+        return ft.RET_OK, pd.DataFrame({"code": code_list, "last_price": [360.0] * len(code_list)})
+
+    def subscribe(self, codes, subtypes, **kwargs):
+        self.subscribe_calls.append((list(codes), list(subtypes)))
+        return ft.RET_OK, None
+
+    def unsubscribe(self, codes, subtypes, **kwargs):
+        return ft.RET_OK, None
+
+
+@pytest.fixture
+def market_data_server(tmp_path):
+    address = f"unix:{tmp_path / 'md.sock'}"
+    client = FutuClient(mode="direct")
+    client._quote_ctx = _StubQuoteContext()
+    client._is_connected = True
+    server_bus = QuoteBus()
+    server = MarketDataServer(client, server_bus, address)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    serving = asyncio.run_coroutine_threadsafe(server.serve_forever(), loop)
+    deadline = time.time() + 5
+    while not (tmp_path / "md.sock").exists() and time.time() < deadline:
+        time.sleep(0.01)
+    yield address, client, server_bus, server
+
+    async def _shutdown():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    serving.cancel()
+    asyncio.run_coroutine_threadsafe(_shutdown(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+
+
+class TestMarketDataServer:
+    """共享行情进程测试"""
+
+    def test_remote_call_returns_frame(self, market_data_server):
+        """测试代理行情请求"""
+        address, _, _, _ = market_data_server
+        ctx = RemoteQuoteContext(address, QuoteBus())
+        ret, data = ctx.get_market_snapshot(["HK.00700"])
+        assert ret == ft.RET_OK
+        assert data.iloc[0]["last_price"] == 360.0
+        ctx.close()
+
+    def test_shared_subscription_and_push(self, market_data_server):
+        """测试多个worker订阅同一标的只订阅一次且都收到推送"""
+        address, client, server_bus, server = market_data_server
+        received = []
+        workers = []
+        for _ in range(2):
+            bus = QuoteBus()
+            bus.add_listener("quote", lambda kind, code, data: received.append(code))
+            ctx = RemoteQuoteContext(address, bus)
+            assert ctx.subscribe(["HK.00700"], [ft.SubType.QUOTE])[0] == ft.RET_OK
+            workers.append(ctx)
+
+        assert client._quote_ctx.subscribe_calls == [(["HK.00700"], ["QUOTE"])]
+        assert server.subscription_count == 1
+
+        server_bus.publish("quote", "HK.00700", {"code": "HK.00700", "last_price": 361.0})
+        deadline = time.time() + 5
+        while len(received) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert received == ["HK.00700", "HK.00700"]
+        for ctx in workers:
+            ctx.close()
+
+    def test_unknown_method_rejected(self, market_data_server):
+        """测试不允许代理交易等接口"""
+        address, _, _, _ = market_data_server
+        ctx = RemoteQuoteContext(address, QuoteBus())
+        with pytest.raises(AttributeError):
+            ctx.place_order
+        ctx.close()
+
+
+class TestMarketDataTransport:
+    """行情服务传输测试"""
+
+    def test_frames_roundtrip_without_pickle(self):
+        """测试帧编码：DataFrame与tuple可还原，不依赖pickle"""
+        frame = pd.DataFrame({"code": ["HK.00700"], "last_price": [360.5]})
+        raw = encode_frame({"id": 1, "result": (ft.RET_OK, frame)})
+        message = unpack_payload(raw[_HEADER.size:])
+        ret, data = message["result"]
+        assert ret == ft.RET_OK
+        pd.testing.assert_frame_equal(data, frame)
+        assert b"pickle" not in raw and not raw[_HEADER.size:].startswith(b"\x80")
+
+    def test_non_loopback_tcp_rejected(self):
+        """测试TCP地址只允许回环"""
+        assert parse_address("tcp:127.0.0.1:11200") == ("tcp", ("127.0.0.1", 11200))
+        assert parse_address("tcp:[::1]:11200") == ("tcp", ("::1", 11200))
+        with pytest.raises(ValueError):
+            parse_address("tcp:0.0.0.0:11200")
+        with pytest.raises(ValueError):
+            parse_address("tcp:10.0.0.5:11200")
+
+    def test_resubscribe_groups_by_subtype(self):
+        """测试重连恢复订阅不做代码×类型笛卡尔积"""
+        ctx = RemoteQuoteContext.__new__(RemoteQuoteContext)
+        ctx._subscriptions = {("HK.00700", "QUOTE"), ("HK.09988", "TICKER")}
+        sent = []
+        ctx._request = lambda message: sent.append((message["codes"], message["subtypes"]))
+        ctx._resubscribe()
+        assert sorted(sent) == [(["HK.00700"], ["QUOTE"]), (["HK.09988"], ["TICKER"])]
+
+    def test_websocket_quotes_served_from_push(self, monkeypatch):
+        """测试WebSocket持有订阅的标的直接使用推送报价，不再请求快照"""
+        from app.api import market
+
+        subscribed, snapshots = [], []
+
+        async def fake_subscribe(codes, subtypes):
+            subscribed.append((codes, subtypes))
+
+        async def fake_get_quotes(codes):
+            snapshots.append(list(codes))
+            return [{"stock_code": c} for c in codes]
+
+        monkeypatch.setattr(market.futu_client, "_is_connected", True)
+        monkeypatch.setattr(market.futu_client, "subscribe", fake_subscribe)
+        monkeypatch.setattr(market.futu_client, "get_quotes", fake_get_quotes)
+        monkeypatch.setattr(market, "subscription_manager", SubscriptionManager(market.futu_client))
+        market.quote_bus.publish("quote", "HK.00700", {
+            "code": "HK.00700", "name": "腾讯控股", "last_price": 361.0, "open_price": 358.0,
+            "high_price": 362.0, "low_price": 357.0, "prev_close_price": 360.0,
+            "volume": 1000, "turnover": 361000.0,
+        })
+
+        async def run():
+            await market._acquire_quote_push("ws:1", ["HK.00700", "HK.09988"])
+            await market._acquire_quote_push("ws:2", ["HK.00700"])
+            return await market._fetch_quotes(["HK.00700", "HK.09988"])
+
+        quotes = asyncio.run(run())
+        assert subscribed == [(["HK.00700", "HK.09988"], [ft.SubType.QUOTE])]
+        assert snapshots == [["HK.09988"]]
+        assert [q["stock_code"] for q in quotes] == ["HK.00700", "HK.09988"]
+        assert quotes[0]["current_price"] == 361.0
@@ -0,0 +1,72 @@
+"""
+行情录制测试
+"""
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from app.services.market_recorder import MarketDataReader, MarketRecorder
+from app.services.quote_bus import QuoteBus
+
+
+def _quote(i):
+    return {
+        "code": "HK.00700", "data_date": "2024-01-02", "data_time": f"09:30:{i:02d}",
+        "last_price": 350.0 + i, "open_price": 350.0, "high_price": 360.0, "low_price": 349.0,
+        "prev_close_price": 348.0, "volume": 1000 * i, "turnover": 350000.0 * i,
+    }
+
+
+def _record(tmp_path, compress):
+    bus = QuoteBus()
+    recorder = MarketRecorder(str(tmp_path), compress=compress, flush_seconds=0.05)
+    recorder.start(bus)
+    for i in range(20):
+        bus.publish("quote", "HK.00700", _quote(i))
+    bus.publish("ticker", "HK.00700", {
+        "code": "HK.00700", "time": "2024-01-02 09:30:01.500", "price": 351.0, "volume": 200,
+        "turnover": 70200.0, "ticker_direction": "SELL", "sequence": 7_000_000_000_001,
+    })
+    bus.publish("kline", "HK.00700", {
+        "code": "HK.00700", "time_key": "2024-01-02 09:31:00", "open": 350.0, "close": 351.0,
+        "high": 352.0, "low": 349.5, "volume": 3000, "turnover": 1.05e6, "k_type": "K_1M",
+    })
+    recorder.stop()
+    assert recorder.recorded == 22 and recorder.dropped == 0
+    return MarketDataReader(str(tmp_path)), date.today().isoformat()
+
+
+class TestMarketRecorder:
+    """行情录制测试"""
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_record_and_read_back(self, tmp_path, compress):
+        """测试录制后可完整读回"""
+        reader, day = _record(tmp_path, compress)
+        assert reader.days() == [day]
+        assert reader.streams(day) == ["kline.K_1M", "quote", "ticker"]
+
+        quotes = reader.read(day, "quote", "HK.00700")
+        assert isinstance(quotes, np.memmap) != compress
+        assert len(quotes) == 20
+        assert np.array_equal(quotes["last_price"], 350.0 + np.arange(20))
+        assert np.all(np.diff(quotes["recv_ns"]) >= 0)
+
+        ticker = reader.read(day, "ticker", "HK.00700")[0]
+        assert ticker["direction"] == -1 and ticker["sequence"] == 7_000_000_000_001
+        assert ticker["time"] == np.datetime64("2024-01-02T09:30:01.500", "ms").astype("i8")
+        assert reader.read(day, "kline.K_1M", "HK.00700")["close"][0] == 351.0
+
+    def test_range_query_and_partial_tail(self, tmp_path):
+        """测试按时间范围读取及不完整尾部"""
+        reader, day = _record(tmp_path, False)
+        window = reader.read(day, "quote", "HK.00700",
+                             start=datetime(2024, 1, 2, 9, 30, 5), end=datetime(2024, 1, 2, 9, 30, 10))
+        assert window["last_price"].tolist() == [355.0, 356.0, 357.0, 358.0, 359.0]
+
+        # 模拟进程中途退出留下的半条记录
+        with open(tmp_path / day / "quote" / "HK.00700.bin", "ab") as f:
+            f.write(b"\x00" * 10)
+        assert len(reader.read(day, "quote", "HK.00700")) == 20
+        assert len(reader.read(day, "quote", "HK.99999")) == 0
@@ -0,0 +1,121 @@
+"""
+行情回放测试
+"""
+import asyncio
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.services.futu_client import FutuClient
+from app.services.market_recorder import MarketDataReader, MarketRecorder
+from app.services.market_replay import ReplayQuoteContext, kline_sources, recorded_sources
+from app.services.quote_bus import QuoteBus
+from benchmarks.fixtures import make_bars
+
+
+def _bars(n):
+    return make_bars(100 + np.arange(n), start="2024-01-02", volume=1000)
+
+
+def _collect(bus):
+    events = []
+    bus.add_listener("*", lambda kind, code, data: events.append((kind, code, data)))
+    return events
+
+
+def _recorded(tmp_path):
+    bus = QuoteBus()
+    recorder = MarketRecorder(str(tmp_path), flush_seconds=0.05)
+    recorder.start(bus)
+    for i in range(30):
+        code = ("HK.00700", "HK.09988")[i % 2]
+        bus.publish("quote", code, {
+            "code": code, "data_date": "2024-01-02", "data_time": f"09:30:{i:02d}",
+            "last_price": 100.0 + i, "open_price": 100.0, "high_price": 130.0, "low_price": 99.0,
+            "prev_close_price": 99.5, "volume": 100 * i, "turnover": 1e4 * i,
+        })
+        bus.publish("ticker", code, {
+            "code": code, "time": f"2024-01-02 09:30:{i:02d}.250", "price": 100.0 + i,
+            "volume": 100, "turnover": 1e4, "ticker_direction": "BUY", "sequence": i,
+        })
+    recorder.stop()
+    return MarketDataReader(str(tmp_path)), date.today().isoformat()
+
+
+class TestMarketReplay:
+    """行情回放测试"""
+
+    def test_recorded_replay_is_deterministic(self, tmp_path):
+        """测试录制行情回放结果确定"""
+        reader, day = _recorded(tmp_path)
+
+        def run():
+            bus = QuoteBus()
+            events = _collect(bus)
+            ctx = ReplayQuoteContext(bus)
+            ctx.subscribe(["HK.00700", "HK.09988"], ["QUOTE", "TICKER"])
+            stats = asyncio.run(ctx.replay(recorded_sources(reader, day), speed=0))
+            return events, stats
+
+        first, stats = run()
+        second, _ = run()
+        assert stats["published"] == 60 and stats["skipped"] == 0
+        assert first == second
+        # 与录制时的到达顺序一致：同一标的报价在前、逐笔在后
+        assert [(k, c) for k, c, _ in first[:4]] == [
+            ("quote", "HK.00700"), ("ticker", "HK.00700"), ("quote", "HK.09988"), ("ticker", "HK.09988"),
+        ]
+        assert first[0][2]["data_time"] == "09:30:00" and first[0][2]["last_price"] == 100.0
+        assert first[1][2]["time"] == "2024-01-02 09:30:00.250"
+
+    def test_replay_only_publishes_subscribed(self, tmp_path):
+        """测试回放只发布已订阅的标的"""
+        reader, day = _recorded(tmp_path)
+        bus = QuoteBus()
+        events = _collect(bus)
+        ctx = ReplayQuoteContext(bus)
+        ctx.subscribe(["HK.00700"], ["QUOTE"])
+        stats = asyncio.run(ctx.replay(recorded_sources(reader, day), speed=0))
+        assert stats["published"] == 15 and stats["skipped"] == 45
+        assert {(k, c) for k, c, _ in events} == {("quote", "HK.00700")}
+
+    def test_kline_replay_paced_by_speed(self):
+        """测试K线回放按速度控制节奏"""
+        bus = QuoteBus()
+        events = _collect(bus)
+        ctx = ReplayQuoteContext(bus)
+        ctx.subscribe(["HK.00700"], ["K_DAY", "QUOTE"])
+        # 1天 = 0.05秒
+        stats = asyncio.run(ctx.replay(kline_sources({"HK.00700": _bars(4)}), speed=86400 * 20))
+        assert stats["published"] == 8
+        assert stats["elapsed_seconds"] >= 0.14
+        assert [e[2]["close"] for e in events if e[0] == "kline"] == [100.0, 101.0, 102.0, 103.0]
+        assert [e[2]["prev_close_price"] for e in events if e[0] == "quote"] == [100.0, 100.0, 101.0, 102.0]
+
+    def test_futu_client_replay_mode(self):
+        """测试富途客户端的回放模式"""
+        bus_events = []
+        client = FutuClient(mode="replay")
+        assert client.connect()
+        assert client.is_connected and not client.is_trade_enabled
+
+        async def run():
+            from app.services.quote_bus import quote_bus
+            listener = lambda kind, code, data: bus_events.append(kind)
+            quote_bus.add_listener("*", listener)
+            try:
+                await client.subscribe(["HK.00700"], ["K_DAY"])
+                await client.replay_context.replay(kline_sources({"HK.00700": _bars(3)}), speed=0)
+                await client.subscribe(["HK.00700"], ["QUOTE"])
+                await client.replay_context.replay(kline_sources({"HK.00700": _bars(3)}), speed=0)
+                return await client.get_quote("HK.00700")
+            finally:
+                quote_bus.remove_listener("*", listener)
+                client.close()
+
+        quote = asyncio.run(run())
+        assert bus_events.count("kline") == 6 and bus_events.count("quote") == 3
+        assert quote["current_price"] == 102.0 and quote["change"] == pytest.approx(1.0)
+        with pytest.raises(Exception):
+            asyncio.run(client.get_kline("HK.00700"))
@@ -0,0 +1,98 @@
+"""
+参数寻优测试
+"""
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import optimizer
+from app.services.backtest import run_backtest
+from app.services.futu_client import futu_client
+from benchmarks.fixtures import make_bars
+
+
+def _bars(seed, n=400):
+    rng = np.random.default_rng(seed)
+    return make_bars(100 * np.exp(np.cumsum(rng.normal(0, 0.02, n))))
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+class TestOptimizer:
+    """参数优化测试"""
+
+    def test_expand_grid_and_folds(self):
+        """测试参数网格展开与滚动窗口划分"""
+        assert optimizer.expand_grid({"fast": [5, 10], "slow": [20]}) == [
+            {"fast": 5, "slow": 20}, {"fast": 10, "slow": 20},
+        ]
+        assert optimizer.expand_grid({}) == [{}]
+        assert optimizer.walk_forward_folds(10, 4, 2) == [(0, 4, 6), (2, 6, 8), (4, 8, 10)]
+
+    def test_shared_bars_roundtrip(self):
+        """测试共享内存K线可完整读回"""
+        series = [_bars(1, 5), _bars(2, 3)]
+        shared = optimizer.SharedBars(series)
+        try:
+            optimizer._init_worker(shared.path, shared.offsets)
+            assert np.array_equal(optimizer._symbol_bars(1), series[1])
+            assert np.array_equal(optimizer._symbol_bars(0, 1, 3), series[0][1:3])
+        finally:
+            shared.close()
+
+    def test_sweep_ranks_like_direct_backtest(self):
+        """测试参数扫描排名与直接回测一致"""
+        series = {"HK.A": _bars(1), "HK.B": _bars(2)}
+        grid = {"fast": [3, 5], "slow": [10, 30]}
+        events = asyncio.run(_collect(optimizer.sweep(series, "MA", grid, metric="total_return", workers=2)))
+
+        progress, result = events[:-1], events[-1]
+        assert progress[-1] == {"type": "progress", "done": 8, "total": 8}
+        assert result["type"] == "result" and result["runs"] == 8 and result["errors"] == 0
+
+        best = result["top_runs"][0]
+        direct = run_backtest(series[best["stock_code"]], "MA", best["params"])
+        assert best["stats"]["total_return"] == pytest.approx(direct.stats["total_return"])
+        returns = [r["stats"]["total_return"] for r in result["top_runs"]]
+        assert returns == sorted(returns, reverse=True)
+        assert len(result["by_params"]) == 4
+
+    def test_walk_forward_out_of_sample(self):
+        """测试滚动优化使用样本外区间评估"""
+        series = {"HK.A": _bars(3)}
+        events = asyncio.run(_collect(optimizer.walk_forward(
+            series, "MA", {"fast": [3, 5], "slow": [20]}, train_bars=200, test_bars=100, workers=1,
+        )))
+        result = events[-1]
+        assert [f["fold"] for f in result["folds"]] == [0, 1]
+        assert all(f["params"]["fast"] in (3, 5) for f in result["folds"])
+        assert result["summary"][0]["folds"] == 2
+        assert result["summary"][0]["oos_return"] is not None
+
+    def test_sweep_api_streams_ndjson(self, monkeypatch):
+        """测试参数扫描接口以NDJSON流式返回"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        client = TestClient(app)
+        with client.stream("POST", "/api/strategy/sweep", json={
+            "stock_codes": ["HK.TEST0", "HK.TEST1"],
+            "strategy_type": "MA",
+            "start_date": "2022-01-01",
+            "end_date": "2023-12-31",
+            "param_grid": {"fast": [5, 10], "slow": [20, 60]},
+            "workers": 2,
+        }) as resp:
+            assert resp.status_code == 200
+            lines = [json.loads(line) for line in resp.iter_lines() if line]
+        assert lines[-1]["type"] == "result"
+        assert lines[-1]["runs"] == 8
+
+        resp = client.post("/api/strategy/sweep", json={
+            "stock_codes": ["HK.TEST0"], "param_grid": {"bogus": [1]},
+        })
+        assert resp.status_code == 400
@@ -0,0 +1,148 @@
+"""
+期权链与希腊值测试
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import futu as ft
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import options
+from app.services.futu_client import FutuClient
+from app.services.options import OptionChains, bs_greeks, bs_price, implied_vol
+from app.services.quote_bus import QuoteBus
+from app.services.subscription_manager import SubscriptionManager
+from app.services.trading_calendar import TradingCalendar
+
+NOW = datetime(2026, 10, 19, 15, 0, tzinfo=timezone.utc)
+EXPIRY = "2026-11-20"
+SPOT = 180.0
+
+
+def _sigma(strike):
+    return 0.25 + 0.6 * np.log(strike / SPOT) ** 2
+
+
+class _OptionQuoteContext:
+    """US.AAPL 单一到期日的期权链，快照价格按波动率微笑定价"""
+
+    def __init__(self, n: int = 300):
+        strikes = np.round(np.linspace(120, 240, n), 2)
+        self.chain = pd.DataFrame({
+            "code": [f"US.AAPL261120{t[0]}{i}" for i in range(n) for t in ("CALL", "PUT")],
+            "name": [f"AAPL {k} {t}" for k in strikes for t in ("CALL", "PUT")],
+            "option_type": [t for _ in strikes for t in (ft.OptionType.CALL, ft.OptionType.PUT)],
+            "strike_price": np.repeat(strikes, 2),
+        })
+        years = (datetime(2026, 11, 20, 21, 0, tzinfo=timezone.utc) - NOW).total_seconds() / options.SECONDS_PER_YEAR
+        strike = self.chain["strike_price"].to_numpy()
+        price = bs_price(SPOT, strike, years, 0.045, _sigma(strike), self.chain["option_type"] == ft.OptionType.CALL)
+        self.snapshot = pd.DataFrame({
+            "code": ["US.AAPL", *self.chain["code"]],
+            "last_price": [SPOT, *price],
+            "bid_price": [SPOT, *(price - 0.01)],
+            "ask_price": [SPOT, *(price + 0.01)],
+            "volume": 100,
+            "option_open_interest": 1000,
+        }).set_index("code", drop=False)
+        self.snapshot_batches = []
+        self.chain_calls = 0
+
+    def get_option_expiration_date(self, code):
+        return ft.RET_OK, pd.DataFrame({"strike_time": ["2026-10-16", EXPIRY], "option_expiry_date_distance": [-3, 32]})
+
+    def get_option_chain(self, code, start=None, end=None, **kwargs):
+        self.chain_calls += 1
+        return ft.RET_OK, self.chain
+
+    def get_market_snapshot(self, code_list):
+        self.snapshot_batches.append(len(code_list))
+        return ft.RET_OK, self.snapshot.loc[code_list].reset_index(drop=True)
+
+    def subscribe(self, codes, subtypes, **kwargs):
+        return ft.RET_OK, None
+
+
+def _chains(monkeypatch):
+    monkeypatch.setattr(options, "SNAPSHOT_BATCH_SIZE", 200)
+    monkeypatch.setattr(options.settings, "OPTION_RISK_FREE_RATES", {"US": 0.045})
+    client = FutuClient()
+    client._quote_ctx = _OptionQuoteContext()
+    client._is_connected = True
+    bus = QuoteBus()
+    calendar = TradingCalendar(client, clock=lambda: NOW)
+    chains = OptionChains(client, bus, SubscriptionManager(client, min_hold=0), refresh_seconds=60, calendar=calendar)
+    return chains, client._quote_ctx, bus
+
+
+class TestOptionPricing:
+    """期权定价测试"""
+
+    def test_implied_vol_round_trip(self):
+        """测试隐含波动率可还原定价"""
+        rng = np.random.default_rng(0)
+        strike = rng.uniform(50, 150, 1000)
+        years = rng.uniform(7 / 365, 2, 1000)
+        is_call = rng.random(1000) < 0.5
+        sigma = rng.uniform(0.1, 1.0, 1000)
+        price = bs_price(100.0, strike, years, 0.03, sigma, is_call)
+        iv = implied_vol(price, 100.0, strike, years, 0.03, is_call)
+        # 价格对波动率不敏感（深度实值/虚值）的合约不参与比较
+        sensitive = bs_greeks(100.0, strike, years, 0.03, sigma, is_call)["vega"] > 1e-3
+        np.testing.assert_allclose(iv[sensitive], sigma[sensitive], atol=1e-4)
+        # 低于内在价值、超过上限、已到期
+        assert np.isnan(implied_vol(np.array([1.0, 120.0, 5.0]), 100.0, np.array([80.0, 80.0, 100.0]),
+                                    np.array([0.5, 0.5, 0.0]), 0.03, True)).all()
+
+    def test_greeks_match_finite_differences(self):
+        """测试希腊值与有限差分一致"""
+        strike = np.array([80.0, 100.0, 120.0, 80.0, 100.0, 120.0])
+        is_call = np.array([True, True, True, False, False, False])
+        greeks = bs_greeks(100.0, strike, 0.5, 0.03, 0.3, is_call)
+        h = 0.01
+
+        def price(spot=100.0, years=0.5, sigma=0.3):
+            return bs_price(spot, strike, years, 0.03, sigma, is_call)
+
+        np.testing.assert_allclose(greeks["delta"], (price(100 + h) - price(100 - h)) / (2 * h), atol=1e-6)
+        np.testing.assert_allclose(greeks["gamma"], (price(100 + h) - 2 * price() + price(100 - h)) / h ** 2, atol=1e-4)
+        np.testing.assert_allclose(greeks["vega"], (price(sigma=0.31) - price(sigma=0.29)) / 2, rtol=1e-3)
+        np.testing.assert_allclose(greeks["theta"], price(years=0.5 - 1 / 365) - price(), rtol=1e-2)
+
+
+class TestOptionChain:
+    """期权链测试"""
+
+    def test_chain_recomputes_greeks_on_underlying_tick(self, monkeypatch):
+        """测试正股报价变动时重算希腊值"""
+        chains, quote_ctx, bus = _chains(monkeypatch)
+
+        chain = asyncio.run(chains.chain("US.AAPL"))
+        assert chain.expiry == EXPIRY and len(chain) == 600
+        # 标的 + 600个合约按200只一批
+        assert quote_ctx.snapshot_batches == [200, 200, 200, 1]
+        np.testing.assert_allclose(chain.iv, _sigma(chain.strike), atol=1e-3)
+        iv, delta = chain.iv.copy(), chain.greeks["delta"].copy()
+
+        bus.publish("quote", "US.AAPL", {"code": "US.AAPL", "last_price": SPOT * 1.02})
+        assert chain.spot == SPOT * 1.02
+        assert (chain.greeks["delta"][chain.is_call] >= delta[chain.is_call]).all()
+        np.testing.assert_array_equal(chain.iv, iv)
+
+        # 刷新周期内再次读取不重新拉取快照和期权链
+        asyncio.run(chains.chain("US.AAPL", EXPIRY))
+        assert len(quote_ctx.snapshot_batches) == 4 and quote_ctx.chain_calls == 1
+
+    def test_option_chain_api_mock(self):
+        """测试模拟模式下的期权链接口"""
+        client = TestClient(app)
+        data = client.get("/api/market/options/HK.00700", params={"option_type": "CALL"}).json()
+        assert data["rows"] and all(r["option_type"] == "CALL" for r in data["rows"])
+        deltas = [r["delta"] for r in data["rows"]]
+        assert deltas == sorted(deltas, reverse=True) and all(0 < d < 1 for d in deltas)
+        assert all(r["iv"] > 0 for r in data["rows"])
+        assert client.get("/api/market/options/JP.7203").status_code == 400
+        assert client.get("/api/market/options/HK.00700", params={"expiry": "20261120"}).status_code == 422
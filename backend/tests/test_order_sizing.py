@@ -0,0 +1,92 @@
+"""
+最大可买卖数量测试
+"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.account_sync import AccountSync
+from app.services.order_sizing import OrderSizer
+from app.services.quote_bus import QuoteBus
+
+
+class _Client:
+    active_account_id = "A"
+
+    def __init__(self):
+        self.max_qty_calls = []
+
+    async def get_max_trd_qtys(self, stock_code, price, order_type="LIMIT", acc_id=None):
+        self.max_qty_calls.append((stock_code, price))
+        await asyncio.sleep(0.01)
+        return {"max_cash_buy": 500, "max_cash_and_margin_buy": 1200, "max_position_sell": 300}
+
+    async def get_orders(self, acc_id=None):
+        return []
+
+    async def get_positions(self, acc_id=None):
+        return [{"stock_code": "HK.00700", "available_quantity": 250}]
+
+    async def get_acc_info(self, acc_id=None):
+        return {"cash_power": {"HKD": 100_000.0, "USD": 5_000.0}, "buying_power": 300_000.0, "currency": "HKD"}
+
+
+class _Master:
+    async def lot_size(self, stock_code):
+        return 100 if stock_code.startswith("HK.") else 1
+
+
+def _sizer(bus=None):
+    client = _Client()
+    sync = AccountSync(client, min_interval=0)
+    return OrderSizer(client, sync, _Master(), bus=bus, max_age=60), client, sync
+
+
+class TestOrderSizing:
+    """最大可买卖数量测试"""
+
+    def test_local_estimate_from_account_cache(self):
+        """测试根据账户缓存本地估算"""
+        sizer, client, sync = _sizer()
+
+        async def run():
+            await sync.refresh("A")
+            return (await sizer.max_qty("HK.00700", 350.0), await sizer.max_qty("US.AAPL", 180.0),
+                    await sizer.max_qty("HK.09988", 80.0))
+
+        hk, us, other = asyncio.run(run())
+        assert hk["source"] == "cache" and client.max_qty_calls == []
+        assert (hk["max_cash_buy"], hk["max_margin_buy"], hk["max_sell"], hk["odd_lot_sell"]) == (200, 800, 200, 50)
+        # 融资购买力为港币，美股只给出现金可买
+        assert us["max_cash_buy"] == 27 and us["max_margin_buy"] is None and us["max_sell"] == 0
+        assert other["max_sell"] == 0
+
+    def test_stale_cache_queries_opend_once_while_typing(self):
+        """测试缓存过期时连续输入只查询一次OpenD"""
+        bus = QuoteBus()
+        sizer, client, sync = _sizer(bus)
+
+        async def run():
+            # 连续输入价格：并发请求合并为一次查询
+            results = await asyncio.gather(*(sizer.max_qty("HK.00700", p) for p in (35.0, 350.0, 351.0)))
+            # 订单推送后 OpenD 结果和账户缓存都失效
+            bus.publish("order", "HK.00700", {"order_id": "1"})
+            sync._states["A"].refreshed_at = float("-inf")
+            results.append(await sizer.max_qty("HK.00700", 350.0))
+            return results
+
+        results = asyncio.run(run())
+        assert client.max_qty_calls == [("HK.00700", 35.0), ("HK.00700", 350.0)]
+        first = results[0]
+        assert first["source"] == "opend" and first["max_cash_buy"] == 500 and first["max_margin_buy"] == 1200
+        # 其他价格按购买力换算，按整手取整
+        assert results[1]["max_cash_buy"] == 0 and results[2]["max_margin_buy"] == 100
+        assert results[3]["max_cash_buy"] == 500 and results[3]["max_sell"] == 300
+
+    def test_max_qty_api_mock(self):
+        """测试模拟模式下的最大数量接口"""
+        client = TestClient(app)
+        data = client.get("/api/trade/max-qty", params={"stock_code": "HK.00700", "price": 350.0}).json()
+        assert data["lot_size"] == 100 and data["max_cash_buy"] % 100 == 0 and data["max_cash_buy"] > 0
+        assert client.get("/api/trade/max-qty", params={"stock_code": "HK.00700", "price": 0}).status_code == 422
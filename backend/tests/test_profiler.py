@@ -0,0 +1,100 @@
+"""
+请求采样分析测试
+"""
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.futu_client import futu_client
+from app.utils.profiler import ProfiledThreadPoolExecutor, ProfilerMiddleware, RequestProfiler, request_profiler
+
+
+def _blocking_sdk_call():
+    time.sleep(0.05)
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def _endpoint(scope, receive, send):
+    _busy(0.03)
+    await asyncio.get_running_loop().run_in_executor(None, _blocking_sdk_call)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(middleware, path="/api/market/search"):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        asyncio.get_running_loop().set_default_executor(ProfiledThreadPoolExecutor())
+        await middleware({"type": "http", "method": "GET", "path": path}, receive, send)
+
+    asyncio.run(run())
+    return sent
+
+
+class TestProfiler:
+    """性能分析测试"""
+
+    def test_profile_captures_loop_and_executor_stacks(self):
+        """测试采样同时覆盖事件循环与线程池调用栈"""
+        profiler = RequestProfiler(capacity=2, interval=0.002)
+        profiler.configure(enabled=True)
+        _call(ProfilerMiddleware(_endpoint, profiler))
+
+        [summary] = profiler.list_profiles()
+        assert summary["status"] == 200 and summary["duration_ms"] >= 80
+        assert summary["cpu_ms"] > 0 and summary["executor_ms"] > 0
+        folded = profiler.get(summary["id"]).folded()
+        assert "_busy (test_profiler.py)" in folded
+        assert "[run_in_executor];" in folded and "_blocking_sdk_call (test_profiler.py)" in folded
+        # 栈从中间件以下开始
+        assert all(line.startswith("_endpoint (test_profiler.py)") for line in folded.splitlines())
+
+    def test_routes_filter_and_bounded_store(self):
+        """测试按路由过滤与有界存储"""
+        profiler = RequestProfiler(capacity=2, interval=0.002)
+        profiler.configure(enabled=True, routes=["/api/market"])
+        middleware = ProfilerMiddleware(_endpoint, profiler)
+        _call(middleware, "/api/trade/orders")
+        assert profiler.list_profiles() == []
+        for _ in range(3):
+            _call(middleware)
+        assert [p["id"] for p in profiler.list_profiles()] == [3, 2]
+
+        profiler.configure(enabled=False)
+        _call(middleware)
+        assert len(profiler.list_profiles()) == 2
+
+    def test_admin_api(self, monkeypatch):
+        """测试管理接口"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        for name in ("enabled", "routes", "sample_rate"):
+            monkeypatch.setattr(request_profiler, name, getattr(request_profiler, name))
+        request_profiler.clear()
+        client = TestClient(app)
+
+        assert client.put("/api/admin/profiler", json={"sample_rate": 2}).status_code == 400
+        resp = client.put("/api/admin/profiler", json={"enabled": True, "routes": ["/api/market/search"]})
+        assert resp.json()["enabled"] is True
+
+        client.get("/api/market/search", params={"keyword": "腾讯"})
+        client.get("/api/account/positions")
+        profiles = client.get("/api/admin/profiles").json()
+        assert [p["path"] for p in profiles] == ["/api/market/search"]
+        resp = client.get(f"/api/admin/profiles/{profiles[0]['id']}")
+        assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/plain")
+        assert client.get("/api/admin/profiles/999999").status_code == 404
+        request_profiler.clear()
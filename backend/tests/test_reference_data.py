@@ -0,0 +1,119 @@
+"""
+每手股数与最小价位测试
+"""
+import asyncio
+
+import futu as ft
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import futu_client as futu_client_module
+from app.services.futu_client import FutuClient
+from app.services.reference_data import OrderRejected, ReferenceData
+from app.services.security_master import SecurityMaster
+
+
+def _reference():
+    reference = ReferenceData()
+    reference.update_lots("HK", ["HK.00700", "HK.09988", "HK.00005"], [100, 100, 400])
+    return reference
+
+
+class TestReferenceData:
+    """参考数据测试"""
+
+    def test_tick_ladder_and_rounding(self):
+        """测试价位表与价格取整"""
+        reference = ReferenceData()
+        assert reference.tick_size("HK.00700", 0.2) == 0.001
+        assert reference.tick_size("HK.00700", 0.25) == 0.001
+        assert reference.tick_size("HK.00700", 10.0) == 0.01
+        assert reference.tick_size("HK.00700", 350.0) == 0.2
+        assert reference.tick_size("US.AAPL", 0.5) == 0.0001 and reference.tick_size("US.AAPL", 180.0) == 0.01
+        assert reference.tick_size("JP.7203", 100.0) is None
+
+        assert reference.round_price("HK.00700", 350.3, "BUY") == 350.2
+        assert reference.round_price("HK.00700", 350.3, "SELL") == 350.4
+        assert reference.round_price("HK.00700", 10.01, "BUY") == 10.0
+        assert reference.round_price("HK.00700", 10.01, "SELL") == 10.02
+        assert reference.round_price("US.AAPL", 0.12345, "SELL") == 0.1235
+        assert reference.is_valid_price("HK.00700", 350.4) and not reference.is_valid_price("HK.00700", 350.3)
+        # 浮点表示误差不算不合规
+        assert reference.is_valid_price("SH.600519", 0.1 + 0.2)
+
+    def test_normalize_order(self):
+        """测试下单前校验与调整"""
+        reference = _reference()
+        assert reference.lot_size("HK.00005") == 400 and reference.lot_size("HK.00001") is None
+        assert reference.normalize_order("HK.00700", "BUY", 350.4, 200) == (350.4, 200)
+
+        with pytest.raises(OrderRejected, match="每手"):
+            reference.normalize_order("HK.00700", "BUY", 350.4, 150)
+        with pytest.raises(OrderRejected, match="最小价位"):
+            reference.normalize_order("HK.00700", "BUY", 350.3, 100)
+        with pytest.raises(OrderRejected, match="范围"):
+            reference.normalize_order("HK.00700", "BUY", 10000.0, 100)
+        assert reference.normalize_order("HK.00700", "SELL", 350.3, 150, adjust=True) == (350.4, 100)
+        with pytest.raises(OrderRejected):
+            reference.normalize_order("HK.00700", "BUY", 350.4, 50, adjust=True)
+
+        # 市价单不校验价格；未加载的市场只校验价格；A股卖出允许零股
+        assert reference.normalize_order("HK.00700", "BUY", 0.0, 100, "MARKET") == (0.0, 100)
+        assert reference.normalize_order("US.AAPL", "BUY", 180.01, 3) == (180.01, 3)
+        reference.update_lots("SH", ["SH.600519"], [100])
+        assert reference.normalize_order("SH.600519", "SELL", 1500.0, 30) == (1500.0, 30)
+        with pytest.raises(OrderRejected):
+            reference.normalize_order("SH.600519", "BUY", 1500.0, 30)
+
+    def test_security_master_loads_lot_table(self):
+        """测试证券主数据加载每手股数"""
+        class _QuoteContext:
+            def get_stock_basicinfo(self, market, stock_type):
+                return ft.RET_OK, pd.DataFrame({"code": ["HK.00700", "HK.00005"], "name": ["腾讯控股", "汇丰控股"],
+                                                "lot_size": [100, 400]})
+
+        client = FutuClient()
+        client._quote_ctx = _QuoteContext()
+        client._is_connected = True
+        reference = ReferenceData()
+        master = SecurityMaster(client, reference=reference)
+        assert asyncio.run(master.lot_size("HK.00005")) == 400
+        assert reference.loaded("HK") == 2 and reference.lot_size("HK.00700") == 100
+
+
+class TestOrderRejection:
+    """无效订单拒绝测试"""
+
+    def test_rejected_order_skips_rate_limiter(self, monkeypatch):
+        """测试被拒订单不占用限流额度"""
+        acquired = []
+        monkeypatch.setattr(futu_client_module, "reference_data", _reference())
+        monkeypatch.setattr(futu_client_module, "limiter", lambda name: acquired.append(name))
+
+        with pytest.raises(OrderRejected):
+            asyncio.run(FutuClient().place_order("HK.00700", "BUY", 350.3, 100))
+        with pytest.raises(OrderRejected):
+            asyncio.run(FutuClient().place_order("HK.00700", "BUY", 350.4, 150))
+        assert acquired == []
+
+    def test_order_api_rejects_invalid_order_once(self, monkeypatch):
+        """测试下单接口只校验一次并返回400"""
+        reference = _reference()
+        calls = []
+
+        def normalize_order(*args, **kwargs):
+            calls.append(args)
+            return ReferenceData.normalize_order(reference, *args, **kwargs)
+
+        monkeypatch.setattr(reference, "normalize_order", normalize_order)
+        monkeypatch.setattr(futu_client_module, "reference_data", reference)
+        monkeypatch.setattr(futu_client_module.futu_client, "_is_connected", True)
+        monkeypatch.setattr(futu_client_module.futu_client, "_trade_enabled", True)
+
+        response = TestClient(app).post("/api/trade/order", json={
+            "stock_code": "HK.00700", "side": "BUY", "price": 350.3, "quantity": 100,
+        })
+        assert response.status_code == 400 and "最小价位" in response.json()["detail"]
+        assert len(calls) == 1
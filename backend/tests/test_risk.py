@@ -0,0 +1,109 @@
+"""
+组合风险分析测试
+"""
+import asyncio
+from datetime import date
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.futu_client import futu_client
+from app.services.kline_store import KLINE_DTYPE, to_epoch
+from app.services.risk import RiskEngine, portfolio_risk, returns_panel
+from benchmarks.fixtures import make_bars
+
+
+def _series(codes, days=120, seed=0):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, days)
+    end = to_epoch(date.today())
+    series = {}
+    for i, code in enumerate(codes):
+        close = 100 * np.exp(np.cumsum((0.5 + i * 0.5) * market + rng.normal(0, 0.01, days)))
+        series[code] = make_bars(close, end - np.arange(days)[::-1] * 86400)
+    return series
+
+
+class _StubStore:
+    def __init__(self, series):
+        self.series = series
+        self.calls = 0
+
+    async def get(self, code, start, end=None, ktype="K_DAY", autype="qfq", client=None):
+        self.calls += 1
+        return self.series.get(code, np.empty(0, dtype=KLINE_DTYPE))
+
+
+class TestRiskModel:
+    """风险模型测试"""
+
+    def test_returns_panel_aligns_and_fills(self):
+        """测试收益率面板按时间对齐并填充"""
+        a = make_bars([10, 11, 12, 13], [1, 2, 3, 4])
+        b = make_bars([20, 22], [2, 4])
+        times, returns = returns_panel({"A": a, "B": b}, ["A", "B"], lookback=10)
+        assert times.tolist() == [2, 3, 4]
+        assert returns[:, 0] == pytest.approx([0.1, 1 / 11, 1 / 12])
+        # B: 上市前为0，停牌日沿用前值
+        assert returns[:, 1] == pytest.approx([0.0, 0.0, 0.1])
+
+    def test_portfolio_metrics_match_direct_computation(self):
+        """测试组合指标与直接计算一致"""
+        codes = ["HK.A", "HK.B", "HK.C"]
+        series = _series(codes + ["HK.800000"])
+        engine = RiskEngine()
+        model = engine.build_model(series, codes, "HK.800000")
+        weights = np.array([0.5, 0.3, 0.2])
+        report = portfolio_risk(model, weights, 1_000_000)
+
+        pnl = model.returns @ weights
+        assert report["portfolio"]["volatility"] == pytest.approx(pnl.std(ddof=1) * np.sqrt(252))
+        assert report["portfolio"]["var_95"] == pytest.approx(-np.quantile(pnl, 0.05))
+        assert report["portfolio"]["cvar_95"] >= report["portfolio"]["var_95"]
+        slope = np.polyfit(model.benchmark_returns, model.returns[:, 1], 1)[0]
+        assert report["positions"][1]["beta"] == pytest.approx(slope)
+        assert sum(p["risk_contribution"] for p in report["positions"]) == pytest.approx(1.0)
+        assert report["concentration"]["hhi"] == pytest.approx(0.38)
+        assert np.allclose(report["correlation"], np.corrcoef(model.returns, rowvar=False), atol=1e-6)
+
+    def test_model_cached_across_weight_changes(self):
+        """测试权重变化时复用缓存的模型"""
+        codes = [f"HK.{i:05d}" for i in range(300)]
+        store = _StubStore(_series(codes + ["HK.800000"], days=300))
+        engine = RiskEngine(store=store)
+
+        async def run():
+            first = await engine.analyze([{"stock_code": c, "market_value": 100.0} for c in codes],
+                                         include_matrix=False)
+            second = await engine.analyze([{"stock_code": c, "market_value": 100.0 + i} for i, c in enumerate(codes)],
+                                          include_matrix=False)
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert store.calls == 301
+        assert first["concentration"]["effective_n"] == pytest.approx(300)
+        assert second["positions"][0]["weight"] < second["positions"][-1]["weight"]
+        assert first["observations"] == 252 and "correlation" not in first
+
+    def test_missing_history_is_excluded(self):
+        """测试缺少历史数据的标的被排除"""
+        store = _StubStore(_series(["HK.A", "HK.800000"]))
+        engine = RiskEngine(store=store)
+        report = asyncio.run(engine.analyze([
+            {"stock_code": "HK.A", "market_value": 100.0},
+            {"stock_code": "HK.NEW", "market_value": 100.0},
+        ]))
+        assert report["excluded"] == ["HK.NEW"]
+        assert report["positions"][0]["weight"] == pytest.approx(0.5)
+
+    def test_risk_api_mock(self, monkeypatch):
+        """测试模拟模式下的风险接口"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        resp = TestClient(app).get("/api/account/risk")
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [p["stock_code"] for p in data["positions"]] == ["HK.00700", "HK.09988"]
+        assert sum(p["weight"] for p in data["positions"]) == pytest.approx(1.0)
+        assert len(data["correlation"]) == 2 and data["portfolio"]["beta"] is not None
@@ -0,0 +1,127 @@
+"""
+全市场选股测试
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.futu_client import FutuClient, futu_client
+from app.services.screener import Screener, build_table, screen_table
+from app.services.security_master import SecurityMaster
+from app.utils.rate_limit import RateLimiter
+from benchmarks import fixtures
+
+
+class _CountingQuoteContext(fixtures.FakeQuoteContext):
+    def __init__(self, n):
+        codes = fixtures.make_codes(n)
+        super().__init__(
+            snapshot=fixtures.make_snapshot_frame(codes),
+            kline=fixtures.make_kline_frame(codes[0], 10),
+            basicinfo=fixtures.make_basicinfo_frame(n),
+        )
+        self.batches = []
+        self.basicinfo_calls = 0
+
+    def get_market_snapshot(self, code_list):
+        self.batches.append(len(code_list))
+        return super().get_market_snapshot(code_list)
+
+    def get_stock_basicinfo(self, market, **kwargs):
+        self.basicinfo_calls += 1
+        return super().get_stock_basicinfo(market, **kwargs)
+
+
+def _connected_client(n):
+    client = FutuClient()
+    client._quote_ctx = _CountingQuoteContext(n)
+    client._is_connected = True
+    return client
+
+
+class TestScreener:
+    """选股器测试"""
+
+    def test_full_scan_chunks_and_caches(self):
+        """测试全市场扫描分块请求并缓存"""
+        client = _connected_client(1000)
+        screener = Screener(client, SecurityMaster(client), refresh_seconds=60)
+
+        async def run():
+            first = await screener.screen("HK", [{"field": "change_ratio", "op": ">", "value": 1}],
+                                          sort_by="change_ratio", limit=10)
+            second = await screener.screen("HK", [{"field": "pe_ratio", "op": "<", "value": 10}])
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert client._quote_ctx.batches == [400, 400, 200]
+        assert client._quote_ctx.basicinfo_calls == 1
+        assert first["total"] == second["total"] == 1000
+        ratios = [row["change_ratio"] for row in first["rows"]]
+        assert ratios == sorted(ratios, reverse=True) and ratios[-1] > 1
+
+    def test_concurrent_queries_share_one_refresh(self):
+        """测试并发查询共享一次刷新"""
+        client = _connected_client(500)
+        screener = Screener(client, SecurityMaster(client), refresh_seconds=60)
+
+        async def run():
+            return await asyncio.gather(*(screener.table("HK") for _ in range(5)))
+
+        tables = asyncio.run(run())
+        assert all(t is tables[0] for t in tables)
+        assert client._quote_ctx.batches == [400, 100]
+
+    def test_vectorized_filters_match_pandas(self):
+        """测试向量化筛选与pandas结果一致"""
+        frame = fixtures.make_snapshot_frame(fixtures.make_codes(300))
+        frame.loc[frame.index[::30], "suspension"] = True
+        table = build_table("HK", frame)
+        filters = [
+            {"field": "turnover_rate", "op": ">=", "value": 1},
+            {"field": "total_market_val", "op": "<", "value": 2e12},
+        ]
+        matched, rows = screen_table(table, filters, sort_by="turnover", ascending=True, limit=1000)
+
+        expected = frame[(frame.turnover_rate >= 1) & (frame.total_market_val < 2e12) & ~frame.suspension]
+        assert matched == len(expected)
+        assert [r["stock_code"] for r in rows] == expected.sort_values("turnover", kind="stable").code.tolist()
+
+    def test_missing_values_sort_last(self):
+        """测试缺失值排在最后"""
+        frame = fixtures.make_snapshot_frame(fixtures.make_codes(5))
+        frame["pe_ratio"] = frame["pe_ratio"].astype(object)
+        frame.loc[0, "pe_ratio"] = "N/A"
+        table = build_table("HK", frame)
+        _, rows = screen_table(table, [], sort_by="pe_ratio")
+        assert rows[-1]["stock_code"] == frame.code[0] and rows[-1]["pe_ratio"] is None
+        with pytest.raises(ValueError):
+            screen_table(table, [{"field": "open_price", "op": ">", "value": 0}])
+
+    def test_rate_limiter_reserves_window_slots(self):
+        """测试限流器按窗口预留额度"""
+        limiter = RateLimiter(limit=3, window=30)
+        delays = [limiter.reserve() for _ in range(5)]
+        assert delays[:3] == [0, 0, 0]
+        assert delays[3] == pytest.approx(30, abs=0.5)
+        assert delays[4] == pytest.approx(30, abs=0.5)
+
+    def test_screener_api_mock(self, monkeypatch):
+        """测试模拟模式下的选股接口"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        client = TestClient(app)
+        resp = client.post("/api/market/screener", json={
+            "market": "HK",
+            "filters": [{"field": "change_ratio", "op": ">", "value": 0}],
+            "sort_by": "volume_ratio",
+            "limit": 5,
+        })
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["total"] == 500 and len(data["rows"]) == 5
+        assert all(row["change_ratio"] > 0 for row in data["rows"])
+
+        resp = client.post("/api/market/screener", json={"filters": [{"field": "bogus", "op": ">", "value": 0}]})
+        assert resp.status_code == 422
@@ -0,0 +1,157 @@
+"""
+实盘策略运行时测试
+"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.futu_client import futu_client
+from app.services.quote_bus import QuoteBus, quote_bus, trade_bus
+from app.services.strategy_runtime import SignalStrategy, Strategy, StrategyRuntime
+from app.services.subscription_manager import SubscriptionManager
+
+
+class _StubClient:
+    is_connected = True
+
+    def __init__(self):
+        self.subscribed = []
+        self.unsubscribed = []
+        self.orders = []
+
+    async def subscribe(self, codes, subtypes):
+        self.subscribed.append((codes, subtypes))
+
+    async def unsubscribe(self, codes, subtypes):
+        self.unsubscribed.append((codes, subtypes))
+
+    async def place_order(self, stock_code, side, price, quantity, order_type="LIMIT", acc_id=None):
+        self.orders.append((stock_code, side, price, quantity))
+        return {"order_id": str(len(self.orders))}
+
+
+class _Recorder(Strategy):
+    def __init__(self, strategy_id, delay=0.0):
+        super().__init__(strategy_id, strategy_id, ["HK.00700"], ["QUOTE"])
+        self.delay = delay
+        self.seen = []
+
+    async def on_quote(self, ctx, code, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.seen.append(data["seq"])
+
+
+class TestStrategyRuntime:
+    """策略运行时测试"""
+
+    def test_shared_subscription_and_isolation(self):
+        """测试多个策略共享订阅，慢策略只丢弃自己的事件"""
+        async def run():
+            bus, client = QuoteBus(), _StubClient()
+            runtime = StrategyRuntime(bus, client, queue_size=4, subscriptions=SubscriptionManager(client, min_hold=0))
+            fast, slow = _Recorder("fast"), _Recorder("slow", delay=0.05)
+            runtime.add(fast)
+            runtime.add(slow)
+            await runtime.start("fast")
+            await runtime.start("slow")
+            assert client.subscribed == [(["HK.00700"], ["QUOTE"])]
+
+            for seq in range(20):
+                bus.publish("quote", "HK.00700", {"code": "HK.00700", "seq": seq})
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.3)
+
+            assert fast.seen == list(range(20))
+            slow_stats = runtime.stats("slow").to_dict()
+            assert slow_stats["dropped"] > 0
+            assert slow.seen[-1] == 19
+            assert runtime.stats("fast").to_dict()["latency_ms"]["p99"] >= 0
+
+            await runtime.stop("fast")
+            assert client.unsubscribed == []
+            await runtime.stop("slow")
+            assert client.unsubscribed == [(["HK.00700"], ["QUOTE"])]
+            assert runtime.subscription_count == 0
+
+        asyncio.run(run())
+
+    def test_signal_strategy_places_orders_through_client(self):
+        """测试信号策略在K线收盘后按目标仓位下单"""
+        async def run():
+            bus, client = QuoteBus(), _StubClient()
+            runtime = StrategyRuntime(bus, client)
+            strategy = SignalStrategy("ma", "MA", "MA", "HK.00700", 10000.0,
+                                      params={"fast": 2, "slow": 3}, dry_run=False)
+            runtime.add(strategy)
+            await runtime.start("ma")
+            for minute, close in enumerate([10, 10, 10, 11, 12, 13, 12, 10, 9, 8]):
+                bus.publish("kline", "HK.00700", {
+                    "code": "HK.00700", "k_type": "K_1M",
+                    "time_key": f"2024-01-02 09:{30 + minute}:00", "close": close,
+                })
+            await asyncio.sleep(0.05)
+            await runtime.stop("ma")
+            return client.orders, strategy
+
+        orders, strategy = asyncio.run(run())
+        assert orders[0][1] == "BUY"
+        assert orders[-1][1] == "SELL"
+        assert strategy.shares == 0
+
+    def test_signal_strategy_rounds_to_lot_size(self):
+        """测试信号策略按每手股数下单，不足一手时不下单"""
+        class _Master:
+            async def lot_size(self, stock_code):
+                return 100
+
+        async def run():
+            bus, client = QuoteBus(), _StubClient()
+            runtime = StrategyRuntime(bus, client, master=_Master())
+            strategy = SignalStrategy("ma", "MA", "MA", "HK.00700", 5000.0,
+                                      params={"fast": 2, "slow": 3}, dry_run=False)
+            runtime.add(strategy)
+            await runtime.start("ma")
+            for minute, close in enumerate([10, 10, 10, 11, 12, 13, 12, 10, 9, 8]):
+                bus.publish("kline", "HK.00700", {
+                    "code": "HK.00700", "k_type": "K_1M",
+                    "time_key": f"2024-01-02 09:{30 + minute}:00", "close": close,
+                })
+            await asyncio.sleep(0.05)
+            await runtime.stop("ma")
+            return client.orders, strategy
+
+        orders, strategy = asyncio.run(run())
+        assert orders and all(quantity % 100 == 0 for _, _, _, quantity in orders)
+        # 5000 元按 12 元买入只能买 4 手
+        assert orders[0] == ("HK.00700", "BUY", 12.0, 400)
+        assert strategy.shares == 0 and strategy.cash == 5000.0 - 400 * 12.0 + 400 * orders[-1][2]
+
+    def test_strategy_api_lifecycle(self, monkeypatch):
+        """测试策略接口的启动与停止"""
+        monkeypatch.setattr(futu_client, "_is_connected", False)
+        # 运行时的消费协程需要常驻事件循环，使用带生命周期的 TestClient（跳过OpenD连接）
+        monkeypatch.setattr(futu_client, "connect", lambda *args, **kwargs: False)
+        # 生命周期会把全局事件总线绑定到 TestClient 的事件循环，测试结束后恢复
+        monkeypatch.setattr(quote_bus, "_loop", quote_bus._loop)
+        monkeypatch.setattr(quote_bus, "_loop_thread_id", quote_bus._loop_thread_id)
+        monkeypatch.setattr(trade_bus, "_loop", trade_bus._loop)
+        monkeypatch.setattr(trade_bus, "_loop_thread_id", trade_bus._loop_thread_id)
+        with TestClient(app) as client:
+            created = client.post("/api/strategy/strategies", json={
+                "name": "测试均线", "type": "MA", "stock_code": "HK.00700", "params": {"fast": 3, "slow": 8},
+            })
+            assert created.status_code == 200
+            strategy_id = created.json()["id"]
+            assert client.post(f"/api/strategy/strategies/{strategy_id}/start").json()["enabled"] is True
+            listed = client.get("/api/strategy/strategies").json()
+            assert any(s["id"] == strategy_id and s["enabled"] for s in listed)
+            assert client.post(f"/api/strategy/strategies/{strategy_id}/stop").json()["enabled"] is False
+            assert client.delete(f"/api/strategy/strategies/{strategy_id}").status_code == 200
+            assert client.get(f"/api/strategy/strategies/{strategy_id}").status_code == 404
+
+            bad = client.post("/api/strategy/strategies", json={
+                "name": "x", "type": "MA", "stock_code": "HK.00700", "params": {"fast": 0},
+            })
+            assert bad.status_code == 400
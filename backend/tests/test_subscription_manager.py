@@ -0,0 +1,125 @@
+"""
+行情订阅额度管理测试
+"""
+import asyncio
+
+from app.services.subscription_manager import PRIORITY_HIGH, PRIORITY_LOW, SubscriptionManager, worker_quota
+
+
+class _Client:
+    is_connected = True
+
+    def __init__(self):
+        self.subscribed = []
+        self.unsubscribed = []
+
+    async def subscribe(self, codes, subtypes):
+        self.subscribed.append((codes, subtypes))
+
+    async def unsubscribe(self, codes, subtypes):
+        self.unsubscribed.append((codes, subtypes))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _manager(quota=2, min_hold=60):
+    client, clock = _Client(), _Clock()
+    return SubscriptionManager(client, quota=quota, min_hold=min_hold, clock=clock), client, clock
+
+
+def _quote(*codes):
+    return [(c, "QUOTE") for c in codes]
+
+
+class TestSubscriptionManager:
+    """订阅管理测试"""
+
+    def test_refcount_and_min_hold(self):
+        """测试引用计数与最短持有时间"""
+        manager, client, clock = _manager()
+
+        async def run():
+            await manager.acquire("a", _quote("HK.00700"))
+            await manager.acquire("b", _quote("HK.00700"))
+            assert client.subscribed == [(["HK.00700"], ["QUOTE"])]
+
+            await manager.release("a")
+            await manager.release("b")
+            # 未到最短持有时间，保持订阅
+            assert client.unsubscribed == [] and manager.is_active("HK.00700", "QUOTE")
+            assert manager.stats()["idle"] == 1
+
+            # 空闲期间再次使用无需重新订阅
+            await manager.acquire("c", _quote("HK.00700"))
+            await manager.release("c")
+            clock.now = 61
+            await manager.reap()
+            assert client.unsubscribed == [(["HK.00700"], ["QUOTE"])]
+            assert manager.used == 0 and manager.stats()["idle"] == 0
+
+        asyncio.run(run())
+        assert len(client.subscribed) == 1
+
+    def test_lru_eviction_protects_high_priority(self):
+        """测试按LRU淘汰时保护高优先级订阅"""
+        manager, client, clock = _manager(quota=3)
+
+        async def run():
+            await manager.acquire("strategy", _quote("HK.00001"), PRIORITY_HIGH)
+            await manager.acquire("ws1", _quote("HK.00002"), PRIORITY_LOW)
+            clock.now = 10
+            await manager.acquire("ws2", _quote("HK.00003"), PRIORITY_LOW)
+
+            # 未满最短持有时间，无法淘汰
+            clock.now = 30
+            assert await manager.acquire("ws3", _quote("HK.00004"), PRIORITY_LOW) == set()
+
+            clock.now = 100
+            active = await manager.acquire("ws4", _quote("HK.00005"), PRIORITY_LOW)
+            return active
+
+        active = asyncio.run(run())
+        # 最久未使用的低优先级订阅 HK.00002 被淘汰，策略订阅保留
+        assert active == {("HK.00005", "QUOTE")}
+        assert client.unsubscribed == [(["HK.00002"], ["QUOTE"])]
+        assert manager.is_active("HK.00001", "QUOTE") and not manager.is_active("HK.00002", "QUOTE")
+        assert manager.evictions == 1 and manager.used == 3
+        assert manager.stats()["pending"] == 2
+
+    def test_pending_promoted_when_quota_frees(self):
+        """测试额度释放后等待中的订阅得以订阅"""
+        manager, client, clock = _manager(quota=1, min_hold=0)
+
+        async def run():
+            await manager.acquire("strategy", _quote("HK.00001"), PRIORITY_HIGH)
+            # 低优先级不能淘汰高优先级订阅
+            assert await manager.acquire("ws", _quote("HK.00002"), PRIORITY_LOW) == set()
+            await manager.release("strategy")
+
+        asyncio.run(run())
+        assert client.unsubscribed == [(["HK.00001"], ["QUOTE"])]
+        assert manager.is_active("HK.00002", "QUOTE") and manager.used == 1
+
+    def test_disconnected_registers_without_subscribing(self):
+        """测试未连接时只登记不订阅"""
+        manager, client, _ = _manager()
+        client.is_connected = False
+
+        async def run():
+            assert await manager.acquire("a", _quote("HK.00700")) == set()
+            await manager.release("a")
+
+        asyncio.run(run())
+        assert client.subscribed == [] and manager.stats()["pending"] == 0
+
+    def test_worker_quota_split_in_shared_mode(self):
+        """测试共享模式下额度按worker数拆分"""
+        assert worker_quota(300, "shared", 4) == 75
+        assert worker_quota(300, "direct", 4) == 300
+        assert worker_quota(2, "shared", 4) == 1
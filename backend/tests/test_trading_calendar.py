@@ -0,0 +1,134 @@
+"""
+交易日历测试
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import futu as ft
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.futu_client import FutuClient
+from app.services.security_master import SecurityMaster
+from app.services.trading_calendar import MAX_IDLE_SECONDS, TradingCalendar
+from benchmarks import fixtures
+
+
+class _CalendarQuoteContext(fixtures.FakeQuoteContext):
+    """2026-10 港股：10-01 国庆、10-19 重阳节休市，12-24 半日市"""
+
+    def __init__(self):
+        codes = fixtures.make_codes(10)
+        super().__init__(
+            snapshot=fixtures.make_snapshot_frame(codes),
+            kline=fixtures.make_kline_frame(codes[0], 10),
+            basicinfo=fixtures.make_basicinfo_frame(10),
+        )
+        self.calendar_calls = 0
+        self.basicinfo_calls = 0
+
+    def request_trading_days(self, market=None, start=None, end=None, code=None):
+        self.calendar_calls += 1
+        days = []
+        day = date.fromisoformat(start)
+        while day <= date.fromisoformat(end):
+            if day.weekday() < 5 and day not in (date(2026, 10, 1), date(2026, 10, 19)):
+                days.append({"time": day.isoformat(), "trade_date_type": "MORNING" if day == date(2026, 12, 24) else "WHOLE"})
+            day += timedelta(days=1)
+        return ft.RET_OK, days
+
+    def get_stock_basicinfo(self, market, **kwargs):
+        self.basicinfo_calls += 1
+        return super().get_stock_basicinfo(market, **kwargs)
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _hk(day, hour, minute=0):
+    """香港时间 -> UTC"""
+    return datetime(2026, 10, day, hour, minute, tzinfo=timezone.utc) - timedelta(hours=8)
+
+
+def _calendar(now):
+    client = FutuClient()
+    client._quote_ctx = _CalendarQuoteContext()
+    client._is_connected = True
+    calendar = TradingCalendar(client, clock=_Clock(now))
+    asyncio.run(calendar.ensure(["HK"]))
+    return client, calendar
+
+
+class TestTradingCalendar:
+    """交易日历测试"""
+
+    def test_phases_and_intervals(self):
+        """测试交易时段与间隔"""
+        _, calendar = _calendar(_hk(20, 10))
+        assert calendar.phase("HK.00700") == "OPEN"
+        assert calendar.interval(["HK"], 1.0) == 1.0
+        assert calendar.interval(["HK"], 1.0, _hk(20, 9, 35)) == 0.5
+        assert calendar.interval(["HK"], 1.0, _hk(20, 16, 0)) == 0.5
+        assert calendar.phase("HK", _hk(20, 12, 30)) == "BREAK"
+        assert calendar.interval(["HK"], 1.0, _hk(20, 12, 58)) == 120
+        assert calendar.interval(["HK"], 1.0, _hk(20, 20)) == MAX_IDLE_SECONDS
+
+    def test_holidays_and_half_days_from_opend(self):
+        """测试从OpenD获取假期与半日市"""
+        client, calendar = _calendar(_hk(16, 17))
+        # 周五收盘后，下周一重阳节休市
+        assert calendar.next_open("HK") == _hk(20, 9, 30)
+        assert calendar.sessions("HK", date(2026, 10, 19)) == []
+        half = calendar.sessions("HK", date(2026, 12, 24))
+        assert len(half) == 1 and half[0][1].strftime("%H:%M") == "12:10"
+        asyncio.run(calendar.ensure(["HK", "HK.00700"]))
+        assert client._quote_ctx.calendar_calls == 1
+        days = asyncio.run(calendar.trading_days("HK", date(2026, 10, 15), date(2026, 10, 21)))
+        assert [d["date"] for d in days] == ["2026-10-15", "2026-10-16", "2026-10-20", "2026-10-21"]
+
+    def test_disconnected_falls_back_to_weekdays(self):
+        """测试未连接时按工作日推算"""
+        calendar = TradingCalendar(FutuClient(), clock=_Clock(_hk(19, 10)))
+        asyncio.run(calendar.ensure(["SZ.000001", "US.AAPL"]))
+        assert calendar.phase("SZ.000001") == "OPEN"
+        assert calendar.sessions("US", date(2026, 10, 24)) == []
+
+    def test_cached_data_stale_only_after_session(self):
+        """测试缓存数据只在收盘后过期"""
+        _, calendar = _calendar(_hk(17, 12))
+        # 周五收盘后加载，周六/周日不需要刷新
+        assert not calendar.is_stale("HK", age=18 * 3600, max_age=60)
+        # 周五收盘前加载
+        assert calendar.is_stale("HK", age=21 * 3600, max_age=60)
+        assert not calendar.is_stale("HK", age=30, max_age=60)
+
+    def test_security_master_not_reloaded_outside_sessions(self):
+        """测试非交易时段不重新加载证券主数据"""
+        client, calendar = _calendar(_hk(17, 12))
+        master = SecurityMaster(client, ttl=0, calendar=calendar)
+
+        async def run():
+            await master.frame("HK")
+            await master.frame("HK")
+            # 周二开盘后再访问（加载时间同步回拨）
+            key = ("HK", ft.SecurityType.STOCK)
+            elapsed = (_hk(20, 10) - _hk(17, 12)).total_seconds()
+            master._frames[key] = (master._frames[key][0] - elapsed, master._frames[key][1])
+            calendar._clock.now = _hk(20, 10)
+            await master.frame("HK")
+
+        asyncio.run(run())
+        assert client._quote_ctx.basicinfo_calls == 2
+
+    def test_calendar_api(self):
+        """测试交易日历接口"""
+        client = TestClient(app)
+        data = client.get("/api/market/calendar/HK", params={"start_date": "2026-10-12", "end_date": "2026-10-18"}).json()
+        assert data["market"] == "HK" and data["phase"] in ("OPEN", "BREAK", "CLOSED")
+        assert len(data["trading_days"]) == 5
+        assert client.get("/api/market/calendar/JP").status_code == 400
@@ -0,0 +1,82 @@
+"""
+WebSocket行情编码测试
+"""
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import ws_codec
+
+
+client = TestClient(app)
+
+
+def _quote(code: str, price: float, volume: int = 1000) -> dict:
+    return {
+        "stock_code": code,
+        "stock_name": code,
+        "current_price": price,
+        "open_price": 100.0,
+        "high_price": 110.0,
+        "low_price": 90.0,
+        "prev_close_price": 100.0,
+        "volume": volume,
+        "turnover": price * volume,
+        "change": price - 100.0,
+        "change_ratio": (price - 100.0),
+        "updated_at": datetime.now(),
+    }
+
+
+class TestDeltaCodec:
+    """增量编码测试"""
+
+    def test_delta_roundtrip(self):
+        """测试关键帧+增量帧解码后与原始行情一致"""
+        encoder = ws_codec.DeltaQuoteEncoder(keyframe_interval=10)
+        decoder = ws_codec.DeltaQuoteDecoder()
+        decoder.decode(encoder.encode([_quote("HK.00700", 360.2), _quote("HK.09988", 75.35)]))
+        state = decoder.decode(encoder.encode([_quote("HK.00700", 360.4, 1200), _quote("HK.09988", 75.35)]))
+        assert state["HK.00700"]["current_price"] == 360.4
+        assert state["HK.00700"]["volume"] == 1200
+        assert state["HK.09988"]["current_price"] == 75.35
+
+    def test_unchanged_quotes_send_empty_delta(self):
+        """测试无变化时增量帧远小于关键帧"""
+        encoder = ws_codec.DeltaQuoteEncoder()
+        quotes = [_quote(f"HK.{i:05d}", 100 + i * 0.01) for i in range(300)]
+        keyframe = encoder.encode(quotes)
+        delta = encoder.encode(quotes)
+        assert len(delta) < 50 < len(keyframe)
+
+    def test_keyframe_on_new_symbol_and_resync(self):
+        """测试新增股票或客户端请求时发送关键帧"""
+        encoder = ws_codec.DeltaQuoteEncoder()
+        decoder = ws_codec.DeltaQuoteDecoder()
+        decoder.decode(encoder.encode([_quote("HK.00700", 360.0)]))
+        decoder.decode(encoder.encode([_quote("HK.00700", 360.0), _quote("US.AAPL", 185.0)]))
+        assert set(decoder.decode(encoder.encode([_quote("US.AAPL", 186.0)]))) == {"HK.00700", "US.AAPL"}
+        encoder.request_keyframe()
+        assert set(decoder.decode(encoder.encode([_quote("US.AAPL", 186.0)]))) == {"US.AAPL"}
+
+
+class TestQuoteWebSocket:
+    """行情推送接口测试"""
+
+    def test_default_json_protocol(self):
+        """测试默认JSON协议保持原有格式"""
+        with client.websocket_connect("/api/market/ws/HK.00700") as ws:
+            data = ws.receive_json()
+        assert data["stock_code"] == "HK.00700"
+        assert "updated_at" in data
+
+    def test_msgpack_delta_subprotocol(self):
+        """测试协商MessagePack增量协议"""
+        with client.websocket_connect(
+            "/api/market/ws?codes=HK.00700,US.AAPL",
+            subprotocols=[ws_codec.PROTOCOL_MSGPACK_DELTA],
+        ) as ws:
+            assert ws.accepted_subprotocol == ws_codec.PROTOCOL_MSGPACK_DELTA
+            state = ws_codec.DeltaQuoteDecoder().decode(ws.receive_bytes())
+        assert set(state) == {"HK.00700", "US.AAPL"}
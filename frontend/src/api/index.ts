@@ -61,6 +61,10 @@ export const api = {
     reconnect: () => request.post('/account/reconnect')
   },
 
+  // 增量同步（wait 为长轮询秒数，请求超时相应放宽）
+  sync: (params: { since?: number; epoch?: string; acc_id?: string; wait?: number }) =>
+    request.get('/sync', { params, timeout: ((params.wait || 0) + 10) * 1000 }),
+
   // 行情相关
   market: {
     quote: (stockCode: string) => request.get(`/market/quote/${stockCode}`),
@@ -71,9 +75,19 @@ export const api = {
   // 交易相关
   trade: {
     createOrder: (data: any) => request.post('/trade/order', data),
-    cancelOrder: (orderId: string) => request.delete(`/trade/order/${orderId}`),
-    getOrders: (status?: string) => request.get('/trade/orders', { params: { status } }),
-    getOrder: (orderId: string) => request.get(`/trade/order/${orderId}`)
+    cancelOrder: (orderId: string, accId?: string) => request.delete(`/trade/order/${orderId}`, { params: { acc_id: accId } }),
+    getOrders: (status?: string, accId?: string) => request.get('/trade/orders', { params: { status, acc_id: accId } }),
+    getOrder: (orderId: string, accId?: string) => request.get(`/trade/order/${orderId}`, { params: { acc_id: accId } })
+  },
+
+  // 策略相关
+  strategy: {
+    backtest: (data: any) => request.post('/strategy/backtest', data),
+    list: () => request.get('/strategy/strategies'),
+    create: (data: any) => request.post('/strategy/strategies', data),
+    start: (id: string) => request.post(`/strategy/strategies/${id}/start`),
+    stop: (id: string) => request.post(`/strategy/strategies/${id}/stop`),
+    remove: (id: string) => request.delete(`/strategy/strategies/${id}`)
   }
 }
 
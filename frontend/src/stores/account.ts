@@ -11,6 +11,11 @@ export const useAccountStore = defineStore('account', () => {
   const opendConnected = ref(false)
   const tradeEnabled = ref(false)
   const loading = ref(false)
+  const orders = ref<any[]>([])
+  // 增量同步游标
+  const syncVersion = ref<number | null>(null)
+  const syncEpoch = ref('')
+  const syncAccountId = ref('')
 
   // 计算属性
   const totalAssets = computed(() => accountInfo.value?.total_assets || 0)
@@ -55,6 +60,48 @@ export const useAccountStore = defineStore('account', () => {
     }
   }
 
+  function mergeByKey(list: any[], changed: any[], removed: string[], key: string) {
+    const map = new Map(list.map(item => [item[key], item]))
+    removed.forEach(k => map.delete(k))
+    changed.forEach(item => map.set(item[key], item))
+    return Array.from(map.values())
+  }
+
+  // 只拉取上次同步之后变化的订单、持仓与资金字段
+  async function syncState(wait = 0) {
+    const accId = currentAccountId.value
+    if (syncAccountId.value !== accId) {
+      syncVersion.value = null
+    }
+    try {
+      loading.value = wait === 0
+      const delta: any = await api.sync({
+        since: syncVersion.value ?? undefined,
+        epoch: syncEpoch.value || undefined,
+        acc_id: accId || undefined,
+        wait
+      })
+      if (delta.full) {
+        orders.value = delta.orders
+        positions.value = delta.positions
+        accountInfo.value = { ...delta.balance }
+      } else {
+        orders.value = mergeByKey(orders.value, delta.orders, delta.removed_orders, 'order_id')
+        positions.value = mergeByKey(positions.value, delta.positions, delta.removed_positions, 'stock_code')
+        if (Object.keys(delta.balance).length > 0) {
+          accountInfo.value = { ...accountInfo.value, ...delta.balance }
+        }
+      }
+      syncVersion.value = delta.version
+      syncEpoch.value = delta.epoch
+      syncAccountId.value = accId
+    } catch (error) {
+      console.error('同步账户状态失败:', error)
+    } finally {
+      loading.value = false
+    }
+  }
+
   async function fetchAccountStatus() {
     try {
       const status = await api.account.status()
@@ -82,8 +129,7 @@ export const useAccountStore = defineStore('account', () => {
 
   async function refreshAll() {
     await Promise.all([
-      fetchAccountInfo(),
-      fetchPositions(),
+      syncState(),
       fetchAccountStatus()
     ])
   }
@@ -92,6 +138,7 @@ export const useAccountStore = defineStore('account', () => {
     // 状态
     accountInfo,
     positions,
+    orders,
     accounts,
     currentAccountId,
     opendConnected,
@@ -107,6 +154,7 @@ export const useAccountStore = defineStore('account', () => {
     fetchAccountInfo,
     fetchPositions,
     fetchAccountStatus,
+    syncState,
     switchAccount,
     refreshAll
   }
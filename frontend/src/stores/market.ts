@@ -2,6 +2,9 @@ import { defineStore } from 'pinia'
 import { ref } from 'vue'
 import { api } from '@/api'
 
+// 图表最多绘制的K线根数
+const KLINE_MAX_POINTS = 2000
+
 export const useMarketStore = defineStore('market', () => {
   // 状态
   const currentQuote = ref<any>(null)
@@ -27,7 +30,8 @@ export const useMarketStore = defineStore('market', () => {
   async function fetchKline(stockCode: string, params?: any) {
     try {
       loading.value = true
-      klineData.value = await api.market.kline(stockCode, params)
+      // 长区间由服务端按K线聚合降采样，图表绘制的点数保持不变
+      klineData.value = await api.market.kline(stockCode, { max_points: KLINE_MAX_POINTS, ...params })
     } catch (error) {
       console.error('获取K线数据失败:', error)
     } finally {